@@ -3,6 +3,7 @@
  # Tim Klug
 
 
+import arcpy
 from arcpy import env
 from arcpy import da
 from arcpy import ta
@@ -16,19 +17,34 @@ import time
 import string
 import datetime
 from sets import Set
+
+from EK_Autoshape_Pool import RunOrbits, ReportFailures
+from EK_Autoshape_Time import EphToReqTime
+from EK_Autoshape_Orbits import OrbitLabel, FileOrbit
+from EK_Autoshape_Tracks import ExportLineNative, SimplifyArc, SimplifySummary, LINE_PARTS
+from EK_Autoshape_Swath import BufferDistanceKm, BufferOrbitNative, FormatBufferNative, BUFFER_PARTS, FORMAT_PARTS
+from EK_Autoshape_Lenses import ReadLensSchedule, LensSwathsNative
+from EK_Autoshape_Manifest import LoadManifest, HashShapefile, Pending, Complete, SaveManifest, RunStale
+from EK_Autoshape_Index import IndexCurrent, BuildIndex
+from EK_Autoshape_Coverage import BuildCoverage, CoverageSummary
+from EK_Autoshape_GeoPackage import PackMission
+from EK_Autoshape_Trace import OpenTrace, BeginStage, EndStage, ReportTrace, SaveTrace
+
 arcpy.env.overwriteOutput = True
-arcpy.CheckOutExtension("tracking")
 
-gp = arcgisscripting.create(9.3)
+ # Tracking Analyst license held by this process, checked out on first use by CheckOutTracking()
+_tracking = []
 
 
  #
- # This file consists of five functions and a main level program designed to be run as an ArcGIS python tool.
+ # This file consists of eleven functions and a main level program designed to be run as an ArcGIS python tool.
  # These functions are designed to process a directory of point-arc shapefiles of ISS orbits during EarthKAM
  # missions. The main level program establishes a workflow that exports time-enabled polylines from each
  # point-arc ephemeris shapefile, converts those polylines to buffered polygon shapes that reflect the field
  # of view of each camera lens being used, and reformats buffer shapefiles to contain orbit numbers and photo 
- # request formatted datetime objects.
+ # request formatted datetime objects. A fused mode runs the same three steps per orbit in memory and writes
+ # only the formatted buffer shapefiles. An optional lens schedule also buffers every orbit line for each
+ # candidate lens in one pass, into \Lens, and the footprints can be rasterized into coverage and revisit grids.
  #
  # Author:
  #   Tim Klug
@@ -38,28 +54,6 @@ gp = arcgisscripting.create(9.3)
  #
 
  
- # set parameters in ArcGIS python tool
-
- # Set main workspace. Should be named "Mission_XX"
-arcpy.env.workspace = gp.GetParameterAsText(0)
-
- # Set lens swap orbit as a long integer
-SwapLens = gp.GetParameter(1)
-
- # Set mission number as a long integer
-MissionNum = gp.GetParameter(2)
-
-
- # set workspace parameters
-
- # Set location of processing directory. All exported outputs will appear here.
- #   Should be located at \Mission_XX\MXX_Processed_Orbits
-procDir = arcpy.env.workspace + r'\M' + str(MissionNum) + '_Processed_Orbits'
-
- # Create processing directory if nonexistent.
-if not os.path.isdir(procDir):
-  os.makedirs(procDir)
-  
  # Convert Ephemeris Time (MM/DD/YY HH:MM:SS) to Request Time format (YYYY/DDD/HH:MM:SS)
 def ConvertEphTime(EphTime):
 
@@ -78,11 +72,9 @@ def ConvertEphTime(EphTime):
  # Define output ReqTime format string
   ReqTime_fmt = '%Y/%j/%H:%M:%S'
   
- # Declare a datetime object of ArcEph_fmt datetime format
-  dt = datetime.datetime.strptime(EphTime, ArcEph_fmt)
- 
- # Strip the dt datetime object in the ReqTime_fmt format
-  ReqTime = dt.strftime(ReqTime_fmt)
+ # Parse the ArcEph_fmt string with the fixed-layout parser and write it in the ReqTime_fmt format.
+ #   Conversions are memoized, since every orbit repeats the same ephemeris seconds
+  ReqTime = EphToReqTime(EphTime)
   
  # Return the reformatted date and time string 
   return ReqTime
@@ -103,13 +95,16 @@ def ReqFmt(buffFC_in, buffOrbNum):
  
  # Declare array of field names to be referenced by the arcpy update cursor
   fields = ["Start_Time", "OrbitNum", "ReqTime", "MDYTime"]
+
+ # Orbit label shared by every row, e.g. "Orbit 0998"
+  label = OrbitLabel(int(buffOrbNum))
   
  # Instantiate arcpy update cursor using the input buffer feature class and the referenced fields
   with arcpy.da.UpdateCursor(buffFC_in, fields) as cursor:
   
     for row in cursor:                     # Loop through each row of the cursor in the feature class
     
-      row[1] = "Orbit " + buffOrbNum       # Give an orbit name to the "OrbitNum" field
+      row[1] = label                       # Give an orbit name to the "OrbitNum" field
       
       row[2] = ConvertEphTime(row[0])      # Convert the ephemeris time found in "Start_Time" field and write to "ReqTime"
       
@@ -119,7 +114,91 @@ def ReqFmt(buffFC_in, buffOrbNum):
       
   return
 
-def ExportLines(procDir):
+def CheckOutTracking():
+
+# Checks out the Tracking Analyst extension once per process. Worker processes only check it out when they run
+# an orbit on the Tracking Analyst path, not when they import this file
+#
+
+  if not _tracking:
+    arcpy.CheckOutExtension("tracking")
+    _tracking.append(True)
+
+  return
+
+def ExportLine(arcFC, outLineFC, native=False, toleranceKm=0.0):
+
+# Exports time-enabled polylines from a single point-arc ephemeris feature class
+#
+# Params:
+#   arcFC: in, required, type = string
+#   string containing the path to the point-arc feature class being processed
+#
+#   outLineFC: in, required, type = string
+#   string containing the path to the output polyline feature class
+#
+#   native: in, optional, type = boolean
+#   build the polylines with the native segment engine instead of the Tracking Analyst extension.
+#   outLineFC must then be a shapefile path
+#
+#   toleranceKm: in, optional, type = float
+#   drop the arc points within toleranceKm of the simplified ground track before building the polylines, and add
+#   the OFFSETS of the points each polyline covers (see EK_Autoshape_Tracks.py). 0 keeps every point
+#
+#   stats: out, required, type = tuple
+#   (points, kept, deviation) simplification statistics of the orbit, or None when not simplified
+#
+
+# Build the same line fields with array math when the native engine is requested
+  if native:
+    stats = ExportLineNative(arcFC, outLineFC, toleranceKm)
+    return stats if toleranceKm else None
+
+# Keep only the vertices of the simplified track in an in_memory copy, keyed on their file order (FID)
+  stats = None
+
+  if toleranceKm:
+    (kept, offsets, stats) = SimplifyArc(arcFC, toleranceKm)
+    arcCopy = r'in_memory\orb' + str(FileOrbit(arcFC)).zfill(4) + '_kept'
+    arcpy.CopyFeatures_management(arcFC, arcCopy)
+    with arcpy.da.UpdateCursor(arcCopy, ["SHAPE@XY"]) as cursor:
+      for (row, point) in enumerate(cursor):
+        if row not in kept:
+          cursor.deleteRow()
+    arcFC = arcCopy
+
+# Set arcpy time-enabled polyline function parameters
+  time_field = "TA_DATE"
+  distance_field_units = "KILOMETERS"
+  distance_field_name = "D_KM"
+  duration_field_units = "SECONDS"
+  duration_field_name = "DURATION"
+  speed_field_units = "KILOMETERS_PER_HOUR"
+  speed_field_name = "SPP_KM_H"
+  course_field_units = "DEGREES"
+  course_field_name = "HEADING"
+
+# Convert arc-point shapes from current feature class to time-enabled polylines
+  CheckOutTracking()
+
+  arcpy.TrackIntervalsToLine_ta(arcFC, outLineFC, time_field, "", "", "", "", "",
+                                distance_field_units,   distance_field_name,
+                                duration_field_units,   duration_field_name,
+                                speed_field_units,      speed_field_name,
+                                course_field_units,     course_field_name)
+
+# Record the points each span of the simplified track covers, one polyline per span in time order, and release
+# the copy of the kept points
+  if stats is not None:
+    arcpy.AddField_management(outLineFC, "OFFSETS", "TEXT", field_length=254)
+    with arcpy.da.UpdateCursor(outLineFC, ["OFFSETS"]) as cursor:
+      for (row, values) in enumerate(cursor):
+        cursor.updateRow([offsets[row]])
+    arcpy.Delete_management(arcFC)
+
+  return stats
+
+def ExportLines(procDir, workers=1, native=False, manifest=None, toleranceKm=0.0, stats=None, pipelined=False):
 
 # Exports time-enabled polylines from each point-arc ephemeris feature class in the MXX_Processed_Orbits\Arc" directory
 # 
@@ -127,6 +206,27 @@ def ExportLines(procDir):
 #   procDir: in, required, type = string
 #   string containing the path to the processing directory
 #
+#   workers: in, optional, type = integer
+#   number of worker processes sharing the orbits of this stage
+#
+#   native: in, optional, type = boolean
+#   build the polylines with the native segment engine
+#
+#   manifest: in, optional, type = dictionary
+#   rebuild manifest. Only lines whose point-arc or parameters changed are rebuilt. None rebuilds every line
+#
+#   toleranceKm: in, optional, type = float
+#   track simplification tolerance in kilometers. 0 keeps every point
+#
+#   stats: in, optional, type = dictionary
+#   filled with the simplification statistics of each rebuilt orbit
+#
+#   pipelined: in, optional, type = boolean
+#   overlap the reads and writes of consecutive orbits when running serially (native only)
+#
+#   failures: out, required, type = list
+#   list of (orbNum, error) tuples for each orbit that failed
+#
 
 # Set arc-point input directory within processing directory
   arcDir_in = glob.glob(procDir + r'\Arc\*.shp')
@@ -138,35 +238,78 @@ def ExportLines(procDir):
   if not os.path.isdir(lineDir_out):
     os.makedirs(lineDir_out)
    
-# Loop for each feature class in the arc-point directory
+# Run ExportLine for each feature class in the arc-point directory whose line is out of date
+  jobs = []
+
   for arcFC in arcDir_in:
-  
-# Strip orbit number integer current arc-point feature class
-    arcOrbNum = int(arcFC[-12:-8])
+    current = FileOrbit(arcFC)
+    outLineFC = lineDir_out + r'\orb' + str(current).zfill(4) + "_line.shp"
+    inputs = {"Arc": HashShapefile(manifest, arcFC)} if manifest is not None else None
+    params = {"native": bool(native)}
+    if toleranceKm:
+      params["decimateKm"] = float(toleranceKm)
+    jobs.append((current, (arcFC, outLineFC, native, toleranceKm), inputs, params, outLineFC))
+
+# Split the native line engine into its read, build and write parts when pipelining
+  if native and pipelined:
+    jobs = [(orbNum, args[:2] + args[3:], inputs, params, output) for (orbNum, args, inputs, params, output) in jobs]
+    return RunStale(ExportLineNative, jobs, workers, manifest, procDir, "Line", values=stats, pipeline=LINE_PARTS)
+
+  return RunStale(ExportLine, jobs, workers, manifest, procDir, "Line", values=stats)
+
+def BufferOrbit(lineFC, outBuffFC, current, SwapLens, native=False, geodesic=False):
+
+#
+# Converts a single time-enabled polyline feature class to a buffered polygon feature class
+#
+# Params:
+#   lineFC: in, required, type = string
+#   string containing the path to the polyline feature class being processed
+#
+#   outBuffFC: in, required, type = string
+#   string containing the path to the output buffer feature class
+#
+#   current: in, required, type = integer
+#   orbit number of the polyline feature class being processed
+#
+#   SwapLens: in, required, type = integer
+#   index of the lens swap orbit
+#
+#   native: in, optional, type = boolean
+#   build the swath polygons with the native swath engine instead of Buffer_analysis.
+#   lineFC and outBuffFC must then be shapefile paths
+#
+#   geodesic: in, optional, type = boolean
+#   buffer geodesically instead of in the planar units of the line feature class
+#
+
+# Set buffer distance for pre-lens swap (56 km) or post-lens swap (17 km) cases
+  buffKm = BufferDistanceKm(current, SwapLens)
+
+# Build the flat-ended swath polygons with array math when the native engine is requested
+  if native:
+    BufferOrbitNative(lineFC, outBuffFC, buffKm, geodesic)
+    return
+
+# Carry the OFFSETS of a simplified track to the buffer. Every span has its own Start_Time
+  dissolve_fields = ["Start_Time"]
+
+  if "OFFSETS" in [field.name for field in arcpy.ListFields(lineFC)]:
+    dissolve_fields.append("OFFSETS")
+
+# Convert polyline feature class to a buffered polygons
+  buff = arcpy.Buffer_analysis(in_features=lineFC,
+                    out_feature_class=outBuffFC,
+                    buffer_distance_or_field=str(buffKm) + " Kilometers",
+                    line_side="FULL",
+                    line_end_type="FLAT",
+                    dissolve_option="LIST",
+                    dissolve_field=dissolve_fields,
+                    method="GEODESIC" if geodesic else "PLANAR")
 
-# Set arcpy time-enabled polyline function parameters
-    outLineFC = lineDir_out + r'\orb' + str(arcOrbNum).zfill(4) + "_line.shp"
-    time_field = "TA_DATE"
-    distance_field_units = "KILOMETERS"
-    distance_field_name = "D_KM"
-    duration_field_units = "SECONDS"
-    duration_field_name = "DURATION"
-    speed_field_units = "KILOMETERS_PER_HOUR"
-    speed_field_name = "SPP_KM_H"
-    course_field_units = "DEGREES"
-    course_field_name = "HEADING"
-  
-# Convert arc-point shapes from current feature class to time-enabled polylines
-    arcpy.TrackIntervalsToLine_ta(arcFC, outLineFC, time_field, "", "", "", "", "",
-                                  distance_field_units,   distance_field_name,
-                                  duration_field_units,   duration_field_name,
-                                  speed_field_units,      speed_field_name,
-                                  course_field_units,     course_field_name)
-    #arcOrbNum += 1
-    
   return
 
-def BufferFOV(procDir, SwapLens):
+def BufferFOV(procDir, SwapLens, workers=1, native=False, geodesic=False, manifest=None, pipelined=False):
 
 # 
 # Converts time-enabled polyline features to buffered polygon feature classes
@@ -178,6 +321,25 @@ def BufferFOV(procDir, SwapLens):
 #   SwapLens: in, required, type = integer
 #   index of the lens swap orbit
 #
+#   workers: in, optional, type = integer
+#   number of worker processes sharing the orbits of this stage
+#
+#   native: in, optional, type = boolean
+#   build the swath polygons with the native swath engine
+#
+#   geodesic: in, optional, type = boolean
+#   buffer geodesically
+#
+#   manifest: in, optional, type = dictionary
+#   rebuild manifest. Only buffers whose polyline, buffer distance or engine changed are rebuilt, and are
+#   recorded as awaiting FormatBuffer. None rebuilds every buffer
+#
+#   pipelined: in, optional, type = boolean
+#   overlap the reads and writes of consecutive orbits when running serially (native only)
+#
+#   failures: out, required, type = list
+#   list of (orbNum, error) tuples for each orbit that failed
+#
 
 # Set polyline input directory within processing directory
   lineDir_in = glob.glob(procDir + r'\Line\*.shp')
@@ -189,35 +351,56 @@ def BufferFOV(procDir, SwapLens):
   if not os.path.isdir(buffDir_out):
     os.makedirs(buffDir_out)
  
- # Loop for each feature class in the polylines directory
-  for lineFC in lineDir_in:             
-  
- # Strip current orbit number from current feature class
-    current = int(lineFC[-13:-9])       
-    
-    if current <= SwapLens:
+ # Run BufferOrbit for each feature class in the polylines directory whose buffer is out of date
+  jobs = []
 
-# Set buffer distance for pre-lens swap cases
-      buffDist = "56 Kilometers"
-      
-    else:
-    
-# Set buffer distance for post-lens swap cases
-      buffDist = "17 Kilometers"
-      
-# Convert polyline feature class to a buffered polygons  
-    buff = arcpy.Buffer_analysis(in_features=lineFC,
-                      out_feature_class= buffDir_out + '\orb' + str(current).zfill(4) + '_buff.shp',
-                      buffer_distance_or_field=buffDist,
-                      line_side="FULL",
-                      line_end_type="FLAT",
-                      dissolve_option="LIST",
-                      dissolve_field=["Start_Time"],
-                      method="PLANAR")
+  for lineFC in lineDir_in:
+    current = FileOrbit(lineFC)
+    outBuffFC = buffDir_out + '\orb' + str(current).zfill(4) + '_buff.shp'
+    inputs = {"Line": HashShapefile(manifest, lineFC)} if manifest is not None else None
+    params = {"buffKm": BufferDistanceKm(current, SwapLens), "native": bool(native), "geodesic": bool(geodesic)}
+    jobs.append((current, (lineFC, outBuffFC, current, SwapLens, native, geodesic), inputs, params, outBuffFC))
+
+# Split the native swath engine into its read, build and write parts when pipelining
+  if native and pipelined:
+    jobs = [(orbNum, (args[0], args[1], params["buffKm"], geodesic), inputs, params, output)
+            for (orbNum, args, inputs, params, output) in jobs]
+    return RunStale(BufferOrbitNative, jobs, workers, manifest, procDir, "Buff", complete=False,
+                    pipeline=BUFFER_PARTS)
+
+  return RunStale(BufferOrbit, jobs, workers, manifest, procDir, "Buff", complete=False)
+
+def FormatOrbit(BuffFC, buffOrbNum):
+
+# Reformats a single buffered polygon feature class to display request formatted times and orbit numbers
+#
+# Params:
+#
+#   BuffFC: in, required, type = string
+#   string containing the path to the buffer feature class being processed
+#
+#   buffOrbNum: in, required, type = string
+#   string containing the orbit number of the buffer feature class being processed
+#
+
+# Add "OrbitNum" field to buffer feature class using arcpy
+  arcpy.AddField_management(BuffFC, "OrbitNum", "STRING")
+
+# Add "ReqTime" field to buffer feature class using arcpy
+  arcpy.AddField_management(BuffFC, "ReqTime", "STRING")
+
+# Add "MDYTime" field to buffer feature class using arcpy
+  arcpy.AddField_management(BuffFC, "MDYTime", "STRING")
+
+# Convert date time string found in "Start_Time" field to request format
+  ReqFmt(BuffFC, buffOrbNum)
+
+# Delete "Start_Time" field using arcpy (This data has now been moved to "MDYTime")
+  arcpy.DeleteField_management(BuffFC, ["Start_Time"])
 
   return
 
-def FormatBuffer(procDir):
+def FormatBuffer(procDir, workers=1, manifest=None, native=False, pipelined=False):
 
 # Reformats buffered polygon feature classes to display request formatted times and orbit numbers
 # 
@@ -226,37 +409,357 @@ def FormatBuffer(procDir):
 #   procDir: in, required, type = string
 #   string containing the path to the processing directory
 #
+#   workers: in, optional, type = integer
+#   number of worker processes sharing the orbits of this stage
+#
+#   manifest: in, optional, type = dictionary
+#   rebuild manifest. Only buffers rebuilt by BufferFOV and not yet formatted are formatted.
+#   None formats every buffer
+#
+#   native: in, optional, type = boolean
+#   rewrite the buffers with the native shapefile writer instead of adding and calculating fields
+#
+#   pipelined: in, optional, type = boolean
+#   overlap the reads and writes of consecutive orbits when running serially (native only)
+#
+#   failures: out, required, type = list
+#   list of (orbNum, error) tuples for each orbit that failed
+#
 
 # Set buffer polygon input directory within processing directory
   BuffDir_in = glob.glob(procDir + r'\Buff\*.shp')
 
-# Loop for each feature class in buffer directory
-  for BuffFC in BuffDir_in:
-  
-# Strip orbit number string from current ceature class
-    buffOrbNum = BuffFC[-13:-9]
-    
-# Add "OrbitNum" field to buffer feature class using arcpy
-    arcpy.AddField_management(BuffFC, "OrbitNum", "STRING")
+# Restrict the feature classes to the unformatted buffers recorded in the manifest
+  if manifest is not None:
+    pending = set(Pending(manifest, "Buff"))
+    BuffDir_in = [BuffFC for BuffFC in BuffDir_in if FileOrbit(BuffFC) in pending]
 
-# Add "ReqTime" field to buffer feature class using arcpy    
-    arcpy.AddField_management(BuffFC, "ReqTime", "STRING")
-    
-# Add "MDYTime" field to buffer feature class using arcpy
-    arcpy.AddField_management(BuffFC, "MDYTime", "STRING")
+# Run FormatOrbit for each feature class in buffer directory
+  if native:
+    jobs = [(FileOrbit(BuffFC), (BuffFC, FileOrbit(BuffFC))) for BuffFC in BuffDir_in]
 
-# Convert date time string found in "Start_Time" field to request format
-    ReqFmt(BuffFC, buffOrbNum)
+    failures = RunOrbits(FormatBufferNative, jobs, workers, pipeline=FORMAT_PARTS if pipelined else None)
+  else:
+    jobs = [(FileOrbit(BuffFC), (BuffFC, str(FileOrbit(BuffFC)).zfill(4))) for BuffFC in BuffDir_in]
 
-# Delete "Start_Time" field using arcpy (This data has now been moved to "MDYTime")
-    arcpy.DeleteField_management(BuffFC, ["Start_Time"])
-      
-  return
+    failures = RunOrbits(FormatOrbit, jobs, workers)
+
+# Record the formatted buffers as complete
+  if manifest is not None:
+    failed = set(orbNum for (orbNum, error) in failures)
+
+    for (orbNum, args) in jobs:
+      if orbNum not in failed:
+        Complete(manifest, "Buff", orbNum)
+
+    SaveManifest(procDir, manifest)
+
+  return failures
+
+def FuseOrbit(arcFC, procDir, SwapLens, keepIntermediate=False, native=False, geodesic=False, toleranceKm=0.0):
+
+# Streams a single point-arc ephemeris feature class through line building, FOV buffering and attribute
+# formatting in the in_memory workspace, writing only the formatted footprint to the "MXX_Processed_Orbits\Buff"
+# directory
+#
+# Params:
+#   arcFC: in, required, type = string
+#   string containing the path to the point-arc feature class being processed
+#
+#   procDir: in, required, type = string
+#   string containing the path to the processing directory
+#
+#   SwapLens: in, required, type = integer
+#   index of the lens swap orbit
+#
+#   keepIntermediate: in, optional, type = boolean
+#   also write the polyline to the "Line" directory and the unformatted buffer to the "Debug" directory
+#
+#   native: in, optional, type = boolean
+#   build the polylines and swath polygons with the native engines. The native engines write shapefiles,
+#   so the intermediates are kept in the scratch folder instead of the in_memory workspace
+#
+#   geodesic: in, optional, type = boolean
+#   buffer geodesically
+#
+#   toleranceKm: in, optional, type = float
+#   track simplification tolerance in kilometers. 0 keeps every point
+#
+#   stats: out, required, type = tuple
+#   simplification statistics returned by ExportLine()
+#
+
+# Strip orbit number string from current arc-point feature class
+  arcOrbNum = str(FileOrbit(arcFC)).zfill(4)
+
+# Set in_memory intermediate feature classes
+  if native:
+    lineFC = os.path.join(arcpy.env.scratchFolder, 'orb' + arcOrbNum + '_line.shp')
+    buffFC = os.path.join(arcpy.env.scratchFolder, 'orb' + arcOrbNum + '_buff.shp')
+  else:
+    lineFC = r'in_memory\orb' + arcOrbNum + '_line'
+    buffFC = r'in_memory\orb' + arcOrbNum + '_buff'
+
+  try:
+
+# Convert arc-point shapes to time-enabled polylines and buffer them without touching disk
+    stats = ExportLine(arcFC, lineFC, native, toleranceKm)
+
+    BufferOrbit(lineFC, buffFC, int(arcOrbNum), SwapLens, native, geodesic)
+
+# Copy intermediate outputs to disk only when requested for debugging
+    if keepIntermediate:
+      arcpy.CopyFeatures_management(lineFC, procDir + r'\Line\orb' + arcOrbNum + '_line.shp')
+      arcpy.CopyFeatures_management(buffFC, procDir + r'\Debug\orb' + arcOrbNum + '_buff.shp')
+
+# Format the in_memory buffer and write the final footprint in a single copy
+    FormatOrbit(buffFC, arcOrbNum)
+
+    arcpy.CopyFeatures_management(buffFC, procDir + r'\Buff\orb' + arcOrbNum + '_buff.shp')
+
+  finally:
+
+# Release the intermediate feature classes of this orbit
+    for fc in (lineFC, buffFC):
+      if arcpy.Exists(fc):
+        arcpy.Delete_management(fc)
+
+  return stats
+
+def FuseOrbits(procDir, SwapLens, workers=1, keepIntermediate=False, native=False, geodesic=False, manifest=None,
+               toleranceKm=0.0, stats=None):
+
+# Runs the fused line, buffer and format pipeline for each point-arc ephemeris feature class in the
+# MXX_Processed_Orbits\Arc" directory
+#
+# Params:
+#   procDir: in, required, type = string
+#   string containing the path to the processing directory
+#
+#   SwapLens: in, required, type = integer
+#   index of the lens swap orbit
+#
+#   workers: in, optional, type = integer
+#   number of worker processes sharing the orbits of this stage
+#
+#   keepIntermediate: in, optional, type = boolean
+#   also write the intermediate polylines and unformatted buffers to disk
+#
+#   native: in, optional, type = boolean
+#   build the polylines and swath polygons with the native engines
+#
+#   geodesic: in, optional, type = boolean
+#   buffer geodesically
+#
+#   manifest: in, optional, type = dictionary
+#   rebuild manifest. Only footprints whose point-arc or parameters changed are rebuilt.
+#   None rebuilds every footprint
+#
+#   toleranceKm: in, optional, type = float
+#   track simplification tolerance in kilometers. 0 keeps every point
+#
+#   stats: in, optional, type = dictionary
+#   filled with the simplification statistics of each orbit that was rebuilt
+#
+#   failures: out, required, type = list
+#   list of (orbNum, error) tuples for each orbit that failed
+#
+
+# Set arc-point input directory within processing directory
+  arcDir_in = glob.glob(procDir + r'\Arc\*.shp')
+
+# Create output directories if nonexistent
+  outDirs = [procDir + r'\Buff']
+
+  if keepIntermediate:
+    outDirs += [procDir + r'\Line', procDir + r'\Debug']
+
+  for outDir in outDirs:
+    if not os.path.isdir(outDir):
+      os.makedirs(outDir)
+
+# Run FuseOrbit for each feature class in the arc-point directory whose footprint is out of date
+  jobs = []
+
+  for arcFC in arcDir_in:
+    current = FileOrbit(arcFC)
+    outBuffFC = procDir + r'\Buff\orb' + str(current).zfill(4) + '_buff.shp'
+    inputs = {"Arc": HashShapefile(manifest, arcFC)} if manifest is not None else None
+    params = {"buffKm": BufferDistanceKm(current, SwapLens), "native": bool(native), "geodesic": bool(geodesic)}
+    if toleranceKm:
+      params["decimateKm"] = float(toleranceKm)
+    jobs.append((current, (arcFC, procDir, SwapLens, keepIntermediate, native, geodesic, toleranceKm), inputs, params,
+                 outBuffFC))
+
+  return RunStale(FuseOrbit, jobs, workers, manifest, procDir, "Buff", values=stats)
 
 #  ************************************ Main level loop ******************************************
 
-ExportLines(procDir)
+ # The main level program only runs when the tool is executed, not when worker processes import this file
+if __name__ == '__main__':
+
+  # Create the geoprocessor of the tool. Worker processes importing this file never need one
+  gp = arcgisscripting.create(9.3)
+
+  # set parameters in ArcGIS python tool
+
+  # Set main workspace. Should be named "Mission_XX"
+  arcpy.env.workspace = gp.GetParameterAsText(0)
+
+  # Set lens swap orbit as a long integer
+  SwapLens = gp.GetParameter(1)
+
+  # Set mission number as a long integer
+  MissionNum = gp.GetParameter(2)
+
+  # Set number of worker processes as an optional long integer. Orbits are processed serially when left empty
+  Workers = gp.GetParameter(3) or 1
+
+  # Set fused mode as an optional boolean. Streams each orbit from \Arc to \Buff without intermediate files
+  Fused = gp.GetParameter(4)
+
+  # Set intermediate output as an optional boolean. Keeps \Line and unformatted \Debug buffers in fused mode
+  KeepIntermediate = gp.GetParameter(5)
+
+  # Set native engines as an optional boolean. Builds lines and swaths with array math instead of geoprocessing tools
+  Native = gp.GetParameter(6)
+
+  # Set geodesic buffering as an optional boolean. Keeps the true FOV width at high latitudes
+  Geodesic = gp.GetParameter(7)
+
+  # Set full rebuild as an optional boolean. Ignores the rebuild manifest and reprocesses every orbit
+  FullRebuild = gp.GetParameter(8)
+
+  # Set GeoPackage output as an optional boolean. Packs \Arc, \Line and \Buff into one \MXX_Mission.gpkg, replacing
+  #   only the orbits whose shapefiles changed. The shapefiles are kept unless drop packed shapefiles is also set
+  GeoPackage = gp.GetParameter(9)
+
+  # Set trace file as an optional .json or .csv path. Records wall time, CPU time, rows, files and peak memory
+  #   of every stage and orbit. Stage summaries are always reported in the tool messages
+  TraceFile = gp.GetParameterAsText(10)
+
+  # Set profile orbit as an optional long integer. Runs that orbit of every stage under cProfile
+  ProfileOrbit = gp.GetParameter(11)
+
+  # Set track simplification as an optional double in kilometers. Drops arc points lying within this distance of
+  #   the simplified ground track before buffering, one footprint per span. Each footprint keeps the Start_Time
+  #   offsets of the points it covers in an OFFSETS field
+  Simplify = gp.GetParameter(12) or 0
+
+  # Set pipelined execution as an optional boolean. With the native engines and a single worker, reads the next
+  #   orbit and writes the previous one while the current orbit is processed
+  Pipelined = gp.GetParameter(13)
+
+  # Set lens schedule as an optional .csv path with Lens, FirstOrbit, LastOrbit and BuffKm columns. Also writes
+  #   the footprints of every scheduled lens of each orbit, tagged by lens, to \Lens
+  LensSchedule = gp.GetParameterAsText(14)
+
+  # Set coverage cell size as an optional double in degrees. Rasterizes the footprints in \Buff into coverage,
+  #   revisit and first pass grids saved to \AutoShape_Coverage.npz
+  CoverageCell = gp.GetParameter(15) or 0
+
+  # Set drop packed shapefiles as an optional boolean, off by default. With GeoPackage output, deletes each orbit
+  #   shapefile once it is packed, leaving the GeoPackage as the only copy. This ends incremental processing: the
+  #   rebuild manifest, footprint index, planner, lenses, coverage, watch mode and KML export all read the
+  #   shapefiles, so run them before, and the next run rebuilds every orbit from a new \Arc
+  DropPacked = gp.GetParameter(16)
+
+  # Check out the Tracking Analyst extension used by TrackIntervalsToLine_ta. The native engines never call it,
+  #   so seats without a Tracking Analyst license can run them
+  if not Native:
+    CheckOutTracking()
+
+
+  # set workspace parameters
+
+  # Set location of processing directory. All exported outputs will appear here.
+  #   Should be located at \Mission_XX\MXX_Processed_Orbits
+  procDir = arcpy.env.workspace + r'\M' + str(MissionNum) + '_Processed_Orbits'
+
+  # Create processing directory if nonexistent.
+  if not os.path.isdir(procDir):
+    os.makedirs(procDir)
+
+  # Load the rebuild manifest so only orbits with changed inputs or parameters are reprocessed
+  manifest = LoadManifest(procDir)
+
+  if FullRebuild:
+    manifest['stages'] = {}
+
+  # Open the trace measuring each stage and orbit
+  trace = OpenTrace(TraceFile, ProfileOrbit)
+
+  # Run each stage over every out of date orbit, collecting the orbits that failed in each stage
+  failures = []
+  simplifyStats = {}
+
+  if Fused:
+
+    BeginStage(trace, "FuseOrbits")
+    for (orbNum, error) in FuseOrbits(procDir, SwapLens, Workers, KeepIntermediate, Native, Geodesic, manifest,
+                                          Simplify, simplifyStats):
+      failures.append(("FuseOrbits", orbNum, error))
+    EndStage(trace)
 
-BufferFOV(procDir, SwapLens)
+  else:
 
-FormatBuffer(procDir)
\ No newline at end of file
+    BeginStage(trace, "ExportLines")
+    for (orbNum, error) in ExportLines(procDir, Workers, Native, manifest, Simplify, simplifyStats, Pipelined):
+      failures.append(("ExportLines", orbNum, error))
+    EndStage(trace)
+
+    BeginStage(trace, "BufferFOV")
+    for (orbNum, error) in BufferFOV(procDir, SwapLens, Workers, Native, Geodesic, manifest, Pipelined):
+      failures.append(("BufferFOV", orbNum, error))
+    EndStage(trace)
+
+    BeginStage(trace, "FormatBuffer")
+    for (orbNum, error) in FormatBuffer(procDir, Workers, manifest, Native, Pipelined):
+      failures.append(("FormatBuffer", orbNum, error))
+    EndStage(trace)
+
+  # Buffer each orbit line once more for every candidate lens of the schedule. Needs the \Line shapefiles
+  if LensSchedule and Fused and not KeepIntermediate:
+    gp.AddWarning("The lens schedule needs the \\Line shapefiles. Set intermediate output in fused mode.")
+
+  elif LensSchedule:
+    BeginStage(trace, "LensSwaths")
+    for (orbNum, error) in LensSwathsNative(procDir, ReadLensSchedule(LensSchedule), Geodesic, Workers, manifest,
+                                            Pipelined):
+      failures.append(("LensSwaths", orbNum, error))
+    EndStage(trace)
+
+  # Report the points and segments dropped by the simplified track and the largest deviation it introduced
+  if Simplify:
+    gp.AddMessage(SimplifySummary(simplifyStats, Simplify))
+
+  # Report which orbits failed once every stage has finished
+  ReportFailures(gp, failures)
+
+  # Index the footprints in \Buff for site queries, only when a buffer changed since the index was saved. An
+  #   empty \Buff, left behind once the shapefiles were packed and dropped, keeps the last index
+  if glob.glob(procDir + r'\Buff\*.shp') and not IndexCurrent(procDir):
+    BeginStage(trace, "BuildIndex")
+    BuildIndex(procDir)
+    EndStage(trace, files=1)
+
+  # Measure the area covered by the footprints and how often each cell is revisited
+  if CoverageCell:
+    BeginStage(trace, "BuildCoverage")
+    coverage = BuildCoverage(procDir, CoverageCell)
+    EndStage(trace, files=1)
+    gp.AddMessage(CoverageSummary(coverage))
+
+  # Pack the orbit shapefiles into the mission GeoPackage, replacing only the orbits that changed. Packed shapefiles
+  #   are only dropped when asked, and kept when an orbit failed so it can be rerun from its \Arc
+  if GeoPackage:
+    BeginStage(trace, "PackMission")
+    (packed, dropped) = PackMission(procDir, arcpy.env.workspace + r'\M' + str(MissionNum) + '_Mission.gpkg',
+                                    DropPacked and not failures)
+    EndStage(trace, files=1 if packed or dropped else 0)
+    if DropPacked and failures:
+      gp.AddWarning("Orbits failed, so the packed shapefiles were kept for a rerun.")
+
+  # Report the time and memory of each stage, and write the trace file when one was given
+  ReportTrace(gp, trace)
+  SaveTrace(trace)
@@ -0,0 +1,190 @@
+# EarthKAM AutoShape Arc Export Engine
+# EK_Autoshape_Arcs.py
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from EK_Autoshape_Lighting import SortIntervals, AssignOrbits
+from EK_Autoshape_Orbits import GroupOrbits, FileOrbit
+from EK_Autoshape_Time import ParseLightTimes
+from EK_Autoshape_Cache import ReadColumns
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for splitting raw coasting arcs into daylight
+ # point-arc shapefiles without arcpy, the native counterpart of the Daylight tool. The points of each coasting
+ # arc are labeled with the orbit number of their lighting interval and written to one orbNNNN_arc.shp per
+ # orbit with the coasting arc attributes and an OrbitNum field. The coasting arcs themselves are left
+ # unchanged.
+ #
+ # A sunlit pass can start at the end of one coasting arc and finish in the next. SharedOrbits() finds these
+ # orbits before the arcs are split: each is written only by the coasting arc holding most of its points, with
+ # the points of the other arcs merged in, so jobs splitting different coasting arcs in parallel never write
+ # the same point-arc.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Arcs.py <MXX_Raw_Orbits directory> <MXX_Processed_Orbits directory> [--lighting CSV]
+ #                               [--offset N]
+ #
+ # Without a lighting csv the sunlit intervals are computed from the coasting arcs (see EK_Autoshape_Solar.py).
+ #
+
+
+ # Orbit number field added to each point-arc shapefile
+ORBIT_FIELD = ("OrbitNum", 'C', 24, 0)
+
+ # Coasting arc fields not copied to the point-arc shapefiles, as deleted by the Daylight tool
+_DROPPED_FIELDS = ("TRACKID", "OrbitNum")
+
+
+def ReadLightingCSV(inCSV):
+
+ # Read a subpoint lighting csv into sorted epoch second interval arrays
+ #
+ # Params:
+ #   inCSV : in, required, type = string
+ #   path to the lighting csv (start and end times formatted as Y/m/d H:M:S.f)
+ #
+ #   (starts, ends) : out, required, type = tuple
+ #   float64 arrays returned by SortIntervals()
+
+  with open(inCSV, 'r') as f:
+    lines = [line.strip().split(',') for line in f if line.strip()]
+
+  return SortIntervals(ParseLightTimes([row[0] for row in lines]), ParseLightTimes([row[1] for row in lines]))
+
+def SharedOrbits(rawArcs, starts, ends, baseOrbit, numbers=None):
+
+ # Find the orbits whose points fall in more than one coasting arc
+ #
+ # Params:
+ #   rawArcs : in, required, type = list
+ #   paths to the raw coasting arc shapefiles of the mission, in time order
+ #
+ #   starts, ends, baseOrbit, numbers : in, required, type = see ExportArcsNative()
+ #
+ #   shared : out, required, type = dictionary
+ #   (owner, arcs) tuple of each orbit spanning coasting arcs, keyed on orbit number: the coasting arc holding
+ #   most of its points (the earliest on ties) and every coasting arc holding its points, in rawArcs order
+
+  held = {}
+
+  for rawArc in rawArcs:
+    for orbit in GroupOrbits(AssignOrbits(ReadColumns(rawArc)['time'], starts, ends, baseOrbit, numbers)):
+      held.setdefault(orbit.number, []).append((rawArc, len(orbit)))
+
+  return dict((number, (max(arcs, key=lambda arc: arc[1])[0], [arc[0] for arc in arcs]))
+              for (number, arcs) in held.items() if len(arcs) > 1)
+
+def _OrbitRows(rawArc, number, fields, starts, ends, baseOrbit, numbers):
+
+ # Return the records, in the given field order, and the shapes of the points of one orbit in a coasting arc
+
+  (arcFields, records, shapes) = shp.ReadShapefile(rawArc)
+
+  position = dict((f[0], i) for (i, f) in enumerate(arcFields))
+  rows = np.flatnonzero(AssignOrbits(ReadColumns(rawArc)['time'], starts, ends, baseOrbit, numbers) == number)
+
+  return ([[records[r][position[f[0]]] if f[0] in position else None for f in fields] for r in rows],
+          [shapes[r] for r in rows])
+
+def ExportArcsNative(coastingArc, procDir, starts, ends, baseOrbit, numbers=None, shared=None):
+
+ # Write the daylight orbits of one coasting arc to point-arc shapefiles
+ #
+ # Params:
+ #   coastingArc : in, required, type = string
+ #   path to the raw coasting arc shapefile
+ #
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   starts, ends : in, required, type = float64 arrays
+ #   sorted lighting intervals returned by SortIntervals() or EphemerisLighting()
+ #
+ #   baseOrbit : in, required, type = integer
+ #   orbit number of the first lighting interval
+ #
+ #   numbers : in, optional, type = int array
+ #   orbit number of each lighting interval, as returned by EphemerisLighting()
+ #
+ #   shared : in, optional, type = dictionary
+ #   orbits spanning coasting arcs returned by SharedOrbits(), given the same coasting arc paths. Such an
+ #   orbit is only written by its owner, from the points of every coasting arc holding it. None writes each
+ #   orbit from the points of this coasting arc only
+ #
+ #   orbits : out, required, type = list of integers
+ #   orbit numbers written
+
+  arcDir_out = os.path.join(procDir, 'Arc')
+
+  if not os.path.isdir(arcDir_out):
+    os.makedirs(arcDir_out)
+
+  orbits = AssignOrbits(ReadColumns(coastingArc)['time'], starts, ends, baseOrbit, numbers)
+
+  (fields, records, shapes) = shp.ReadShapefile(coastingArc)
+
+  keep      = [i for (i, f) in enumerate(fields) if f[0] not in _DROPPED_FIELDS]
+  outFields = [fields[i] for i in keep] + [ORBIT_FIELD]
+
+  written = []
+
+  for orbit in GroupOrbits(orbits):
+    (owner, arcs) = (shared or {}).get(orbit.number, (coastingArc, [coastingArc]))
+
+    if owner != coastingArc:
+      continue
+
+    label = 'Orbit ' + str(orbit.number)
+
+ # Points of the other coasting arcs holding the orbit are merged in coasting arc (time) order
+    outRecords = []
+    outShapes  = []
+
+    for arc in arcs:
+      if arc == coastingArc:
+        outRecords += [[records[r][i] for i in keep] for r in orbit.rows]
+        outShapes  += [shapes[r] for r in orbit.rows]
+      else:
+        (arcRecords, arcShapes) = _OrbitRows(arc, orbit.number, outFields[:-1], starts, ends, baseOrbit, numbers)
+        outRecords += arcRecords
+        outShapes  += arcShapes
+
+    shp.WriteShapefile(os.path.join(arcDir_out, 'orb' + str(orbit.number).zfill(4) + '_arc.shp'), shp.POINT,
+                       outFields, [record + [label] for record in outRecords], outShapes, prj=coastingArc)
+
+    written.append(orbit.number)
+
+  return written
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  from EK_Autoshape_Solar import EphemerisLighting
+
+  parser = argparse.ArgumentParser(description='Split raw coasting arcs into daylight point-arc shapefiles without arcpy.')
+  parser.add_argument('rawDir', help='path to the MXX_Raw_Orbits directory')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('--lighting', help='subpoint lighting csv. Computed from the coasting arcs when omitted')
+  parser.add_argument('--offset', type=int, default=0, help='orbit number offset')
+  args = parser.parse_args()
+
+  rawArcs = sorted(glob.glob(os.path.join(args.rawDir, '*.shp')))
+
+  if args.lighting:
+    (starts, ends) = ReadLightingCSV(args.lighting)
+    numbers = None
+  else:
+    (starts, ends, numbers) = EphemerisLighting(rawArcs, orbitOffset=args.offset)
+
+  baseOrbit = FileOrbit(rawArcs[0]) - 2 + args.offset
+  shared    = SharedOrbits(rawArcs, starts, ends, baseOrbit, numbers)
+
+  for rawArc in rawArcs:
+    print('ExportArcs: ' + os.path.basename(rawArc) + ' -> orbits ' +
+          ', '.join(str(o) for o in ExportArcsNative(rawArc, args.procDir, starts, ends, baseOrbit, numbers, shared)))
@@ -0,0 +1,304 @@
+# EarthKAM AutoShape Batch Driver
+# EK_Autoshape_Batch.py
+
+import argparse
+import csv
+import glob
+import os
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+from EK_Autoshape_Pool import OpenPool, SubmitOrbit
+from EK_Autoshape_Arcs import ReadLightingCSV, SharedOrbits, ExportArcsNative
+from EK_Autoshape_Orbits import FileOrbit
+from EK_Autoshape_Solar import EphemerisLighting, WriteLightingCSV
+from EK_Autoshape_Tracks import ExportLineNative
+from EK_Autoshape_Swath import BufferDistanceKm, BufferOrbitNative
+from EK_Autoshape_KMZ import ExportOrbitKMZ
+
+ #
+ # This file consists of functions and a command line program for reprocessing many missions in one run. Each
+ # mission is taken through the Daylight, AutoShape and KML stages with the native engines, and the orbit jobs
+ # of every mission are scheduled on one shared worker pool. A mission moves on to its next stage as soon as
+ # the last orbit of its current stage completes, so the stages of different missions overlap and the pool is
+ # kept busy until the last mission finishes. Each stage is handed the orbits that came out of the one before
+ # (the orbits written by the Daylight jobs, then those whose footprint was built), so an orbit that fails is
+ # reported and left out of the later stages of its mission even when an older output of it is still on disk.
+ # A mission whose stage cannot be prepared (no coasting arcs, unreadable lighting csv) stops there without
+ # affecting the others.
+ #
+ # The Daylight jobs split the coasting arcs in parallel. A sunlit pass spanning two coasting arcs is written
+ # only by the job of the arc holding most of it (see SharedOrbits()), so no two jobs write the same point-arc.
+ #
+ # Every stage rewrites its outputs, so the batch is a full reprocess and does not consult the rebuild
+ # manifest of the ArcGIS tools.
+ #
+ # The missions csv needs a header row with workspace, MissionNum and SwapLens columns, and optionally
+ # orbitOffset, lighting (path to the subpoint lighting csv, computed from the coasting arcs when empty) and
+ # geodesic (true/false) columns. Each workspace is a Mission_XX directory holding MXX_Raw_Orbits.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Batch.py <missions.csv> [--workers N]
+ #
+
+
+ # Stages run for each mission, in order
+STAGES = ("Daylight", "AutoShape", "KML")
+
+
+def ReadMissions(missionsCSV):
+
+ # Read a csv of missions to reprocess
+ #
+ # Params:
+ #   missionsCSV : in, required, type = string
+ #   path to the csv, with a header row naming at least the workspace, MissionNum and SwapLens columns
+ #
+ #   missions : out, required, type = list
+ #   list of mission dictionaries with workspace, MissionNum, SwapLens, orbitOffset, lighting and geodesic keys
+
+  with open(missionsCSV, 'r') as f:
+    rows = [dict((key.strip().lower(), (value or '').strip()) for (key, value) in row.items() if key is not None)
+            for row in csv.DictReader(f)]
+
+  missions = []
+
+  for row in rows:
+    missions.append({'workspace':   row['workspace'],
+                     'MissionNum':  int(row['missionnum']),
+                     'SwapLens':    int(row['swaplens']),
+                     'orbitOffset': int(row.get('orbitoffset') or 0),
+                     'lighting':    row.get('lighting') or None,
+                     'geodesic':    (row.get('geodesic') or '').lower() in ('1', 'true', 'yes', 'y')})
+
+  return missions
+
+def FuseOrbitNative(arcFC, procDir, SwapLens, geodesic=False):
+
+ # Build the line and the formatted FOV buffer of one point-arc shapefile
+ #
+ # Params:
+ #   arcFC : in, required, type = string
+ #   path to the point-arc shapefile being processed
+ #
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   SwapLens : in, required, type = integer
+ #   index of the lens swap orbit
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the swath corners geodesically
+
+  arcOrbNum = FileOrbit(arcFC)
+
+  lineFC = os.path.join(procDir, 'Line', 'orb' + str(arcOrbNum).zfill(4) + '_line.shp')
+  buffFC = os.path.join(procDir, 'Buff', 'orb' + str(arcOrbNum).zfill(4) + '_buff.shp')
+
+  ExportLineNative(arcFC, lineFC)
+
+  BufferOrbitNative(lineFC, buffFC, BufferDistanceKm(arcOrbNum, SwapLens), geodesic, arcOrbNum)
+
+  return
+
+def _MissionDirs(mission):
+
+ # Return the raw and processing directories of a mission
+
+  prefix = 'M' + str(mission['MissionNum'])
+
+  return (os.path.join(mission['workspace'], prefix + '_Raw_Orbits'),
+          os.path.join(mission['workspace'], prefix + '_Processed_Orbits'))
+
+def _MakeDirs(*dirs):
+
+ # Create each directory if nonexistent
+
+  for folder in dirs:
+    if not os.path.isdir(folder):
+      os.makedirs(folder)
+
+  return
+
+def StageJobs(mission, stage, orbits=None):
+
+ # Prepare the orbit jobs of one stage of a mission
+ #
+ # Params:
+ #   mission : in, required, type = dictionary
+ #   mission returned by ReadMissions()
+ #
+ #   stage : in, required, type = string
+ #   one of STAGES
+ #
+ #   orbits : in, optional, type = list
+ #   orbit numbers that came out of the previous stage. None takes every point-arc (AutoShape) or buffer
+ #   (KML) found in the processing directory. Not used by Daylight
+ #
+ #   jobs : out, required, type = list
+ #   list of (func, orbNum, args) tuples, one per orbit (per coasting arc for Daylight)
+
+  (rawDir, procDir) = _MissionDirs(mission)
+
+  if stage == "Daylight":
+    rawArcs = sorted(glob.glob(os.path.join(rawDir, '*.shp')))
+
+    if not rawArcs:
+      raise IOError('no coasting arcs in ' + rawDir)
+
+    _MakeDirs(procDir)
+
+ # The lighting intervals are prepared once here and shared by the jobs of every coasting arc
+    if mission['lighting']:
+      (starts, ends) = ReadLightingCSV(mission['lighting'])
+      numbers = None
+    else:
+      (starts, ends, numbers) = EphemerisLighting(rawArcs, orbitOffset=mission['orbitOffset'])
+      WriteLightingCSV(os.path.join(procDir, 'M' + str(mission['MissionNum']) + '_Lighting.csv'), starts, ends)
+
+    baseOrbit = FileOrbit(rawArcs[0]) - 2 + mission['orbitOffset']
+    shared    = SharedOrbits(rawArcs, starts, ends, baseOrbit, numbers)
+
+    return [(ExportArcsNative, FileOrbit(rawArc), (rawArc, procDir, starts, ends, baseOrbit, numbers, shared))
+            for rawArc in rawArcs]
+
+  if stage == "AutoShape":
+    _MakeDirs(os.path.join(procDir, 'Line'), os.path.join(procDir, 'Buff'))
+
+    return [(FuseOrbitNative, FileOrbit(arcFC), (arcFC, procDir, mission['SwapLens'], mission['geodesic']))
+            for arcFC in _StageInputs(procDir, 'Arc', '_arc.shp', orbits)]
+
+  googleDir_out = os.path.join(procDir, 'Google')
+
+  _MakeDirs(googleDir_out)
+
+  return [(ExportOrbitKMZ, FileOrbit(buffFC), (buffFC, os.path.join(googleDir_out,
+                                                                   'Orbit_' + str(FileOrbit(buffFC)).zfill(4) + '.kmz')))
+          for buffFC in _StageInputs(procDir, 'Buff', '_buff.shp', orbits)]
+
+def _StageInputs(procDir, folder, suffix, orbits):
+
+ # Return the input shapefiles of a stage: those of the given orbits, or every one in the folder
+
+  if orbits is None:
+    return sorted(glob.glob(os.path.join(procDir, folder, '*.shp')))
+
+  return [os.path.join(procDir, folder, 'orb' + str(orbNum).zfill(4) + suffix) for orbNum in sorted(orbits)]
+
+def RunMissions(missions, workers=1, progress=None):
+
+ # Run the Daylight, AutoShape and KML stages of every mission on one shared worker pool
+ #
+ # Params:
+ #   missions : in, required, type = list
+ #   missions returned by ReadMissions()
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes. Values below 2 run every job serially in the current process
+ #
+ #   progress : in, optional, type = function
+ #   called with a one line progress message after each completed orbit job and stage
+ #
+ #   failures : out, required, type = list
+ #   list of (mission, stage, orbNum, error) tuples, where mission is the "MXX" label and orbNum is None
+ #   when the stage itself could not be prepared
+
+  report   = progress or (lambda message: None)
+  results  = queue.Queue()
+  failures = []
+
+  labels  = ['M' + str(mission['MissionNum']) for mission in missions]
+  stage   = [0] * len(missions)
+  pending = [0] * len(missions)
+  done    = [0] * len(missions)
+  orbits  = [None] * len(missions)   # orbits that came out of the previous stage of each mission
+  passed  = [set() for mission in missions]
+
+  pool = OpenPool(workers)
+
+  def Advance(i):
+
+ # Submit the jobs of the next stage of mission i that has any, or finish the mission
+
+    while stage[i] < len(STAGES):
+      name = STAGES[stage[i]]
+
+      try:
+        jobs = StageJobs(missions[i], name, orbits[i])
+      except Exception as e:
+        failures.append((labels[i], name, None, type(e).__name__ + ': ' + str(e).strip()))
+        report(labels[i] + ' ' + name + ': stopped. ' + failures[-1][3])
+        stage[i] = len(STAGES)
+        return
+
+      if jobs:
+        pending[i] = len(jobs)
+        done[i]    = 0
+        passed[i]  = set()
+
+        for (func, orbNum, args) in jobs:
+          SubmitOrbit(pool, func, orbNum, args, lambda result, i=i, name=name: results.put((i, name, result)))
+        return
+
+      report(labels[i] + ' ' + name + ': nothing to process')
+      orbits[i] = []
+      stage[i] += 1
+
+    return
+
+  try:
+    for i in range(len(missions)):
+      Advance(i)
+
+    while any(pending):
+      (i, name, (orbNum, error, value)) = results.get()
+
+      pending[i] -= 1
+      done[i]    += 1
+
+      if error is not None:
+        failures.append((labels[i], name, orbNum, error))
+        report(labels[i] + ' ' + name + ': orbit ' + str(orbNum).zfill(4) + ' failed. ' + error)
+
+ # Daylight jobs are per coasting arc and return the orbits they wrote
+      elif name == "Daylight":
+        passed[i].update(value)
+      else:
+        passed[i].add(orbNum)
+
+      report(labels[i] + ' ' + name + ': ' + str(done[i]) + '/' + str(done[i] + pending[i]) + ' done')
+
+      if pending[i] == 0:
+        orbits[i] = sorted(passed[i])
+        stage[i] += 1
+        Advance(i)
+
+  finally:
+    if pool is not None:
+      pool.close()
+      pool.join()
+
+  return failures
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Reprocess many missions through the Daylight, AutoShape and KML stages.')
+  parser.add_argument('missionsCSV', help='csv of missions with workspace, MissionNum and SwapLens columns')
+  parser.add_argument('--workers', type=int, default=1, help='number of worker processes shared by all missions')
+  args = parser.parse_args()
+
+  def Progress(message):
+    print(message)
+
+  failures = RunMissions(ReadMissions(args.missionsCSV), args.workers, Progress)
+
+  if not failures:
+    print('All missions processed successfully.')
+
+  for (mission, stage, orbNum, error) in failures:
+    print(mission + ' ' + stage + (': orbit ' + str(orbNum).zfill(4) if orbNum is not None else '') + ' failed. ' + error)
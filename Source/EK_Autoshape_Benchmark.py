@@ -0,0 +1,534 @@
+# EarthKAM AutoShape Benchmark
+# EK_Autoshape_Benchmark.py
+
+import argparse
+import datetime
+import glob
+import json
+import math
+import multiprocessing
+import os
+import platform
+import shutil
+import struct
+import time
+
+import numpy as np
+
+from EK_Autoshape_Time import ParseLightTimes, EpochSecondsToEphTimes
+from EK_Autoshape_Lighting import AssignOrbits, WriteCalendarCSV
+from EK_Autoshape_Cache import CACHE_DIR, ReadColumns
+from EK_Autoshape_Solar import SolarElevation, SunlitIntervals, WriteLightingCSV
+from EK_Autoshape_Arcs import ReadLightingCSV, SharedOrbits, ExportArcsNative
+from EK_Autoshape_Orbits import FileOrbit
+from EK_Autoshape_Tracks import ExportLinesNative
+from EK_Autoshape_Swath import BufferFOVNative, FormatBufferNative
+from EK_Autoshape_KMZ import ExportOrbitKMZ
+from EK_Autoshape_Trace import PeakRSS, CPUTime
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of a synthetic ephemeris generator and a command line benchmark of the AutoShape stages.
+ #
+ # The generator writes a deterministic mission in the layout exported from STK: coasting arc point shapefiles
+ # (Coast_NNNN.shp, named with their first orbit number, with TRACKID and TA_DATE fields) of a circular orbit at
+ # the inclination and period of the ISS, with the ground track drifting by the rotation of the Earth and the
+ # regression of the node, and the matching subpoint lighting csv. The same size arguments always produce the
+ # same files, so a slow mission can be reproduced without real STK exports.
+ #
+ # The benchmark then times each stage on its own, in stage order, each stage reading the outputs of the one
+ # before it:
+ #
+ #   ReadCSV       read the lighting csv                        (ReadCSV of the Daylight and Calendar tools)
+ #   FillOrbs      label every coasting arc point with its orbit (FillOrbs, from a cold columnar cache)
+ #   ExportArcs    write the daylight point-arc shapefiles        (ExportArcs)
+ #   ExportLines   build the orbit line shapefiles                (ExportLines)
+ #   BufferFOV     buffer the lines to FOV polygons               (BufferFOV)
+ #   FormatBuffer  write the request formatted buffer fields      (FormatBuffer)
+ #   ExportGoogle  write one .kmz per orbit                       (ExportGoogle)
+ #   export_gCal   write the Google Calendar csv                  (export_gCal)
+ #
+ # The ArcGIS tools run their main level programs when imported, so each stage is timed through the native
+ # engine the tools call when the Native option is set. Every stage runs in its own process, which isolates its
+ # peak memory: the peak resident set size is recorded before and after the timed call. Wall time, CPU time,
+ # rows, files and throughput of each stage are written to a JSON file, and a previous JSON file can be given to
+ # print the change of each stage between versions.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Benchmark.py <work directory> [--days D | --orbits N] [--step SEC] [--arc-orbits N]
+ #                                    [--repeat N] [--out results.json] [--compare previous.json]
+ #
+ # The work directory is created if nonexistent and must otherwise be a previous benchmark work directory. The
+ # results are written to AutoShape_Benchmark.json in the work directory unless --out is given.
+ #
+
+
+ # Orbital period and inclination of the ISS
+ISS_PERIOD_S = 5560.8
+ISS_INCLINATION_DEG = 51.64
+
+ # Rotation rate of the Earth and nodal regression of the ISS orbit in degrees per second
+EARTH_RATE_DEG = 360.0 / 86164.0905
+NODE_RATE_DEG = -5.0 / 86400.0
+
+ # Default start of the synthetic mission and orbit number of its first orbit
+START_TIME = '2026-03-01T00:00:00'
+FIRST_ORBIT = 1000
+
+ # Mission number and lens swap orbit index used for the synthetic mission
+MISSION_NUM = 1
+SWAP_LENS = 1
+
+ # Configuration file marking a benchmark work directory
+CONFIG_NAME = 'AutoShape_Bench.json'
+
+ # Results file written to the work directory when no other path is given
+RESULTS_NAME = 'AutoShape_Benchmark.json'
+
+ # Layout version of the results file
+RESULTS_VERSION = 1
+
+ # Fields of the synthetic coasting arcs
+COAST_FIELDS = [("TRACKID", 'N', 10, 0),
+                ("TA_DATE", 'C', 24, 0)]
+
+
+def GroundTrack(seconds, lon0=0.0):
+
+ # Compute the subpoint of a circular ISS orbit passing the ascending node at seconds 0
+ #
+ # Params:
+ #   seconds : in, required, type = float array
+ #   seconds since the first ascending node
+ #
+ #   lon0 : in, optional, type = float
+ #   longitude of the first ascending node in degrees
+ #
+ #   (lon, lat) : out, required, type = tuple
+ #   float64 arrays of subpoint longitude [-180, 180) and latitude in degrees
+
+  seconds = np.asarray(seconds, dtype=np.float64)
+
+  u   = 2.0 * np.pi * seconds / ISS_PERIOD_S
+  inc = np.radians(ISS_INCLINATION_DEG)
+
+  lat = np.degrees(np.arcsin(np.sin(inc) * np.sin(u)))
+  lon = lon0 + np.degrees(np.arctan2(np.cos(inc) * np.sin(u), np.cos(u))) + (NODE_RATE_DEG - EARTH_RATE_DEG) * seconds
+
+  return ((lon + 180.0) % 360.0 - 180.0, lat)
+
+def GenerateMission(workDir, days=1.0, stepSec=10.0, arcOrbits=8, orbits=None, start=START_TIME):
+
+ # Write a synthetic mission: coasting arc shapefiles and the matching subpoint lighting csv
+ #
+ # Params:
+ #   workDir : in, required, type = string
+ #   directory receiving the MXX_Raw_Orbits directory and the MXX_Lighting.csv file
+ #
+ #   days : in, optional, type = float
+ #   mission length in days
+ #
+ #   stepSec : in, optional, type = float
+ #   seconds between ephemeris points
+ #
+ #   arcOrbits : in, optional, type = integer
+ #   number of orbits in each coasting arc
+ #
+ #   orbits : in, optional, type = integer
+ #   mission length in orbits. Overrides days when given
+ #
+ #   start : in, optional, type = string
+ #   ISO 8601 UTC time of the first ascending node
+ #
+ #   (rawArcs, lightCSV, points) : out, required, type = tuple
+ #   coasting arc paths, lighting csv path and the total number of ephemeris points
+
+  prefix = 'M' + str(MISSION_NUM)
+  rawDir = os.path.join(workDir, prefix + '_Raw_Orbits')
+
+  if os.path.isdir(rawDir):
+    shutil.rmtree(rawDir)
+
+  os.makedirs(rawDir)
+
+  if orbits is None:
+    orbits = int(math.ceil(days * 86400.0 / ISS_PERIOD_S))
+
+  epoch    = (np.datetime64(start, 's') - np.datetime64(0, 's')).astype(np.int64)
+  rawArcs  = []
+  allTimes = []
+  allLon   = []
+  allLat   = []
+
+  for first in range(0, orbits, arcOrbits):
+    span    = min(arcOrbits, orbits - first) * ISS_PERIOD_S
+    seconds = first * ISS_PERIOD_S + np.arange(0.0, span, stepSec)
+
+    (lon, lat) = GroundTrack(seconds)
+    times      = epoch + np.floor(seconds)
+
+    rawArc = os.path.join(rawDir, 'Coast_' + str(FIRST_ORBIT + first).zfill(4) + '.shp')
+
+    shp.WriteShapefile(rawArc, shp.POINT, COAST_FIELDS,
+                       [[i + 1, stamp] for (i, stamp) in enumerate(EpochSecondsToEphTimes(times))],
+                       list(zip(lon.tolist(), lat.tolist())))
+
+    rawArcs.append(rawArc)
+    allTimes.append(times)
+    allLon.append(lon)
+    allLat.append(lat)
+
+  times = np.concatenate(allTimes)
+
+ # The lighting csv covers the same ephemeris from two orbits earlier, as the STK lighting report the Daylight
+ #   tool numbers from the first coasting arc orbit minus 2
+  seconds    = np.arange(-2 * ISS_PERIOD_S, 0.0, stepSec)
+  (lon, lat) = GroundTrack(seconds)
+  lightTimes = np.concatenate((epoch + np.floor(seconds), times))
+
+  (starts, ends) = SunlitIntervals(lightTimes, SolarElevation(lightTimes, np.concatenate([lon] + allLon),
+                                                              np.concatenate([lat] + allLat)))
+
+  lightCSV = os.path.join(workDir, prefix + '_Lighting.csv')
+
+  WriteLightingCSV(lightCSV, starts, ends)
+
+  return (rawArcs, lightCSV, len(times))
+
+def _CountRecords(paths):
+
+ # Return the total number of records of a list of shapefiles, read from their dbf headers
+
+  total = 0
+
+  for path in paths:
+    with open(os.path.splitext(path)[0] + '.dbf', 'rb') as dbf:
+      total += struct.unpack('<xxxxI', dbf.read(8))[0]
+
+  return total
+
+ ## Stages ##
+ #
+ # Each stage function prepares its inputs outside the timed section and returns a function running the stage,
+ # which returns the (rows, files) it processed.
+
+def _ReadCSVStage(ctx):
+
+  def Run():
+    (starts, ends) = ReadLightingCSV(ctx['lighting'])
+    return (len(starts), 0)
+
+  return Run
+
+def _FillOrbsStage(ctx):
+
+  (starts, ends) = ReadLightingCSV(ctx['lighting'])
+
+  for rawArc in ctx['rawArcs']:
+    shutil.rmtree(os.path.join(os.path.dirname(rawArc), CACHE_DIR), ignore_errors=True)
+
+  def Run():
+    rows = 0
+
+    for rawArc in ctx['rawArcs']:
+      rows += len(AssignOrbits(ReadColumns(rawArc)['time'], starts, ends, ctx['baseOrbit']))
+
+    return (rows, 0)
+
+  return Run
+
+def _ExportArcsStage(ctx):
+
+  (starts, ends) = ReadLightingCSV(ctx['lighting'])
+
+  arcDir = os.path.join(ctx['procDir'], 'Arc')
+
+  if os.path.isdir(arcDir):
+    shutil.rmtree(arcDir)
+
+  def Run():
+    shared = SharedOrbits(ctx['rawArcs'], starts, ends, ctx['baseOrbit'])
+
+    for rawArc in ctx['rawArcs']:
+      ExportArcsNative(rawArc, ctx['procDir'], starts, ends, ctx['baseOrbit'], None, shared)
+
+    written = glob.glob(os.path.join(arcDir, '*.shp'))
+
+    return (_CountRecords(written), len(written))
+
+  return Run
+
+def _ExportLinesStage(ctx):
+
+  def Run():
+    ExportLinesNative(ctx['procDir'])
+
+    written = glob.glob(os.path.join(ctx['procDir'], 'Line', '*.shp'))
+
+    return (_CountRecords(written), len(written))
+
+  return Run
+
+def _BufferFOVStage(ctx):
+
+  def Run():
+    BufferFOVNative(ctx['procDir'], SWAP_LENS)
+
+    written = glob.glob(os.path.join(ctx['procDir'], 'Buff', '*.shp'))
+
+    return (_CountRecords(written), len(written))
+
+  return Run
+
+def _FormatBufferStage(ctx):
+
+ # Rebuild the unformatted buffers so the stage can be repeated
+  BufferFOVNative(ctx['procDir'], SWAP_LENS)
+
+  buffFCs = sorted(glob.glob(os.path.join(ctx['procDir'], 'Buff', '*.shp')))
+
+  def Run():
+    for buffFC in buffFCs:
+      FormatBufferNative(buffFC, FileOrbit(buffFC))
+
+    return (_CountRecords(buffFCs), len(buffFCs))
+
+  return Run
+
+def _ExportGoogleStage(ctx):
+
+  buffFCs   = sorted(glob.glob(os.path.join(ctx['procDir'], 'Buff', '*.shp')))
+  googleDir = os.path.join(ctx['procDir'], 'Google')
+
+  if not os.path.isdir(googleDir):
+    os.makedirs(googleDir)
+
+  def Run():
+    for buffFC in buffFCs:
+      ExportOrbitKMZ(buffFC, os.path.join(googleDir, 'Orbit_' + str(FileOrbit(buffFC)).zfill(4) + '.kmz'))
+
+    return (_CountRecords(buffFCs), len(buffFCs))
+
+  return Run
+
+def _ExportCalendarStage(ctx):
+
+  with open(ctx['lighting'], 'r') as f:
+    lines = [line.strip().split(',') for line in f if line.strip()]
+
+  startTimes = ParseLightTimes([row[0] for row in lines])
+  endTimes   = ParseLightTimes([row[1] for row in lines])
+
+  def Run():
+    WriteCalendarCSV(ctx['calendar'], startTimes, endTimes, ctx['baseOrbit'])
+    return (len(startTimes), 1)
+
+  return Run
+
+ # Stages in run order, each with the function preparing it
+STAGES = [("ReadCSV",      _ReadCSVStage),
+          ("FillOrbs",     _FillOrbsStage),
+          ("ExportArcs",   _ExportArcsStage),
+          ("ExportLines",  _ExportLinesStage),
+          ("BufferFOV",    _BufferFOVStage),
+          ("FormatBuffer", _FormatBufferStage),
+          ("ExportGoogle", _ExportGoogleStage),
+          ("export_gCal",  _ExportCalendarStage)]
+
+def _TimeStage(name, ctx, conn):
+
+ # Prepare and time one stage in a child process, sending its measurements back through conn
+
+  try:
+    Run = dict(STAGES)[name](ctx)
+
+    setupRSS = PeakRSS()
+    cpu      = CPUTime()
+    wall     = time.time()
+
+    (rows, files) = Run()
+
+    conn.send({'wall': time.time() - wall, 'cpu': CPUTime() - cpu, 'rows': rows, 'files': files,
+               'setupRSS': setupRSS, 'peakRSS': PeakRSS(), 'error': None})
+
+  except Exception as e:
+    conn.send({'error': type(e).__name__ + ': ' + str(e).strip()})
+
+  conn.close()
+
+  return
+
+def RunStage(name, ctx):
+
+ # Run one stage in its own process
+ #
+ # Params:
+ #   name : in, required, type = string
+ #   stage name, one of the names of STAGES
+ #
+ #   ctx : in, required, type = dictionary
+ #   benchmark context with rawArcs, lighting, calendar, procDir and baseOrbit keys
+ #
+ #   result : out, required, type = dictionary
+ #   wall and cpu seconds, rows, files, setupRSS and peakRSS bytes, and error (None on success)
+
+  (parent, child) = multiprocessing.Pipe(duplex=False)
+
+  proc = multiprocessing.Process(target=_TimeStage, args=(name, ctx, child))
+  proc.start()
+  child.close()
+
+  try:
+    result = parent.recv()
+  except EOFError:
+    result = {'error': 'stage process exited with code ' + str(proc.exitcode)}
+
+  proc.join()
+
+  return result
+
+def RunBenchmark(workDir, days=1.0, stepSec=10.0, arcOrbits=8, orbits=None, repeat=1):
+
+ # Generate a synthetic mission and time every stage on it
+ #
+ # Params:
+ #   workDir : in, required, type = string
+ #   benchmark work directory. Created if nonexistent; an existing directory must hold CONFIG_NAME
+ #
+ #   days, stepSec, arcOrbits, orbits : in, optional
+ #   mission size, as passed to GenerateMission()
+ #
+ #   repeat : in, optional, type = integer
+ #   number of times each stage is run. The fastest run is kept
+ #
+ #   results : out, required, type = dictionary
+ #   environment, configuration and per-stage measurements, as written by WriteResults()
+
+  if os.path.isdir(workDir) and os.listdir(workDir) and not os.path.isfile(os.path.join(workDir, CONFIG_NAME)):
+    raise IOError(workDir + ' is not empty and is not a benchmark work directory')
+
+  if not os.path.isdir(workDir):
+    os.makedirs(workDir)
+
+  config = {'days': days, 'stepSec': stepSec, 'arcOrbits': arcOrbits, 'orbits': orbits, 'start': START_TIME}
+
+  with open(os.path.join(workDir, CONFIG_NAME), 'w') as f:
+    json.dump(config, f)
+
+  procDir = os.path.join(workDir, 'M' + str(MISSION_NUM) + '_Processed_Orbits')
+
+  if os.path.isdir(procDir):
+    shutil.rmtree(procDir)
+
+  os.makedirs(procDir)
+
+  (rawArcs, lightCSV, points) = GenerateMission(workDir, days, stepSec, arcOrbits, orbits)
+
+  ctx = {'rawArcs':   rawArcs,
+         'lighting':  lightCSV,
+         'calendar':  os.path.join(workDir, 'M' + str(MISSION_NUM) + '_Calendar.csv'),
+         'procDir':   procDir,
+         'baseOrbit': FIRST_ORBIT - 2}
+
+  stages = []
+
+  for (name, prepare) in STAGES:
+    runs = [RunStage(name, ctx) for i in range(max(1, repeat))]
+    good = [run for run in runs if run['error'] is None]
+
+    if not good:
+      stages.append({'stage': name, 'error': runs[-1]['error']})
+      continue
+
+    best = min(good, key=lambda run: run['wall'])
+    best['stage'] = name
+    best['rowsPerSec'] = best['rows'] / best['wall'] if best['wall'] > 0 else None
+    best['runs'] = [run['wall'] for run in good]
+
+    stages.append(best)
+
+  config['points'] = points
+  config['coastingArcs'] = len(rawArcs)
+
+  return {'version': RESULTS_VERSION,
+          'created': datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+          'python': platform.python_version(),
+          'numpy': np.__version__,
+          'platform': platform.platform(),
+          'config': config,
+          'stages': stages}
+
+def WriteResults(outJSON, results):
+
+ # Write benchmark results to a JSON file
+ #
+ # Params:
+ #   outJSON : in, required, type = string
+ #   path to the output JSON file
+ #
+ #   results : in, required, type = dictionary
+ #   results returned by RunBenchmark()
+
+  with open(outJSON, 'w') as f:
+    json.dump(results, f, indent=2, sort_keys=True)
+
+  return
+
+def CompareResults(previous, results):
+
+ # Compare the stage wall times of two benchmark results
+ #
+ # Params:
+ #   previous, results : in, required, type = dictionary
+ #   results returned by RunBenchmark() or read from a results JSON file
+ #
+ #   rows : out, required, type = list
+ #   list of (stage, previous wall, current wall, ratio) tuples for the stages timed in both, where a ratio
+ #   above 1 is a slowdown
+
+  before = dict((s['stage'], s['wall']) for s in previous['stages'] if s.get('error') is None)
+  rows   = []
+
+  for stage in results['stages']:
+    if stage.get('error') is None and stage['stage'] in before and before[stage['stage']] > 0:
+      rows.append((stage['stage'], before[stage['stage']], stage['wall'], stage['wall'] / before[stage['stage']]))
+
+  return rows
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Time each AutoShape stage on a synthetic mission.')
+  parser.add_argument('workDir', help='benchmark work directory')
+  parser.add_argument('--days', type=float, default=1.0, help='mission length in days')
+  parser.add_argument('--orbits', type=int, help='mission length in orbits. Overrides --days')
+  parser.add_argument('--step', type=float, default=10.0, help='seconds between ephemeris points')
+  parser.add_argument('--arc-orbits', type=int, default=8, help='orbits in each coasting arc')
+  parser.add_argument('--repeat', type=int, default=1, help='runs of each stage. The fastest is kept')
+  parser.add_argument('--out', help='results JSON file, ' + RESULTS_NAME + ' in the work directory when omitted')
+  parser.add_argument('--compare', help='previous results JSON file to compare against')
+  args = parser.parse_args()
+
+  results = RunBenchmark(args.workDir, args.days, args.step, args.arc_orbits, args.orbits, args.repeat)
+
+  WriteResults(args.out or os.path.join(args.workDir, RESULTS_NAME), results)
+
+  print(str(results['config']['points']) + ' ephemeris points in ' + str(results['config']['coastingArcs']) +
+        ' coasting arcs')
+
+  for stage in results['stages']:
+    if stage.get('error') is not None:
+      print('%-13s failed. %s' % (stage['stage'], stage['error']))
+      continue
+
+    peak = '%8.1f MB' % (stage['peakRSS'] / 1048576.0) if stage['peakRSS'] is not None else '       n/a'
+    print('%-13s %9.3f s wall %9.3f s cpu %10d rows %6d files %12.0f rows/s %s peak' %
+          (stage['stage'], stage['wall'], stage['cpu'], stage['rows'], stage['files'], stage['rowsPerSec'] or 0, peak))
+
+  if args.compare:
+    with open(args.compare, 'r') as f:
+      previous = json.load(f)
+
+    for (stage, before, after, ratio) in CompareResults(previous, results):
+      print('%-13s %9.3f s -> %9.3f s  x%.2f' % (stage, before, after, ratio))
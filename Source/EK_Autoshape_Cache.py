@@ -0,0 +1,162 @@
+# EarthKAM AutoShape Columnar Cache
+# EK_Autoshape_Cache.py
+
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from EK_Autoshape_Time import EphToEpochSeconds
+from EK_Autoshape_Files import ShapefileStats, ReplaceFile
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions for keeping a columnar on-disk cache of the ephemeris shapefiles read by the
+ # AutoShape tools. The first read of a shapefile decodes it once into a single NumPy .npy file holding a
+ # structured array with one row per record and one field per column:
+ #
+ #   x, y           point coordinates (point shapefiles)
+ #   x1, y1, x2, y2 first and last vertex of each feature (polyline shapefiles)
+ #   time           epoch seconds of the TA_DATE or Start_Time field
+ #   stamp          the TA_DATE or Start_Time strings themselves
+ #   label          the OrbitNum strings ("Orbit 1234"), kept as written. Orbit numbers are carried as integers by
+ #                  the tools that know them and never parsed back out of these labels
+ #   offsets        the OFFSETS strings of the spans of a simplified track (line and buffer shapefiles)
+ #
+ # Later reads memory-map the file instead of parsing the .shp and .dbf files again. The cache of a shapefile
+ # sits in a Cache directory next to it, named after the shapefile and a hash of the sizes and times of the .shp
+ # and .dbf files it was built from (orb1234_arc.<hash>.npy), so a changed shapefile simply has no cache yet.
+ # A cache file is never rewritten in place: the caches of earlier versions of the shapefile are removed once
+ # the new one is written, and any still memory-mapped by the running tool, which Windows refuses to remove,
+ # are left for a later build to clean up.
+ #
+
+
+ # Name of the cache directory created next to cached shapefiles
+CACHE_DIR = 'Cache'
+
+ # Cache layout version, part of the cache file hash. Caches of other versions are rebuilt
+CACHE_VERSION = 4
+
+ # Time fields, in order of preference
+_TIME_FIELDS = ("TA_DATE", "Start_Time")
+
+
+def _CachePaths(path):
+
+ # Return the cache file of the current version of a shapefile, and the glob pattern of all its cache files
+
+  (folder, name) = os.path.split(os.path.splitext(path)[0])
+  key = hashlib.md5(json.dumps([CACHE_VERSION, ShapefileStats(path)]).encode('utf-8')).hexdigest()[:16]
+
+  return (os.path.join(folder, CACHE_DIR, name + '.' + key + '.npy'),
+          os.path.join(folder, CACHE_DIR, name + '.*.npy'))
+
+def _Decode(path):
+
+ # Decode the columns of a shapefile into arrays
+
+  fields  = [f[0] for f in shp.ReadFields(path)]
+  timeCol = next((fields.index(name) for name in _TIME_FIELDS if name in fields), None)
+  lblCol  = fields.index("OrbitNum") if "OrbitNum" in fields else None
+  offCol  = fields.index("OFFSETS") if "OFFSETS" in fields else None
+
+  shapeType = shp.ReadShapeType(path)
+  width     = 2 if shapeType == shp.POINT else 4
+
+  coords = []
+  stamps = []
+  labels = []
+  spans  = []
+
+ # Points are kept whole, polylines by their first and last vertex. Null shapes keep their row as NaN
+  for (record, shape) in shp.IterShapefile(path):
+    if not shape:
+      coords.append((np.nan,) * width)
+    else:
+      coords.append(tuple(shape) if width == 2 else shape[0][0] + shape[-1][-1])
+
+    if timeCol is not None:
+      stamps.append(record[timeCol])
+
+    if lblCol is not None:
+      labels.append(record[lblCol] or '')
+
+    if offCol is not None:
+      spans.append(record[offCol] or '')
+
+  coords  = np.asarray(coords, dtype=np.float64).reshape(-1, width)
+  names   = ('x', 'y') if width == 2 else ('x1', 'y1', 'x2', 'y2')
+  columns = dict((name, coords[:, i]) for (i, name) in enumerate(names))
+
+  if timeCol is not None:
+    columns['stamp'] = np.asarray(stamps, dtype='U')
+    columns['time']  = EphToEpochSeconds(stamps) if stamps else np.zeros(0, dtype=np.float64)
+
+  if lblCol is not None:
+    columns['label'] = np.asarray(labels, dtype='U')
+
+  if offCol is not None:
+    columns['offsets'] = np.asarray(spans, dtype='U')
+
+  return columns
+
+def BuildCache(path):
+
+ # Decode a shapefile and write its columnar cache
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   columns : out, required, type = dictionary
+ #   in-memory arrays of the cached columns, keyed on column name
+
+  (cachePath, pattern) = _CachePaths(path)
+
+  if not os.path.isdir(os.path.dirname(cachePath)):
+    os.makedirs(os.path.dirname(cachePath))
+
+  columns = _Decode(path)
+  names   = sorted(columns)
+  table   = np.empty(len(columns[names[0]]), dtype=[(name, columns[name].dtype) for name in names])
+
+  for name in names:
+    table[name] = columns[name]
+
+  with ReplaceFile(cachePath) as f:
+    np.save(f, table)
+
+ # Remove the caches of earlier versions of the shapefile. One still memory-mapped cannot be removed on Windows
+ #   and is left for the next build
+  for stale in glob.glob(pattern):
+    if stale != cachePath:
+      try:
+        os.remove(stale)
+      except OSError:
+        pass
+
+  return columns
+
+def ReadColumns(path):
+
+ # Return the columns of a shapefile, memory-mapped from its cache while the shapefile is unchanged
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   columns : out, required, type = dictionary
+ #   read-only arrays of the cached columns, keyed on column name (x, y or x1, y1, x2, y2, and time, stamp
+ #   and label where the shapefile has the fields), one row per record in file order. Null shapes have NaN
+ #   coordinates. The cache file stays mapped until every returned array is released
+
+  cachePath = _CachePaths(path)[0]
+
+  if os.path.isfile(cachePath):
+    table = np.load(cachePath, mmap_mode='r')
+    return dict((name, table[name]) for name in table.dtype.names)
+
+  return BuildCache(path)
@@ -14,6 +14,10 @@ import string
 import datetime
 from arcpy import env
 
+from EK_Autoshape_Time import ParseLightTimes
+from EK_Autoshape_Lighting import WriteCalendarCSV
+from EK_Autoshape_Trace import OpenTrace, BeginStage, EndStage, ReportTrace, SaveTrace
+
 arcpy.env.overwriteOutput = True
 
 gp = arcgisscripting.create(9.3)
@@ -43,6 +47,10 @@ baseOrbitNum = gp.GetParameterAsText(1)
 
 calCSV = gp.GetParameterAsText(2)
 
+ # Optional trace file (.json or .csv) recording wall time, CPU time, rows and peak memory of each stage.
+ #   Stage summaries are always reported in the tool messages
+TraceFile = gp.GetParameterAsText(3)
+
 
 def ReadCSV(inCSV):
 
@@ -58,7 +66,7 @@ def ReadCSV(inCSV):
 
  # Define two arrays for storing datetime objects of start and end subpoint lighting times
   startTimes = []
-  endtimes   = []
+  endTimes   = []
 
  # Define input format for datetime objects being read from input csv
   input_fmt  = '%Y/%m/%d %H:%M:%S.%f'
@@ -72,11 +80,10 @@ def ReadCSV(inCSV):
  # Begin parsing csv by declaring a 2 element list of lines from input file
   lines = list(reader)
 
- # Parse each line for both start and end times
- #   strip datetime objects and appending them to the appropriate list
-  for row in lines:
-    startTimes.append(datetime.datetime.strptime(row[0], input_fmt) )
-    endTimes.append(datetime.datetime.strptime(row[1], input_fmt) )
+ # Parse the start and end time columns of every line, each in one batch with the fixed-layout
+ #   input_fmt parser shared by the AutoShape tools
+  startTimes = ParseLightTimes([row[0] for row in lines])
+  endTimes   = ParseLightTimes([row[1] for row in lines])
     
  # Return datetime arrays as a tuple
   return (startTimes, endTimes)
@@ -101,27 +108,10 @@ def export_gCal(calCSV, startTimes, endTimes, current):
  #
  
 
-# Specify date and time formats for output
-  date_fmt = '%m/%d/%Y'                                                      
-  
-  time_fmt = '%H:%M:%S'
-  
-  with open(calCSV, 'wb') as csvfile:
-  
-    csvfile.write("Subject,Start Date,Start Time,End Date,End Time\n")       # Write column headers to csv output
-    
-    for i, val in enumerate(startTimes):                                     # Non-pythonic loop. Sue me.
-    
-      csvfile.write('Orbit ' + str(current) + ',' \                          # Output each line corresponding to subpoint lighting times from input csv
-                    + startTimes[i].strftime(date_fmt)+ ',' \
-                    + startTimes[i].strftime(time_fmt)+ ',' \
-                    + endTimes[i].strftime(date_fmt)+ ',' \
-                    + endTimes[i].strftime(time_fmt)+ '\n')
-                    
-      current += 1                                                           # Iterate current orbit number and loop index
-      
-      i += 1
-      
+# Write one event per orbit with the calendar writer shared by the AutoShape tools. The orbit number parameter
+#   is read as text, so it is converted before numbering the intervals
+  WriteCalendarCSV(calCSV, startTimes, endTimes, int(current))
+
   return
 
 ## Main level program ##
@@ -130,11 +120,22 @@ def export_gCal(calCSV, startTimes, endTimes, current):
 startTimes = []
 endTimes = []
 
+# Open the trace measuring each stage
+trace = OpenTrace(TraceFile)
+
 # Assign tuple of dto arrays to output of ReadCSV()
+BeginStage(trace, "ReadCSV")
 (startTimes,endTimes) = ReadCSV(inCSV)
+EndStage(trace, rowsRead=len(startTimes))
 
 # Export Google Calendar csv input file using formatted lighting interval times
+BeginStage(trace, "export_gCal")
 export_gCal(calCSV, startTimes, endTimes, baseOrbitNum)
+EndStage(trace, rowsWritten=len(startTimes), files=1)
+
+# Report the time and memory of each stage, and write the trace file when one was given
+ReportTrace(gp, trace)
+SaveTrace(trace)
 
 
 
@@ -0,0 +1,286 @@
+# EarthKAM AutoShape Coverage Grid
+# EK_Autoshape_Coverage.py
+
+import argparse
+import os
+
+import numpy as np
+
+from EK_Autoshape_Index import LoadIndex
+from EK_Autoshape_Swath import EARTH_RADIUS_KM
+from EK_Autoshape_Files import ReplaceFile
+
+ #
+ # This file consists of functions and a command line program for measuring how much of the Earth the FOV
+ # footprints of a mission cover and how often each place is revisited. Every footprint of the footprint index
+ # is rasterized onto a regular lon/lat grid with a scanline fill vectorized over all the footprints of an orbit:
+ # each footprint edge is expanded into its crossings of the grid row centers, the crossings are sorted along
+ # each (footprint, row) and the nonzero winding spans between them are expanded into cells. A cell is covered
+ # by a footprint when its center lies inside it.
+ #
+ # One pass over the footprints fills three grids: coverage (cells seen at least once), revisit (number of
+ # distinct orbits seeing each cell) and first pass (seconds from the start of the mission until a footprint
+ # first covers each cell, -1 where never). They are saved with the grid geometry and summary statistics in one
+ # compressed array file next to the rebuild manifest.
+ #
+ # Footprints crossing the antimeridian wrap around a global grid and are clipped to a regional one.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Coverage.py <MXX_Processed_Orbits directory> [--cell DEG]
+ #                                   [--box XMIN YMIN XMAX YMAX] [--out <coverage.npz>]
+ #
+
+
+ # Name of the coverage file within the processing directory
+COVERAGE_NAME = 'AutoShape_Coverage.npz'
+
+ # Default grid cell size in degrees
+CELL_DEG = 0.25
+
+ # Default grid extent (west, south, east, north) in degrees
+GLOBAL_BOX = (-180.0, -90.0, 180.0, 90.0)
+
+
+def _Crossings(edges, owner, south, cellDeg, rows):
+
+ # Return the footprint, row, x and winding direction of every crossing of an edge with a grid row center
+
+  (y1, y2) = (edges[:, 1], edges[:, 3])
+  (lo, hi) = (np.minimum(y1, y2), np.maximum(y1, y2))
+
+ # Rows whose center lies in [lo, hi). Horizontal edges cross none
+  first = np.clip(np.ceil((lo - south) / cellDeg - 0.5), 0, rows).astype(np.int64)
+  stop  = np.clip(np.ceil((hi - south) / cellDeg - 0.5), 0, rows).astype(np.int64)
+  count = np.maximum(stop - first, 0)
+
+  edge = np.repeat(np.arange(len(edges)), count)
+  row  = first[edge] + np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+
+  center = south + (row + 0.5) * cellDeg
+  (x1, y1, x2, y2) = (edges[edge, 0], y1[edge], edges[edge, 2], y2[edge])
+
+  x    = x1 + (center - y1) * (x2 - x1) / (y2 - y1)
+  wind = np.where(y2 > y1, 1, -1)
+
+  return (owner[edge], row, x, wind)
+
+def _FillCells(edges, owner, grid):
+
+ # Scanline fill the footprints owning a set of edges
+ #
+ # Params:
+ #   edges : in, required, type = float64 array
+ #   array of shape (m, 4) of closed ring edges (x1, y1, x2, y2)
+ #
+ #   owner : in, required, type = int array
+ #   footprint of each edge
+ #
+ #   grid : in, required, type = dictionary
+ #   grid returned by CoverageGrid()
+ #
+ #   (footprint, cell) : out, required, type = tuple
+ #   int64 arrays pairing each footprint with the flat index (row * cols + col) of each cell it covers
+
+  (west, south, cellDeg, rows, cols) = (grid['west'], grid['south'], grid['cell'], grid['rows'], grid['cols'])
+
+  (fp, row, x, wind) = _Crossings(edges, owner, south, cellDeg, rows)
+
+  order = np.lexsort((x, row, fp))
+  (fp, row, x) = (fp[order], row[order], x[order])
+
+ # The winding of every closed ring sums to zero along a row, so a running sum over all the sorted crossings
+ # returns to zero at the end of each (footprint, row) and spans never run from one into the next
+  inside = np.flatnonzero(np.cumsum(wind[order])[:-1] != 0)
+
+  first = np.ceil((x[inside] - west) / cellDeg - 0.5).astype(np.int64)
+  stop  = np.ceil((x[inside + 1] - west) / cellDeg - 0.5).astype(np.int64)
+  count = np.maximum(stop - first, 0)
+
+  span = np.repeat(np.arange(len(inside)), count)
+  col  = first[span] + np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)
+
+  (fp, row) = (fp[inside][span], row[inside][span])
+
+  if grid['wraps']:
+    col %= cols
+  else:
+    keep = (col >= 0) & (col < cols)
+    (fp, row, col) = (fp[keep], row[keep], col[keep])
+
+  return (fp, row * cols + col)
+
+def CoverageGrid(cellDeg=CELL_DEG, box=GLOBAL_BOX):
+
+ # Define a lon/lat coverage grid
+ #
+ # Params:
+ #   cellDeg : in, optional, type = float
+ #   cell size in degrees
+ #
+ #   box : in, optional, type = tuple
+ #   (west, south, east, north) extent in degrees, widened to a whole number of cells
+ #
+ #   grid : out, required, type = dictionary
+ #   west, south, cell, rows, cols and wraps (the grid spans every longitude) keys
+
+  (west, south, east, north) = [float(v) for v in box]
+
+  if cellDeg <= 0 or east <= west or north <= south:
+    raise ValueError('coverage grid needs a positive cell size and a box with west < east and south < north')
+
+  cols = int(np.ceil((east - west) / cellDeg - 1e-9))
+  rows = int(np.ceil((north - south) / cellDeg - 1e-9))
+
+  return {'west': west, 'south': south, 'cell': float(cellDeg), 'rows': rows, 'cols': cols,
+          'wraps': cols * cellDeg >= 360.0}
+
+def CellAreas(grid):
+
+ # Return the area in square kilometers of the cells of each grid row, on the mean earth sphere
+
+  edges = np.radians(np.clip(grid['south'] + np.arange(grid['rows'] + 1) * grid['cell'], -90.0, 90.0))
+
+  return EARTH_RADIUS_KM ** 2 * np.radians(grid['cell']) * np.diff(np.sin(edges))
+
+def BuildCoverage(procDir, cellDeg=CELL_DEG, box=GLOBAL_BOX, outPath=None):
+
+ # Rasterize the footprints of a mission into coverage, revisit and first pass grids and save them
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   cellDeg : in, optional, type = float
+ #   cell size in degrees
+ #
+ #   box : in, optional, type = tuple
+ #   (west, south, east, north) extent of the grid in degrees
+ #
+ #   outPath : in, optional, type = string
+ #   path of the coverage file. Defaults to COVERAGE_NAME in the processing directory
+ #
+ #   coverage : out, required, type = dictionary
+ #   coverage (bool), revisit (uint16) and firstPass (int32 seconds from epoch, -1 where never) grids of shape
+ #   (rows, cols) with row 0 at the south edge, the grid keys of CoverageGrid(), epoch (seconds since
+ #   1970-01-01 of the first footprint) and the statistics returned by CoverageStats()
+
+  grid  = CoverageGrid(cellDeg, box)
+  index = LoadIndex(procDir)
+  cells = grid['rows'] * grid['cols']
+
+  orbits = index['orbit']
+  times  = index['start']
+  epoch  = float(times.min()) if len(times) else 0.0
+
+ # Owner of every edge of the index, in the packed footprint order of the edges
+  owner = np.repeat(np.arange(len(orbits)), index['edgeCount'])
+
+  revisit   = np.zeros(cells, dtype=np.uint16)
+  firstPass = np.full(cells, np.inf)
+
+ # One orbit at a time bounds the crossings in memory and lets each orbit count once per cell
+  byOrbit = np.argsort(orbits[owner], kind='mergesort')
+  bounds  = np.flatnonzero(np.diff(orbits[owner][byOrbit])) + 1
+
+  for edgeRows in np.split(byOrbit, bounds) if len(owner) else []:
+    (fp, cell) = _FillCells(index['edges'][edgeRows], owner[edgeRows], grid)
+
+    if not len(cell):
+      continue
+
+ # Earliest footprint of the orbit over each cell
+    order = np.lexsort((times[fp], cell))
+    (seen, first) = np.unique(cell[order], return_index=True)
+
+    revisit[seen] += 1
+    firstPass[seen] = np.minimum(firstPass[seen], times[fp[order][first]])
+
+  shape = (grid['rows'], grid['cols'])
+
+  coverage = {'coverage':  (revisit > 0).reshape(shape),
+              'revisit':   revisit.reshape(shape),
+              'firstPass': np.where(np.isinf(firstPass), -1, np.round(firstPass - epoch)).astype(np.int32)
+                             .reshape(shape),
+              'epoch':     epoch}
+
+  coverage.update(grid)
+  coverage.update(CoverageStats(coverage, len(orbits), len(np.unique(orbits))))
+
+  SaveCoverage(outPath or os.path.join(procDir, COVERAGE_NAME), coverage)
+
+  return coverage
+
+def CoverageStats(coverage, footprints, orbits):
+
+ # Summarize the coverage grids
+ #
+ # Params:
+ #   coverage : in, required, type = dictionary
+ #   grids and grid keys as built by BuildCoverage()
+ #
+ #   footprints, orbits : in, required, type = integer
+ #   number of footprints and orbits rasterized
+ #
+ #   stats : out, required, type = dictionary
+ #   footprints, orbits, cellsCovered, areaKm2 (covered area), fraction (covered share of the grid area),
+ #   meanRevisit (over covered cells), maxRevisit and lastFirstPass (seconds from epoch until the last cell
+ #   was first covered, -1 when none)
+
+  revisit = coverage['revisit']
+  areas   = CellAreas(coverage)[:, np.newaxis] * np.ones((1, coverage['cols']))
+  covered = coverage['coverage']
+
+  return {'footprints':    int(footprints),
+          'orbits':        int(orbits),
+          'cellsCovered':  int(covered.sum()),
+          'areaKm2':       float(areas[covered].sum()),
+          'fraction':      float(areas[covered].sum() / areas.sum()),
+          'meanRevisit':   float(revisit[covered].mean()) if covered.any() else 0.0,
+          'maxRevisit':    int(revisit.max()) if revisit.size else 0,
+          'lastFirstPass': int(coverage['firstPass'].max()) if covered.any() else -1}
+
+def SaveCoverage(path, coverage):
+
+ # Write a coverage dictionary to a compressed array file, replacing any previous one only once fully written
+
+  with ReplaceFile(path) as f:
+    np.savez_compressed(f, **dict((key, np.asarray(value)) for (key, value) in coverage.items()))
+
+  return
+
+def LoadCoverage(path):
+
+ # Load a coverage file written by BuildCoverage()
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the coverage file
+ #
+ #   coverage : out, required, type = dictionary
+ #   grids as arrays, grid keys and statistics as python scalars
+
+  with np.load(path, allow_pickle=False) as data:
+    return dict((key, data[key] if data[key].ndim else data[key].item()) for key in data.files)
+
+def CoverageSummary(coverage):
+
+ # Describe the statistics of a coverage dictionary in one line
+
+  return (str(coverage['orbits']) + ' orbits, ' + str(coverage['footprints']) + ' footprints cover '
+          + '%.0f km2 (%.2f%% of the grid) in %d cells of %g deg. Mean revisit %.2f, max %d orbits'
+          % (coverage['areaKm2'], 100.0 * coverage['fraction'], coverage['cellsCovered'], coverage['cell'],
+             coverage['meanRevisit'], coverage['maxRevisit']))
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Rasterize the FOV footprints of a mission into coverage grids.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('--cell', type=float, default=CELL_DEG, help='grid cell size in degrees')
+  parser.add_argument('--box', nargs=4, type=float, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'), default=GLOBAL_BOX,
+                      help='grid extent, global when omitted')
+  parser.add_argument('--out', help='coverage file, ' + COVERAGE_NAME + ' in the processing directory when omitted')
+  args = parser.parse_args()
+
+  print(CoverageSummary(BuildCoverage(args.procDir, args.cell, args.box, args.out)))
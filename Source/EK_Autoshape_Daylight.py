@@ -2,6 +2,7 @@
 # EK_Autoshape_Daylight.py
 # Tim Klug
 
+import arcpy
 from arcpy import env
 from arcpy import da
 from arcpy import ta
@@ -16,6 +17,14 @@ import string
 import datetime
 from sets import Set
 
+from EK_Autoshape_Lighting import NO_ORBIT, SortIntervals, AssignOrbits
+from EK_Autoshape_Time import ParseLightTimes
+from EK_Autoshape_Manifest import LoadManifest, HashFile, HashShapefile, IsCurrent, Record, SaveManifest
+from EK_Autoshape_Cache import ReadColumns
+from EK_Autoshape_Orbits import GroupOrbits, FileOrbit
+from EK_Autoshape_Solar import EphemerisLighting, WriteLightingCSV
+from EK_Autoshape_Trace import OpenTrace, BeginStage, EndStage, BeginOrbit, EndOrbit, ReportTrace, SaveTrace
+
 arcpy.env.overwriteOutput = True
 arcpy.CheckOutExtension("tracking")
 
@@ -25,7 +34,8 @@ gp = arcgisscripting.create(9.3)
  # This file consists of three functions and a main level program designed to be run as an ArcGIS python tool.
  # These functions are designed to read subpoint lighting intervals of coasting arcs of the ISS from a csv input.
  # Each coasting arc shapefile (exported from AGI Systems Toolkit) is assigned an orbit number based on the 
- # subpoint lighting schedule read from the input csv. Each daylight orbit is exported from the coasting arc layer 
+ # subpoint lighting schedule read from the input csv, or computed from the ephemeris itself when no csv is given
+ # (see EK_Autoshape_Solar.py). Each daylight orbit is exported from the coasting arc layer 
  # as a shapefile containing an arc of points spanning 45 minutes of daylight on the station's ground track.
  #
  # Author:
@@ -42,6 +52,7 @@ gp = arcgisscripting.create(9.3)
 arcpy.env.workspace = gp.GetParameterAsText(0)
 
 # Input csv file with subpoint sunlight start and end times formatted as Y/m/d H:M:S.f, Y/m/d H:M:S.f
+#   Optional. When left empty the sunlit intervals are computed from the coasting arcs with a solar position model
 inCSV = gp.GetParameterAsText(1)
 
 # Mission number read as long integer
@@ -50,6 +61,13 @@ MissionNum = gp.GetParameter(2)
 # Optional offset parameter. Used to correct indices for orbit numbers
 orbitOffset = gp.GetParameter(3) 
 
+# Optional trace file (.json or .csv). Records wall time, CPU time, rows, files and peak memory of every stage
+#   and coasting arc. Stage summaries are always reported in the tool messages
+TraceFile = gp.GetParameterAsText(4)
+
+# Optional orbit number of a coasting arc run under cProfile
+ProfileOrbit = gp.GetParameter(5)
+
 
 
  # set workspace parameters
@@ -66,17 +84,9 @@ if not os.path.isdir(procDir):
 
 
 
- # Global variables set to keep track of orbit indices.
- # Necessary for linking subpoint lighting times from input csv with sunlit segments of coasting arcs through each iteration of FillOrbs()
-
- # OrbInd stores ordinal number of orbit increments e.g. first, second, third... 
-global OrbInd
-OrbInd  = 0
-
- # OrbFill calculates the actual orbit number for each coasting arc.
+ # Orbit number of the first subpoint lighting interval of the mission.
  # Values range from [0, ~6000]. Note addition of offset parameter for future adjustment
-global OrbFill
-OrbFill = int(rawDir[0][-8:-4]) - 2 + orbitOffset
+baseOrbit = FileOrbit(rawDir[0]) - 2 + orbitOffset
 
 
 
@@ -95,10 +105,7 @@ def ReadCSV(inCSV):
 
  # Define two arrays for storing datetime objects of start and end subpoint lighting times
   startTimes = []
-  endtimes   = []
-
- # Define input format for datetime objects being read from input csv
-  input_fmt  = '%Y/%m/%d %H:%M:%S.%f'
+  endTimes   = []
 
  # Open input csv file in read mode
   f = open(inCSV, 'rb')
@@ -109,16 +116,15 @@ def ReadCSV(inCSV):
  # Begin parsing csv by declaring a 2 element list of lines from input file
   lines = list(reader)
 
- # Parse each line for both start and end times
- #   strip datetime objects and appending them to the appropriate list
-  for row in lines:
-    startTimes.append(datetime.datetime.strptime(row[0], input_fmt) )
-    endTimes.append(datetime.datetime.strptime(row[1], input_fmt) )
+ # Parse the start and end time columns of every line (Y/m/d H:M:S.f), each in one batch with the fixed-layout
+ #   lighting time parser shared by the AutoShape tools
+  startTimes = ParseLightTimes([row[0] for row in lines])
+  endTimes   = ParseLightTimes([row[1] for row in lines])
     
  # Return datetime arrays as a tuple
   return (startTimes, endTimes)
 
-def FillOrbs(coastingArc, sTime, eTime):
+def FillOrbs(coastingArc, starts, ends, baseOrbit, numbers=None):
 
  # Fill daylight sections of coasting arc layers with their appropriate orbit number
  #
@@ -126,51 +132,53 @@ def FillOrbs(coastingArc, sTime, eTime):
  #   coastingArc : in, required, type = string
  #   path to the input feature class containing a coasting arc with multiple orbits to be sorted
  #
- #   sTime : in, required, type = datetime array
- #   array of subpoint lighting start times retrieved from input csv
+ #   starts : in, required, type = float64 array
+ #   sorted subpoint lighting start times in epoch seconds returned by SortIntervals()
  #
- #   eTime : in, required, type = datetime array
- #   array of subpoint lighting end times retrieved from input csv
-
- # Declare use of global variables defined above
-  global OrbInd
-  global OrbFill
-
- # Define input format of datetime objects being compared in each row of the update cursorclass
-  ReqTime_fmt = '%m/%d/%y %H:%M:%S'
+ #   ends : in, required, type = float64 array
+ #   subpoint lighting end times in epoch seconds returned by SortIntervals()
+ #
+ #   baseOrbit : in, required, type = integer
+ #   orbit number of the first subpoint lighting interval of the mission
+ #
+ #   numbers : in, optional, type = int array
+ #   orbit number of each lighting interval, when computed from the ephemeris by EphemerisLighting()
+ #
+ #   orbits : out, required, type = int64 array
+ #   orbit number of each coasting arc row in file order, or NO_ORBIT for rows outside every interval
 
  # Define fields being referenced by update cursor
   fields = ["TA_DATE","OrbitNum"]
 
- # Create arcpy update cursor referencing the fields defined above
+ # Memory-map the point timestamps, already parsed to epoch seconds, and current OrbitNum labels from the columnar
+ #   cache. The cache is decoded from the shapefile only on first use or after the coasting arc has changed
+  columns = ReadColumns(coastingArc)
+  times   = columns['time']
+
+ # Map every point to the orbit number of its lighting interval in one binary-search pass
+  orbits = AssignOrbits(times, starts, ends, baseOrbit, numbers)
+
+ # Leave the coasting arc untouched when a previous run already labeled it, so its cache stays valid
+  if 'label' in columns and all((columns['label'][orbit.rows] == 'Orbit ' + str(orbit.number)).all()
+                                for orbit in GroupOrbits(orbits)):
+    return orbits
+
+ # Release the memory-mapped cache of the coasting arc before rewriting it, so the next read can remove it
+  columns = times = None
+
+ # Create arcpy update cursor referencing the fields defined above. Rows are returned in the same order as the search cursor
   with arcpy.da.UpdateCursor(coastingArc, fields) as cursor:
-    for row in cursor:                                            # Iterate through each row of the feature class
-    
-      if OrbInd < len(sTime):                                     # Continue making comparisons while the number of orbits
-                                                                  #   processed is less than the total number of lighting times
-                                                                  #   found in input file
-                                                                  
-        rowDT = datetime.datetime.strptime(row[0], ReqTime_fmt)   # Read and store the dto of the current row
-        
-        if rowDT < sTime[OrbInd]:                                 # Compare current row's dto with current subpoint lighting time
-        
-          continue                                                # Loop continues without updating row with orbit number for non-lighting times (night orbits)
-          
-        elif rowDT <= eTime[OrbInd]:                              # Row dto is less than the next end of subpoint lighting (day orbits)
-        
-          row[1] = 'Orbit ' + str(OrbFill)                        # Set orbit number field to equal current orbit number 
-          
-          cursor.updateRow(row)                                   # Update cursor to save changes before moving to next row
-          
-        elif rowDT > eTime[OrbInd]:                               # Row dto has exceeded next end of subpoint lighting (night has now fallen)
-        
-          OrbInd  += 1                                            # Increment OrbInd global variable to begin making comparisons to next subpoint lighting schedule
-          
-          OrbFill += 1                                            # Increment OrbFill global variable to begin filling next orbit number 
-          
-  return
-
-def ExportArcs(coastingArc, fcOrbNum, procDir):
+    for i, row in enumerate(cursor):                              # Iterate through each row of the feature class
+
+      if orbits[i] != NO_ORBIT:                                   # Rows outside every lighting interval (night orbits) are left empty
+
+        row[1] = 'Orbit ' + str(orbits[i])                        # Set orbit number field to the row's orbit number
+
+        cursor.updateRow(row)                                     # Update cursor to save changes before moving to next row
+
+  return orbits
+
+def ExportArcs(coastingArc, orbits, fcOrbNum, procDir, manifest=None, inputs=None, params=None):
 
  # Export point-arc shapefiles of individual sunlight orbits from current coasting arc layer
  # 
@@ -178,11 +186,24 @@ def ExportArcs(coastingArc, fcOrbNum, procDir):
  #   coastingArc, in, required, type = string
  #   path to feature class of coasting arc being sorted for dayligh orbits
  #
+ #   orbits, in, required, type = int array
+ #   orbit number of each coasting arc row in file order, as returned by FillOrbs()
+ #
  #   fcOrbNum, in, required, type = integer
  #   Integer representing the orbit number of the first element of the coasting arc input
  #
  #   procDir, in, required, type = string
  #   path to processing directory
+ #
+ #   manifest, in, optional, type = dictionary
+ #   rebuild manifest. Existing arc-point files are only kept when they were built from the same inputs and
+ #   parameters. None keeps every existing arc-point file
+ #
+ #   inputs, in, optional, type = dictionary
+ #   content hashes of the coasting arc and lighting csv, recorded in the manifest
+ #
+ #   params, in, optional, type = dictionary
+ #   parameters the orbit labels depend on, recorded in the manifest
 
  # Set output directory within processing directory
   arcDir_out = procDir + r'\Arc'
@@ -191,49 +212,118 @@ def ExportArcs(coastingArc, fcOrbNum, procDir):
   if not os.path.isdir(arcDir_out):
     os.makedirs(arcDir_out)
     
- # Define a set to store a record of all orbit numbers within coasting arc
-  s = set()
-  
- # Define a search cursor referencing orbit number field of the coasting arc 
-  with arcpy.da.SearchCursor(coastingArc, "OrbitNum") as cursor:
- 
- # Add each non-empty row of the cursor to the set of all orbit numbers within coasting arc
-    for row in cursor:
-      if row[0] != '':
-        s.add(row[0])    # sets ignore duplicates
+ # Define the fields copied to each point-arc output (every attribute except the object id and geometry fields)
+  desc   = arcpy.Describe(coastingArc)
+  fields = ["SHAPE@"] + [f.name for f in arcpy.ListFields(coastingArc)
+                         if f.type not in ("OID", "Geometry")]
+
+ # Group the row indices of each daylight orbit on the integer orbit numbers filled by FillOrbs()
+  groups = GroupOrbits(orbits)
+
+ # Nothing to export if no daylight orbits were filled in this coasting arc
+  if not groups:
+    return
+
+ # Read the coasting arc once. Cursor rows come back in file order, the order of the orbit number array
+  with arcpy.da.SearchCursor(coastingArc, fields) as cursor:
+    rows = list(cursor)
+
+ # Define a dictionary of per-orbit row buffers keyed on orbit number
+  orbRows = dict((orbit.number, [rows[i] for i in orbit.rows]) for orbit in groups)
+
+  while fcOrbNum <= max(orbRows):                                           # Continue exporting daylight orbits from coasting arc
+                                                                            #   while fcOrbNum is less than the max orbit number found
 
-  while fcOrbNum <= int(max(s)[-4:]):                                       # Continue exporting daylight orbits from coasting arc
-                                                                            #   while fcOrbNum is less than the max orbit number found in the set
-  
     outArcFC = arcDir_out + r'\\orb' + str(fcOrbNum).zfill(4) + "_arc.shp"  # Define output filename using output directory and orbit number
-    
-    if not os.path.isfile(outArcFC):                                        # Check if output arc-point file already exists
-          
-      arcpy.Select_analysis(coastingArc,
-                            outArcFC,
-                            '"OrbitNum" = \'Orbit ' + str(fcOrbNum) +'\'')  # select features with current orbit number and export to new arc-point shapefile
-      
+
+    if manifest is None:                                                    # Check if output arc-point file already exists
+      current = os.path.isfile(outArcFC)                                    #   and, with a manifest, is up to date
+    else:
+      current = IsCurrent(manifest, "Arc", fcOrbNum, inputs, params, outArcFC)
+
+    if not current:
+
+      arcpy.CreateFeatureclass_management(arcDir_out,                       # Create an empty arc-point shapefile with the coasting arc schema
+                                          os.path.basename(outArcFC),
+                                          "POINT",
+                                          coastingArc,
+                                          spatial_reference=desc.spatialReference)
+
+      with arcpy.da.InsertCursor(outArcFC, fields) as outCursor:            # Write the buffered rows of the current orbit to the new shapefile
+        for row in orbRows.get(fcOrbNum, []):
+          outCursor.insertRow(row)
+
+      if manifest is not None:                                              # Record the inputs the new arc-point file was built from
+        Record(manifest, "Arc", fcOrbNum, inputs, params)
+
     fcOrbNum += 1                                                           # Increment orbit number to export next daylight orbit
 
     
 ## Main level program ##
 
+ # Open the trace measuring each stage and coasting arc
+trace = OpenTrace(TraceFile, ProfileOrbit)
+
  # Define start and end datetime object arrays for subpoint lighting intervals
 startTimes = []
 endTimes = []
 
-# Assign tuple of dto arrays to output of ReadCSV()
-(startTimes,endTimes) = ReadCSV(inCSV)
+if inCSV:
+
+  # Assign tuple of dto arrays to output of ReadCSV()
+  BeginStage(trace, "ReadCSV")
+  (startTimes,endTimes) = ReadCSV(inCSV)
+
+  # Sort the lighting intervals once into epoch second arrays shared by every coasting arc
+  (starts, ends) = SortIntervals(startTimes, endTimes)
+  EndStage(trace, rowsRead=len(starts))
+
+  # Number the intervals consecutively from baseOrbit
+  numbers = None
+
+else:
+
+  # Compute the sunlit intervals and their orbit numbers from the coasting arcs themselves
+  BeginStage(trace, "EphemerisLighting")
+  (starts, ends, numbers) = EphemerisLighting(rawDir, orbitOffset=orbitOffset or 0)
+
+  # Write them as a lighting csv for the Calendar tool and for hashing in the manifest
+  inCSV = procDir + r'\M' + str(MissionNum) + '_Lighting.csv'
+  WriteLightingCSV(inCSV, starts, ends)
+  EndStage(trace, rowsWritten=len(starts), files=1)
+
+# Load the rebuild manifest and hash the lighting csv every orbit label depends on
+manifest = LoadManifest(procDir)
+
+lightHash = HashFile(manifest, inCSV)
 
 # Loop through raw input directory of coasting arcs
+BeginStage(trace, "Daylight")
+
 for coastingArc in rawDir:
 
-  fcOrbNum = int(coastingArc[-8:-4])                            # Read first orbit number of the current coasting arc
+  fcOrbNum = FileOrbit(coastingArc)                             # Read first orbit number of the current coasting arc
+
+  probe = BeginOrbit(fcOrbNum, [coastingArc, procDir + r'\Arc']) # Measure the coasting arc and the arc-point files it writes
     
   arcpy.AddField_management(coastingArc, "OrbitNum", "STRING")  # Add "OrbitNum" field to coasting arc feature
   
   arcpy.DeleteField_management(coastingArc, ["TRACKID"])        # Delete "TrackID" field from coasting arc feature
   
-  FillOrbs(coastingArc, startTimes, endTimes)                   # Fill coasting arc feature's orbit numbers using FillOrbs()
+  orbits = FillOrbs(coastingArc, starts, ends, baseOrbit, numbers)  # Fill coasting arc feature's orbit numbers using FillOrbs()
   
-  ExportArcs(coastingArc, fcOrbNum, procDir)                    # Export all daylight intervals within current coasting arc to new arc-point shapefiles
\ No newline at end of file
+  inputs = {"CoastingArc": HashShapefile(manifest, coastingArc), # Hash the labeled coasting arc, .dbf included so TA_DATE edits are seen,
+            "Lighting": lightHash}                               #   and the lighting csv its orbit numbers were filled from
+
+  ExportArcs(coastingArc, orbits, fcOrbNum, procDir,            # Export all daylight intervals within current coasting arc to new arc-point shapefiles
+             manifest, inputs, {"baseOrbit": baseOrbit})
+
+  SaveManifest(procDir, manifest)                               # Save the manifest after each coasting arc
+
+  EndOrbit(probe)
+
+EndStage(trace)
+
+# Report the time and memory of each stage, and write the trace file when one was given
+ReportTrace(gp, trace)
+SaveTrace(trace)
@@ -0,0 +1,80 @@
+# EarthKAM AutoShape File Helpers
+# EK_Autoshape_Files.py
+
+import contextlib
+import os
+
+ #
+ # This file consists of the file helpers shared by the manifest, the columnar cache, the footprint index and
+ # the coverage grids. Each of them records the sizes and modification times of the files it was built from, to
+ # tell when it is out of date, and replaces its own file only once the new one is fully written, so a tool
+ # stopped mid-write never leaves a truncated file behind for the next run to trust.
+ #
+
+
+def FileStats(paths):
+
+ # Return the names, sizes and modification times of a list of files
+ #
+ # Params:
+ #   paths : in, required, type = list of strings
+ #   paths to the files. Missing files are left out
+ #
+ #   stats : out, required, type = list
+ #   list of [name, size, mtime] lists, in the order of paths. Lists compare equal to the same list read back
+ #   from a .json file
+
+  stats = []
+
+  for path in paths:
+    if os.path.isfile(path):
+      st = os.stat(path)
+      stats.append([os.path.basename(path), st.st_size, st.st_mtime])
+
+  return stats
+
+def ShapefileStats(path):
+
+ # Return the FileStats() of the .shp and .dbf files of a shapefile, which change whenever its shapes or
+ # attributes are rewritten
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   stats : out, required, type = list
+
+  base = os.path.splitext(path)[0]
+
+  return FileStats([base + '.shp', base + '.dbf'])
+
+@contextlib.contextmanager
+def ReplaceFile(path, mode='wb'):
+
+ # Open a temporary file next to path for writing, and move it over path once it is written and closed. The
+ # temporary file is removed instead when writing fails
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the file being replaced
+ #
+ #   mode : in, optional, type = string
+ #   open mode of the temporary file, 'wb' or 'w'
+ #
+ #   f : out, required, type = file
+ #   the open temporary file
+
+  temp = path + '.tmp'
+
+  try:
+    with open(temp, mode) as f:
+      yield f
+  except BaseException:
+    if os.path.isfile(temp):
+      os.remove(temp)
+    raise
+
+  if os.path.isfile(path):
+    os.remove(path)
+
+  os.rename(temp, path)
@@ -0,0 +1,490 @@
+# EarthKAM AutoShape GeoPackage Output
+# EK_Autoshape_GeoPackage.py
+
+import argparse
+import datetime
+import glob
+import os
+import sqlite3
+import struct
+
+from EK_Autoshape_Files import ShapefileStats
+from EK_Autoshape_Orbits import FileOrbit
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for writing the outputs of a mission into a single
+ # OGC GeoPackage (SQLite) file instead of thousands of per-orbit shapefiles. The \Arc, \Line and \Buff
+ # shapefiles become the arc, line and buff feature tables. Each table carries an integer orbit column with a
+ # B-tree index and the gpkg_rtree_index spatial index, so one orbit or one area can be pulled without a scan.
+ # The spatial index is kept by the insert, update and delete triggers of the GeoPackage rtree extension, so
+ # GIS clients editing the layers keep it current too. The ST_ functions the triggers call are registered on
+ # each connection opened here.
+ #
+ # Packing is incremental. The size and time of every source shapefile are recorded in the autoshape_sources
+ # table, and only orbits whose shapefiles changed since the last pack are replaced, each in one transaction
+ # with batched inserts. Orbits whose shapefiles were removed are dropped. The per-orbit shapefiles are the
+ # working layout of the tools, so the stages write them first and packing keeps them by default. On request,
+ # once an orbit layer is packed its shapefile is deleted, leaving the GeoPackage as the only copy: such sources
+ # are marked as dropped and are kept by later packs until a new shapefile for the orbit appears.
+ #
+ # Dropping the shapefiles ends incremental processing of the mission. The rebuild manifest, the footprint index,
+ # the planner, the lenses, the coverage grids, the watch mode and the KML export all read the shapefiles and do
+ # not read the GeoPackage, so they have to run before the drop, and the next run rebuilds every orbit from a new
+ # \Arc.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_GeoPackage.py <MXX_Processed_Orbits directory> <output .gpkg> [--drop]
+ #
+
+
+ # Feature table, geometry type and source directory of each layer
+LAYERS = [("arc",  "POINT",           'Arc'),
+          ("line", "MULTILINESTRING", 'Line'),
+          ("buff", "MULTIPOLYGON",    'Buff')]
+
+ # GeoPackage application id ("GPKG") and version 1.2 user version
+_APPLICATION_ID = 0x47504B47
+_USER_VERSION   = 10200
+
+ # Spatial reference system of the STK ephemeris exports
+WGS84_SRS_ID = 4326
+
+_WGS84_WKT = ('GEOGCS["WGS 84",DATUM["WGS_1984",SPHEROID["WGS 84",6378137,298.257223563]],'
+              'PRIMEM["Greenwich",0],UNIT["degree",0.0174532925199433],AUTHORITY["EPSG","4326"]]')
+
+ # SQLite column type of each dbf field type
+_COLUMN_TYPES = {'C': 'TEXT', 'N': 'REAL', 'F': 'REAL', 'L': 'BOOLEAN', 'D': 'TEXT'}
+
+ # WKB geometry type codes
+_WKB_POINT           = 1
+_WKB_MULTILINESTRING = 5
+_WKB_MULTIPOLYGON    = 6
+
+ # Number of features inserted per executemany batch
+BATCH_SIZE = 5000
+
+ # Maintenance triggers of the gpkg_rtree_index extension (GeoPackage 1.2 annex F.3), for table t and geometry
+ # column c with the integer primary key fid
+_RTREE_TRIGGERS = """
+  CREATE TRIGGER IF NOT EXISTS "rtree_{t}_{c}_insert" AFTER INSERT ON "{t}"
+  WHEN (NEW."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}"))
+  BEGIN
+    INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW.fid,
+      ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+  END;
+  CREATE TRIGGER IF NOT EXISTS "rtree_{t}_{c}_update1" AFTER UPDATE OF "{c}" ON "{t}"
+  WHEN OLD.fid = NEW.fid AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+  BEGIN
+    INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW.fid,
+      ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+  END;
+  CREATE TRIGGER IF NOT EXISTS "rtree_{t}_{c}_update2" AFTER UPDATE OF "{c}" ON "{t}"
+  WHEN OLD.fid = NEW.fid AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+  BEGIN
+    DELETE FROM "rtree_{t}_{c}" WHERE id = OLD.fid;
+  END;
+  CREATE TRIGGER IF NOT EXISTS "rtree_{t}_{c}_update3" AFTER UPDATE ON "{t}"
+  WHEN OLD.fid != NEW.fid AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}"))
+  BEGIN
+    DELETE FROM "rtree_{t}_{c}" WHERE id = OLD.fid;
+    INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW.fid,
+      ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));
+  END;
+  CREATE TRIGGER IF NOT EXISTS "rtree_{t}_{c}_update4" AFTER UPDATE ON "{t}"
+  WHEN OLD.fid != NEW.fid AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}"))
+  BEGIN
+    DELETE FROM "rtree_{t}_{c}" WHERE id IN (OLD.fid, NEW.fid);
+  END;
+  CREATE TRIGGER IF NOT EXISTS "rtree_{t}_{c}_delete" AFTER DELETE ON "{t}"
+  WHEN OLD."{c}" NOT NULL
+  BEGIN
+    DELETE FROM "rtree_{t}_{c}" WHERE id = OLD.fid;
+  END;
+  """
+
+
+def _Now():
+
+ # Return the current UTC time in the GeoPackage timestamp format
+
+  return datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')[:-4] + 'Z'
+
+def _Envelope(blob):
+
+ # Return the (xmin, xmax, ymin, ymax) envelope of a GeoPackage geometry blob, None when empty or unknown
+
+  if blob is None:
+    return None
+
+  flags = struct.unpack_from('<B', blob, 3)[0]
+  order = '<' if flags & 0x01 else '>'
+
+  if flags & 0x10:
+    return None
+
+ # Envelope codes 1 to 4 all start with the xy envelope
+  if (flags >> 1) & 0x07:
+    return struct.unpack_from(order + '4d', blob, 8)
+
+ # Points are written without an envelope, so read the coordinates of the WKB point instead
+  wkbOrder = '<' if struct.unpack_from('<B', blob, 8)[0] == 1 else '>'
+
+  if struct.unpack_from(wkbOrder + 'I', blob, 9)[0] % 1000 != _WKB_POINT:
+    return None
+
+  (x, y) = struct.unpack_from(wkbOrder + '2d', blob, 13)
+
+  return (x, x, y, y)
+
+def _EnvelopeValue(i):
+
+ # Return an ST_ function giving one envelope value of a geometry blob
+
+  return lambda blob: None if _Envelope(blob) is None else _Envelope(blob)[i]
+
+def Connect(gpkgPath):
+
+ # Open a GeoPackage with the ST_ functions called by the rtree triggers
+ #
+ # Params:
+ #   gpkgPath : in, required, type = string
+ #   path to the GeoPackage. Created if nonexistent
+ #
+ #   conn : out, required, type = sqlite3 connection
+
+  conn = sqlite3.connect(gpkgPath, timeout=60)
+
+  conn.create_function('ST_IsEmpty', 1, lambda blob: None if blob is None else int(_Envelope(blob) is None))
+  conn.create_function('ST_MinX', 1, _EnvelopeValue(0))
+  conn.create_function('ST_MaxX', 1, _EnvelopeValue(1))
+  conn.create_function('ST_MinY', 1, _EnvelopeValue(2))
+  conn.create_function('ST_MaxY', 1, _EnvelopeValue(3))
+
+  return conn
+
+def _Initialize(conn):
+
+ # Create the GeoPackage core tables, the source record table and the required spatial reference systems
+
+  conn.execute('PRAGMA application_id = %d' % _APPLICATION_ID)
+  conn.execute('PRAGMA user_version = %d' % _USER_VERSION)
+
+  conn.executescript("""
+    CREATE TABLE IF NOT EXISTS gpkg_spatial_ref_sys (
+      srs_name TEXT NOT NULL, srs_id INTEGER NOT NULL PRIMARY KEY, organization TEXT NOT NULL,
+      organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+    CREATE TABLE IF NOT EXISTS gpkg_contents (
+      table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE, description TEXT DEFAULT '',
+      last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+      min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER,
+      CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys(srs_id));
+    CREATE TABLE IF NOT EXISTS gpkg_geometry_columns (
+      table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL, srs_id INTEGER NOT NULL,
+      z TINYINT NOT NULL, m TINYINT NOT NULL,
+      CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name),
+      CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents(table_name),
+      CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id));
+    CREATE TABLE IF NOT EXISTS gpkg_extensions (
+      table_name TEXT, column_name TEXT, extension_name TEXT NOT NULL, definition TEXT NOT NULL, scope TEXT NOT NULL,
+      CONSTRAINT ge_tce UNIQUE (table_name, column_name, extension_name));
+    CREATE TABLE IF NOT EXISTS autoshape_sources (
+      layer TEXT NOT NULL, orbit INTEGER NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL,
+      dropped INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (layer, orbit));
+    """)
+
+ # Packs written before shapefiles could be dropped lack the dropped column
+  if 'dropped' not in [row[1] for row in conn.execute('PRAGMA table_info(autoshape_sources)')]:
+    conn.execute('ALTER TABLE autoshape_sources ADD COLUMN dropped INTEGER NOT NULL DEFAULT 0')
+
+  conn.executemany('INSERT OR IGNORE INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+                   [('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', 'undefined cartesian coordinate reference system'),
+                    ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', 'undefined geographic coordinate reference system'),
+                    ('WGS 84 geodetic', WGS84_SRS_ID, 'EPSG', 4326, _WGS84_WKT, 'longitude/latitude coordinates in decimal degrees on the WGS 84 spheroid')])
+
+  conn.commit()
+
+  return
+
+def _SrsId(conn, prjPath):
+
+ # Return the srs_id of a shapefile coordinate system, registering systems other than WGS 84 under new ids
+
+  if not os.path.isfile(prjPath):
+    return WGS84_SRS_ID
+
+  with open(prjPath, 'r') as f:
+    wkt = f.read().strip()
+
+  if wkt.startswith('GEOGCS') and 'WGS_1984' in wkt and 'PROJCS' not in wkt:
+    return WGS84_SRS_ID
+
+  row = conn.execute('SELECT srs_id FROM gpkg_spatial_ref_sys WHERE definition = ?', (wkt,)).fetchone()
+
+  if row is not None:
+    return row[0]
+
+  srsId = max(100000, conn.execute('SELECT MAX(srs_id) FROM gpkg_spatial_ref_sys').fetchone()[0] + 1)
+  conn.execute('INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)',
+               (wkt.split('"')[1] if '"' in wkt else 'Custom', srsId, 'NONE', srsId, wkt, 'from ' + os.path.basename(prjPath)))
+
+  return srsId
+
+def _CreateLayer(conn, table, geometryType, srsId):
+
+ # Create a feature table with its orbit index and rtree spatial index, if not already present. The rtree
+ # triggers are also added to tables packed before they were written
+
+  if conn.execute('SELECT 1 FROM gpkg_contents WHERE table_name = ?', (table,)).fetchone() is not None:
+    conn.executescript(_RTREE_TRIGGERS.format(t=table, c='geom'))
+    return
+
+  conn.execute('CREATE TABLE "%s" (fid INTEGER PRIMARY KEY AUTOINCREMENT, geom %s, orbit INTEGER NOT NULL)'
+               % (table, geometryType))
+  conn.execute('CREATE INDEX "%s_orbit" ON "%s" (orbit)' % (table, table))
+  conn.execute('CREATE VIRTUAL TABLE "rtree_%s_geom" USING rtree(id, minx, maxx, miny, maxy)' % table)
+  conn.executescript(_RTREE_TRIGGERS.format(t=table, c='geom'))
+
+  conn.execute('INSERT INTO gpkg_contents (table_name, data_type, identifier, last_change, srs_id) VALUES (?, ?, ?, ?, ?)',
+               (table, 'features', table, _Now(), srsId))
+  conn.execute('INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, 0, 0)', (table, 'geom', geometryType, srsId))
+  conn.execute('INSERT INTO gpkg_extensions VALUES (?, ?, ?, ?, ?)',
+               (table, 'geom', 'gpkg_rtree_index', 'http://www.geopackage.org/spec120/#extension_rtree', 'write-only'))
+
+  return
+
+def _AddColumns(conn, table, fields):
+
+ # Add the attribute columns of a shapefile that the feature table does not have yet
+
+  present = set(row[1].lower() for row in conn.execute('PRAGMA table_info("%s")' % table))
+
+  for (name, ftype, size, decimals) in fields:
+    if name.lower() not in present:
+      columnType = 'INTEGER' if ftype == 'N' and decimals == 0 else _COLUMN_TYPES.get(ftype, 'TEXT')
+      conn.execute('ALTER TABLE "%s" ADD COLUMN "%s" %s' % (table, name, columnType))
+      present.add(name.lower())
+
+  return
+
+def _SignedArea(ring):
+
+ # Return the signed area of a ring, negative for the clockwise outer rings of the shapefile format
+
+  return sum(x0 * y1 - x1 * y0 for ((x0, y0), (x1, y1)) in zip(ring[:-1], ring[1:])) / 2.0
+
+def _Polygons(shape):
+
+ # Group the rings of a shapefile polygon into polygons: each clockwise ring starts a polygon and the counter
+ # clockwise rings that follow it are its holes
+
+  polygons = []
+
+  for ring in shape:
+    if _SignedArea(ring) <= 0 or not polygons:
+      polygons.append([ring])
+    else:
+      polygons[-1].append(ring)
+
+  return polygons
+
+def _Points(points):
+
+ # Encode a WKB point list
+
+  return struct.pack('<I', len(points)) + struct.pack('<%dd' % (2 * len(points)), *[c for p in points for c in p])
+
+def GeometryBlob(geometryType, shape, srsId):
+
+ # Encode a shapefile shape as a GeoPackage geometry blob
+ #
+ # Params:
+ #   geometryType : in, required, type = string
+ #   "POINT", "MULTILINESTRING" or "MULTIPOLYGON"
+ #
+ #   shape : in, required, type = tuple or list
+ #   shape returned by IterShapefile()
+ #
+ #   srsId : in, required, type = integer
+ #   spatial reference system id
+ #
+ #   (blob, bbox) : out, required, type = tuple
+ #   GeoPackage binary header followed by little endian WKB, and the (xmin, xmax, ymin, ymax) envelope
+
+  if geometryType == "POINT":
+    bbox = (shape[0], shape[0], shape[1], shape[1])
+    wkb  = struct.pack('<BIdd', 1, _WKB_POINT, shape[0], shape[1])
+
+ # Points carry no envelope in the header
+    return (b'GP' + struct.pack('<BBi', 0, 1, srsId) + wkb, bbox)
+
+  xs = [p[0] for part in shape for p in part]
+  ys = [p[1] for part in shape for p in part]
+  bbox = (min(xs), max(xs), min(ys), max(ys))
+
+  if geometryType == "MULTILINESTRING":
+    wkb = struct.pack('<BII', 1, _WKB_MULTILINESTRING, len(shape))
+    wkb += b''.join(struct.pack('<BI', 1, 2) + _Points(part) for part in shape)
+  else:
+    polygons = _Polygons(shape)
+    wkb = struct.pack('<BII', 1, _WKB_MULTIPOLYGON, len(polygons))
+    wkb += b''.join(struct.pack('<BII', 1, 3, len(rings)) + b''.join(_Points(ring) for ring in rings)
+                    for rings in polygons)
+
+ # Little endian flag with an xy envelope
+  return (b'GP' + struct.pack('<BBi4d', 0, 0x03, srsId, *bbox) + wkb, bbox)
+
+def _DeleteOrbit(conn, table, orbNum):
+
+ # Delete the features of one orbit. The delete trigger removes their rtree entries
+
+  conn.execute('DELETE FROM "%s" WHERE orbit = ?' % table, (orbNum,))
+
+  return
+
+def WriteOrbit(conn, table, geometryType, orbNum, path):
+
+ # Replace the features of one orbit in a feature table with those of a shapefile, in one transaction
+ #
+ # Params:
+ #   conn : in, required, type = sqlite3 connection
+ #   connection to the GeoPackage
+ #
+ #   table : in, required, type = string
+ #   feature table name
+ #
+ #   geometryType : in, required, type = string
+ #   geometry type of the feature table
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number of the shapefile
+ #
+ #   path : in, required, type = string
+ #   path to the shapefile
+
+  fields = shp.ReadFields(path)
+  srsId  = _SrsId(conn, os.path.splitext(path)[0] + '.prj')
+
+  _CreateLayer(conn, table, geometryType, srsId)
+  _AddColumns(conn, table, fields)
+  _DeleteOrbit(conn, table, orbNum)
+
+  names  = ', '.join(['geom', 'orbit'] + ['"%s"' % f[0] for f in fields])
+  insert = 'INSERT INTO "%s" (%s) VALUES (%s)' % (table, names, ', '.join('?' * (len(fields) + 2)))
+
+ # The insert trigger adds the rtree entry of each feature
+  rows = []
+
+  for (record, shape) in shp.IterShapefile(path):
+    blob = None if shape is None else sqlite3.Binary(GeometryBlob(geometryType, shape, srsId)[0])
+    rows.append([blob, orbNum] + record)
+
+    if len(rows) == BATCH_SIZE:
+      conn.executemany(insert, rows)
+      rows = []
+
+  conn.executemany(insert, rows)
+
+  return
+
+def DropShapefile(path):
+
+ # Delete every file of a shapefile, including the index and metadata files written by ArcGIS
+
+  (folder, name) = os.path.split(os.path.splitext(path)[0])
+
+  for part in os.listdir(folder or '.'):
+    if part.startswith(name + '.'):
+      os.remove(os.path.join(folder, part))
+
+  return
+
+def PackMission(procDir, gpkgPath, drop=False):
+
+ # Pack the \Arc, \Line and \Buff shapefiles of a mission into one GeoPackage, replacing only changed orbits
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   gpkgPath : in, required, type = string
+ #   path to the mission GeoPackage. Created if nonexistent
+ #
+ #   drop : in, optional, type = boolean
+ #   delete each orbit shapefile once its layer is committed to the GeoPackage. Ends incremental processing, as
+ #   the other tools read the shapefiles
+ #
+ #   (packed, dropped) : out, required, type = tuple
+ #   numbers of orbit layers written and removed
+
+  conn = Connect(gpkgPath)
+
+  try:
+    _Initialize(conn)
+
+    packed  = 0
+    dropped = 0
+
+    for (table, geometryType, folder) in LAYERS:
+      recorded = dict((orbit, (size, mtime)) for (orbit, size, mtime)
+                      in conn.execute('SELECT orbit, size, mtime FROM autoshape_sources WHERE layer = ?', (table,)))
+      kept  = set(orbit for (orbit,) in conn.execute('SELECT orbit FROM autoshape_sources WHERE layer = ? AND dropped',
+                                                      (table,)))
+      found = set()
+
+      for path in sorted(glob.glob(os.path.join(procDir, folder, '*.shp'))):
+        orbNum = FileOrbit(path)
+        found.add(orbNum)
+
+ # The .dbf changes whenever attributes are rewritten, e.g. by FormatBuffer, so both files are compared
+        stats = ShapefileStats(path)
+        size  = sum(s[1] for s in stats)
+        mtime = max(s[2] for s in stats)
+
+        if recorded.get(orbNum) != (size, mtime):
+          with conn:
+            WriteOrbit(conn, table, geometryType, orbNum, path)
+            conn.execute('INSERT OR REPLACE INTO autoshape_sources VALUES (?, ?, ?, ?, 0)', (table, orbNum, size, mtime))
+
+          packed += 1
+
+ # The shapefile is only deleted once its features are committed
+        if drop:
+          with conn:
+            conn.execute('UPDATE autoshape_sources SET dropped = 1 WHERE layer = ? AND orbit = ?', (table, orbNum))
+          DropShapefile(path)
+
+ # Drop the orbits whose shapefiles were removed, keeping those whose shapefiles were deleted after packing
+      for orbNum in sorted(set(recorded) - found - kept):
+        with conn:
+          _DeleteOrbit(conn, table, orbNum)
+          conn.execute('DELETE FROM autoshape_sources WHERE layer = ? AND orbit = ?', (table, orbNum))
+
+        dropped += 1
+
+ # Refresh the layer extent from its spatial index
+      if conn.execute('SELECT 1 FROM gpkg_contents WHERE table_name = ?', (table,)).fetchone() is not None:
+        with conn:
+          conn.execute('UPDATE gpkg_contents SET min_x = (SELECT MIN(minx) FROM "rtree_%s_geom"), '
+                       'max_x = (SELECT MAX(maxx) FROM "rtree_%s_geom"), min_y = (SELECT MIN(miny) FROM "rtree_%s_geom"), '
+                       'max_y = (SELECT MAX(maxy) FROM "rtree_%s_geom"), last_change = ? WHERE table_name = ?'
+                       % (table, table, table, table), (_Now(), table))
+
+  finally:
+    conn.close()
+
+  return (packed, dropped)
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Pack the orbit shapefiles of a mission into one GeoPackage.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('gpkgPath', help='path to the output .gpkg')
+  parser.add_argument('--drop', action='store_true', help='delete the orbit shapefiles once they are packed. Later runs rebuild every orbit')
+  args = parser.parse_args()
+
+  (packed, dropped) = PackMission(args.procDir, args.gpkgPath, args.drop)
+
+  print('PackMission: ' + str(packed) + ' orbit layers written, ' + str(dropped) + ' removed')
@@ -0,0 +1,623 @@
+# EarthKAM AutoShape Footprint Index
+# EK_Autoshape_Index.py
+
+import argparse
+import csv
+import datetime
+import glob
+import os
+
+import numpy as np
+
+from EK_Autoshape_Time import (EphToReqTimes, EphToDatetime64, Datetime64ToEpochSeconds, ParseReqTime,
+                               ParseEphTime)
+from EK_Autoshape_Orbits import OrbitLabel, FileOrbit
+from EK_Autoshape_Files import ShapefileStats, ReplaceFile
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for answering "which orbit can see this site"
+ # queries against the FOV footprints of a mission. Every footprint polygon in the \Buff directory is read once
+ # into a packed R-tree: the footprint bounding boxes are ordered with Sort-Tile-Recursive packing and grouped
+ # into fixed size nodes, level by level, up to a single root. The tree, the footprint edges and the OrbitNum,
+ # ReqTime and MDYTime attributes are saved next to the rebuild manifest and reloaded while the buffers are
+ # unchanged.
+ #
+ # Queries are vectorized over any number of points or boxes: each tree level filters all (query, node) pairs
+ # at once, and the surviving (query, footprint) pairs are refined exactly with a nonzero winding test and a
+ # segment-box clip, so overlapping swath parts and holes are both handled.
+ #
+ # The index also orders the footprints on time for "which footprint was the camera in at this time" queries.
+ # Each footprint spans from its MDYTime to the MDYTime of the next footprint of its orbit (the last one spans
+ # the median ephemeris step), and a running maximum of the span ends lets a binary search on each side find the
+ # footprints overlapping a time or time range in O(log n). Query times are request times (YYYY/DDD/HH:MM:SS)
+ # or ephemeris times (MM/DD/YY HH:MM:SS).
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Index.py <MXX_Processed_Orbits directory> --point LON LAT
+ #   python EK_Autoshape_Index.py <MXX_Processed_Orbits directory> --box XMIN YMIN XMAX YMAX
+ #   python EK_Autoshape_Index.py <MXX_Processed_Orbits directory> --sites <sites.csv> [--out <matches.csv>]
+ #   python EK_Autoshape_Index.py <MXX_Processed_Orbits directory> --time TIME [--geometry]
+ #   python EK_Autoshape_Index.py <MXX_Processed_Orbits directory> --range START END [--geometry]
+ #
+
+
+ # Name of the index file within the processing directory
+INDEX_NAME = 'AutoShape_Index.npz'
+
+ # Index layout version. Index files of other versions are rebuilt
+INDEX_VERSION = 2
+
+ # Number of children of each R-tree node
+NODE_SIZE = 16
+
+ # Largest number of (query, edge) pairs refined at once, bounding the memory of bulk queries
+_CHUNK_EDGES = 1 << 22
+
+
+def _BufferStats(procDir):
+
+ # Return the buffer shapefiles of a processing directory with the sizes and times of their .shp and .dbf files
+
+  paths = sorted(glob.glob(os.path.join(procDir, 'Buff', '*.shp')))
+
+  return (paths, [s for path in paths for s in ShapefileStats(path)])
+
+def _ReadFootprints(paths):
+
+ # Read the bounding box, edges and attributes of every footprint of the buffer shapefiles
+
+  boxes     = []
+  orbits    = []
+  orbitNums = []
+  reqTimes  = []
+  mdyTimes  = []
+  edges     = []
+  counts    = []
+
+  for path in paths:
+    orbNum = FileOrbit(path)
+    fields = [f[0] for f in shp.ReadFields(path)]
+
+ # Buffers not yet run through FormatBuffer carry only Start_Time, so the formatted values are derived from it
+    formatted = "ReqTime" in fields
+    timeCol   = fields.index("MDYTime" if formatted else "Start_Time")
+    stamps    = []
+
+    if formatted:
+      (orbitCol, reqCol) = (fields.index("OrbitNum"), fields.index("ReqTime"))
+
+    for (record, shape) in shp.IterShapefile(path):
+      if not shape:
+        continue
+
+      points = np.asarray([p for part in shape for p in part], dtype=np.float64)
+      ring   = np.concatenate([np.column_stack((np.asarray(part[:-1], dtype=np.float64),
+                                                np.asarray(part[1:], dtype=np.float64)))
+                               for part in shape if len(part) > 1])
+
+      boxes.append((points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()))
+      edges.append(ring)
+      counts.append(len(ring))
+      orbits.append(orbNum)
+      stamps.append(record[timeCol])
+
+      if formatted:
+        orbitNums.append(record[orbitCol])
+        reqTimes.append(record[reqCol])
+
+    if not formatted:
+      orbitNums.extend([OrbitLabel(orbNum)] * len(stamps))
+      reqTimes.extend(EphToReqTimes(stamps))
+
+    mdyTimes.extend(stamps)
+
+  return (np.asarray(boxes, dtype=np.float64).reshape(-1, 4), np.asarray(orbits, dtype=np.int32),
+          np.asarray(orbitNums, dtype='U'), np.asarray(reqTimes, dtype='U'),
+          np.asarray(mdyTimes, dtype='U'),
+          np.concatenate(edges) if edges else np.zeros((0, 4), dtype=np.float64),
+          np.asarray(counts, dtype=np.int64))
+
+def _STROrder(boxes):
+
+ # Return the Sort-Tile-Recursive order of a set of boxes: vertical slices on x center, each sorted on y center
+
+  n = len(boxes)
+  slices = int(np.ceil(np.sqrt(np.ceil(n / float(NODE_SIZE)))))
+  sliceSize = slices * NODE_SIZE
+
+  cx = (boxes[:, 0] + boxes[:, 2]) / 2.0
+  cy = (boxes[:, 1] + boxes[:, 3]) / 2.0
+
+  byX = np.argsort(cx, kind='mergesort')
+  sliceOf = np.empty(n, dtype=np.int64)
+  sliceOf[byX] = np.arange(n) // sliceSize
+
+  return np.lexsort((cy, sliceOf))
+
+def _PackLevels(boxes):
+
+ # Group consecutive boxes into nodes, level by level up to a single root. Children of node i of a level are
+ # the boxes i * NODE_SIZE to (i + 1) * NODE_SIZE - 1 of the level below
+
+  levels = [boxes]
+
+  while len(levels[-1]) > 1:
+    below = levels[-1]
+    starts = np.arange(0, len(below), NODE_SIZE)
+
+    levels.append(np.column_stack((np.minimum.reduceat(below[:, 0], starts),
+                                   np.minimum.reduceat(below[:, 1], starts),
+                                   np.maximum.reduceat(below[:, 2], starts),
+                                   np.maximum.reduceat(below[:, 3], starts))))
+
+  return levels
+
+def _TimeSpans(orbits, starts):
+
+ # Return the end of the time span of each footprint: the start of the next footprint of its orbit, or the
+ # median step between footprints for the last footprint of an orbit (one second without any step)
+
+  order = np.lexsort((starts, orbits))
+  (o, t) = (orbits[order], starts[order])
+
+  same = o[1:] == o[:-1]
+  step = t[1:][same] - t[:-1][same]
+  step = float(np.median(step[step > 0])) if (step > 0).any() else 1.0
+
+  ends = np.empty(len(t))
+  ends[:-1] = np.where(same, t[1:], t[:-1] + step)
+  ends[-1:] = t[-1:] + step
+
+  spans = np.empty(len(t))
+  spans[order] = ends
+
+  return spans
+
+def BuildIndex(procDir):
+
+ # Build the footprint index of a processing directory and save it next to the rebuild manifest
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   index : out, required, type = dictionary
+ #   footprint index accepted by the query functions
+
+  (paths, stats) = _BufferStats(procDir)
+
+  (boxes, orbits, orbitNums, reqTimes, mdyTimes, edges, counts) = _ReadFootprints(paths)
+
+ # Reorder the footprints and their edge runs into packed order
+  order  = _STROrder(boxes)
+  starts = np.cumsum(counts) - counts
+
+  counts = counts[order]
+  edges  = edges[np.repeat(starts[order] - np.cumsum(counts) + counts, counts) + np.arange(int(counts.sum()))]
+
+  levels = _PackLevels(boxes[order]) if len(order) else [boxes]
+
+ # Time span of each footprint, and the footprints in start order with the running maximum of their ends
+  starts = Datetime64ToEpochSeconds(EphToDatetime64(mdyTimes[order])) if len(order) else np.zeros(0)
+  ends   = _TimeSpans(orbits[order], starts) if len(order) else np.zeros(0)
+  byTime = np.argsort(starts, kind='mergesort')
+
+  index = {'version':    np.int32(INDEX_VERSION),
+           'sources':    np.asarray([s[0] for s in stats], dtype='U'),
+           'sizes':      np.asarray([s[1] for s in stats], dtype=np.int64),
+           'mtimes':     np.asarray([s[2] for s in stats], dtype=np.float64),
+           'orbit':      orbits[order],
+           'orbitNum':   orbitNums[order],
+           'reqTime':    reqTimes[order],
+           'mdyTime':    mdyTimes[order],
+           'edges':      edges,
+           'edgeStart':  np.cumsum(counts) - counts,
+           'edgeCount':  counts,
+           'nodes':      np.concatenate(levels),
+           'levelStart': np.cumsum([0] + [len(level) for level in levels]).astype(np.int64),
+           'start':      starts,
+           'end':        ends,
+           'byTime':     byTime,
+           'timeStart':  starts[byTime],
+           'endMax':     np.maximum.accumulate(ends[byTime]) if len(order) else np.zeros(0)}
+
+ # Write the index, replacing the previous one only once fully written
+  with ReplaceFile(os.path.join(procDir, INDEX_NAME)) as f:
+    np.savez(f, **index)
+
+  return index
+
+def IndexCurrent(procDir):
+
+ # Tell whether the saved footprint index of a processing directory matches the buffer shapefiles. Only the
+ # version and source file arrays of the index are read
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   current : out, required, type = boolean
+
+  path = os.path.join(procDir, INDEX_NAME)
+
+  if not os.path.isfile(path):
+    return False
+
+  with np.load(path, allow_pickle=False) as data:
+    if int(data['version']) != INDEX_VERSION:
+      return False
+
+    saved = [(str(s), int(z), float(t)) for (s, z, t) in zip(data['sources'], data['sizes'], data['mtimes'])]
+
+  return saved == [(str(s), int(z), float(t)) for (s, z, t) in _BufferStats(procDir)[1]]
+
+def LoadIndex(procDir):
+
+ # Load the footprint index of a processing directory, rebuilding it when missing or when the buffers changed
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   index : out, required, type = dictionary
+ #   footprint index accepted by the query functions
+
+  if not IndexCurrent(procDir):
+    return BuildIndex(procDir)
+
+  with np.load(os.path.join(procDir, INDEX_NAME), allow_pickle=False) as data:
+    return dict((key, data[key]) for key in data.files)
+
+def _Descend(index, qbox):
+
+ # Filter (query, node) pairs down the tree, returning the (query, footprint) pairs whose boxes intersect
+
+  nodes      = index['nodes']
+  levelStart = index['levelStart']
+  top        = len(levelStart) - 2
+
+  if len(index['edgeCount']) == 0 or len(qbox) == 0:
+    return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+
+  query = np.arange(len(qbox), dtype=np.int64)
+  node  = np.zeros(len(qbox), dtype=np.int64)
+
+  for level in range(top, -1, -1):
+
+ # Expand each surviving node to its children, except at the root level
+    if level < top:
+      query = np.repeat(query, NODE_SIZE)
+      node  = np.repeat(node * NODE_SIZE, NODE_SIZE) + np.tile(np.arange(NODE_SIZE), len(node))
+
+      keep  = node < levelStart[level + 1] - levelStart[level]
+      query = query[keep]
+      node  = node[keep]
+
+    box = nodes[levelStart[level] + node]
+    q   = qbox[query]
+
+    keep = (box[:, 0] <= q[:, 2]) & (box[:, 2] >= q[:, 0]) & (box[:, 1] <= q[:, 3]) & (box[:, 3] >= q[:, 1])
+    query = query[keep]
+    node  = node[keep]
+
+  return (query, node)
+
+def _Refine(index, qbox, query, feat):
+
+ # Keep the (query, footprint) pairs whose query box touches the footprint: an edge crosses the box, or the
+ # box lies inside the footprint by the nonzero winding rule
+
+  counts = index['edgeCount'][feat]
+  keep   = np.zeros(len(feat), dtype=bool)
+  total  = np.cumsum(counts)
+  first  = 0
+
+  while first < len(feat):
+    last = max(int(np.searchsorted(total, total[first] - counts[first] + _CHUNK_EDGES, side='right')), first + 1)
+    c    = counts[first:last]
+
+    pair = np.repeat(np.arange(first, last), c)
+    edge = (np.repeat(index['edgeStart'][feat[first:last]] - np.cumsum(c) + c, c) + np.arange(int(c.sum())))
+
+    (x0, y0, x1, y1) = index['edges'][edge].T
+    (bx0, by0, bx1, by1) = qbox[query[pair]].T
+
+ # Segment against box by Liang-Barsky clipping
+    dx  = x1 - x0
+    dy  = y1 - y0
+    lo  = np.zeros(len(edge))
+    hi  = np.ones(len(edge))
+    hit = np.ones(len(edge), dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+      for (p, d) in ((-dx, x0 - bx0), (dx, bx1 - x0), (-dy, y0 - by0), (dy, by1 - y0)):
+        hit &= ~((p == 0) & (d < 0))
+        r   = d / p
+        lo  = np.where(p < 0, np.maximum(lo, r), lo)
+        hi  = np.where(p > 0, np.minimum(hi, r), hi)
+
+    hit &= lo <= hi
+
+ # Winding number of the lower left box corner
+    side  = dx * (by0 - y0) - (bx0 - x0) * dy
+    wind  = ((y0 <= by0) & (y1 > by0) & (side > 0)).astype(np.int64)
+    wind -= ((y0 > by0) & (y1 <= by0) & (side < 0))
+
+    keep[first:last] = ((np.bincount(pair - first, weights=hit, minlength=last - first) > 0)
+                        | (np.bincount(pair - first, weights=wind, minlength=last - first) != 0))
+    first = last
+
+  return keep
+
+def QueryBoxes(index, xmin, ymin, xmax, ymax):
+
+ # Find the footprints touching each of a set of query boxes
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   xmin, ymin, xmax, ymax : in, required, type = float arrays
+ #   query box bounds in degrees. Points are boxes with xmin == xmax and ymin == ymax
+ #
+ #   (query, feat) : out, required, type = tuple
+ #   int64 arrays pairing each query with each footprint it touches, sorted on query then ReqTime.
+ #   Footprint attributes are index['orbitNum'][feat], index['reqTime'][feat] and index['mdyTime'][feat]
+
+  qbox = np.column_stack([np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in (xmin, ymin, xmax, ymax)])
+  n    = len(qbox)
+
+ # Swath rings unwrapped across the antimeridian extend past +-180, so queries are repeated shifted by 360
+  nodes  = index['nodes']
+  shifts = [0.0]
+
+  if len(nodes) and nodes[-1, 2] > 180.0:
+    shifts.append(360.0)
+  if len(nodes) and nodes[-1, 0] < -180.0:
+    shifts.append(-360.0)
+
+  shifted = np.concatenate([qbox + [shift, 0.0, shift, 0.0] for shift in shifts])
+
+  (query, feat) = _Descend(index, shifted)
+
+  keep  = _Refine(index, shifted, query, feat)
+  query = query[keep] % n
+  feat  = feat[keep]
+
+ # Drop footprints matched by more than one shifted copy of a query
+  (pairs, unique) = np.unique(query * len(index['edgeCount']) + feat, return_index=True)
+  query = query[unique]
+  feat  = feat[unique]
+
+  order = np.lexsort((index['reqTime'][feat], query))
+
+  return (query[order], feat[order])
+
+def QueryPoints(index, lon, lat):
+
+ # Find the footprints containing each of a set of points
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   lon, lat : in, required, type = float arrays
+ #   point coordinates in degrees
+ #
+ #   (query, feat) : out, required, type = tuple
+ #   int64 arrays pairing each point with each footprint containing it, sorted on point then ReqTime
+
+  return QueryBoxes(index, lon, lat, lon, lat)
+
+def _Matches(index, feat):
+
+ # Return the (OrbitNum, ReqTime, MDYTime) tuples of a list of footprints
+
+  return [(str(index['orbitNum'][i]), str(index['reqTime'][i]), str(index['mdyTime'][i])) for i in feat]
+
+def QueryPoint(index, lon, lat):
+
+ # Find the footprints containing a single point
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   lon, lat : in, required, type = float
+ #   point coordinates in degrees
+ #
+ #   matches : out, required, type = list
+ #   list of (OrbitNum, ReqTime, MDYTime) tuples sorted on ReqTime
+
+  return _Matches(index, QueryPoints(index, [lon], [lat])[1])
+
+def QueryBox(index, xmin, ymin, xmax, ymax):
+
+ # Find the footprints touching a single bounding box
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   xmin, ymin, xmax, ymax : in, required, type = float
+ #   box bounds in degrees
+ #
+ #   matches : out, required, type = list
+ #   list of (OrbitNum, ReqTime, MDYTime) tuples sorted on ReqTime
+
+  return _Matches(index, QueryBoxes(index, [xmin], [ymin], [xmax], [ymax])[1])
+
+def QueryTimes(index, tmin, tmax):
+
+ # Find the footprints whose time span overlaps each of a set of time ranges
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   tmin, tmax : in, required, type = float arrays
+ #   query ranges in seconds since 1970-01-01. Points in time are ranges with tmin == tmax
+ #
+ #   (query, feat) : out, required, type = tuple
+ #   int64 arrays pairing each query with each footprint whose span [start, end) meets [tmin, tmax], sorted on
+ #   query then start time
+
+  tmin = np.atleast_1d(np.asarray(tmin, dtype=np.float64))
+  tmax = np.atleast_1d(np.asarray(tmax, dtype=np.float64))
+
+  byTime = index['byTime']
+
+ # Candidates start no later than tmax, after every footprint ending by tmin
+  first = np.searchsorted(index['endMax'], tmin, side='right')
+  stop  = np.searchsorted(index['timeStart'], tmax, side='right')
+  count = np.maximum(stop - first, 0)
+
+  query = np.repeat(np.arange(len(tmin), dtype=np.int64), count)
+  feat  = byTime[np.repeat(first, count) + np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count)]
+
+  keep = index['end'][feat] > tmin[query]
+
+  return (query[keep], feat[keep].astype(np.int64))
+
+def TimeSeconds(text):
+
+ # Convert a request time (YYYY/DDD/HH:MM:SS) or ephemeris time (MM/DD/YY HH:MM:SS) string to seconds since
+ # 1970-01-01
+ #
+ # Params:
+ #   text : in, required, type = string
+ #
+ #   seconds : out, required, type = float
+
+  text = text.strip()
+  dto  = ParseEphTime(text) if text[2:3] == '/' else ParseReqTime(text)
+
+  return (dto - datetime.datetime(1970, 1, 1)).total_seconds()
+
+def FootprintRings(index, feat):
+
+ # Return the rings of one footprint, rebuilt from its edges
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   feat : in, required, type = integer
+ #   footprint number
+ #
+ #   rings : out, required, type = list
+ #   list of closed rings of (lon, lat) tuples
+
+  start = int(index['edgeStart'][feat])
+  edges = index['edges'][start:start + int(index['edgeCount'][feat])]
+
+ # A ring ends with the edge returning to its first point
+  rings = []
+  ring  = []
+
+  for (x1, y1, x2, y2) in edges.tolist():
+    ring.append((x1, y1))
+
+    if (x2, y2) == ring[0]:
+      rings.append(ring + [ring[0]])
+      ring = []
+
+  return rings
+
+def QueryTime(index, tmin, tmax=None):
+
+ # Find the footprints covering a time or time range
+ #
+ # Params:
+ #   index : in, required, type = dictionary
+ #   footprint index returned by LoadIndex() or BuildIndex()
+ #
+ #   tmin : in, required, type = float or string
+ #   time, or start of the range, in seconds since 1970-01-01 or as a string accepted by TimeSeconds()
+ #
+ #   tmax : in, optional, type = float or string
+ #   end of the range. A single time when omitted
+ #
+ #   matches : out, required, type = list
+ #   list of (OrbitNum, ReqTime, MDYTime, rings) tuples sorted on time, with the rings of FootprintRings()
+
+  (tmin, tmax) = [TimeSeconds(t) if hasattr(t, 'strip') else t for t in (tmin, tmin if tmax is None else tmax)]
+
+  feat = QueryTimes(index, [tmin], [tmax])[1]
+
+  return [match + (FootprintRings(index, i),) for (match, i) in zip(_Matches(index, feat), feat)]
+
+def RingsWKT(rings):
+
+ # Format footprint rings as a WKT MULTIPOLYGON
+
+  return 'MULTIPOLYGON (' + ', '.join('((' + ', '.join('%.6f %.6f' % p for p in ring) + '))'
+                                      for ring in rings) + ')'
+
+def ReadSites(sitesCSV):
+
+ # Read a csv of target sites with name, lat and lon columns
+ #
+ # Params:
+ #   sitesCSV : in, required, type = string
+ #   path to the csv, with a header row naming at least the name, lat and lon columns
+ #
+ #   (rows, lon, lat) : out, required, type = tuple
+ #   list of row dictionaries, and float64 arrays of site longitude and latitude
+
+  with open(sitesCSV, 'r') as f:
+    rows = [dict((key.strip().lower(), value.strip()) for (key, value) in row.items() if key is not None)
+            for row in csv.DictReader(f)]
+
+  lon = np.asarray([float(row['lon']) for row in rows], dtype=np.float64)
+  lat = np.asarray([float(row['lat']) for row in rows], dtype=np.float64)
+
+  return (rows, lon, lat)
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Find the orbits whose FOV footprints cover a site.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('--point', nargs=2, type=float, metavar=('LON', 'LAT'), help='single site to query')
+  parser.add_argument('--box', nargs=4, type=float, metavar=('XMIN', 'YMIN', 'XMAX', 'YMAX'),
+                      help='bounding box to query')
+  parser.add_argument('--sites', help='csv of sites with name, lat and lon columns')
+  parser.add_argument('--out', help='csv written with the matches of --sites, printed when omitted')
+  parser.add_argument('--time', help='request time (YYYY/DDD/HH:MM:SS) or ephemeris time to look up')
+  parser.add_argument('--range', nargs=2, metavar=('START', 'END'), help='time range to look up')
+  parser.add_argument('--geometry', action='store_true', help='print the WKT footprint of each time match')
+  parser.add_argument('--rebuild', action='store_true', help='rebuild the index even if it is current')
+  args = parser.parse_args()
+
+  index = BuildIndex(args.procDir) if args.rebuild else LoadIndex(args.procDir)
+
+  if args.point:
+    for match in QueryPoint(index, args.point[0], args.point[1]):
+      print('%s  %s  %s' % match)
+
+  if args.box:
+    for match in QueryBox(index, *args.box):
+      print('%s  %s  %s' % match)
+
+  for times in ([[args.time]] if args.time else []) + ([args.range] if args.range else []):
+    for match in QueryTime(index, *times):
+      print('%s  %s  %s' % match[:3] + ('  ' + RingsWKT(match[3]) if args.geometry else ''))
+
+  if args.sites:
+    (rows, lon, lat) = ReadSites(args.sites)
+    (query, feat) = QueryPoints(index, lon, lat)
+
+    lines = [[rows[q].get('name', str(q)), match[0], match[1], match[2]]
+             for (q, match) in zip(query, _Matches(index, feat))]
+
+    if args.out:
+      with open(args.out, 'w') as f:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['Name', 'OrbitNum', 'ReqTime', 'MDYTime'])
+        writer.writerows(lines)
+    else:
+      for line in lines:
+        print('%s  %s  %s  %s' % tuple(line))
@@ -9,6 +9,12 @@ import glob
 from arcpy import env
 from arcpy import conversion
 import arcgisscripting
+
+from EK_Autoshape_KMZ import ExportOrbitKMZ, ExportOrbitKMZs, ExportMissionKMZ, ExportRegionatedKMZ
+from EK_Autoshape_Pool import ReportFailures
+from EK_Autoshape_Orbits import FileOrbit
+from EK_Autoshape_Trace import OpenTrace, BeginStage, EndStage, BeginOrbit, EndOrbit, ReportTrace, SaveTrace
+
 arcpy.env.overwriteOutput = True
 
 gp = arcgisscripting.create(9.3)
@@ -35,6 +41,29 @@ arcpy.env.workspace = gp.GetParameterAsText(0)
 # Set mission number as a long integer
 MissionNum = gp.GetParameter(1)
 
+# Set native export as an optional boolean. Streams placemarks straight from the shapefiles instead of
+#  rendering each orbit through an arcpy mapping layer
+Native = gp.GetParameter(2)
+
+# Set single mission export as an optional boolean. Writes one Mission_XX.kmz with a folder per orbit
+#  (native export only)
+SingleKMZ = gp.GetParameter(3)
+
+# Set regionated export as an optional boolean. Writes one Mission_XX_Regions.kmz of level of detail tiles
+#  for viewing the whole mission (native export only)
+Regionated = gp.GetParameter(4)
+
+# Set trace file as an optional .json or .csv path. Records wall time, CPU time, rows, files and peak memory
+#  of the export and of every orbit. The export summary is always reported in the tool messages
+TraceFile = gp.GetParameterAsText(5)
+
+# Set profile orbit as an optional long integer. Runs the export of that orbit under cProfile
+ProfileOrbit = gp.GetParameter(6)
+
+# Set pipelined export as an optional boolean. Reads the next buffer and writes the previous .kmz while the
+#  current orbit is converted (native export only)
+Pipelined = gp.GetParameter(7)
+
 
 # set workspace parameters
 
@@ -43,7 +72,7 @@ MissionNum = gp.GetParameter(1)
 procDir = arcpy.env.workspace + r'\M' + str(MissionNum) + '_Processed_Orbits'
 
 
-def ExportGoogle(procDir):
+def ExportGoogle(procDir, native=False, singleKMZ=False, missionName=None, regionated=False, pipelined=False):
 
 # Exports Google Earth .kmz files of buffered orbit polygons to the
 # MXX_Processed_Orbits\Google" directory
@@ -52,6 +81,25 @@ def ExportGoogle(procDir):
 #   procDir: in, required, type = string
 #   string containing the path to the processing directory
 #
+#   native: in, optional, type = boolean
+#   write the .kmz files with the native streaming writer instead of LayerToKML_conversion
+#
+#   singleKMZ: in, optional, type = boolean
+#   write a single mission .kmz with one folder per orbit instead of one .kmz per orbit (native only)
+#
+#   missionName: in, optional, type = string
+#   name of the single mission .kmz, e.g. "Mission_62"
+#
+#   regionated: in, optional, type = boolean
+#   write a single mission .kmz of Region/Lod tiles, coarse when zoomed out and full resolution when
+#   zoomed in (native only)
+#
+#   pipelined: in, optional, type = boolean
+#   overlap the reads and writes of consecutive orbits (native only)
+#
+#   failures: out, required, type = list
+#   list of (orbNum, error) tuples for each orbit that failed in a pipelined export
+#
 
 # Set polygon buffer input directory within processing directory
   buffDir_in = glob.glob(procDir + r'\Buff\*.shp')
@@ -63,22 +111,47 @@ def ExportGoogle(procDir):
   if not os.path.isdir(googleDir_out):
     os.makedirs(googleDir_out)
 
+# Stream every orbit into a regionated mission .kmz when requested
+  if native and regionated:
+    ExportRegionatedKMZ(buffDir_in, googleDir_out + '\\' + missionName + "_Regions.kmz", missionName)
+    return []
+
+# Stream every orbit into one mission .kmz when requested
+  if native and singleKMZ:
+    ExportMissionKMZ(buffDir_in, googleDir_out + '\\' + missionName + ".kmz", missionName)
+    return []
+
+# Read, convert and write consecutive orbits concurrently when requested
+  if native and pipelined:
+    return ExportOrbitKMZs(buffDir_in, googleDir_out, True)
+
 # Loop for each buffered polygon in input directory
   for buffFC in buffDir_in:
   
 # Strip orbit number from current feature class
-    current = buffFC[-13:-9]
+    current = FileOrbit(buffFC)
 
 # Set output file name
-    outKMZ = googleDir_out + r'\Orbit_' + current.zfill(4) + ".kmz"
+    outKMZ = googleDir_out + r'\Orbit_' + str(current).zfill(4) + ".kmz"
+
+# Measure the orbit when a trace stage is open
+    probe = BeginOrbit(current, [buffFC, outKMZ])
+
+# Stream the polygons and attributes straight into the .kmz with the native writer
+    if native:
+      ExportOrbitKMZ(buffFC, outKMZ)
+      EndOrbit(probe)
+      continue
 
 # Create an arcpy mapping layer from current feature class
     lyr = arcpy.mapping.Layer(buffFC)
     
 # Use arcpy tool to convert layer to .kmz file
     arcpy.LayerToKML_conversion(lyr, outKMZ)
+
+    EndOrbit(probe)
     
-  return
+  return []
 
 # Ensure preprocessing of ephemeris data has occurred before kmz conversion
 if not os.path.isdir(procDir):
@@ -86,4 +159,16 @@ if not os.path.isdir(procDir):
   
 # Export kmz files from buffered polylines in processing directory
 else:
-  ExportGoogle(procDir)
\ No newline at end of file
+  trace = OpenTrace(TraceFile, ProfileOrbit)
+
+  BeginStage(trace, "ExportGoogle")
+  failures = ExportGoogle(procDir, Native, SingleKMZ, 'Mission_' + str(MissionNum), Regionated, Pipelined)
+  EndStage(trace)
+
+# Report the orbits a pipelined export could not convert
+  if Pipelined:
+    ReportFailures(gp, [("ExportGoogle", orbNum, error) for (orbNum, error) in failures])
+
+# Report the time and memory of the export, and write the trace file when one was given
+  ReportTrace(gp, trace)
+  SaveTrace(trace)
\ No newline at end of file
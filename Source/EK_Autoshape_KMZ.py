@@ -0,0 +1,566 @@
+# EarthKAM AutoShape KMZ Writer
+# EK_Autoshape_KMZ.py
+
+import argparse
+import codecs
+import glob
+import io
+import math
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+from xml.sax.saxutils import escape
+
+from EK_Autoshape_Pool import RunOrbits
+from EK_Autoshape_Orbits import OrbitLabel, FileOrbit
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for exporting buffered orbit polygons to Google
+ # Earth .kmz files without arcpy. Polygon rings and the OrbitNum, ReqTime and MDYTime attributes of each buffer
+ # shapefile are streamed feature by feature into KML placemarks, written to a temporary .kml file and deflated
+ # into the .kmz archive in chunks, so memory use does not grow with the size of the mission.
+ #
+ # Either one .kmz per orbit (Orbit_NNNN.kmz, as produced by LayerToKML_conversion) or a single mission .kmz
+ # holding one folder per orbit can be written. Per-orbit exports can be pipelined, reading the next buffer and
+ # writing the previous .kmz while the current orbit is converted. Each pipelined .kmz is then built in memory,
+ # which is bounded by the size of one orbit.
+ #
+ # For viewing a whole mission, a regionated .kmz can also be written. The mission extent is split into a quadtree
+ # of tiles linked by NetworkLinks with <Region>/<Lod> limits. Coarse tiles hold simplified outlines of runs of
+ # consecutive footprint segments and are shown when zoomed out. Leaf tiles hold the full resolution per-segment
+ # polygons and are only loaded once their region fills enough of the view. Placemarks are buffered in memory up
+ # to a fixed size and then appended to their tile files one tile at a time, so only one tile file is open at once.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_KMZ.py <MXX_Processed_Orbits directory> [--mission NAME] [--regions DEPTH] [--pipelined]
+ #
+
+
+ # Attribute fields written to the description of each placemark
+KML_FIELDS = ["OrbitNum", "ReqTime", "MDYTime"]
+
+ # Characters of regionated placemarks buffered in memory before they are appended to their tile files
+KMZ_TILE_BUFFER = 1 << 22
+
+ # Shared polygon style: translucent fill with an outline, colors in KML aabbggrr order
+KML_STYLE = ('<Style id="fov"><LineStyle><color>ff00aaff</color><width>1</width></LineStyle>'
+             '<PolyStyle><color>5000aaff</color></PolyStyle></Style>\n')
+
+
+def _SignedArea(ring):
+
+ # Return twice the signed area of a ring. Negative for clockwise (outer) rings in the shapefile convention
+
+  return sum(x1 * y2 - x2 * y1 for ((x1, y1), (x2, y2)) in zip(ring[:-1], ring[1:]))
+
+def _Coordinates(ring):
+
+ # Format a ring as a KML coordinate string
+
+  return ' '.join('%.6f,%.6f' % (x, y) for (x, y) in ring)
+
+def PolygonKML(shape):
+
+ # Convert a shapefile polygon shape to a KML geometry string
+ #
+ # Params:
+ #   shape : in, required, type = list
+ #   list of rings, each a list of (x, y) tuples. Clockwise rings are outer boundaries and counterclockwise
+ #   rings are holes of the preceding outer boundary
+ #
+ #   kml : out, required, type = string
+ #   KML Polygon, or MultiGeometry of Polygons for multipart shapes
+
+  polygons = []
+
+  for ring in shape:
+    if _SignedArea(ring) <= 0 or not polygons:
+      polygons.append([ring])
+    else:
+      polygons[-1].append(ring)
+
+  parts = []
+
+  for rings in polygons:
+    kml = '<Polygon><outerBoundaryIs><LinearRing><coordinates>' + _Coordinates(rings[0])
+    kml += '</coordinates></LinearRing></outerBoundaryIs>'
+
+    for hole in rings[1:]:
+      kml += '<innerBoundaryIs><LinearRing><coordinates>' + _Coordinates(hole) + '</coordinates></LinearRing></innerBoundaryIs>'
+
+    parts.append(kml + '</Polygon>')
+
+  if len(parts) == 1:
+    return parts[0]
+
+  return '<MultiGeometry>' + ''.join(parts) + '</MultiGeometry>'
+
+def _WriteFolder(out, buffFC, name):
+
+ # Stream the features of one buffer shapefile into an open KML file as a folder of placemarks
+
+  _WriteFeatures(out, [f[0] for f in shp.ReadFields(buffFC)], shp.IterShapefile(buffFC), name)
+
+  return
+
+def _WriteFeatures(out, fields, features, name):
+
+ # Write (record, shape) features with the given field names into an open KML file as a folder of placemarks
+
+  cols = [(field, fields.index(field)) for field in KML_FIELDS if field in fields]
+
+  out.write('<Folder><name>' + escape(name) + '</name>\n')
+
+  for (record, shape) in features:
+    if not shape:
+      continue
+
+    values = dict((field, u'' if record[col] is None else u'%s' % record[col]) for (field, col) in cols)
+
+    out.write('<Placemark><name>' + escape(values.get("ReqTime", "")) + '</name><styleUrl>#fov</styleUrl>')
+    out.write('<ExtendedData>')
+
+    for (field, col) in cols:
+      out.write('<Data name="' + field + '"><value>' + escape(values[field]) + '</value></Data>')
+
+    out.write('</ExtendedData>' + PolygonKML(shape) + '</Placemark>\n')
+
+  out.write('</Folder>\n')
+
+  return
+
+def _WriteDocument(out, name):
+
+ # Open the KML document in an open KML file
+
+  out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+  out.write('<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>' + escape(name) + '</name>\n')
+  out.write(KML_STYLE)
+
+  return
+
+def WriteKMZ(buffFCs, outKMZ, name):
+
+ # Write one or more buffer shapefiles to a .kmz file, one folder per shapefile
+ #
+ # Params:
+ #   buffFCs : in, required, type = list of (path, folder name) tuples
+ #   buffer shapefiles to export, in folder order
+ #
+ #   outKMZ : in, required, type = string
+ #   path to the output .kmz file
+ #
+ #   name : in, required, type = string
+ #   name of the KML document
+
+  (handle, tempKML) = tempfile.mkstemp(suffix='.kml', dir=os.path.dirname(os.path.abspath(outKMZ)))
+  os.close(handle)
+
+  try:
+    with codecs.open(tempKML, 'w', 'utf-8') as out:
+      _WriteDocument(out, name)
+
+      for (buffFC, folder) in buffFCs:
+        _WriteFolder(out, buffFC, folder)
+
+      out.write('</Document></kml>\n')
+
+ # Deflate the finished KML into the archive. zipfile copies the file in chunks
+    with zipfile.ZipFile(outKMZ, 'w', zipfile.ZIP_DEFLATED) as kmz:
+      kmz.write(tempKML, 'doc.kml')
+
+  finally:
+    os.remove(tempKML)
+
+  return
+
+def ExportOrbitKMZ(buffFC, outKMZ):
+
+ # Write the buffer shapefile of a single orbit to its own .kmz file
+ #
+ # Params:
+ #   buffFC : in, required, type = string
+ #   path to the orbit buffer shapefile
+ #
+ #   outKMZ : in, required, type = string
+ #   path to the output .kmz file
+
+  name = 'Orbit_' + str(FileOrbit(buffFC)).zfill(4)
+
+  WriteKMZ([(buffFC, name)], outKMZ, name)
+
+  return
+
+def _ReadOrbitKMZ(buffFC, outKMZ):
+
+ # Read the field names and features of one pipelined ExportOrbitKMZ() orbit
+
+  return ([f[0] for f in shp.ReadFields(buffFC)], list(shp.IterShapefile(buffFC)))
+
+def _BuildOrbitKMZ(buff, buffFC, outKMZ):
+
+ # Build the .kmz archive of one pipelined ExportOrbitKMZ() orbit in memory
+
+  (fields, features) = buff
+
+  name = 'Orbit_' + str(FileOrbit(buffFC)).zfill(4)
+  kml  = io.BytesIO()
+  out  = codecs.getwriter('utf-8')(kml)
+
+  _WriteDocument(out, name)
+  _WriteFeatures(out, fields, features, name)
+  out.write('</Document></kml>\n')
+
+  archive = io.BytesIO()
+
+  with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as kmz:
+    kmz.writestr('doc.kml', kml.getvalue())
+
+  return archive.getvalue()
+
+def _WriteOrbitKMZ(data, buffFC, outKMZ):
+
+ # Write the .kmz archive of one pipelined ExportOrbitKMZ() orbit
+
+  with open(outKMZ, 'wb') as f:
+    f.write(data)
+
+  return
+
+ # Read, compute and write parts of ExportOrbitKMZ() for RunPipeline()
+KMZ_PARTS = (_ReadOrbitKMZ, _BuildOrbitKMZ, _WriteOrbitKMZ)
+
+def ExportOrbitKMZs(buffFCs, googleDir_out, pipelined=False):
+
+ # Write the buffer shapefile of each orbit to its own Orbit_NNNN.kmz file
+ #
+ # Params:
+ #   buffFCs : in, required, type = list of strings
+ #   paths to the orbit buffer shapefiles
+ #
+ #   googleDir_out : in, required, type = string
+ #   path to the output directory
+ #
+ #   pipelined : in, optional, type = boolean
+ #   overlap the reads and writes of consecutive orbits (see RunPipeline())
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each orbit that failed
+
+  jobs = [(FileOrbit(buffFC), (buffFC, os.path.join(googleDir_out,
+                                                            'Orbit_' + str(FileOrbit(buffFC)).zfill(4) + '.kmz')))
+          for buffFC in sorted(buffFCs)]
+
+  return RunOrbits(ExportOrbitKMZ, jobs, pipeline=KMZ_PARTS if pipelined else None)
+
+def ExportMissionKMZ(buffFCs, outKMZ, name):
+
+ # Write the buffer shapefiles of a whole mission to a single .kmz file with one folder per orbit
+ #
+ # Params:
+ #   buffFCs : in, required, type = list of strings
+ #   paths to the orbit buffer shapefiles
+ #
+ #   outKMZ : in, required, type = string
+ #   path to the output .kmz file
+ #
+ #   name : in, required, type = string
+ #   name of the KML document, e.g. the mission name
+
+  WriteKMZ([(buffFC, OrbitLabel(FileOrbit(buffFC))) for buffFC in sorted(buffFCs)], outKMZ, name)
+
+  return
+
+def _ShapefileBounds(buffFC):
+
+ # Read the (xmin, ymin, xmax, ymax) bounding box from a shapefile header
+
+  with open(os.path.splitext(buffFC)[0] + '.shp', 'rb') as f:
+    f.seek(36)
+    return struct.unpack('<4d', f.read(32))
+
+def _RunOutline(footprints):
+
+ # Return the closed, clockwise outline ring of a run of consecutive footprints of one orbit
+ #
+ # Each footprint is reduced to the box of its vertices in the frame of the local track direction, taken between
+ # the centroids of its neighbours. The outline runs along the left edges of the boxes and back along their right
+ # edges, so it follows the swath around curves instead of filling the inside of the curve like a hull would. For
+ # the quadrilateral rings of the native swath engine the boxes stay close to the rings themselves
+ #
+ # Params:
+ #   footprints : in, required, type = list of lists
+ #   list of the (x, y) vertices of each footprint, in track order
+ #
+ #   ring : out, required, type = list of (x, y) tuples
+
+  centroids = [(sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+               for points in footprints]
+
+  left  = []
+  right = []
+
+ # Start from the direction of the first edge, the track direction of a native ring, for a run of one footprint
+  ((x0, y0), (x1, y1)) = footprints[0][:2]
+  norm = math.hypot(x1 - x0, y1 - y0)
+  (dx, dy) = ((x1 - x0) / norm, (y1 - y0) / norm) if norm > 0.0 else (1.0, 0.0)
+
+  for (i, (points, (cx, cy))) in enumerate(zip(footprints, centroids)):
+    (ax, ay) = centroids[max(i - 1, 0)]
+    (bx, by) = centroids[min(i + 1, len(centroids) - 1)]
+    norm = math.hypot(bx - ax, by - ay)
+
+ # Keep the previous direction where neighbouring centroids coincide
+    if norm > 0.0:
+      (dx, dy) = ((bx - ax) / norm, (by - ay) / norm)
+
+    along = [(x - cx) * dx + (y - cy) * dy for (x, y) in points]
+    cross = [(y - cy) * dx - (x - cx) * dy for (x, y) in points]
+
+    (a0, a1) = (min(along), max(along))
+    (c0, c1) = (min(cross), max(cross))
+
+    left.append((cx + a0 * dx - c1 * dy, cy + a0 * dy + c1 * dx))
+    left.append((cx + a1 * dx - c1 * dy, cy + a1 * dy + c1 * dx))
+    right.append((cx + a0 * dx - c0 * dy, cy + a0 * dy + c0 * dx))
+    right.append((cx + a1 * dx - c0 * dy, cy + a1 * dy + c0 * dx))
+
+  right.reverse()
+
+  return left + right + left[:1]
+
+def _RegionKML(box, minLod, maxLod):
+
+ # Format a KML Region for a (west, south, east, north) box and level of detail range in pixels
+
+  return ('<Region><LatLonAltBox><north>%.6f</north><south>%.6f</south><east>%.6f</east><west>%.6f</west>'
+          '</LatLonAltBox><Lod><minLodPixels>%d</minLodPixels><maxLodPixels>%d</maxLodPixels></Lod></Region>'
+          % (box[3], box[1], box[2], box[0], minLod, maxLod))
+
+def _TileName(tile):
+
+ # Archive path of a (level, x, y) tile
+
+  return 'tiles/%d_%d_%d.kml' % tile
+
+def ExportRegionatedKMZ(buffFCs, outKMZ, name, depth=3, segmentsPerOutline=4, minLodPixels=128, maxLodPixels=512):
+
+ # Write the buffer shapefiles of a whole mission to a regionated .kmz with level of detail tiles
+ #
+ # Params:
+ #   buffFCs : in, required, type = list of strings
+ #   paths to the orbit buffer shapefiles
+ #
+ #   outKMZ : in, required, type = string
+ #   path to the output .kmz file
+ #
+ #   name : in, required, type = string
+ #   name of the KML document, e.g. the mission name
+ #
+ #   depth : in, optional, type = integer
+ #   level of the full resolution leaf tiles. The mission extent is split into 4^depth leaf tiles
+ #
+ #   segmentsPerOutline : in, optional, type = integer
+ #   consecutive segments of an orbit merged into one coarse outline on the level above the leaves. The run length
+ #   doubles on each coarser level
+ #
+ #   minLodPixels : in, optional, type = integer
+ #   size in pixels a tile region must reach on screen before the tile is loaded
+ #
+ #   maxLodPixels : in, optional, type = integer
+ #   size in pixels above which the coarse outlines of a tile are hidden in favour of its child tiles
+
+  buffFCs = sorted(buffFCs)
+
+  if not buffFCs:
+    return
+
+ # Mission extent from the shapefile headers, without reading any features
+  bounds = [_ShapefileBounds(buffFC) for buffFC in buffFCs]
+  extent = (min(b[0] for b in bounds), min(b[1] for b in bounds), max(b[2] for b in bounds), max(b[3] for b in bounds))
+  width  = max(extent[2] - extent[0], 1e-9)
+  height = max(extent[3] - extent[1], 1e-9)
+
+  def TileOf(level, x, y):
+    n = 1 << level
+    return (level, min(max(int((x - extent[0]) / width * n), 0), n - 1),
+            min(max(int((y - extent[1]) / height * n), 0), n - 1))
+
+  def TileBox(tile):
+    (level, tx, ty) = tile
+    n = float(1 << level)
+    return (extent[0] + width * tx / n, extent[1] + height * ty / n,
+            extent[0] + width * (tx + 1) / n, extent[1] + height * (ty + 1) / n)
+
+  tempDir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(outKMZ)))
+  parts   = set()
+  pending = {}
+  size    = [0]
+
+  def PartPath(tile):
+    return os.path.join(tempDir, '%d_%d_%d.part' % tile)
+
+  def Append():
+    for (tile, texts) in pending.items():
+      with codecs.open(PartPath(tile), 'a', 'utf-8') as part:
+        part.write(u''.join(texts))
+    pending.clear()
+    size[0] = 0
+
+  def Write(tile, text):
+    parts.add(tile)
+    pending.setdefault(tile, []).append(text)
+    size[0] += len(text)
+    if size[0] >= KMZ_TILE_BUFFER:
+      Append()
+
+  def Flush(level, chunk, orbit):
+    (footprints, first, last) = chunk
+
+ # Unwrap the run across the antimeridian relative to its first point, so a pass crossing +-180 gives a narrow
+ # outline instead of a band around the globe, then shift the outline back to the side of +-180 holding its centroid
+    x0 = footprints[0][0][0]
+    footprints = [[(x0 + (x - x0 + 180.0) % 360.0 - 180.0, y) for (x, y) in points] for points in footprints]
+    ring = _RunOutline(footprints)
+    cx = sum(p[0] for p in ring[:-1]) / (len(ring) - 1)
+    cy = sum(p[1] for p in ring[:-1]) / (len(ring) - 1)
+
+    shift = -360.0 if cx > 180.0 else 360.0 if cx < -180.0 else 0.0
+    if shift:
+      ring = [(x + shift, y) for (x, y) in ring]
+      cx += shift
+
+    label = OrbitLabel(orbit) + u' ' + first + (u' - ' + last if last != first else u'')
+    Write(TileOf(level, cx, cy), u'<Placemark><name>' + escape(label) + u'</name><styleUrl>#fov</styleUrl>'
+          + PolygonKML([ring]) + u'</Placemark>\n')
+
+  try:
+
+ # Stream every footprint once: full resolution placemarks go to the leaf tile of their centroid, and their
+ # vertices accumulate into the coarse outline of each level until the run of segments for that level ends
+    for buffFC in buffFCs:
+      orbit  = FileOrbit(buffFC)
+      fields = [f[0] for f in shp.ReadFields(buffFC)]
+      cols   = [(field, fields.index(field)) for field in KML_FIELDS if field in fields]
+      chunks = [None] * depth
+      index  = 0
+
+      for (record, shape) in shp.IterShapefile(buffFC):
+        if not shape:
+          continue
+
+        values = dict((field, u'' if record[col] is None else u'%s' % record[col]) for (field, col) in cols)
+        stamp  = values.get("ReqTime", u'')
+        points = [p for ring in shape for p in ring]
+
+        placemark = u'<Placemark><name>' + escape(stamp) + u'</name><styleUrl>#fov</styleUrl><ExtendedData>'
+        placemark += u''.join(u'<Data name="' + field + u'"><value>' + escape(values[field]) + u'</value></Data>'
+                              for (field, col) in cols)
+        placemark += u'</ExtendedData>' + PolygonKML(shape) + u'</Placemark>\n'
+
+        Write(TileOf(depth, sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points)),
+              placemark)
+
+        for level in range(depth):
+          if chunks[level] is not None and index % (segmentsPerOutline << (depth - 1 - level)) == 0:
+            Flush(level, chunks[level], orbit)
+            chunks[level] = None
+
+          if chunks[level] is None:
+            chunks[level] = ([points], stamp, stamp)
+          else:
+            chunks[level] = (chunks[level][0] + [points], chunks[level][1], stamp)
+
+        index += 1
+
+      for level in range(depth):
+        if chunks[level] is not None:
+          Flush(level, chunks[level], orbit)
+
+    Append()
+
+ # Every ancestor of a tile with content must exist so the tile can be reached from the root
+    tiles = set(parts)
+
+    for tile in list(tiles):
+      (level, tx, ty) = tile
+      while level > 0:
+        (level, tx, ty) = (level - 1, tx >> 1, ty >> 1)
+        tiles.add((level, tx, ty))
+
+    with zipfile.ZipFile(outKMZ, 'w', zipfile.ZIP_DEFLATED) as kmz:
+
+ # Root document linking the whole mission tile, active at every zoom level
+      root = (u'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document><name>'
+              + escape(name) + u'</name>\n<NetworkLink><name>' + escape(name) + u'</name>'
+              + _RegionKML(TileBox((0, 0, 0)), 0, -1) + u'<Link><href>' + _TileName((0, 0, 0))
+              + u'</href><viewRefreshMode>onRegion</viewRefreshMode></Link></NetworkLink>\n</Document></kml>\n')
+      kmz.writestr('doc.kml', root.encode('utf-8'))
+
+      for tile in sorted(tiles):
+        (level, tx, ty) = tile
+        tileKML = os.path.join(tempDir, '%d_%d_%d.kml' % tile)
+
+        with codecs.open(tileKML, 'w', 'utf-8') as out:
+          out.write(u'<?xml version="1.0" encoding="UTF-8"?>\n<kml xmlns="http://www.opengis.net/kml/2.2"><Document>')
+          out.write(u'<name>%d_%d_%d</name>\n' % tile + KML_STYLE)
+
+ # Links to the child tiles, each loaded once its own region is large enough on screen. Links are relative
+ # to this tile, which sits in the same tiles/ folder
+          for child in [(level + 1, 2 * tx + dx, 2 * ty + dy) for dx in (0, 1) for dy in (0, 1)]:
+            if child in tiles:
+              out.write(u'<NetworkLink><name>%d_%d_%d</name>' % child + _RegionKML(TileBox(child), minLodPixels, -1))
+              out.write(u'<Link><href>' + _TileName(child)[len('tiles/'):] + u'</href>')
+              out.write(u'<viewRefreshMode>onRegion</viewRefreshMode></Link></NetworkLink>\n')
+
+ # Tile content: coarse outlines hide once the children take over, leaf polygons stay visible
+          if tile in parts:
+            out.write(u'<Folder><name>Footprints</name>')
+            out.write(_RegionKML(TileBox(tile), 0 if level == 0 else minLodPixels,
+                                 -1 if level == depth else maxLodPixels) + u'\n')
+
+            with codecs.open(PartPath(tile), 'r', 'utf-8') as part:
+              for line in part:
+                out.write(line)
+
+            out.write(u'</Folder>\n')
+
+          out.write(u'</Document></kml>\n')
+
+        kmz.write(tileKML, _TileName(tile))
+        os.remove(tileKML)
+
+  finally:
+    shutil.rmtree(tempDir, ignore_errors=True)
+
+  return
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Export orbit buffer shapefiles to .kmz files without arcpy.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('--mission', help='write a single mission .kmz with this name instead of one per orbit')
+  parser.add_argument('--regions', type=int, metavar='DEPTH',
+                      help='with --mission, write a regionated .kmz with this many levels of detail tiles')
+  parser.add_argument('--pipelined', action='store_true',
+                      help='read the next buffer and write the previous .kmz while the current orbit is converted')
+  args = parser.parse_args()
+
+  buffFCs = sorted(glob.glob(os.path.join(args.procDir, 'Buff', '*.shp')))
+  googleDir_out = os.path.join(args.procDir, 'Google')
+
+  if not os.path.isdir(googleDir_out):
+    os.makedirs(googleDir_out)
+
+  if args.mission and args.regions:
+    ExportRegionatedKMZ(buffFCs, os.path.join(googleDir_out, args.mission + '_Regions.kmz'), args.mission, args.regions)
+  elif args.mission:
+    ExportMissionKMZ(buffFCs, os.path.join(googleDir_out, args.mission + '.kmz'), args.mission)
+  else:
+    for (orbNum, error) in ExportOrbitKMZs(buffFCs, googleDir_out, args.pipelined):
+      print('ExportGoogle: orbit ' + str(orbNum).zfill(4) + ' failed. ' + error)
@@ -0,0 +1,267 @@
+# EarthKAM AutoShape Lens Schedule
+# EK_Autoshape_Lenses.py
+
+import argparse
+import csv
+import glob
+import os
+
+from EK_Autoshape_Time import EphToReqTimes
+from EK_Autoshape_Manifest import HashShapefile, RunStale
+from EK_Autoshape_Orbits import OrbitLabel, FileOrbit
+from EK_Autoshape_Tracks import OFFSETS_FIELD
+from EK_Autoshape_Swath import (BufferDistanceKm, FORMATTED_FIELDS, ReadSegments, SwathFrame, SwathRings,
+                                DissolveGroups, GroupRings)
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for building the FOV footprints of several
+ # candidate lenses from one pass over each orbit's ground track. A lens schedule lists, for each lens, the
+ # range of orbits it may be used on and its buffer distance. Every orbit line is read once, the heading of each
+ # segment and its Start_Time grouping are computed once, and only the corner offsets are repeated for each lens
+ # scheduled on the orbit. The footprints of all lenses land in one \Lens\orbXXXX_lens.shp per orbit, with the
+ # fields of a formatted buffer plus the Lens name and its BuffKm, so planners can compare coverage options by
+ # filtering on Lens instead of rerunning the buffer stage for each lens plan. The footprints of a simplified
+ # track also carry the OFFSETS of their spans.
+ #
+ # The schedule csv needs a header row with Lens, FirstOrbit, LastOrbit and BuffKm columns. Lens names are at
+ # most 24 characters. An empty FirstOrbit or LastOrbit leaves that end of the range open, and lens ranges may
+ # overlap. The single lens swap of the AutoShape tool is the schedule returned by SwapSchedule().
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Lenses.py <MXX_Processed_Orbits directory> <schedule.csv> [--geodesic] [--workers N]
+ #                                                                                   [--pipelined]
+ #
+
+
+ # Longest lens name, the width of the Lens field. Longer names would be truncated by the dbf and could no longer
+ # be told apart, so ReadLensSchedule() rejects them
+LENS_WIDTH = 24
+
+ # Fields written to each lens footprint shapefile: the formatted buffer fields, tagged with the lens
+LENS_FIELDS = FORMATTED_FIELDS + [("Lens",   'C', LENS_WIDTH, 0),
+                                  ("BuffKm", 'N', 12, 3)]
+
+
+def SwapSchedule(SwapLens):
+
+ # Return the lens schedule of a single lens swap, as buffered by BufferFOV
+ #
+ # Params:
+ #   SwapLens : in, required, type = integer
+ #   index of the lens swap orbit
+ #
+ #   schedule : out, required, type = list
+ #   list of (lens, firstOrbit, lastOrbit, buffKm) tuples, see ReadLensSchedule()
+
+  return [("Wide",   None,         SwapLens, float(BufferDistanceKm(SwapLens, SwapLens))),
+          ("Narrow", SwapLens + 1, None,     float(BufferDistanceKm(SwapLens + 1, SwapLens)))]
+
+def ReadLensSchedule(scheduleCSV):
+
+ # Read a lens schedule csv
+ #
+ # Params:
+ #   scheduleCSV : in, required, type = string
+ #   path to the csv, with a header row naming the Lens, FirstOrbit, LastOrbit and BuffKm columns
+ #
+ #   schedule : out, required, type = list
+ #   list of (lens, firstOrbit, lastOrbit, buffKm) tuples in file order. firstOrbit and lastOrbit are None
+ #   for an open end
+
+  with open(scheduleCSV, 'r') as f:
+    rows = [dict((key.strip().lower(), (value or '').strip()) for (key, value) in row.items() if key is not None)
+            for row in csv.DictReader(f)]
+
+  schedule = []
+
+  for row in rows:
+    if not row.get('lens'):
+      continue
+
+    lens   = row['lens']
+    first  = int(row['firstorbit']) if row.get('firstorbit') else None
+    last   = int(row['lastorbit']) if row.get('lastorbit') else None
+    buffKm = float(row['buffkm'])
+
+    if len(lens) > LENS_WIDTH:
+      raise ValueError('lens ' + lens + ' has a name longer than ' + str(LENS_WIDTH) + ' characters')
+
+    if buffKm <= 0:
+      raise ValueError('lens ' + lens + ' has a BuffKm of ' + row['buffkm'] + ', expected a positive distance')
+
+    if first is not None and last is not None and last < first:
+      raise ValueError('lens ' + lens + ' ends at orbit ' + str(last) + ' before it starts at ' + str(first))
+
+    schedule.append((lens, first, last, buffKm))
+
+  if not schedule:
+    raise ValueError(os.path.basename(scheduleCSV) + ' lists no lenses')
+
+  return schedule
+
+def OrbitLenses(schedule, orbNum):
+
+ # Return the lenses scheduled on one orbit
+ #
+ # Params:
+ #   schedule : in, required, type = list
+ #   lens schedule returned by ReadLensSchedule() or SwapSchedule()
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number
+ #
+ #   lenses : out, required, type = list
+ #   list of [lens, buffKm] pairs in schedule order, without repeats
+
+  lenses = []
+
+  for (lens, first, last, buffKm) in schedule:
+    if (first is None or orbNum >= first) and (last is None or orbNum <= last) and [lens, buffKm] not in lenses:
+      lenses.append([lens, buffKm])
+
+  return lenses
+
+def LensOrbitNative(lineFC, outLensFC, lenses, geodesic=False, orbNum=None):
+
+ # Write the footprints of every scheduled lens of one orbit line shapefile
+ #
+ # Params:
+ #   lineFC : in, required, type = string
+ #   path to the line shapefile being processed
+ #
+ #   outLensFC : in, required, type = string
+ #   path to the output polygon shapefile
+ #
+ #   lenses : in, required, type = list
+ #   list of [lens, buffKm] pairs returned by OrbitLenses()
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the swath corners geodesically
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number
+
+  args = (lineFC, outLensFC, lenses, geodesic, orbNum)
+
+  return _WriteLens(_BuildLens(_ReadLens(*args), *args), *args)
+
+def _ReadLens(lineFC, outLensFC, lenses, geodesic=False, orbNum=None):
+
+ # Read the segments of one LensOrbitNative() orbit
+
+  return ReadSegments(lineFC)
+
+def _BuildLens(segments, lineFC, outLensFC, lenses, geodesic=False, orbNum=None):
+
+ # Build the records and polygons of every lens of one LensOrbitNative() orbit from its segments
+
+  (lon1, lat1, lon2, lat2, startTimes, offsets) = segments
+
+ # Headings, the Start_Time grouping and the request times are shared by every lens
+  frame = SwathFrame(lon1, lat1, lon2, lat2, geodesic)
+
+  (stamps, groups) = DissolveGroups(~frame['degenerate'], startTimes)
+
+  formatted = [[OrbitLabel(orbNum), reqTime, stamp] for (reqTime, stamp) in zip(EphToReqTimes(stamps), stamps)]
+
+  if offsets is None:
+    (fields, spans) = (LENS_FIELDS, [[]] * len(groups))
+  else:
+    (fields, spans) = (LENS_FIELDS + [OFFSETS_FIELD], [[offsets[group[0]]] for group in groups])
+
+  records = []
+  shapes  = []
+
+  for (lens, buffKm) in lenses:
+    records.extend(record + [lens, buffKm] + span for (record, span) in zip(formatted, spans))
+    shapes.extend(GroupRings(SwathRings(frame, buffKm), groups))
+
+  return (fields, records, shapes)
+
+def _WriteLens(footprints, lineFC, outLensFC, lenses, geodesic=False, orbNum=None):
+
+ # Write the footprints of one LensOrbitNative() orbit, returning the number written
+
+  (fields, records, shapes) = footprints
+
+  shp.WriteShapefile(outLensFC, shp.POLYGON, fields, records, shapes, prj=lineFC)
+
+  return len(records)
+
+ # Read, compute and write parts of LensOrbitNative() for RunPipeline()
+LENS_PARTS = (_ReadLens, _BuildLens, _WriteLens)
+
+def LensSwathsNative(procDir, schedule, geodesic=False, workers=1, manifest=None, pipelined=False, counts=None):
+
+ # Build the lens footprints of every line shapefile in the processing directory
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   schedule : in, required, type = list
+ #   lens schedule returned by ReadLensSchedule() or SwapSchedule(). Orbits without a scheduled lens are
+ #   skipped
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the swath corners geodesically
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes
+ #
+ #   manifest : in, optional, type = dictionary
+ #   rebuild manifest. Only orbits whose polyline or scheduled lenses changed are rebuilt. None rebuilds every
+ #   orbit
+ #
+ #   pipelined : in, optional, type = boolean
+ #   overlap the reads and writes of consecutive orbits when running serially (see RunPipeline())
+ #
+ #   counts : in, optional, type = dictionary
+ #   filled with the number of footprints written for each orbit rebuilt
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each orbit that failed
+
+  lensDir_out = os.path.join(procDir, 'Lens')
+
+  if not os.path.isdir(lensDir_out):
+    os.makedirs(lensDir_out)
+
+  jobs = []
+
+  for lineFC in sorted(glob.glob(os.path.join(procDir, 'Line', '*.shp'))):
+    current = FileOrbit(lineFC)
+    lenses  = OrbitLenses(schedule, current)
+
+    if not lenses:
+      continue
+
+    outLensFC = os.path.join(lensDir_out, 'orb' + str(current).zfill(4) + '_lens.shp')
+    inputs = {"Line": HashShapefile(manifest, lineFC)} if manifest is not None else None
+    params = {"lenses": lenses, "geodesic": bool(geodesic)}
+    jobs.append((current, (lineFC, outLensFC, lenses, geodesic, current), inputs, params, outLensFC))
+
+  return RunStale(LensOrbitNative, jobs, workers, manifest, procDir, "Lens", values=counts,
+                  pipeline=LENS_PARTS if pipelined else None)
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Buffer orbit line shapefiles for every lens of a lens schedule.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('schedule', help='lens schedule csv with Lens, FirstOrbit, LastOrbit and BuffKm columns')
+  parser.add_argument('--geodesic', action='store_true', help='offset swath corners geodesically')
+  parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+  parser.add_argument('--pipelined', action='store_true',
+                      help='read the next orbit and write the previous one while the current one is buffered')
+  args = parser.parse_args()
+
+  counts = {}
+
+  for (orbNum, error) in LensSwathsNative(args.procDir, ReadLensSchedule(args.schedule), args.geodesic,
+                                          args.workers, None, args.pipelined, counts):
+    print('LensSwaths: orbit ' + str(orbNum).zfill(4) + ' failed. ' + error)
+
+  print('LensSwaths: ' + str(sum(counts.values())) + ' footprints written for ' + str(len(counts)) + ' orbits')
@@ -0,0 +1,135 @@
+# EarthKAM AutoShape Lighting Engine
+# EK_Autoshape_Lighting.py
+
+import datetime
+import sys
+
+import numpy as np
+
+ #
+ # This file consists of functions shared by the AutoShape tools for matching ephemeris points to the subpoint
+ # lighting intervals of the ISS. The intervals are sorted once into epoch second arrays, and whole columns of
+ # point timestamps are mapped to orbit numbers with a binary search. No state is kept between calls, so each
+ # coasting arc can be labeled on its own, in any order and in parallel with the others.
+ #
+
+
+ # Orbit number given to points that fall outside every lighting interval (night orbits)
+NO_ORBIT = -1
+
+ # Reference time for the epoch second arrays used throughout the lighting engine
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def EpochSeconds(dto):
+
+ # Convert a datetime object to seconds since EPOCH
+ #
+ # Params:
+ #   dto : in, required, type = datetime object
+ #   date and time to be converted
+ #
+ #   seconds : out, required, type = float
+ #   seconds elapsed between EPOCH and dto
+
+  delta = dto - EPOCH
+
+  return delta.days * 86400.0 + delta.seconds + delta.microseconds / 1e6
+
+def SortIntervals(startTimes, endTimes):
+
+ # Sort subpoint lighting intervals chronologically into epoch second arrays
+ #
+ # Params:
+ #   startTimes : in, required, type = datetime array
+ #   array of subpoint lighting start times retrieved from input csv
+ #
+ #   endTimes : in, required, type = datetime array
+ #   array of subpoint lighting end times retrieved from input csv
+ #
+ #   (starts, ends), out, required, type = tuple
+ #   tuple of two float64 arrays of interval start and end times in epoch seconds, sorted on start time
+
+  starts = np.array([EpochSeconds(dto) for dto in startTimes], dtype=np.float64)
+  ends   = np.array([EpochSeconds(dto) for dto in endTimes],   dtype=np.float64)
+
+ # Stable sort keeps csv order for intervals sharing a start time
+  order = np.argsort(starts, kind='mergesort')
+
+  return (starts[order], ends[order])
+
+def AssignOrbits(times, starts, ends, baseOrbit, numbers=None):
+
+ # Map a column of point timestamps to the orbit numbers of the lighting intervals containing them
+ #
+ # Params:
+ #   times : in, required, type = float array
+ #   point timestamps in epoch seconds, in any order
+ #
+ #   starts : in, required, type = float64 array
+ #   sorted interval start times returned by SortIntervals()
+ #
+ #   ends : in, required, type = float64 array
+ #   interval end times returned by SortIntervals()
+ #
+ #   baseOrbit : in, required, type = integer
+ #   orbit number of the first (earliest) lighting interval
+ #
+ #   numbers : in, optional, type = int array
+ #   orbit number of each interval, in the order of starts. Intervals are numbered consecutively from
+ #   baseOrbit when omitted
+ #
+ #   orbits : out, required, type = int64 array
+ #   orbit number of each point, or NO_ORBIT for points outside every interval
+
+  times = np.asarray(times, dtype=np.float64)
+
+ # Index of the last interval starting at or before each point
+  idx = np.searchsorted(starts, times, side='right') - 1
+
+ # Points are sunlit when such an interval exists and has not yet ended
+  inside = idx >= 0
+  inside[inside] = times[inside] <= ends[idx[inside]]
+
+  orbits = np.full(times.shape, NO_ORBIT, dtype=np.int64)
+  orbits[inside] = idx[inside] + baseOrbit if numbers is None else np.asarray(numbers)[idx[inside]]
+
+  return orbits
+
+def _OpenCSV(path):
+
+ # Open a csv for writing without newline translation, so rows end in \n on every platform as with the 'wb' mode
+ # of the original export_gCal (binary on Python 2, newline='' text on Python 3)
+
+  if sys.version_info[0] < 3:
+    return open(path, 'wb')
+
+  return open(path, 'w', newline='')
+
+def WriteCalendarCSV(calCSV, startTimes, endTimes, current):
+
+ # Write subpoint lighting intervals as a Google Calendar import csv, one event per orbit
+ #
+ # Params:
+ #   calCSV : in, required, type = string
+ #   path to the output csv
+ #
+ #   startTimes, endTimes : in, required, type = datetime arrays
+ #   subpoint lighting start and end times, in orbit order
+ #
+ #   current : in, required, type = integer
+ #   orbit number of the first interval. Later intervals are numbered consecutively
+
+  date_fmt = '%m/%d/%Y'
+  time_fmt = '%H:%M:%S'
+
+  lines = ["Subject,Start Date,Start Time,End Date,End Time\n"]
+
+  for (i, (start, end)) in enumerate(zip(startTimes, endTimes)):
+    lines.append('Orbit ' + str(current + i) + ',' + start.strftime(date_fmt) + ',' + start.strftime(time_fmt) + ','
+                 + end.strftime(date_fmt) + ',' + end.strftime(time_fmt) + '\n')
+
+  with _OpenCSV(calCSV) as f:
+    f.writelines(lines)
+
+  return
@@ -0,0 +1,272 @@
+# EarthKAM AutoShape Rebuild Manifest
+# EK_Autoshape_Manifest.py
+
+import hashlib
+import json
+import os
+
+from EK_Autoshape_Pool import RunOrbits
+from EK_Autoshape_Files import FileStats, ReplaceFile
+
+ #
+ # This file consists of functions for keeping a rebuild manifest in the MXX_Processed_Orbits directory. For each
+ # stage output (Arc, Line, Buff) the manifest records the content hashes of the inputs it was built from and the
+ # parameters it was built with, such as SwapLens buffer distances. A rerun compares them against the current
+ # inputs and parameters and rebuilds only the orbits that changed.
+ #
+ # Content hashes are cached against the size and modification time of each file, so unchanged inputs are not
+ # reread on every run.
+ #
+
+
+ # Name of the manifest file within the processing directory
+MANIFEST_NAME = 'AutoShape_Manifest.json'
+
+ # Manifest layout version. Manifests of other versions are discarded
+MANIFEST_VERSION = 1
+
+ # Shapefile component extensions covered by a shapefile content hash
+_SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf', '.prj')
+
+
+def LoadManifest(procDir):
+
+ # Load the manifest of a processing directory
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the processing directory
+ #
+ #   manifest : out, required, type = dictionary
+ #   manifest with "files" (hash cache) and "stages" (output records) entries. Empty if none exists yet
+
+  path = os.path.join(procDir, MANIFEST_NAME)
+
+  if os.path.isfile(path):
+    with open(path, 'r') as f:
+      manifest = json.load(f)
+
+    if manifest.get('version') == MANIFEST_VERSION:
+      return manifest
+
+  return {'version': MANIFEST_VERSION, 'files': {}, 'stages': {}}
+
+def SaveManifest(procDir, manifest):
+
+ # Write the manifest of a processing directory, replacing the previous one only once fully written
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the processing directory
+ #
+ #   manifest : in, required, type = dictionary
+ #   manifest returned by LoadManifest()
+
+  with ReplaceFile(os.path.join(procDir, MANIFEST_NAME), 'w') as f:
+    json.dump(manifest, f, indent=1, sort_keys=True)
+
+  return
+
+def _HashParts(manifest, key, paths):
+
+ # Hash the contents of a group of files, reusing the cached hash while their sizes and times are unchanged
+
+  stats  = FileStats(paths)
+  cached = manifest['files'].get(key)
+
+  if cached is not None and cached['stats'] == stats:
+    return cached['hash']
+
+  digest = hashlib.sha1()
+
+  for path in paths:
+    if os.path.isfile(path):
+      digest.update(os.path.basename(path).encode('utf-8'))
+
+      with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+          digest.update(block)
+
+  manifest['files'][key] = {'stats': stats, 'hash': digest.hexdigest()}
+
+  return digest.hexdigest()
+
+def HashFile(manifest, path):
+
+ # Return the content hash of a single file, such as the subpoint lighting csv
+ #
+ # Params:
+ #   manifest : in, required, type = dictionary
+ #   manifest holding the hash cache
+ #
+ #   path : in, required, type = string
+ #   path to the file
+ #
+ #   hash : out, required, type = string
+
+  return _HashParts(manifest, os.path.abspath(path), [path])
+
+def HashShapefile(manifest, path):
+
+ # Return the content hash of a shapefile, covering its .shp, .shx, .dbf and .prj files
+ #
+ # Params:
+ #   manifest : in, required, type = dictionary
+ #   manifest holding the hash cache
+ #
+ #   path : in, required, type = string
+ #   path to the .shp file
+ #
+ #   hash : out, required, type = string
+
+  base = os.path.splitext(path)[0]
+
+  return _HashParts(manifest, os.path.abspath(path), [base + ext for ext in _SHAPEFILE_PARTS])
+
+def IsCurrent(manifest, stage, orbNum, inputs, params, output):
+
+ # Check whether a stage output was built from the given inputs and parameters and still exists
+ #
+ # Params:
+ #   manifest : in, required, type = dictionary
+ #   manifest returned by LoadManifest()
+ #
+ #   stage : in, required, type = string
+ #   stage name, e.g. "Arc", "Line" or "Buff"
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number of the output
+ #
+ #   inputs : in, required, type = dictionary
+ #   content hash of each input, keyed on input name
+ #
+ #   params : in, required, type = dictionary
+ #   parameters the output depends on
+ #
+ #   output : in, required, type = string
+ #   path to the output file
+ #
+ #   current : out, required, type = boolean
+ #   True when the output can be reused without rebuilding
+
+  entry = manifest['stages'].get(stage, {}).get(str(orbNum).zfill(4))
+
+  return (entry is not None and entry.get('complete', True) and os.path.isfile(output)
+          and entry['inputs'] == inputs and entry['params'] == params)
+
+def Record(manifest, stage, orbNum, inputs, params, complete=True):
+
+ # Record the inputs and parameters a stage output was built from
+ #
+ # Params:
+ #   manifest : in, required, type = dictionary
+ #   manifest returned by LoadManifest()
+ #
+ #   stage : in, required, type = string
+ #   stage name
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number of the output
+ #
+ #   inputs : in, required, type = dictionary
+ #   content hash of each input, keyed on input name
+ #
+ #   params : in, required, type = dictionary
+ #   parameters the output depends on
+ #
+ #   complete : in, optional, type = boolean
+ #   False while the output still awaits a later step of the same stage, e.g. formatting of a new buffer
+
+  manifest['stages'].setdefault(stage, {})[str(orbNum).zfill(4)] = {'inputs': inputs, 'params': params,
+                                                                    'complete': complete}
+
+  return
+
+def Pending(manifest, stage):
+
+ # Return the orbit numbers of a stage whose outputs were recorded as incomplete
+ #
+ # Params:
+ #   manifest : in, required, type = dictionary
+ #   manifest returned by LoadManifest()
+ #
+ #   stage : in, required, type = string
+ #   stage name
+ #
+ #   orbits : out, required, type = list of integers
+
+  return sorted(int(key) for (key, entry) in manifest['stages'].get(stage, {}).items()
+                if not entry.get('complete', True))
+
+def Complete(manifest, stage, orbNum):
+
+ # Mark a recorded stage output as complete
+ #
+ # Params:
+ #   manifest : in, required, type = dictionary
+ #   manifest returned by LoadManifest()
+ #
+ #   stage : in, required, type = string
+ #   stage name
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number of the output
+
+  manifest['stages'][stage][str(orbNum).zfill(4)]['complete'] = True
+
+  return
+
+def RunStale(func, jobs, workers, manifest, procDir, stage, complete=True, values=None, pipeline=None):
+
+ # Run func for the orbits of a stage whose outputs are missing or out of date, and record the rebuilt outputs
+ #
+ # Params:
+ #   func : in, required, type = function
+ #   module level function processing one orbit
+ #
+ #   jobs : in, required, type = list
+ #   list of (orbNum, args, inputs, params, output) tuples, where args is the argument tuple passed to func
+ #
+ #   workers : in, required, type = integer
+ #   number of worker processes
+ #
+ #   manifest : in, required, type = dictionary
+ #   manifest returned by LoadManifest(), or None to run every job without recording
+ #
+ #   procDir : in, required, type = string
+ #   path to the processing directory the manifest is saved to
+ #
+ #   stage : in, required, type = string
+ #   stage name
+ #
+ #   complete : in, optional, type = boolean
+ #   record the rebuilt outputs as complete
+ #
+ #   values : in, optional, type = dictionary
+ #   filled with the value returned by func for each orbit rebuilt
+ #
+ #   pipeline : in, optional, type = tuple
+ #   (read, compute, write) parts of func, see RunOrbits()
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each orbit that failed
+
+  outputs = dict((job[0], job[4]) for job in jobs)
+
+  if manifest is None:
+    return RunOrbits(func, [(orbNum, args) for (orbNum, args, inputs, params, output) in jobs], workers, outputs,
+                     values, pipeline)
+
+  stale = [job for job in jobs if not IsCurrent(manifest, stage, job[0], job[2], job[3], job[4])]
+
+  failures = RunOrbits(func, [(orbNum, args) for (orbNum, args, inputs, params, output) in stale], workers, outputs,
+                       values, pipeline)
+  failed   = set(orbNum for (orbNum, error) in failures)
+
+  for (orbNum, args, inputs, params, output) in stale:
+    if orbNum not in failed:
+      Record(manifest, stage, orbNum, inputs, params, complete)
+
+  SaveManifest(procDir, manifest)
+
+  return failures
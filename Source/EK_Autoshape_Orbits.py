@@ -0,0 +1,214 @@
+# EarthKAM AutoShape Orbit Model
+# EK_Autoshape_Orbits.py
+
+import os
+import re
+
+import numpy as np
+
+from EK_Autoshape_Lighting import NO_ORBIT, AssignOrbits
+from EK_Autoshape_Cache import ReadColumns
+
+ #
+ # This file consists of the in-memory orbit model shared by the AutoShape tools. Ephemeris points are held in
+ # one NumPy structured array (POINT_DTYPE, 32 bytes per point) with an integer orbit number, epoch second time,
+ # longitude, latitude and the row of the point in its shapefile, and line segments in another (SEGMENT_DTYPE).
+ # Orbits are carried as integers from the moment a point is labeled until a shapefile field is written, so no
+ # tool parses "Orbit 1234" labels back into numbers.
+ #
+ # The points of one orbit are addressed through a small Orbit record holding the orbit number, its time span
+ # and the row indices of its points, so splitting a coasting arc into orbits is a single sort instead of one
+ # scan or query per orbit. Segment records give per-segment access where a writer needs one object per
+ # feature. Both records use __slots__ to keep their footprint to a few attributes.
+ #
+
+
+ # Ephemeris point: orbit number (NO_ORBIT when outside every lighting interval), epoch seconds, coordinates in
+ # degrees and the record index of the point in its shapefile
+POINT_DTYPE = np.dtype([('orbit', np.int32),
+                        ('time',  np.float64),
+                        ('lon',   np.float64),
+                        ('lat',   np.float64),
+                        ('row',   np.int32)])
+
+ # Track segment between two consecutive points, with the TrackIntervalsToLine_ta measures. The indices of its
+ # first and last point in the point array keep the Start_Time and End_Time strings reachable
+SEGMENT_DTYPE = np.dtype([('orbit',    np.int32),
+                          ('first',    np.int32),
+                          ('last',     np.int32),
+                          ('lon1',     np.float64),
+                          ('lat1',     np.float64),
+                          ('lon2',     np.float64),
+                          ('lat2',     np.float64),
+                          ('dist',     np.float64),
+                          ('duration', np.float64),
+                          ('speed',    np.float64),
+                          ('heading',  np.float64)])
+
+
+class Orbit(object):
+
+ # The points of one orbit within a point array
+ #
+ # Attributes:
+ #   number : orbit number
+ #   start, end : epoch seconds of the first and last point
+ #   rows : int64 array of the indices of the orbit's points, in array order
+
+  __slots__ = ('number', 'start', 'end', 'rows')
+
+  def __init__(self, number, start, end, rows):
+    self.number = number
+    self.start  = start
+    self.end    = end
+    self.rows   = rows
+
+  def __len__(self):
+    return len(self.rows)
+
+  def __repr__(self):
+    return 'Orbit(' + str(self.number) + ', ' + str(len(self.rows)) + ' points)'
+
+class Segment(object):
+
+ # One row of a segment array, see SEGMENT_DTYPE
+
+  __slots__ = SEGMENT_DTYPE.names
+
+  def __init__(self, *values):
+    for (name, value) in zip(self.__slots__, values):
+      setattr(self, name, value)
+
+def OrbitLabel(orbNum):
+
+ # Return the OrbitNum field label of a buffer or KMZ orbit, e.g. "Orbit 0998", padded like the four digits of
+ # the orbNNNN_buff.shp name ReqFmt labels them from. Coasting arcs and point-arcs keep the unpadded "Orbit 998"
+ # written by FillOrbs
+ #
+ # Params:
+ #   orbNum : in, required, type = integer
+ #
+ #   label : out, required, type = string
+
+  return 'Orbit ' + str(orbNum).zfill(4)
+
+def FileOrbit(path):
+
+ # Return the orbit number in the name of an orbit file, e.g. 998 for orb0998_buff.shp, Orbit_0998.kmz or the
+ # Coast_0998.shp coasting arc starting at that orbit
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to a coasting arc, point-arc, line, buffer, lens or KMZ file
+ #
+ #   orbNum : out, required, type = integer
+ #   the last number in the file name
+
+  return int(re.findall(r'\d+', os.path.basename(os.path.splitext(path)[0]))[-1])
+
+def ReadPoints(path, orbNum=NO_ORBIT):
+
+ # Read the points of an ephemeris shapefile into a point array sorted on time
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to a point shapefile with a TA_DATE field (coasting arc or point-arc)
+ #
+ #   orbNum : in, optional, type = integer
+ #   orbit number of every point, e.g. the orbit of a point-arc. The OrbitNum labels are not parsed
+ #
+ #   points : out, required, type = POINT_DTYPE array
+ #   points with a geometry, in time order (file order for equal times)
+
+  columns = ReadColumns(path)
+  present = np.flatnonzero(~np.isnan(columns['x']))
+
+ # Stable sort keeps file order for points sharing a timestamp
+  rows = present[np.argsort(columns['time'][present], kind='mergesort')]
+
+  points = np.empty(len(rows), dtype=POINT_DTYPE)
+
+  points['orbit'] = orbNum
+  points['time']  = columns['time'][rows]
+  points['lon']   = columns['x'][rows]
+  points['lat']   = columns['y'][rows]
+  points['row']   = rows
+
+  return points
+
+def LabelPoints(points, starts, ends, baseOrbit, numbers=None):
+
+ # Set the orbit number of every point from the lighting intervals containing it
+ #
+ # Params:
+ #   points : in, required, type = POINT_DTYPE array
+ #   points to label, updated in place
+ #
+ #   starts, ends, baseOrbit, numbers : in, required, type = see AssignOrbits()
+ #
+ #   points : out, required, type = POINT_DTYPE array
+
+  points['orbit'] = AssignOrbits(points['time'], starts, ends, baseOrbit, numbers)
+
+  return points
+
+def GroupOrbits(orbits, times=None):
+
+ # Group the rows of an orbit number column by orbit
+ #
+ # Params:
+ #   orbits : in, required, type = int array
+ #   orbit number of each row, NO_ORBIT for rows outside every orbit
+ #
+ #   times : in, optional, type = float array
+ #   epoch seconds of each row, used for the time span of each orbit
+ #
+ #   groups : out, required, type = list
+ #   Orbit records sorted on orbit number, each listing its rows in their original order. Rows labeled
+ #   NO_ORBIT are left out. start and end are None without times
+
+  orbits = np.asarray(orbits)
+
+ # One stable sort brings the rows of each orbit together without reordering them
+  order  = np.argsort(orbits, kind='mergesort')
+  bounds = np.flatnonzero(np.diff(orbits[order])) + 1
+
+  groups = []
+
+  for rows in np.split(order, bounds):
+    if len(rows) == 0 or orbits[rows[0]] == NO_ORBIT:
+      continue
+
+    if times is None:
+      (start, end) = (None, None)
+    else:
+      span = np.asarray(times)[rows]
+      (start, end) = (float(span.min()), float(span.max()))
+
+    groups.append(Orbit(int(orbits[rows[0]]), start, end, rows))
+
+  return groups
+
+def SplitOrbits(points):
+
+ # Group the points of a point array by orbit
+ #
+ # Params:
+ #   points : in, required, type = POINT_DTYPE array
+ #
+ #   groups : out, required, type = list
+ #   Orbit records returned by GroupOrbits(), whose rows index points
+
+  return GroupOrbits(points['orbit'], points['time'])
+
+def Segments(segments):
+
+ # Iterate over a segment array as Segment records
+ #
+ # Params:
+ #   segments : in, required, type = SEGMENT_DTYPE array
+ #
+ #   records : out, required, type = generator of Segment records
+
+  for values in segments.tolist():
+    yield Segment(*values)
@@ -0,0 +1,234 @@
+# EarthKAM AutoShape Photo Request Planner
+# EK_Autoshape_Planner.py
+
+import argparse
+import csv
+import glob
+import os
+
+import numpy as np
+
+from EK_Autoshape_Time import EphToEpochSeconds, EpochSecondsToReqTimes
+from EK_Autoshape_Swath import KM_PER_DEG, BufferDistanceKm
+from EK_Autoshape_Index import LoadIndex, QueryPoints, ReadSites
+from EK_Autoshape_Orbits import OrbitLabel, FileOrbit
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for turning a list of target sites into photo
+ # request time windows. All targets are matched against the mission footprint index in one batch, and every
+ # (target, footprint) match is joined to its orbit line segment through the shared Start_Time. The target is
+ # projected onto the segment in a local kilometer plane: the closest approach time and the times the ground
+ # track comes within the FOV half width of the target are interpolated from the segment Start_Time and
+ # DURATION. Matches of consecutive segments of one orbit are merged into a single window.
+ #
+ # The \Line shapefiles must be present, so fused runs need KeepIntermediate.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Planner.py <MXX_Processed_Orbits directory> <targets.csv> <SwapLens> [--out <windows.csv>]
+ #
+ # The targets csv needs a header row with name, lat, lon and priority columns.
+ #
+
+
+ # Fields of the request window csv
+WINDOW_FIELDS = ["Name", "Priority", "OrbitNum", "EntryTime", "ReqTime", "ExitTime", "Cross_KM"]
+
+
+def ReadLineSegments(procDir, orbits):
+
+ # Read the segments of the line shapefiles of a set of orbits, keyed on orbit and Start_Time
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   orbits : in, required, type = set of integers
+ #   orbit numbers whose line shapefiles are read
+ #
+ #   (keys, ends, starts, durations) : out, required, type = tuple
+ #   dictionary of (orbit, Start_Time) to segment row, float64 array of shape (n, 4) holding the segment
+ #   (lon1, lat1, lon2, lat2) end points, and float64 arrays of segment start epoch seconds and durations
+
+  keys       = {}
+  ends       = []
+  startTimes = []
+  durations  = []
+
+  for lineFC in sorted(glob.glob(os.path.join(procDir, 'Line', '*.shp'))):
+    orbNum = FileOrbit(lineFC)
+
+    if orbNum not in orbits:
+      continue
+
+    fields   = [f[0] for f in shp.ReadFields(lineFC)]
+    timeCol  = fields.index("Start_Time")
+    durCol   = fields.index("DURATION")
+
+    for (record, shape) in shp.IterShapefile(lineFC):
+      if shape:
+        keys.setdefault((orbNum, record[timeCol]), len(ends))
+        ends.append(shape[0][0] + shape[-1][-1])
+        startTimes.append(record[timeCol])
+        durations.append(record[durCol] or 0.0)
+
+  return (keys, np.asarray(ends, dtype=np.float64).reshape(-1, 4), EphToEpochSeconds(startTimes),
+          np.asarray(durations, dtype=np.float64))
+
+def SegmentWindows(lon, lat, ends, starts, durations, halfWidthKm):
+
+ # Interpolate the closest approach and FOV entry and exit times of targets along matched segments
+ #
+ # Params:
+ #   lon, lat : in, required, type = float arrays
+ #   target coordinates in degrees, one per match
+ #
+ #   ends : in, required, type = float64 array
+ #   array of shape (n, 4) holding the (lon1, lat1, lon2, lat2) segment end points, one per match
+ #
+ #   starts, durations : in, required, type = float64 arrays
+ #   segment start epoch seconds and durations in seconds, one per match
+ #
+ #   halfWidthKm : in, required, type = float array
+ #   FOV half width of each match in kilometers
+ #
+ #   (entry, closest, exit, cross, offset) : out, required, type = tuple
+ #   float64 arrays of entry, closest approach and exit epoch seconds, cross track distance in kilometers and
+ #   the along track distance in kilometers by which the closest approach falls outside the segment
+
+  coslat = np.cos(np.radians(lat))
+
+ # Segment end points in a local kilometer plane centered on each target, unwrapped across the antimeridian
+  dlon1 = (ends[:, 0] - lon + 180.0) % 360.0 - 180.0
+  dlon2 = dlon1 + (ends[:, 2] - ends[:, 0] + 180.0) % 360.0 - 180.0
+
+  x1 = dlon1 * coslat * KM_PER_DEG
+  y1 = (ends[:, 1] - lat) * KM_PER_DEG
+  dx = dlon2 * coslat * KM_PER_DEG - x1
+  dy = (ends[:, 3] - lat) * KM_PER_DEG - y1
+
+  length = np.hypot(dx, dy)
+  length[length == 0] = np.nan
+
+ # Along track position of the closest approach from the segment start, and cross track distance
+  along = -(x1 * dx + y1 * dy) / length
+  cross = np.abs(x1 * dy - y1 * dx) / length
+  half  = np.sqrt(np.clip(halfWidthKm ** 2 - cross ** 2, 0.0, None))
+
+  secPerKm = durations / length
+
+  return (starts + (along - half) * secPerKm, starts + along * secPerKm, starts + (along + half) * secPerKm,
+          cross, np.abs(along - np.clip(along, 0.0, length)))
+
+def PlanWindows(procDir, lon, lat, SwapLens, index=None):
+
+ # Find the request time windows of every target over the mission footprints
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   lon, lat : in, required, type = float arrays
+ #   target coordinates in degrees
+ #
+ #   SwapLens : in, required, type = integer
+ #   index of the lens swap orbit
+ #
+ #   index : in, optional, type = dictionary
+ #   footprint index returned by LoadIndex(). Loaded from procDir when omitted
+ #
+ #   windows : out, required, type = list
+ #   list of (target, orbit, entry, closest, exit, cross) tuples sorted on target then entry time, with epoch
+ #   second times and cross track distance in kilometers
+
+  if index is None:
+    index = LoadIndex(procDir)
+
+  lon = np.asarray(lon, dtype=np.float64)
+  lat = np.asarray(lat, dtype=np.float64)
+
+  (target, feat) = QueryPoints(index, lon, lat)
+
+  orbit  = index['orbit'][feat]
+  stamps = index['mdyTime'][feat]
+
+ # Join each match to its line segment, dropping footprints without one
+  (keys, ends, starts, durations) = ReadLineSegments(procDir, set(orbit.tolist()))
+
+  row  = np.asarray([keys.get((o, str(s)), -1) for (o, s) in zip(orbit.tolist(), stamps)], dtype=np.int64)
+  keep = row >= 0
+
+  (target, orbit, row) = (target[keep], orbit[keep], row[keep])
+
+  halfWidthKm = np.asarray([BufferDistanceKm(o, SwapLens) for o in orbit.tolist()], dtype=np.float64)
+
+  (entry, closest, exit, cross, offset) = SegmentWindows(lon[target], lat[target], ends[row], starts[row],
+                                                         durations[row], halfWidthKm)
+
+  valid = ~np.isnan(closest)
+  order = np.lexsort((entry[valid], orbit[valid], target[valid]))
+
+  windows = []
+
+ # Merge overlapping windows of one target and orbit, keeping the closest approach of the segment the
+ # target projects onto
+  for i in np.flatnonzero(valid)[order]:
+    current = windows[-1] if windows else None
+
+    if current is not None and current[0] == target[i] and current[1] == orbit[i] and entry[i] <= current[4]:
+      current[2] = min(current[2], entry[i])
+      current[4] = max(current[4], exit[i])
+
+      if offset[i] < current[6]:
+        (current[3], current[5], current[6]) = (closest[i], cross[i], offset[i])
+    else:
+      windows.append([target[i], orbit[i], entry[i], closest[i], exit[i], cross[i], offset[i]])
+
+  return [(int(w[0]), int(w[1]), w[2], w[3], w[4], w[5]) for w in windows]
+
+def WriteWindows(outCSV, rows, windows):
+
+ # Write request time windows to a csv
+ #
+ # Params:
+ #   outCSV : in, required, type = string
+ #   path to the output csv
+ #
+ #   rows : in, required, type = list
+ #   target row dictionaries returned by ReadSites()
+ #
+ #   windows : in, required, type = list
+ #   windows returned by PlanWindows()
+
+  times = EpochSecondsToReqTimes([t for w in windows for t in w[2:5]])
+
+  with open(outCSV, 'w') as f:
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(WINDOW_FIELDS)
+
+    for (i, (target, orbit, entry, closest, exit, cross)) in enumerate(windows):
+      writer.writerow([rows[target].get('name', str(target)), rows[target].get('priority', ''),
+                       OrbitLabel(orbit), times[3 * i], times[3 * i + 1], times[3 * i + 2],
+                       '%.3f' % cross])
+
+  return
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Plan photo request time windows for a list of target sites.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('targets', help='csv of targets with name, lat, lon and priority columns')
+  parser.add_argument('SwapLens', type=int, help='orbit number of the lens swap')
+  parser.add_argument('--out', help='output csv, defaults to <targets>_Windows.csv')
+  args = parser.parse_args()
+
+  (rows, lon, lat) = ReadSites(args.targets)
+
+  windows = PlanWindows(args.procDir, lon, lat, args.SwapLens)
+
+  outCSV = args.out or os.path.splitext(args.targets)[0] + '_Windows.csv'
+  WriteWindows(outCSV, rows, windows)
+
+  print('Planner: ' + str(len(windows)) + ' windows for ' + str(len(rows)) + ' targets written to ' + outCSV)
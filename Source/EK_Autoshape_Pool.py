@@ -0,0 +1,327 @@
+# EarthKAM AutoShape Orbit Pool
+# EK_Autoshape_Pool.py
+
+import multiprocessing
+import os
+import sys
+import threading
+
+try:
+  import queue
+except ImportError:
+  import Queue as queue
+
+from EK_Autoshape_Trace import OrbitProbe, StartOrbit, StopOrbit, AddOrbitRows
+
+ #
+ # This file consists of functions shared by the AutoShape tools for running per-orbit work across a pool of
+ # processes. Each job is keyed on its orbit number and writes its own deterministically named output, so orbits
+ # can run in any order. An exception raised while processing one orbit is caught in the worker and returned as
+ # a failure record instead of stopping the remaining orbits.
+ #
+ # Note: ArcGIS runs in-process script tools inside ArcMap.exe. Worker processes must be started with the
+ # python interpreter installed alongside ArcGIS instead, and the calling tool must keep its main level program
+ # under an  if __name__ == '__main__':  block so it is not rerun by each worker.
+ #
+ # Serial runs can instead be pipelined when a stage function is split into read, compute and write parts: a
+ # reader thread prefetches the next orbits while the current one is computed, and a writer thread flushes the
+ # previous ones. The threads hand orbits over through bounded queues, so a slow disk or network share holds
+ # back the reader instead of letting orbits pile up in memory.
+ #
+
+ # Orbits held in each of the bounded read-ahead and write-behind queues of RunPipeline()
+PIPELINE_DEPTH = 2
+
+
+def _SetExecutable():
+
+ # Point multiprocessing at the ArcGIS python interpreter when running inside ArcMap.exe or ArcCatalog.exe
+
+  exe = os.path.basename(sys.executable).lower()
+
+  if os.name == 'nt' and exe not in ('python.exe', 'pythonw.exe'):
+    multiprocessing.set_executable(os.path.join(sys.exec_prefix, 'pythonw.exe'))
+
+  return
+
+def _RunJob(job):
+
+ # Run a single orbit job, isolating any exception it raises
+ #
+ # Params:
+ #   job : in, required, type = tuple
+ #   tuple of (func, orbNum, args) where func(*args) processes orbit orbNum, optionally followed by the probe
+ #   returned by OrbitProbe() (or None) and the paths the orbit reads or writes, to measure the orbit
+ #
+ #   (orbNum, error), out, required, type = tuple
+ #   orbit number and None on success, or a one line description of the exception on failure. Jobs with a
+ #   probe element return (orbNum, error, row, value) with the trace row of the orbit (None when unmeasured)
+ #   and the value returned by func
+
+  (func, orbNum, args) = job[:3]
+
+  state = StartOrbit(job[3], orbNum, job[4]) if len(job) > 3 and job[3] is not None else None
+  error = None
+  value = None
+
+  try:
+    value = func(*args)
+  except Exception as e:
+    error = _Error(e)
+
+  if len(job) > 3:
+    return (orbNum, error, StopOrbit(state, error) if state is not None else None, value)
+
+  return (orbNum, error)
+
+def _Error(e):
+
+ # Describe an exception raised by an orbit job in one line
+
+  return type(e).__name__ + ': ' + str(e).strip()
+
+def RunOrbits(func, jobs, workers=1, outputs=None, values=None, pipeline=None):
+
+ # Run func once for each orbit job, across a process pool when more than one worker is requested
+ #
+ # Params:
+ #   func : in, required, type = function
+ #   module level function processing one orbit. Must be importable by worker processes
+ #
+ #   jobs : in, required, type = list
+ #   list of (orbNum, args) tuples, where args is the argument tuple passed to func
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes. Values below 2 run every job serially in the current process
+ #
+ #   outputs : in, optional, type = dictionary
+ #   output path of each orbit number that is not among its arguments, counted when a trace stage is open
+ #
+ #   values : in, optional, type = dictionary
+ #   filled with the value returned by func for each orbit number that succeeded
+ #
+ #   pipeline : in, optional, type = tuple
+ #   (read, compute, write) parts of func. When given, serial runs go through RunPipeline() instead, and
+ #   their orbits are not measured individually by the trace
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each failed orbit, sorted on orbit number
+
+  if pipeline is not None and (workers is None or workers < 2) and len(jobs) > 1:
+    return RunPipeline(pipeline, jobs, values=values)
+
+  probe = OrbitProbe()
+
+ # Measure every orbit in the process that runs it while a trace stage is open
+  tasks = [(func, orbNum, args, probe, _TracePaths(args) + [(outputs or {}).get(orbNum)] if probe else None)
+           for (orbNum, args) in jobs]
+
+  if workers is None or workers < 2 or len(tasks) < 2:
+    results = [_RunJob(task) for task in tasks]
+
+  else:
+    _SetExecutable()
+
+    pool = multiprocessing.Pool(min(workers, len(tasks)))
+
+    try:
+      results = pool.map(_RunJob, tasks, chunksize=1)
+    finally:
+      pool.close()
+      pool.join()
+
+  AddOrbitRows([result[2] for result in results if result[2] is not None])
+
+  if values is not None:
+    values.update((result[0], result[3]) for result in results if result[1] is None)
+
+  return sorted(result[:2] for result in results if result[1] is not None)
+
+def RunPipeline(parts, jobs, depth=PIPELINE_DEPTH, values=None):
+
+ # Run orbit jobs serially, overlapping the read of the next orbits and the write of the previous ones with the
+ # computation of the current orbit
+ #
+ # Params:
+ #   parts : in, required, type = tuple
+ #   (read, compute, write) functions splitting the work of one orbit. read(*args) returns the orbit input,
+ #   compute(data, *args) turns it into the orbit output and write(result, *args) writes it, returning the
+ #   value of the orbit. Reads run on a reader thread and writes on a writer thread
+ #
+ #   jobs : in, required, type = list
+ #   list of (orbNum, args) tuples
+ #
+ #   depth : in, optional, type = integer
+ #   orbits held in each of the read-ahead and write-behind queues. A full queue blocks the thread filling it,
+ #   so at most 2 * depth + 3 orbits are in memory at once
+ #
+ #   values : in, optional, type = dictionary
+ #   filled with the value returned by write for each orbit number that succeeded
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each failed orbit, sorted on orbit number
+
+  (read, compute, write) = parts
+
+  readQueue  = queue.Queue(depth)
+  writeQueue = queue.Queue(depth)
+  stopped    = threading.Event()
+  failures   = []
+
+  def Reader():
+
+ # Read the orbits in job order until every job is read or the run is stopped
+
+    for (orbNum, args) in jobs:
+      if stopped.is_set():
+        break
+
+      try:
+        readQueue.put((orbNum, args, read(*args), None))
+      except Exception as e:
+        readQueue.put((orbNum, args, None, _Error(e)))
+
+    readQueue.put(None)
+
+  def Writer():
+
+ # Write the computed orbits in job order until the end marker
+
+    while True:
+      item = writeQueue.get()
+
+      if item is None:
+        return
+
+      (orbNum, args, result) = item
+
+      try:
+        value = write(result, *args)
+      except Exception as e:
+        failures.append((orbNum, _Error(e)))
+        continue
+
+      if values is not None:
+        values[orbNum] = value
+
+  reader = threading.Thread(target=Reader)
+  writer = threading.Thread(target=Writer)
+
+  for thread in (reader, writer):
+    thread.daemon = True
+    thread.start()
+
+  try:
+    while True:
+      item = readQueue.get()
+
+      if item is None:
+        break
+
+      (orbNum, args, data, error) = item
+
+      if error is None:
+        try:
+          writeQueue.put((orbNum, args, compute(data, *args)))
+        except Exception as e:
+          error = _Error(e)
+
+      if error is not None:
+        failures.append((orbNum, error))
+
+      item = data = None
+
+  finally:
+
+ # Release a reader blocked on a full queue when the run is interrupted, then flush the pending writes
+    stopped.set()
+
+    while reader.is_alive():
+      try:
+        readQueue.get(timeout=0.1)
+      except queue.Empty:
+        pass
+
+    writeQueue.put(None)
+    writer.join()
+
+  return sorted(failures)
+
+def _TracePaths(args):
+
+ # Return the file arguments of an orbit job counted by its trace row
+
+  return [arg for arg in args if hasattr(arg, 'lower') and arg.lower().endswith(('.shp', '.kmz'))]
+
+def OpenPool(workers):
+
+ # Open a process pool shared by several stages or missions
+ #
+ # Params:
+ #   workers : in, required, type = integer
+ #   number of worker processes
+ #
+ #   pool : out, required, type = multiprocessing.Pool
+ #   open pool, or None when fewer than 2 workers are requested. The caller closes and joins it
+
+  if workers is None or workers < 2:
+    return None
+
+  _SetExecutable()
+
+  return multiprocessing.Pool(workers)
+
+def SubmitOrbit(pool, func, orbNum, args, callback):
+
+ # Submit one orbit job to a shared pool without waiting for it
+ #
+ # Params:
+ #   pool : in, required, type = multiprocessing.Pool
+ #   pool returned by OpenPool(). When None the job runs immediately in the current process
+ #
+ #   func : in, required, type = function
+ #   module level function processing one orbit. Must be importable by worker processes
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number of the job
+ #
+ #   args : in, required, type = tuple
+ #   argument tuple passed to func
+ #
+ #   callback : in, required, type = function
+ #   called with the (orbNum, error, value) result of the job, where value is returned by func (None on
+ #   failure), from a pool thread when pool is not None
+
+  job  = (func, orbNum, args, None, None)
+  done = lambda result: callback((result[0], result[1], result[3]))
+
+  if pool is None:
+    done(_RunJob(job))
+  else:
+    pool.apply_async(_RunJob, (job,), callback=done)
+
+  return
+
+def ReportFailures(gp, failures):
+
+ # Report failed orbits to the geoprocessor messages at the end of a run
+ #
+ # Params:
+ #   gp : in, required, type = geoprocessor object
+ #   geoprocessor created by arcgisscripting
+ #
+ #   failures : in, required, type = list
+ #   list of (stage, orbNum, error) tuples collected from each stage
+
+  if not failures:
+    gp.AddMessage("All orbits processed successfully.")
+    return
+
+  for (stage, orbNum, error) in failures:
+    gp.AddWarning(stage + ": orbit " + str(orbNum).zfill(4) + " failed. " + error)
+
+  orbits = sorted(set(orbNum for (stage, orbNum, error) in failures))
+
+  gp.AddWarning(str(len(orbits)) + " orbit(s) failed: " + ", ".join(str(o).zfill(4) for o in orbits))
+
+  return
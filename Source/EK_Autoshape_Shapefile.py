@@ -0,0 +1,322 @@
+# EarthKAM AutoShape Shapefile I/O
+# EK_Autoshape_Shapefile.py
+
+import os
+import shutil
+import struct
+
+ #
+ # This file consists of functions for reading and writing ESRI shapefiles (.shp, .shx, .dbf and .prj) without
+ # arcpy. Only the shape types produced by the AutoShape tools are supported: points, polylines and polygons,
+ # including their Z and M variants on input. The functions are used by the native engines so the AutoShape
+ # pipeline can run on machines without an ArcGIS license.
+ #
+ # Records are read and written as lists of attribute values in field order. Shapes are (x, y) tuples for
+ # points and lists of parts, each a list of (x, y) tuples, for polylines and polygons. Null shapes are None.
+ #
+
+
+ # Shapefile shape type codes
+NULL     = 0
+POINT    = 1
+POLYLINE = 3
+POLYGON  = 5
+
+ # Base shape type of each supported shape type code, including Z (1x) and M (2x) variants
+_BASE = {0: NULL,
+         1: POINT,    11: POINT,    21: POINT,
+         3: POLYLINE, 13: POLYLINE, 23: POLYLINE,
+         5: POLYGON,  15: POLYGON,  25: POLYGON}
+
+ # Text encoding of dbf attribute values
+_ENCODING = 'latin-1'
+
+
+def _Paths(path):
+
+ # Return the .shp, .shx, .dbf and .prj paths of a shapefile given any one of them
+
+  base = os.path.splitext(path)[0]
+
+  return (base + '.shp', base + '.shx', base + '.dbf', base + '.prj')
+
+def _Text(raw):
+
+ # Decode a dbf byte string to text, stripping padding
+
+  text = raw.decode(_ENCODING).strip(u' \x00')
+
+  return str(text) if str is bytes and all(ord(c) < 128 for c in text) else text
+
+def ReadFields(path):
+
+ # Read the attribute field definitions of a shapefile
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   fields : out, required, type = list
+ #   list of (name, type, size, decimals) tuples, where type is a dbf field type letter ('C', 'N', 'F', 'D', 'L')
+
+  with open(_Paths(path)[2], 'rb') as dbf:
+    (numRecs, headLen, recLen) = struct.unpack('<xxxxIHH20x', dbf.read(32))
+    fields = []
+
+    for i in range((headLen - 33) // 32):
+      desc = dbf.read(32)
+      name = _Text(desc[:11].split(b'\x00')[0])
+      fields.append((name, desc[11:12].decode('ascii'), ord(desc[16:17]), ord(desc[17:18])))
+
+  return fields
+
+def ReadShapeType(path):
+
+ # Read the shape type of a shapefile
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   shapeType : out, required, type = integer
+ #   one of NULL, POINT, POLYLINE or POLYGON, with Z and M variants reported as their base type
+
+  with open(_Paths(path)[0], 'rb') as shp:
+    shp.seek(32)
+    code = struct.unpack('<i', shp.read(4))[0]
+
+  if code not in _BASE:
+    raise ValueError('unsupported shape type ' + str(code))
+
+  return _BASE[code]
+
+def _ParseValue(raw, ftype, decimals):
+
+ # Decode one dbf attribute value
+
+  text = _Text(raw)
+
+  if ftype in ('N', 'F'):
+    if text == '' or text.startswith('*'):
+      return None
+    return int(text) if decimals == 0 and '.' not in text else float(text)
+
+  if ftype == 'L':
+    return None if text in ('', '?') else text in ('T', 't', 'Y', 'y')
+
+  return text
+
+def _ParseShape(content):
+
+ # Decode the content of one shp record to a shape
+
+  shapeType = _BASE.get(struct.unpack('<i', content[:4])[0])
+
+  if shapeType == NULL:
+    return None
+
+  if shapeType == POINT:
+    return struct.unpack('<2d', content[4:20])
+
+  if shapeType is None:
+    raise ValueError('unsupported shape type ' + str(struct.unpack('<i', content[:4])[0]))
+
+  (numParts, numPoints) = struct.unpack('<2i', content[36:44])
+  starts = struct.unpack('<%di' % numParts, content[44:44 + 4 * numParts]) + (numPoints,)
+  offset = 44 + 4 * numParts
+  coords = struct.unpack('<%dd' % (2 * numPoints), content[offset:offset + 16 * numPoints])
+  points = list(zip(coords[0::2], coords[1::2]))
+
+  return [points[starts[i]:starts[i + 1]] for i in range(numParts)]
+
+def IterShapefile(path):
+
+ # Stream the records and shapes of a shapefile one feature at a time
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   (record, shape) : out, required, type = generator of tuples
+ #   attribute value list and shape of each feature, in file order
+
+  (shpPath, shxPath, dbfPath, prjPath) = _Paths(path)
+
+  fields = ReadFields(path)
+
+  with open(shpPath, 'rb') as shp:
+    with open(dbfPath, 'rb') as dbf:
+      (numRecs, headLen, recLen) = struct.unpack('<xxxxIHH20x', dbf.read(32))
+      dbf.seek(headLen)
+      shp.seek(100)
+
+      for i in range(numRecs):
+        (recNum, length) = struct.unpack('>2i', shp.read(8))
+        shape = _ParseShape(shp.read(2 * length))
+
+        raw = dbf.read(recLen)
+        record = []
+        offset = 1
+
+        for (name, ftype, size, decimals) in fields:
+          record.append(_ParseValue(raw[offset:offset + size], ftype, decimals))
+          offset += size
+
+        yield (record, shape)
+
+def ReadShapefile(path):
+
+ # Read all fields, records and shapes of a shapefile
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the shapefile
+ #
+ #   (fields, records, shapes) : out, required, type = tuple
+ #   field definitions returned by ReadFields(), and lists of attribute value lists and shapes in file order
+
+  records = []
+  shapes  = []
+
+  for (record, shape) in IterShapefile(path):
+    records.append(record)
+    shapes.append(shape)
+
+  return (ReadFields(path), records, shapes)
+
+def _Bounds(points):
+
+ # Return the (xmin, ymin, xmax, ymax) bounding box of a list of (x, y) tuples
+
+  xs = [p[0] for p in points]
+  ys = [p[1] for p in points]
+
+  return (min(xs), min(ys), max(xs), max(ys))
+
+def _ShapeContent(shapeType, shape):
+
+ # Encode one shape as shp record content, returning the content and its bounding box
+
+  if shape is None:
+    return (struct.pack('<i', NULL), None)
+
+  if shapeType == POINT:
+    return (struct.pack('<i2d', POINT, shape[0], shape[1]), (shape[0], shape[1], shape[0], shape[1]))
+
+  points = [tuple(p) for part in shape for p in part]
+  bbox   = _Bounds(points)
+  starts = []
+  count  = 0
+
+  for part in shape:
+    starts.append(count)
+    count += len(part)
+
+  content = struct.pack('<i4d2i', shapeType, bbox[0], bbox[1], bbox[2], bbox[3], len(shape), len(points))
+  content += struct.pack('<%di' % len(starts), *starts)
+  content += struct.pack('<%dd' % (2 * len(points)), *[c for p in points for c in p])
+
+  return (content, bbox)
+
+def _FormatValue(value, ftype, size, decimals):
+
+ # Encode one attribute value as a fixed width dbf byte string
+
+  if value is None:
+    text = ''
+  elif ftype in ('N', 'F'):
+    text = ('%.' + str(decimals) + 'f') % value if decimals else str(int(round(value)))
+  elif ftype == 'L':
+    text = 'T' if value else 'F'
+  else:
+    text = value if isinstance(value, str) else str(value)
+
+  if not isinstance(text, bytes):
+    text = text.encode(_ENCODING)
+
+  if ftype in ('N', 'F'):
+    return text[:size].rjust(size)
+
+  return text[:size].ljust(size)
+
+def WriteShapefile(path, shapeType, fields, records, shapes, prj=None):
+
+ # Write a shapefile from lists of records and shapes
+ #
+ # Params:
+ #   path : in, required, type = string
+ #   path to the output shapefile. Existing files are overwritten
+ #
+ #   shapeType : in, required, type = integer
+ #   one of POINT, POLYLINE or POLYGON
+ #
+ #   fields : in, required, type = list
+ #   list of (name, type, size, decimals) tuples. Names are truncated to 10 characters
+ #
+ #   records : in, required, type = list
+ #   list of attribute value lists, one per shape, in field order
+ #
+ #   shapes : in, required, type = list
+ #   list of shapes, one per record
+ #
+ #   prj : in, optional, type = string
+ #   path to a .prj file or shapefile whose coordinate system is copied to the output
+
+  (shpPath, shxPath, dbfPath, prjPath) = _Paths(path)
+
+  contents = []
+  bbox     = None
+
+  for shape in shapes:
+    (content, box) = _ShapeContent(shapeType, shape)
+    contents.append(content)
+
+    if box is not None:
+      bbox = box if bbox is None else (min(bbox[0], box[0]), min(bbox[1], box[1]),
+                                       max(bbox[2], box[2]), max(bbox[3], box[3]))
+
+  if bbox is None:
+    bbox = (0.0, 0.0, 0.0, 0.0)
+
+ # Write the main file and its index in one pass over the encoded shapes
+  shpLen = 50 + sum(4 + len(c) // 2 for c in contents)
+  shxLen = 50 + 4 * len(contents)
+
+  with open(shpPath, 'wb') as shp:
+    with open(shxPath, 'wb') as shx:
+      for (out, length) in ((shp, shpLen), (shx, shxLen)):
+        out.write(struct.pack('>7i', 9994, 0, 0, 0, 0, 0, length))
+        out.write(struct.pack('<2i4d4d', 1000, shapeType, bbox[0], bbox[1], bbox[2], bbox[3], 0, 0, 0, 0))
+
+      offset = 50
+
+      for (i, content) in enumerate(contents):
+        shp.write(struct.pack('>2i', i + 1, len(content) // 2))
+        shp.write(content)
+        shx.write(struct.pack('>2i', offset, len(content) // 2))
+        offset += 4 + len(content) // 2
+
+ # Write the attribute table
+  recLen = 1 + sum(f[2] for f in fields)
+
+  with open(dbfPath, 'wb') as dbf:
+    dbf.write(struct.pack('<4BIHH20x', 3, 95, 7, 26, len(records), 33 + 32 * len(fields), recLen))
+
+    for (name, ftype, size, decimals) in fields:
+      dbf.write(struct.pack('<11sc4xBB14x', name[:10].encode('ascii'), ftype.encode('ascii'), size, decimals))
+
+    dbf.write(b'\r')
+
+    for record in records:
+      dbf.write(b' ' + b''.join(_FormatValue(value, f[1], f[2], f[3]) for (value, f) in zip(record, fields)))
+
+    dbf.write(b'\x1a')
+
+ # Copy the coordinate system of the source, if one was given
+  if prj is not None:
+    srcPrj = _Paths(prj)[3]
+
+    if os.path.isfile(srcPrj) and os.path.abspath(srcPrj) != os.path.abspath(prjPath):
+      shutil.copyfile(srcPrj, prjPath)
+
+  return
@@ -0,0 +1,243 @@
+# EarthKAM AutoShape Solar Lighting Model
+# EK_Autoshape_Solar.py
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from EK_Autoshape_Time import EpochSecondsToLightTimes
+from EK_Autoshape_Cache import ReadColumns
+from EK_Autoshape_Orbits import FileOrbit
+
+ #
+ # This file consists of functions and a command line program for computing the subpoint lighting intervals of
+ # the ISS directly from the raw coasting arc ephemeris, in place of the lighting csv exported from STK. The
+ # subsolar point of every ephemeris time is computed with the low precision solar coordinates of the
+ # Astronomical Almanac (about 0.01 degree), which gives the solar elevation at each ground point in one array
+ # pass. Sunrise and sunset are interpolated between the points where the elevation crosses the horizon.
+ #
+ # The first sunlit interval is numbered with the orbit (revolution) it falls in: the first orbit number of its
+ # coasting arc, read from the file name, plus the ascending node crossings before the middle of the interval.
+ # Each later interval adds the number of orbit periods elapsed since the one before, so the numbering neither
+ # repeats nor skips when the sunlit passes drift across the ascending node, and still skips the orbits of
+ # ephemeris gaps.
+ #
+ # Command line usage, writing a lighting csv readable by the Daylight and Calendar tools:
+ #   python EK_Autoshape_Solar.py <MXX_Raw_Orbits directory> <output csv> [--horizon DEG]
+ #
+
+
+ # Julian date of the 1970-01-01 epoch and of the J2000.0 reference epoch
+_JD_EPOCH = 2440587.5
+_JD_J2000 = 2451545.0
+
+ # Solar elevation of sunrise and sunset at the ground point, in degrees
+HORIZON_DEG = 0.0
+
+
+def SubsolarPoint(times):
+
+ # Compute the longitude and latitude of the subsolar point at each time
+ #
+ # Params:
+ #   times : in, required, type = float array
+ #   epoch seconds (UTC)
+ #
+ #   (lon, lat) : out, required, type = tuple
+ #   float64 arrays of subsolar longitude [-180, 180) and latitude in degrees
+
+  n = np.asarray(times, dtype=np.float64) / 86400.0 + _JD_EPOCH - _JD_J2000
+
+ # Mean longitude and mean anomaly of the sun, and the ecliptic longitude and obliquity
+  meanLon = np.radians(280.460 + 0.9856474 * n)
+  anomaly = np.radians(357.528 + 0.9856003 * n)
+  eclLon  = meanLon + np.radians(1.915) * np.sin(anomaly) + np.radians(0.020) * np.sin(2.0 * anomaly)
+  oblique = np.radians(23.439 - 0.0000004 * n)
+
+  rightAsc = np.arctan2(np.cos(oblique) * np.sin(eclLon), np.cos(eclLon))
+  decline  = np.arcsin(np.sin(oblique) * np.sin(eclLon))
+
+ # Greenwich mean sidereal time in degrees
+  gmst = 280.46061837 + 360.98564736629 * n
+
+  lon = (np.degrees(rightAsc) - gmst + 180.0) % 360.0 - 180.0
+
+  return (lon, np.degrees(decline))
+
+def SolarElevation(times, lon, lat):
+
+ # Compute the solar elevation at each ground point
+ #
+ # Params:
+ #   times : in, required, type = float array
+ #   epoch seconds (UTC)
+ #
+ #   lon, lat : in, required, type = float arrays
+ #   ground point coordinates in degrees
+ #
+ #   elevation : out, required, type = float64 array
+ #   elevation of the sun center above the horizon in degrees, ignoring refraction
+
+  (sunLon, sunLat) = SubsolarPoint(times)
+
+  lat    = np.radians(lat)
+  sunLat = np.radians(sunLat)
+
+  sinElev = (np.sin(lat) * np.sin(sunLat)
+             + np.cos(lat) * np.cos(sunLat) * np.cos(np.radians(np.asarray(lon, dtype=np.float64) - sunLon)))
+
+  return np.degrees(np.arcsin(np.clip(sinElev, -1.0, 1.0)))
+
+def SunlitIntervals(times, elevation, horizonDeg=HORIZON_DEG):
+
+ # Find the sunlit intervals of a time ordered series of solar elevations
+ #
+ # Params:
+ #   times : in, required, type = float array
+ #   epoch seconds, sorted
+ #
+ #   elevation : in, required, type = float array
+ #   solar elevation at each time in degrees
+ #
+ #   horizonDeg : in, optional, type = float
+ #   solar elevation of sunrise and sunset
+ #
+ #   (starts, ends) : out, required, type = tuple
+ #   float64 arrays of interval start and end epoch seconds. Sunrise and sunset are interpolated linearly
+ #   between points; intervals sunlit at the first or last point start or end there
+
+  times = np.asarray(times, dtype=np.float64)
+  above = np.asarray(elevation, dtype=np.float64) - horizonDeg
+
+  if len(times) == 0:
+    return (np.zeros(0), np.zeros(0))
+
+  sunlit = above > 0
+
+ # Horizon crossing time between each pair of points on either side of the horizon
+  cross = np.flatnonzero(sunlit[:-1] != sunlit[1:])
+  frac  = above[cross] / (above[cross] - above[cross + 1])
+  when  = times[cross] + frac * (times[cross + 1] - times[cross])
+
+  rising = sunlit[cross + 1]
+
+  starts = when[rising]
+  ends   = when[~rising]
+
+  if sunlit[0]:
+    starts = np.concatenate(([times[0]], starts))
+  if sunlit[-1]:
+    ends = np.concatenate((ends, [times[-1]]))
+
+  return (starts, ends)
+
+def ReadEphemeris(rawArcs):
+
+ # Read the points of a set of coasting arcs in time order
+ #
+ # Params:
+ #   rawArcs : in, required, type = list of strings
+ #   paths to the raw coasting arc shapefiles, named with their first orbit number (...NNNN.shp)
+ #
+ #   (times, lon, lat, revs) : out, required, type = tuple
+ #   float64 arrays of epoch seconds and point coordinates, and the int64 orbit number of each point,
+ #   counted from the first orbit number of its arc at each ascending node
+
+  parts = []
+
+  for rawArc in rawArcs:
+    columns = ReadColumns(rawArc)
+    present = ~np.isnan(columns['x'])
+    order   = np.argsort(columns['time'][present], kind='mergesort')
+
+    (times, lon, lat) = (columns['time'][present][order], columns['x'][present][order],
+                         columns['y'][present][order])
+
+ # Orbit numbers advance where the ground track crosses the equator northbound
+    ascending = np.concatenate(([0], (lat[:-1] < 0) & (lat[1:] >= 0)))
+    revs = FileOrbit(rawArc) + np.cumsum(ascending)
+
+    parts.append((times, lon, lat, revs))
+
+  if not parts:
+    return (np.zeros(0), np.zeros(0), np.zeros(0), np.zeros(0, dtype=np.int64))
+
+  (times, lon, lat, revs) = [np.concatenate(column) for column in zip(*parts)]
+  order = np.argsort(times, kind='mergesort')
+
+  return (times[order], lon[order], lat[order], revs[order].astype(np.int64))
+
+def EphemerisLighting(rawArcs, horizonDeg=HORIZON_DEG, orbitOffset=0):
+
+ # Compute the numbered sunlit intervals of a mission from its raw coasting arcs
+ #
+ # Params:
+ #   rawArcs : in, required, type = list of strings
+ #   paths to the raw coasting arc shapefiles
+ #
+ #   horizonDeg : in, optional, type = float
+ #   solar elevation of sunrise and sunset
+ #
+ #   orbitOffset : in, optional, type = integer
+ #   offset added to every orbit number
+ #
+ #   (starts, ends, numbers) : out, required, type = tuple
+ #   sorted float64 arrays of interval start and end epoch seconds, and the int64 orbit number of each
+ #   interval, for AssignOrbits()
+
+  (times, lon, lat, revs) = ReadEphemeris(rawArcs)
+
+  (starts, ends) = SunlitIntervals(times, SolarElevation(times, lon, lat), horizonDeg)
+
+  if len(starts) == 0:
+    return (starts, ends, np.zeros(0, dtype=np.int64))
+
+  middle = (starts + ends) / 2.0
+  first  = revs[min(np.searchsorted(times, middle[0]), len(times) - 1)] + orbitOffset
+
+ # Orbit periods elapsed between consecutive intervals, one at least
+  spacing = np.diff(middle)
+  steps   = np.maximum(1, np.round(spacing / np.median(spacing))) if len(spacing) else spacing
+
+  numbers = first + np.concatenate(([0], np.cumsum(steps))).astype(np.int64)
+
+  return (starts, ends, numbers)
+
+def WriteLightingCSV(outCSV, starts, ends):
+
+ # Write sunlit intervals as a lighting csv in the layout of the STK export read by ReadCSV()
+ #
+ # Params:
+ #   outCSV : in, required, type = string
+ #   path to the output csv
+ #
+ #   starts, ends : in, required, type = float arrays
+ #   interval start and end epoch seconds
+
+  startTimes = EpochSecondsToLightTimes(starts)
+  endTimes   = EpochSecondsToLightTimes(ends)
+
+  with open(outCSV, 'w') as f:
+    for (start, end) in zip(startTimes, endTimes):
+      f.write(start + ',' + end + '\n')
+
+  return
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Compute ISS subpoint lighting intervals from raw coasting arcs.')
+  parser.add_argument('rawDir', help='path to the MXX_Raw_Orbits directory')
+  parser.add_argument('outCSV', help='path to the output lighting csv')
+  parser.add_argument('--horizon', type=float, default=HORIZON_DEG, help='solar elevation of sunrise and sunset')
+  args = parser.parse_args()
+
+  (starts, ends, numbers) = EphemerisLighting(sorted(glob.glob(os.path.join(args.rawDir, '*.shp'))), args.horizon)
+
+  WriteLightingCSV(args.outCSV, starts, ends)
+
+  if len(numbers):
+    print('Lighting: ' + str(len(starts)) + ' sunlit intervals, orbits ' + str(numbers[0]) + ' to ' + str(numbers[-1]))
@@ -0,0 +1,487 @@
+# EarthKAM AutoShape Swath Engine
+# EK_Autoshape_Swath.py
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from EK_Autoshape_Time import EphToReqTimes
+from EK_Autoshape_Pool import RunOrbits
+from EK_Autoshape_Cache import ReadColumns
+from EK_Autoshape_Orbits import OrbitLabel, FileOrbit
+from EK_Autoshape_Tracks import OFFSETS_FIELD
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for converting orbit line shapefiles to buffered
+ # field of view polygons without arcpy. Every segment of an orbit becomes a flat-ended corridor polygon, built
+ # for all segments at once from the segment headings. Segments sharing a Start_Time are merged into one
+ # feature, like the LIST dissolve of Buffer_analysis. The OFFSETS of the spans of a simplified track are
+ # carried on to their footprints.
+ #
+ # Two modes are offered. The planar mode offsets the corners by a fixed number of degrees, matching the planar
+ # buffer of the geoprocessing tool. The geodesic mode offsets each corner by the true distance on the sphere
+ # perpendicular to the local heading, so the swath keeps its width at high latitudes.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Swath.py <MXX_Processed_Orbits directory> <SwapLens> [--geodesic] [--workers N]
+ #                                                                            [--pipelined]
+ #
+
+
+ # Mean earth radius in kilometers used for geodesic offsets
+EARTH_RADIUS_KM = 6371.0088
+
+ # Kilometers per degree of arc on the mean earth sphere, used for planar offsets
+KM_PER_DEG = np.pi * EARTH_RADIUS_KM / 180.0
+
+ # Fields written to each buffer shapefile, as produced by the LIST dissolve on Start_Time
+BUFF_FIELDS = [("Start_Time", 'C', 24, 0)]
+
+ # Fields written to each buffer shapefile when formatted in the same pass, as left by FormatBuffer
+FORMATTED_FIELDS = [("OrbitNum", 'C', 24, 0),
+                    ("ReqTime",  'C', 24, 0),
+                    ("MDYTime",  'C', 24, 0)]
+
+
+def BufferDistanceKm(current, SwapLens):
+
+ # Return the FOV buffer distance of an orbit in kilometers
+ #
+ # Params:
+ #   current : in, required, type = integer
+ #   orbit number
+ #
+ #   SwapLens : in, required, type = integer
+ #   index of the lens swap orbit
+ #
+ #   buffKm : out, required, type = integer
+ #   56 km for orbits up to the lens swap, 17 km after it
+
+  return 56 if current <= SwapLens else 17
+
+def _Course(lon, lat, bearing):
+
+ # Precompute the terms of _Destination() that do not depend on the distance travelled (all in degrees)
+
+  lat = np.radians(lat)
+  bearing = np.radians(bearing)
+
+  return (np.radians(lon), np.sin(lat), np.cos(lat), np.sin(bearing), np.cos(bearing))
+
+def _Destination(course, distKm):
+
+ # Return the points reached by travelling distKm along a course returned by _Course() on the sphere (in degrees)
+
+  (lon, sinLat, cosLat, sinBearing, cosBearing) = course
+  d = distKm / EARTH_RADIUS_KM
+
+  lat2 = np.arcsin(sinLat * np.cos(d) + cosLat * np.sin(d) * cosBearing)
+  lon2 = lon + np.arctan2(sinBearing * np.sin(d) * cosLat, np.cos(d) - sinLat * np.sin(lat2))
+
+  return (np.degrees(lon2), np.degrees(lat2))
+
+def _Bearing(lon1, lat1, lon2, lat2):
+
+ # Return the initial great circle bearing in degrees from (lon1, lat1) to (lon2, lat2)
+
+  (lon1, lat1, lon2, lat2) = (np.radians(lon1), np.radians(lat1), np.radians(lon2), np.radians(lat2))
+
+  y = np.sin(lon2 - lon1) * np.cos(lat2)
+  x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(lon2 - lon1)
+
+  return np.degrees(np.arctan2(y, x))
+
+def SwathFrame(lon1, lat1, lon2, lat2, geodesic=False):
+
+ # Precompute the part of the swath polygons of every segment that does not depend on the buffer distance, so
+ # swaths of several widths can be built from one pass over the segments
+ #
+ # Params:
+ #   lon1, lat1 : in, required, type = float arrays
+ #   segment start points in degrees
+ #
+ #   lon2, lat2 : in, required, type = float arrays
+ #   segment end points in degrees
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the corners geodesically instead of by a fixed number of degrees
+ #
+ #   frame : out, required, type = dictionary
+ #   segment geometry passed to SwathRings(). The degenerate key holds the boolean mask of zero length segments
+
+  lon1 = np.asarray(lon1, dtype=np.float64)
+  lat1 = np.asarray(lat1, dtype=np.float64)
+  lat2 = np.asarray(lat2, dtype=np.float64)
+
+ # Unwrap end longitudes so segments crossing the antimeridian stay short
+  lon2 = lon1 + (np.asarray(lon2, dtype=np.float64) - lon1 + 180.0) % 360.0 - 180.0
+
+  frame = {'geodesic': geodesic, 'degenerate': (lon1 == lon2) & (lat1 == lat2)}
+
+  if geodesic:
+
+ # Offset each end perpendicular to the local heading: the initial bearing at the start and the
+ # reversed back bearing at the end of each segment
+    startHead = _Bearing(lon1, lat1, lon2, lat2)
+    endHead   = _Bearing(lon2, lat2, lon1, lat1) + 180.0
+
+    frame['courses'] = (_Course(lon1, lat1, startHead - 90.0), _Course(lon2, lat2, endHead - 90.0),
+                        _Course(lon2, lat2, endHead + 90.0), _Course(lon1, lat1, startHead + 90.0))
+
+  else:
+
+ # Left unit normal of each segment, scaled to the buffer distance in degrees by SwathRings()
+    dx = lon2 - lon1
+    dy = lat2 - lat1
+    length = np.hypot(dx, dy)
+    length[frame['degenerate']] = 1.0
+
+    frame['ends']   = (lon1, lat1, lon2, lat2)
+    frame['normal'] = (-dy / length, dx / length)
+
+  return frame
+
+def SwathRings(frame, halfWidthKm):
+
+ # Build flat-ended corridor polygons of one width around every segment of a swath frame
+ #
+ # Params:
+ #   frame : in, required, type = dictionary
+ #   segment geometry returned by SwathFrame()
+ #
+ #   halfWidthKm : in, required, type = float or float array
+ #   buffer distance on each side of the segments in kilometers
+ #
+ #   rings : out, required, type = float64 array
+ #   array of shape (n, 5, 2) holding the closed, clockwise (lon, lat) ring of each segment.
+ #   Rings of zero length segments are NaN
+
+  halfWidthKm = np.asarray(halfWidthKm, dtype=np.float64)
+  degenerate  = frame['degenerate']
+
+  if frame['geodesic']:
+    ((lonSL, latSL), (lonEL, latEL), (lonER, latER), (lonSR, latSR)) = [_Destination(course, halfWidthKm)
+                                                                        for course in frame['courses']]
+
+  else:
+
+ # Offset both ends by the left unit normal of the segment scaled to the buffer distance in degrees
+    (lon1, lat1, lon2, lat2) = frame['ends']
+
+    offset = halfWidthKm / KM_PER_DEG
+    nx = frame['normal'][0] * offset
+    ny = frame['normal'][1] * offset
+
+    (lonSL, latSL, lonSR, latSR) = (lon1 + nx, lat1 + ny, lon1 - nx, lat1 - ny)
+    (lonEL, latEL, lonER, latER) = (lon2 + nx, lat2 + ny, lon2 - nx, lat2 - ny)
+
+ # Left side forward then right side back is clockwise, the outer ring order of the shapefile format
+  rings = np.empty((degenerate.shape[0], 5, 2), dtype=np.float64)
+  rings[:, 0, 0] = lonSL
+  rings[:, 0, 1] = latSL
+  rings[:, 1, 0] = lonEL
+  rings[:, 1, 1] = latEL
+  rings[:, 2, 0] = lonER
+  rings[:, 2, 1] = latER
+  rings[:, 3, 0] = lonSR
+  rings[:, 3, 1] = latSR
+  rings[:, 4]    = rings[:, 0]
+
+  rings[degenerate] = np.nan
+
+  return rings
+
+def SwathPolygons(lon1, lat1, lon2, lat2, halfWidthKm, geodesic=False):
+
+ # Build flat-ended corridor polygons around every segment at once
+ #
+ # Params:
+ #   lon1, lat1 : in, required, type = float arrays
+ #   segment start points in degrees
+ #
+ #   lon2, lat2 : in, required, type = float arrays
+ #   segment end points in degrees
+ #
+ #   halfWidthKm : in, required, type = float or float array
+ #   buffer distance on each side of the segments in kilometers
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the corners geodesically instead of by a fixed number of degrees
+ #
+ #   rings : out, required, type = float64 array
+ #   array of shape (n, 5, 2) holding the closed, clockwise (lon, lat) ring of each segment.
+ #   Rings of zero length segments are NaN
+
+  return SwathRings(SwathFrame(lon1, lat1, lon2, lat2, geodesic), halfWidthKm)
+
+def ReadSegments(lineFC):
+
+ # Read the segment end points and Start_Time of every feature of a line shapefile
+ #
+ # Params:
+ #   lineFC : in, required, type = string
+ #   path to the line shapefile
+ #
+ #   (lon1, lat1, lon2, lat2, startTimes, offsets) : out, required, type = tuple
+ #   float64 arrays of segment start and end points, the list of Start_Time strings and the list of OFFSETS
+ #   strings of a simplified track (None for other lines), read through the columnar cache of the shapefile
+
+  columns = ReadColumns(lineFC)
+  present = ~np.isnan(columns['x1'])
+
+  offsets = columns['offsets'][present].tolist() if 'offsets' in columns else None
+
+  return (columns['x1'][present], columns['y1'][present], columns['x2'][present], columns['y2'][present],
+          columns['stamp'][present].tolist(), offsets)
+
+def DissolveGroups(valid, startTimes):
+
+ # Group the segments sharing a Start_Time, like a LIST dissolve
+ #
+ # Params:
+ #   valid : in, required, type = boolean array
+ #   mask of the segments with a ring. Other segments are left out
+ #
+ #   startTimes : in, required, type = list
+ #   Start_Time string of each segment
+ #
+ #   (stamps, groups) : out, required, type = tuple
+ #   list of Start_Time strings in order of first appearance, and the list of segment indices of each
+
+  stamps = []
+  groups = []
+  index  = {}
+
+  for (i, stamp) in enumerate(startTimes):
+    if not valid[i]:
+      continue
+
+    if stamp not in index:
+      index[stamp] = len(groups)
+      stamps.append(stamp)
+      groups.append([])
+
+    groups[index[stamp]].append(i)
+
+  return (stamps, groups)
+
+def GroupRings(rings, groups):
+
+ # Collect the rings of each segment group into multipart polygon shapes
+ #
+ # Params:
+ #   rings : in, required, type = float64 array
+ #   array of shape (n, 5, 2) returned by SwathRings()
+ #
+ #   groups : in, required, type = list
+ #   segment indices of each polygon, as returned by DissolveGroups()
+ #
+ #   shapes : out, required, type = list
+ #   list of polygon shapes, each a list of rings of (lon, lat) tuples
+
+  points = rings.tolist()
+
+  return [[[tuple(p) for p in points[i]] for i in group] for group in groups]
+
+def DissolveRings(rings, startTimes, offsets=None):
+
+ # Group segment rings sharing a Start_Time into multipart polygons, like a LIST dissolve
+ #
+ # Params:
+ #   rings : in, required, type = float64 array
+ #   array of shape (n, 5, 2) returned by SwathPolygons()
+ #
+ #   startTimes : in, required, type = list
+ #   Start_Time string of each segment
+ #
+ #   offsets : in, optional, type = list
+ #   OFFSETS string of each segment of a simplified track, added to the records
+ #
+ #   (records, shapes) : out, required, type = tuple
+ #   lists of [Start_Time] or [Start_Time, OFFSETS] records and polygon shapes, in order of first appearance
+
+  (stamps, groups) = DissolveGroups(~np.isnan(rings[:, 0, 0]), startTimes)
+
+  if offsets is None:
+    records = [[stamp] for stamp in stamps]
+  else:
+    records = [[stamp, offsets[group[0]]] for (stamp, group) in zip(stamps, groups)]
+
+  return (records, GroupRings(rings, groups))
+
+def BufferOrbitNative(lineFC, outBuffFC, buffKm, geodesic=False, orbNum=None):
+
+ # Write the FOV buffer polygons of one orbit line shapefile
+ #
+ # Params:
+ #   lineFC : in, required, type = string
+ #   path to the line shapefile being processed
+ #
+ #   outBuffFC : in, required, type = string
+ #   path to the output polygon shapefile
+ #
+ #   buffKm : in, required, type = float
+ #   buffer distance on each side of the ground track in kilometers
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the swath corners geodesically
+ #
+ #   orbNum : in, optional, type = integer
+ #   orbit number. When given the polygons are written with the OrbitNum, ReqTime and MDYTime fields of
+ #   FormatBuffer instead of Start_Time
+
+  args = (lineFC, outBuffFC, buffKm, geodesic, orbNum)
+
+  _WriteBuffer(_BuildBuffer(_ReadBuffer(*args), *args), *args)
+
+  return
+
+def _ReadBuffer(lineFC, outBuffFC, buffKm, geodesic=False, orbNum=None):
+
+ # Read the segments of one BufferOrbitNative() orbit
+
+  return ReadSegments(lineFC)
+
+def _BuildBuffer(segments, lineFC, outBuffFC, buffKm, geodesic=False, orbNum=None):
+
+ # Build the fields, records and polygons of one BufferOrbitNative() orbit from its segments
+
+  (lon1, lat1, lon2, lat2, startTimes, offsets) = segments
+
+  rings = SwathPolygons(lon1, lat1, lon2, lat2, buffKm, geodesic)
+
+  (records, shapes) = DissolveRings(rings, startTimes, offsets)
+  extra = [OFFSETS_FIELD] if offsets is not None else []
+
+  if orbNum is None:
+    return (BUFF_FIELDS + extra, records, shapes)
+
+  return (FORMATTED_FIELDS + extra, _FormatRecords(records, orbNum), shapes)
+
+def _WriteBuffer(buff, lineFC, outBuffFC, buffKm, geodesic=False, orbNum=None):
+
+ # Write the polygons of one BufferOrbitNative() orbit
+
+  (fields, records, shapes) = buff
+
+  shp.WriteShapefile(outBuffFC, shp.POLYGON, fields, records, shapes, prj=lineFC)
+
+  return
+
+ # Read, compute and write parts of BufferOrbitNative() for RunPipeline()
+BUFFER_PARTS = (_ReadBuffer, _BuildBuffer, _WriteBuffer)
+
+def _FormatRecords(records, orbNum):
+
+ # Convert Start_Time records to OrbitNum, ReqTime and MDYTime records, keeping the OFFSETS that follow
+
+  stamps = [record[0] for record in records]
+
+  return [[OrbitLabel(orbNum), reqTime, record[0]] + record[1:]
+          for (reqTime, record) in zip(EphToReqTimes(stamps), records)]
+
+def FormatBufferNative(buffFC, orbNum):
+
+ # Rewrite an unformatted buffer shapefile with the OrbitNum, ReqTime and MDYTime fields of FormatBuffer
+ #
+ # Params:
+ #   buffFC : in, required, type = string
+ #   path to the buffer shapefile written by BufferOrbitNative() without an orbit number
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number of the buffer
+
+  _WriteFormat(_BuildFormat(_ReadFormat(buffFC, orbNum), buffFC, orbNum), buffFC, orbNum)
+
+  return
+
+def _ReadFormat(buffFC, orbNum):
+
+ # Read the unformatted buffer of one FormatBufferNative() orbit
+
+  return shp.ReadShapefile(buffFC)
+
+def _BuildFormat(buff, buffFC, orbNum):
+
+ # Convert the Start_Time records of one FormatBufferNative() orbit
+
+  (fields, records, shapes) = buff
+  names = [f[0] for f in fields]
+
+  if names == [f[0] for f in BUFF_FIELDS]:
+    extra = []
+  elif names == [f[0] for f in BUFF_FIELDS + [OFFSETS_FIELD]]:
+    extra = [OFFSETS_FIELD]
+  else:
+    raise ValueError(os.path.basename(buffFC) + ' is not an unformatted buffer')
+
+  return (FORMATTED_FIELDS + extra, _FormatRecords(records, orbNum), shapes)
+
+def _WriteFormat(formatted, buffFC, orbNum):
+
+ # Rewrite the buffer of one FormatBufferNative() orbit with its formatted records
+
+  (fields, records, shapes) = formatted
+
+  shp.WriteShapefile(buffFC, shp.POLYGON, fields, records, shapes)
+
+  return
+
+ # Read, compute and write parts of FormatBufferNative() for RunPipeline()
+FORMAT_PARTS = (_ReadFormat, _BuildFormat, _WriteFormat)
+
+def BufferFOVNative(procDir, SwapLens, geodesic=False, workers=1, pipelined=False):
+
+ # Buffer every line shapefile in the processing directory
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   SwapLens : in, required, type = integer
+ #   index of the lens swap orbit
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the swath corners geodesically
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes
+ #
+ #   pipelined : in, optional, type = boolean
+ #   overlap the reads and writes of consecutive orbits when running serially (see RunPipeline())
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each orbit that failed
+
+  buffDir_out = os.path.join(procDir, 'Buff')
+
+  if not os.path.isdir(buffDir_out):
+    os.makedirs(buffDir_out)
+
+  jobs = []
+
+  for lineFC in sorted(glob.glob(os.path.join(procDir, 'Line', '*.shp'))):
+    current = FileOrbit(lineFC)
+    outBuffFC = os.path.join(buffDir_out, 'orb' + str(current).zfill(4) + '_buff.shp')
+    jobs.append((current, (lineFC, outBuffFC, BufferDistanceKm(current, SwapLens), geodesic)))
+
+  return RunOrbits(BufferOrbitNative, jobs, workers, pipeline=BUFFER_PARTS if pipelined else None)
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Buffer orbit line shapefiles to FOV polygons without arcpy.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('SwapLens', type=int, help='orbit number of the lens swap')
+  parser.add_argument('--geodesic', action='store_true', help='offset swath corners geodesically')
+  parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+  parser.add_argument('--pipelined', action='store_true',
+                      help='read the next orbit and write the previous one while the current one is buffered')
+  args = parser.parse_args()
+
+  for (orbNum, error) in BufferFOVNative(args.procDir, args.SwapLens, args.geodesic, args.workers, args.pipelined):
+    print('BufferFOV: orbit ' + str(orbNum).zfill(4) + ' failed. ' + error)
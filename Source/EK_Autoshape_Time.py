@@ -0,0 +1,389 @@
+# EarthKAM AutoShape Time Parsing
+# EK_Autoshape_Time.py
+
+import datetime
+
+import numpy as np
+
+ #
+ # This file consists of the timestamp parsers and formatters shared by the AutoShape tools. Both input layouts
+ # are fixed width, so they are decoded by slicing digits instead of calling strptime:
+ #
+ #   ephemeris time (TA_DATE, Start_Time):     %m/%d/%y %H:%M:%S          e.g. 03/22/17 14:05:09
+ #   lighting time (subpoint lighting csv):    %Y/%m/%d %H:%M:%S.%f       e.g. 2017/03/22 14:05:09.250
+ #
+ # and request time is written as %Y/%j/%H:%M:%S, e.g. 2017/081/14:05:09. Strings that do not match the fixed
+ # layout (for example unpadded fields) fall back to strptime, so every function returns exactly what the
+ # strptime/strftime calls it replaces would. The batch functions take and return whole columns, using NumPy
+ # datetime64 arrays for the vectorized paths.
+ #
+
+
+ # strptime/strftime equivalents of the fixed layouts
+ArcEph_fmt   = '%m/%d/%y %H:%M:%S'
+Light_fmt    = '%Y/%m/%d %H:%M:%S.%f'
+ReqTime_fmt  = '%Y/%j/%H:%M:%S'
+
+ # Memo of ephemeris time to request time conversions. Ephemeris points repeat the same second across the
+ # Arc, Line and Buff files of an orbit, so most conversions are cache hits
+_ReqTimeMemo = {}
+
+ # Number of entries after which the memo is cleared to bound its memory
+_MEMO_LIMIT = 1000000
+
+
+def _Year2(yy):
+
+ # Expand a two digit year using the strptime pivot: 69-99 are 1900s, 00-68 are 2000s
+
+  return yy + 1900 if yy >= 69 else yy + 2000
+
+def ParseEphTime(EphTime):
+
+ # Parse an ephemeris time string (MM/DD/YY HH:MM:SS) to a datetime object
+ #
+ # Params:
+ #   EphTime : in, required, type = string
+ #   ephemeris time string
+ #
+ #   dto : out, required, type = datetime object
+
+  if (len(EphTime) == 17 and EphTime[2] == '/' and EphTime[5] == '/' and EphTime[8] == ' '
+      and EphTime[11] == ':' and EphTime[14] == ':'):
+    try:
+      return datetime.datetime(_Year2(int(EphTime[6:8])), int(EphTime[0:2]), int(EphTime[3:5]),
+                               int(EphTime[9:11]), int(EphTime[12:14]), int(EphTime[15:17]))
+    except ValueError:
+      pass
+
+  return datetime.datetime.strptime(EphTime, ArcEph_fmt)
+
+def ParseLightTime(LightTime):
+
+ # Parse a lighting time string (YYYY/MM/DD HH:MM:SS.ffffff) to a datetime object
+ #
+ # Params:
+ #   LightTime : in, required, type = string
+ #   lighting time string with one to six fractional second digits
+ #
+ #   dto : out, required, type = datetime object
+
+  if (20 < len(LightTime) <= 26 and LightTime[4] == '/' and LightTime[7] == '/' and LightTime[10] == ' '
+      and LightTime[13] == ':' and LightTime[16] == ':' and LightTime[19] == '.' and LightTime[20:].isdigit()):
+    try:
+      return datetime.datetime(int(LightTime[0:4]), int(LightTime[5:7]), int(LightTime[8:10]),
+                               int(LightTime[11:13]), int(LightTime[14:16]), int(LightTime[17:19]),
+                               int(LightTime[20:].ljust(6, '0')))
+    except ValueError:
+      pass
+
+  return datetime.datetime.strptime(LightTime, Light_fmt)
+
+def ParseReqTime(ReqTime):
+
+ # Parse a request time string (YYYY/DDD/HH:MM:SS) to a datetime object
+ #
+ # Params:
+ #   ReqTime : in, required, type = string
+ #   request time string
+ #
+ #   dto : out, required, type = datetime object
+
+  if (len(ReqTime) == 17 and ReqTime[4] == '/' and ReqTime[8] == '/' and ReqTime[11] == ':'
+      and ReqTime[14] == ':' and ReqTime[5:8].isdigit() and 1 <= int(ReqTime[5:8]) <= 366):
+    try:
+      start = datetime.datetime(int(ReqTime[0:4]), 1, 1, int(ReqTime[9:11]), int(ReqTime[12:14]),
+                                int(ReqTime[15:17]))
+      dto   = start + datetime.timedelta(days=int(ReqTime[5:8]) - 1)
+
+      if dto.year == start.year:
+        return dto
+    except ValueError:
+      pass
+
+  return datetime.datetime.strptime(ReqTime, ReqTime_fmt)
+
+def FormatReqTime(dto):
+
+ # Format a datetime object as a request time string (YYYY/DDD/HH:MM:SS)
+ #
+ # Params:
+ #   dto : in, required, type = datetime object
+ #
+ #   ReqTime : out, required, type = string
+
+  return '%04d/%03d/%02d:%02d:%02d' % (dto.year, dto.timetuple().tm_yday, dto.hour, dto.minute, dto.second)
+
+def EphToReqTime(EphTime):
+
+ # Convert an ephemeris time string to a request time string, memoized
+ #
+ # Params:
+ #   EphTime : in, required, type = string
+ #   ephemeris time string (MM/DD/YY HH:MM:SS)
+ #
+ #   ReqTime : out, required, type = string
+ #   request time string (YYYY/DDD/HH:MM:SS)
+
+  ReqTime = _ReqTimeMemo.get(EphTime)
+
+  if ReqTime is None:
+    if len(_ReqTimeMemo) >= _MEMO_LIMIT:
+      _ReqTimeMemo.clear()
+
+    ReqTime = _ReqTimeMemo[EphTime] = FormatReqTime(ParseEphTime(EphTime))
+
+  return ReqTime
+
+def _Digits(chars, start, stop):
+
+ # Decode the decimal number held in columns [start, stop) of a (n, width) uint8 character array
+
+  value = np.zeros(chars.shape[0], dtype=np.int64)
+
+  for col in range(start, stop):
+    value = value * 10 + (chars[:, col].astype(np.int64) - 48)
+
+  return value
+
+def _CharArray(strings, width):
+
+ # Return a (n, width) uint8 array of the characters of each string, and a mask of the strings of that length
+
+  raw = np.array([s.encode('ascii', 'replace') if not isinstance(s, bytes) else s for s in strings],
+                 dtype='S' + str(width))
+  chars = raw.view(np.uint8).reshape(-1, width)
+  lengths = np.array([len(s) for s in strings], dtype=np.int64)
+
+  return (chars, lengths == width)
+
+def _Assemble(year, month, day, hour, minute, second, micro):
+
+ # Build a datetime64[us] array from integer calendar field arrays
+
+  dt64 = ((year - 1970).astype('datetime64[Y]') + (month - 1).astype('timedelta64[M]')).astype('datetime64[D]')
+
+  return (dt64 + (day - 1).astype('timedelta64[D]') + hour.astype('timedelta64[h]') + minute.astype('timedelta64[m]')
+          + second.astype('timedelta64[s]') + micro.astype('timedelta64[us]'))
+
+def _Valid(chars, seps, digits, month, day, hour, minute, second, year):
+
+ # Mask of rows holding the expected separators, only digits elsewhere, and in-range calendar fields
+
+  ok = np.ones(chars.shape[0], dtype=bool)
+
+  for (col, sep) in seps:
+    ok &= chars[:, col] == ord(sep)
+
+  for col in digits:
+    ok &= (chars[:, col] >= 48) & (chars[:, col] <= 57)
+
+  ok &= (month >= 1) & (month <= 12) & (day >= 1) & (hour <= 23) & (minute <= 59) & (second <= 59)
+
+ # Reject day numbers past the end of their month
+  first = ((year - 1970).astype('datetime64[Y]') + (np.clip(month, 1, 12) - 1).astype('timedelta64[M]'))
+  length = ((first + np.timedelta64(1, 'M')).astype('datetime64[D]') - first.astype('datetime64[D]')).astype(np.int64)
+  ok &= day <= length
+
+  return ok
+
+def EphToDatetime64(EphTimes):
+
+ # Parse a column of ephemeris time strings to a datetime64 array
+ #
+ # Params:
+ #   EphTimes : in, required, type = list of strings
+ #   ephemeris time strings (MM/DD/YY HH:MM:SS)
+ #
+ #   dt64 : out, required, type = datetime64[s] array
+
+  EphTimes = list(EphTimes)
+  (chars, fixed) = _CharArray(EphTimes, 17)
+
+  year   = _Digits(chars, 6, 8)
+  year   = np.where(year >= 69, year + 1900, year + 2000)
+  month  = _Digits(chars, 0, 2)
+  day    = _Digits(chars, 3, 5)
+  hour   = _Digits(chars, 9, 11)
+  minute = _Digits(chars, 12, 14)
+  second = _Digits(chars, 15, 17)
+
+  fixed &= _Valid(chars, [(2, '/'), (5, '/'), (8, ' '), (11, ':'), (14, ':')], [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16],
+                  month, day, hour, minute, second, year)
+
+  dt64 = _Assemble(year, np.where(fixed, month, 1), np.where(fixed, day, 1), hour, minute, second,
+                   np.zeros_like(year)).astype('datetime64[s]')
+
+ # Parse the rows that do not follow the fixed layout one at a time
+  for i in np.flatnonzero(~fixed):
+    dt64[i] = np.datetime64(ParseEphTime(EphTimes[i]), 's')
+
+  return dt64
+
+def LightToDatetime64(LightTimes):
+
+ # Parse a column of lighting time strings to a datetime64 array
+ #
+ # Params:
+ #   LightTimes : in, required, type = list of strings
+ #   lighting time strings (YYYY/MM/DD HH:MM:SS.ffffff)
+ #
+ #   dt64 : out, required, type = datetime64[us] array
+
+  LightTimes = list(LightTimes)
+
+ # Pad fractions to six digits so every row shares one fixed width
+  padded = [s + '0' * (26 - len(s)) if 20 < len(s) < 26 and s[19:20] == '.' else s for s in LightTimes]
+  (chars, fixed) = _CharArray(padded, 26)
+
+  year   = _Digits(chars, 0, 4)
+  month  = _Digits(chars, 5, 7)
+  day    = _Digits(chars, 8, 10)
+  hour   = _Digits(chars, 11, 13)
+  minute = _Digits(chars, 14, 16)
+  second = _Digits(chars, 17, 19)
+  micro  = _Digits(chars, 20, 26)
+
+  fixed &= _Valid(chars, [(4, '/'), (7, '/'), (10, ' '), (13, ':'), (16, ':'), (19, '.')],
+                  [0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18, 20, 21, 22, 23, 24, 25],
+                  month, day, hour, minute, second, year)
+
+  dt64 = _Assemble(np.where(fixed, year, 1970), np.where(fixed, month, 1), np.where(fixed, day, 1),
+                   hour, minute, second, micro)
+
+  for i in np.flatnonzero(~fixed):
+    dt64[i] = np.datetime64(ParseLightTime(LightTimes[i]), 'us')
+
+  return dt64
+
+def Datetime64ToEpochSeconds(dt64):
+
+ # Convert a datetime64 array to float64 seconds since 1970-01-01
+ #
+ # Params:
+ #   dt64 : in, required, type = datetime64 array
+ #
+ #   seconds : out, required, type = float64 array
+
+  return (dt64.astype('datetime64[us]') - np.datetime64(0, 'us')).astype(np.int64) / 1e6
+
+def Datetime64ToDatetimes(dt64):
+
+ # Convert a datetime64 array to a list of datetime objects
+ #
+ # Params:
+ #   dt64 : in, required, type = datetime64 array
+ #
+ #   dtos : out, required, type = list of datetime objects
+
+  return dt64.astype('datetime64[us]').tolist()
+
+def EphToEpochSeconds(EphTimes):
+
+ # Parse a column of ephemeris time strings to epoch seconds
+ #
+ # Params:
+ #   EphTimes : in, required, type = list of strings
+ #   ephemeris time strings (MM/DD/YY HH:MM:SS)
+ #
+ #   seconds : out, required, type = float64 array
+
+  return Datetime64ToEpochSeconds(EphToDatetime64(EphTimes))
+
+def ParseLightTimes(LightTimes):
+
+ # Parse a column of lighting time strings to datetime objects
+ #
+ # Params:
+ #   LightTimes : in, required, type = list of strings
+ #   lighting time strings (YYYY/MM/DD HH:MM:SS.ffffff)
+ #
+ #   dtos : out, required, type = list of datetime objects
+
+  return Datetime64ToDatetimes(LightToDatetime64(LightTimes))
+
+def FormatReqTimes(dt64):
+
+ # Format a datetime64 array as request time strings (YYYY/DDD/HH:MM:SS)
+ #
+ # Params:
+ #   dt64 : in, required, type = datetime64 array
+ #
+ #   ReqTimes : out, required, type = list of strings
+
+  secs  = dt64.astype('datetime64[s]')
+  days  = secs.astype('datetime64[D]')
+  years = days.astype('datetime64[Y]')
+
+  year = years.astype(np.int64) + 1970
+  yday = (days - years.astype('datetime64[D]')).astype(np.int64) + 1
+  sod  = (secs - days.astype('datetime64[s]')).astype(np.int64)
+
+  return ['%04d/%03d/%02d:%02d:%02d' % fields
+          for fields in zip(year.tolist(), yday.tolist(), (sod // 3600).tolist(), (sod // 60 % 60).tolist(),
+                            (sod % 60).tolist())]
+
+def EpochSecondsToReqTimes(seconds):
+
+ # Format an array of epoch seconds as request time strings, dropping fractions of a second
+ #
+ # Params:
+ #   seconds : in, required, type = float64 array
+ #   seconds since 1970-01-01
+ #
+ #   ReqTimes : out, required, type = list of strings
+
+  micros = np.round(np.asarray(seconds, dtype=np.float64) * 1e6).astype(np.int64)
+
+  return FormatReqTimes(np.datetime64(0, 'us') + micros.astype('timedelta64[us]'))
+
+def EpochSecondsToLightTimes(seconds):
+
+ # Format an array of epoch seconds as lighting time strings with milliseconds (YYYY/MM/DD HH:MM:SS.fff)
+ #
+ # Params:
+ #   seconds : in, required, type = float64 array
+ #   seconds since 1970-01-01
+ #
+ #   LightTimes : out, required, type = list of strings
+
+  millis = np.round(np.asarray(seconds, dtype=np.float64) * 1e3).astype(np.int64)
+  text   = np.datetime_as_string(np.datetime64(0, 'ms') + millis.astype('timedelta64[ms]'), unit='ms')
+
+  return [str(s).replace('-', '/').replace('T', ' ') for s in text]
+
+def EpochSecondsToEphTimes(seconds):
+
+ # Format an array of epoch seconds as ephemeris time strings, dropping fractions of a second
+ #
+ # Params:
+ #   seconds : in, required, type = float64 array
+ #   seconds since 1970-01-01
+ #
+ #   EphTimes : out, required, type = list of strings
+
+  whole = np.floor(np.asarray(seconds, dtype=np.float64)).astype(np.int64)
+  text  = np.datetime_as_string(np.datetime64(0, 's') + whole.astype('timedelta64[s]'), unit='s')
+
+  return [s[5:7] + '/' + s[8:10] + '/' + s[2:4] + ' ' + s[11:19] for s in (str(t) for t in text)]
+
+def EphToReqTimes(EphTimes):
+
+ # Convert a column of ephemeris time strings to request time strings, converting each distinct string once
+ #
+ # Params:
+ #   EphTimes : in, required, type = list of strings
+ #   ephemeris time strings (MM/DD/YY HH:MM:SS)
+ #
+ #   ReqTimes : out, required, type = list of strings
+
+  EphTimes = list(EphTimes)
+  missing  = sorted(set(s for s in EphTimes if s not in _ReqTimeMemo))
+
+  if missing:
+    if len(_ReqTimeMemo) + len(missing) > _MEMO_LIMIT:
+      _ReqTimeMemo.clear()
+
+    _ReqTimeMemo.update(zip(missing, FormatReqTimes(EphToDatetime64(missing))))
+
+  return [_ReqTimeMemo[s] for s in EphTimes]
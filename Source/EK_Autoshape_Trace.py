@@ -0,0 +1,389 @@
+# EarthKAM AutoShape Stage Trace
+# EK_Autoshape_Trace.py
+
+import csv
+import ctypes
+import json
+import os
+import platform
+import struct
+import time
+
+try:
+  import cProfile
+except ImportError:
+  import profile as cProfile
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+ #
+ # This file consists of functions shared by the AutoShape tools for instrumenting their stages. A trace opened
+ # by a tool records one row per stage and one row per orbit with:
+ #
+ #   wall, cpu      elapsed and CPU seconds. Stage CPU includes the CPU of the worker processes of its orbits
+ #   rowsRead       records of the shapefiles an orbit read
+ #   rowsWritten    records of the shapefiles an orbit wrote
+ #   files          files an orbit wrote
+ #   peakRSS        peak resident set size in bytes of the process that ran the stage or orbit
+ #
+ # A tool brackets each stage with BeginStage() and EndStage(). While a stage is open, RunOrbits() measures
+ # every orbit job it runs, in the worker process that runs it, and serial per-orbit loops measure their orbits
+ # with BeginOrbit() and EndOrbit(). Rows and files are counted from the shapefile (and .kmz) paths an orbit is
+ # given: a file changed by the orbit was written, an unchanged one was read. A directory counts the files
+ # written into it, which is only meaningful while the orbits of a stage run one at a time.
+ #
+ # At the end of a run ReportTrace() summarizes each stage in the geoprocessor messages and SaveTrace() writes
+ # every row to a .json or .csv trace file. A trace opened with a profile orbit also runs that orbit of every
+ # stage under cProfile and saves the statistics next to the trace file (orbNNNN_<stage>.prof), for reading
+ # with the pstats module.
+ #
+
+
+ # Columns of the trace rows, in the order written to csv trace files
+TRACE_FIELDS = ["stage", "orbit", "wall", "cpu", "rowsRead", "rowsWritten", "files", "peakRSS", "error"]
+
+ # Shapefile component extensions that are not counted as separate files
+_SIDECARS = ('.shx', '.dbf', '.prj', '.cpg', '.sbn', '.sbx', '.xml')
+
+ # Trace of the open stage, measured by RunOrbits() and BeginOrbit()
+_ACTIVE = None
+
+
+def PeakRSS():
+
+ # Return the peak resident set size of the current process
+ #
+ # Params:
+ #   peak : out, required, type = integer
+ #   peak resident set size (peak working set on Windows) in bytes, or None where it cannot be read
+
+  if resource is not None:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == 'Darwin' else peak * 1024
+
+  if os.name != 'nt':
+    return None
+
+  class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+    _fields_ = [("cb", ctypes.c_uint32), ("PageFaultCount", ctypes.c_uint32)] + \
+               [(name, ctypes.c_size_t) for name in ("PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                                                     "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                                                     "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+  counters = PROCESS_MEMORY_COUNTERS()
+  counters.cb = ctypes.sizeof(counters)
+
+  try:
+    process = ctypes.windll.kernel32.GetCurrentProcess
+    process.restype = ctypes.c_void_p
+
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.c_void_p(process()), ctypes.byref(counters), counters.cb):
+      return None
+  except (AttributeError, OSError):
+    return None
+
+  return counters.PeakWorkingSetSize
+
+def CPUTime():
+
+ # Return the user and system CPU seconds of the current process
+
+  t = os.times()
+
+  return t[0] + t[1]
+
+def _Records(path):
+
+ # Return the number of records of a shapefile from its dbf header, or 0 for other files
+
+  dbfPath = os.path.splitext(path)[0] + '.dbf'
+
+  if not path.lower().endswith('.shp') or not os.path.isfile(dbfPath):
+    return 0
+
+  with open(dbfPath, 'rb') as dbf:
+    return struct.unpack('<xxxxI', dbf.read(8))[0]
+
+def _Snapshot(paths):
+
+ # Return the size and modification time of each existing file of paths, expanding directories to their files
+
+  snapshot = {}
+
+  for path in paths:
+    files = [os.path.join(path, name) for name in os.listdir(path)] if os.path.isdir(path) else [path]
+
+    for name in files:
+      if os.path.isfile(name) and not name.lower().endswith(_SIDECARS):
+        st = os.stat(name)
+        snapshot[name] = (st.st_size, st.st_mtime)
+
+  return snapshot
+
+def OpenTrace(tracePath=None, profileOrbit=None):
+
+ # Open a trace for one tool run
+ #
+ # Params:
+ #   tracePath : in, optional, type = string
+ #   path to the .json or .csv trace file written by SaveTrace(). None only reports to the geoprocessor
+ #
+ #   profileOrbit : in, optional, type = integer
+ #   orbit number run under cProfile in every stage. Profiles are saved next to tracePath, or to the current
+ #   directory
+ #
+ #   trace : out, required, type = dictionary
+
+  profileDir = os.path.dirname(os.path.abspath(tracePath)) if tracePath else os.getcwd()
+
+  return {'path': tracePath or None, 'profileOrbit': profileOrbit or None, 'profileDir': profileDir,
+          'rows': [], 'stage': None}
+
+def BeginStage(trace, stage):
+
+ # Start measuring a stage. Orbits run before EndStage() are recorded under it
+ #
+ # Params:
+ #   trace : in, required, type = dictionary
+ #   trace returned by OpenTrace(), or None to do nothing
+ #
+ #   stage : in, required, type = string
+ #   stage name
+
+  global _ACTIVE
+
+  if trace is None:
+    return
+
+  trace['stage'] = {'name': stage, 'wall': time.time(), 'cpu': CPUTime(), 'first': len(trace['rows'])}
+
+  _ACTIVE = trace
+
+  return
+
+def EndStage(trace, rowsRead=None, rowsWritten=None, files=None, error=None):
+
+ # Finish measuring the open stage and add its row to the trace
+ #
+ # Params:
+ #   trace : in, required, type = dictionary
+ #   trace returned by OpenTrace(), or None to do nothing
+ #
+ #   rowsRead, rowsWritten, files : in, optional, type = integer
+ #   totals of the stage. Summed from its orbit rows when omitted
+ #
+ #   error : in, optional, type = string
+ #   error that stopped the stage
+
+  global _ACTIVE
+
+  if trace is None or trace['stage'] is None:
+    return
+
+  stage  = trace['stage']
+  orbits = trace['rows'][stage['first']:]
+  pid    = os.getpid()
+
+ # Orbits run by worker processes add their CPU to that of the calling process
+  cpu  = CPUTime() - stage['cpu'] + sum(row['cpu'] for row in orbits if row.get('pid') != pid)
+  peak = [p for p in [PeakRSS()] + [row['peakRSS'] for row in orbits] if p is not None]
+
+  trace['rows'].append({'stage': stage['name'], 'orbit': None,
+                        'wall': time.time() - stage['wall'], 'cpu': cpu,
+                        'rowsRead': rowsRead if rowsRead is not None else sum(row['rowsRead'] for row in orbits),
+                        'rowsWritten': rowsWritten if rowsWritten is not None else sum(row['rowsWritten'] for row in orbits),
+                        'files': files if files is not None else sum(row['files'] for row in orbits),
+                        'peakRSS': max(peak) if peak else None,
+                        'error': error})
+
+  trace['stage'] = None
+  _ACTIVE = None
+
+  return
+
+def OrbitProbe():
+
+ # Return what a worker process needs to measure the orbits of the open stage
+ #
+ # Params:
+ #   probe : out, required, type = tuple
+ #   (stage, profileOrbit, profileDir), or None when no stage is open
+
+  if _ACTIVE is None or _ACTIVE['stage'] is None:
+    return None
+
+  return (_ACTIVE['stage']['name'], _ACTIVE['profileOrbit'], _ACTIVE['profileDir'])
+
+def StartOrbit(probe, orbNum, paths=()):
+
+ # Start measuring one orbit, in the process that runs it
+ #
+ # Params:
+ #   probe : in, required, type = tuple
+ #   probe returned by OrbitProbe()
+ #
+ #   orbNum : in, required, type = integer
+ #   orbit number
+ #
+ #   paths : in, optional, type = list of strings
+ #   files and directories the orbit reads or writes
+ #
+ #   state : out, required, type = dictionary
+ #   measurement state passed to StopOrbit()
+
+  (stage, profileOrbit, profileDir) = probe
+
+  paths = [p for p in paths if p]
+
+  state = {'stage': stage, 'orbit': orbNum, 'paths': paths, 'before': _Snapshot(paths), 'profiler': None,
+           'profileDir': profileDir}
+
+  if profileOrbit is not None and int(orbNum) == int(profileOrbit):
+    state['profiler'] = cProfile.Profile()
+    state['profiler'].enable()
+
+  state['wall'] = time.time()
+  state['cpu']  = CPUTime()
+
+  return state
+
+def StopOrbit(state, error=None):
+
+ # Finish measuring one orbit
+ #
+ # Params:
+ #   state : in, required, type = dictionary
+ #   state returned by StartOrbit()
+ #
+ #   error : in, optional, type = string
+ #   error the orbit failed with
+ #
+ #   row : out, required, type = dictionary
+ #   trace row of the orbit
+
+  wall = time.time() - state['wall']
+  cpu  = CPUTime() - state['cpu']
+
+  if state['profiler'] is not None:
+    state['profiler'].disable()
+    state['profiler'].dump_stats(os.path.join(state['profileDir'], 'orb' + str(state['orbit']).zfill(4) + '_' +
+                                              state['stage'] + '.prof'))
+
+  before = state['before']
+  after  = _Snapshot(state['paths'])
+
+  written = [path for path in after if before.get(path) != after[path]]
+  read    = [path for path in after if before.get(path) == after[path]]
+
+  return {'stage': state['stage'], 'orbit': state['orbit'], 'wall': wall, 'cpu': cpu,
+          'rowsRead': sum(_Records(path) for path in read),
+          'rowsWritten': sum(_Records(path) for path in written),
+          'files': len(written), 'peakRSS': PeakRSS(), 'error': error, 'pid': os.getpid()}
+
+def AddOrbitRows(rows):
+
+ # Add orbit rows measured by StopOrbit() to the trace of the open stage
+
+  if _ACTIVE is not None:
+    _ACTIVE['rows'].extend(rows)
+
+  return
+
+def BeginOrbit(orbNum, paths=()):
+
+ # Start measuring one orbit of a serial per-orbit loop under the open stage
+ #
+ # Params:
+ #   orbNum : in, required, type = integer
+ #   orbit number
+ #
+ #   paths : in, optional, type = list of strings
+ #   files and directories the orbit reads or writes
+ #
+ #   state : out, required, type = dictionary
+ #   state passed to EndOrbit(), or None when no stage is open
+
+  probe = OrbitProbe()
+
+  return StartOrbit(probe, orbNum, paths) if probe is not None else None
+
+def EndOrbit(state, error=None):
+
+ # Finish measuring one orbit started by BeginOrbit() and add its row to the trace
+ #
+ # Params:
+ #   state : in, required, type = dictionary
+ #   state returned by BeginOrbit()
+ #
+ #   error : in, optional, type = string
+ #   error the orbit failed with
+
+  if state is not None:
+    AddOrbitRows([StopOrbit(state, error)])
+
+  return
+
+def ReportTrace(gp, trace):
+
+ # Report the stages of a trace to the geoprocessor messages
+ #
+ # Params:
+ #   gp : in, required, type = geoprocessor object
+ #   geoprocessor created by arcgisscripting
+ #
+ #   trace : in, required, type = dictionary
+ #   trace returned by OpenTrace(), or None to do nothing
+
+  if trace is None:
+    return
+
+  for row in trace['rows']:
+    if row['orbit'] is not None:
+      continue
+
+    orbits = [r for r in trace['rows'] if r['stage'] == row['stage'] and r['orbit'] is not None]
+    peak   = ', peak ' + str(int(row['peakRSS'] / 1048576.0)) + ' MB' if row['peakRSS'] is not None else ''
+
+    message = ('%s: %.2f s wall, %.2f s cpu, %d rows read, %d rows written, %d files%s' %
+               (row['stage'], row['wall'], row['cpu'], row['rowsRead'], row['rowsWritten'], row['files'], peak))
+
+    if orbits:
+      slowest = max(orbits, key=lambda r: r['wall'])
+      message += '. Slowest of %d orbits: %s (%.2f s)' % (len(orbits), str(slowest['orbit']).zfill(4), slowest['wall'])
+
+    gp.AddMessage(message)
+
+  if trace['path']:
+    gp.AddMessage("Trace written to " + trace['path'])
+
+  return
+
+def SaveTrace(trace):
+
+ # Write the rows of a trace to its trace file, as JSON or, for a .csv path, as csv
+ #
+ # Params:
+ #   trace : in, required, type = dictionary
+ #   trace returned by OpenTrace(), or None to do nothing
+
+  if trace is None or not trace['path']:
+    return
+
+  rows = [dict((key, row.get(key)) for key in TRACE_FIELDS) for row in trace['rows']]
+
+  if trace['path'].lower().endswith('.csv'):
+    with open(trace['path'], 'w') as f:
+      writer = csv.writer(f, lineterminator='\n')
+      writer.writerow(TRACE_FIELDS)
+
+      for row in rows:
+        writer.writerow(['' if row[key] is None else row[key] for key in TRACE_FIELDS])
+
+  else:
+    with open(trace['path'], 'w') as f:
+      json.dump({'profileOrbit': trace['profileOrbit'], 'rows': rows}, f, indent=1)
+
+  return
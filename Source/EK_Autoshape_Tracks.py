@@ -0,0 +1,456 @@
+# EarthKAM AutoShape Track Segment Engine
+# EK_Autoshape_Tracks.py
+
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from EK_Autoshape_Pool import RunOrbits
+from EK_Autoshape_Cache import ReadColumns
+from EK_Autoshape_Orbits import SEGMENT_DTYPE, FileOrbit, ReadPoints, Segments
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of functions and a command line program for building time-enabled polylines from
+ # point-arc ephemeris shapefiles without arcpy or the Tracking Analyst extension. Each consecutive pair of arc
+ # points becomes one two-vertex segment carrying the same D_KM, DURATION, SPP_KM_H and HEADING fields that
+ # TrackIntervalsToLine_ta produces, computed for the whole orbit with array math in a single pass.
+ #
+ # Densely sampled ephemeris puts many almost collinear points on the ground track. An optional tolerance
+ # simplifies the track with the Douglas-Peucker algorithm before the segments are built: the simplified track
+ # keeps only the vertices needed to stay within the tolerance (great circle distance in kilometers) of every
+ # point, and the points in between are dropped. Each span between two kept vertices becomes one segment, so the
+ # buffer stage has fewer segments to buffer and the footprints have fewer vertices. The Start_Time boundaries of
+ # the dropped points are kept in an OFFSETS field: the seconds from the span Start_Time of every point the span
+ # covers, so the request time of each of them is still known. A span covers at most MAX_SPAN_POINTS points,
+ # which keeps its offsets within the field. The maximum deviation of each orbit is returned for reporting.
+ #
+ # Command line usage, e.g. on a headless batch machine:
+ #   python EK_Autoshape_Tracks.py <MXX_Processed_Orbits directory> [--workers N] [--simplify KM] [--pipelined]
+ #
+
+
+ # Mean earth radius in kilometers used for haversine distances
+EARTH_RADIUS_KM = 6371.0088
+
+ # Fields written to each line shapefile, in TrackIntervalsToLine_ta order
+LINE_FIELDS = [("Start_Time", 'C', 24, 0),
+               ("End_Time",   'C', 24, 0),
+               ("D_KM",       'N', 19, 11),
+               ("DURATION",   'N', 19, 11),
+               ("SPP_KM_H",   'N', 19, 11),
+               ("HEADING",    'N', 19, 11)]
+
+ # Field added to the line shapefiles of a simplified track, holding the space separated offsets in seconds from
+ # the Start_Time of each point a span covers. It is carried on to the buffers by the swath engines
+OFFSETS_FIELD = ("OFFSETS", 'C', 254, 0)
+
+ # Largest number of points covered by one span of a simplified track. The offsets of an orbit stay below
+ # 100000 seconds, so those of this many points fit the OFFSETS field
+MAX_SPAN_POINTS = 42
+
+
+def BuildSegments(lon, lat, times):
+
+ # Compute distance, duration, speed and initial bearing for every consecutive pair of track points
+ #
+ # Params:
+ #   lon : in, required, type = float array
+ #   point longitudes in degrees, in track order
+ #
+ #   lat : in, required, type = float array
+ #   point latitudes in degrees, in track order
+ #
+ #   times : in, required, type = float array
+ #   point times in epoch seconds, in track order
+ #
+ #   (dist, duration, speed, heading) : out, required, type = tuple
+ #   tuple of n - 1 float64 arrays: haversine distance in kilometers, duration in seconds,
+ #   speed in kilometers per hour and initial bearing in degrees clockwise from north [0, 360)
+
+  lon   = np.radians(np.asarray(lon, dtype=np.float64))
+  lat   = np.radians(np.asarray(lat, dtype=np.float64))
+  times = np.asarray(times, dtype=np.float64)
+
+  (lon1, lon2) = (lon[:-1], lon[1:])
+  (lat1, lat2) = (lat[:-1], lat[1:])
+  dlon = lon2 - lon1
+
+ # Haversine great circle distance
+  h = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2.0) ** 2
+  dist = 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+  duration = np.diff(times)
+
+ # Speed is left at zero for repeated timestamps
+  speed = np.zeros_like(dist)
+  moving = duration > 0
+  speed[moving] = dist[moving] / duration[moving] * 3600.0
+
+ # Initial great circle bearing
+  y = np.sin(dlon) * np.cos(lat2)
+  x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+  heading = np.degrees(np.arctan2(y, x)) % 360.0
+
+  return (dist, duration, speed, heading)
+
+def _UnitVectors(lon, lat):
+
+ # Return the (n, 3) unit vectors of points given in degrees
+
+  lon = np.radians(lon)
+  lat = np.radians(lat)
+
+  return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def _Dot(u, v):
+
+ # Row-wise dot product of two (n, 3) arrays
+
+  return np.einsum('ij,ij->i', u, v)
+
+def _Angle(u, v):
+
+ # Row-wise angle in radians between two (n, 3) arrays of unit vectors
+
+  return np.arctan2(np.linalg.norm(np.cross(u, v), axis=1), _Dot(u, v))
+
+def _Foot(p, a, b):
+
+ # Return the unit normal of each great circle through a and b, whether it is defined, the signed distance of
+ # p from it (sine of the angle) and whether the foot of the perpendicular falls between a and b
+
+  normal = np.cross(a, b)
+  length = np.linalg.norm(normal, axis=1)
+  arc    = length > 1e-15
+
+  normal[arc] /= length[arc][:, np.newaxis]
+
+  side = _Dot(p, normal)
+  foot = p - side[:, np.newaxis] * normal
+  between = arc & (_Dot(np.cross(a, foot), normal) >= 0) & (_Dot(np.cross(foot, b), normal) >= 0)
+
+  return (foot, side, between)
+
+def TrackDeviation(p, a, b):
+
+ # Compute the great circle distance from points to the great circle arcs between pairs of points
+ #
+ # Params:
+ #   p : in, required, type = float64 array
+ #   (n, 3) unit vectors of the points
+ #
+ #   a, b : in, required, type = float64 arrays
+ #   (n, 3) unit vectors of the arc ends of each point
+ #
+ #   deviation : out, required, type = float64 array
+ #   distance of each point to its arc in kilometers
+
+  (foot, side, between) = _Foot(p, a, b)
+
+ # Distance to the great circle, used where the foot of the perpendicular falls between the arc ends
+  across = np.arcsin(np.clip(np.abs(side), 0.0, 1.0))
+  ends   = np.minimum(_Angle(p, a), _Angle(p, b))
+
+  return EARTH_RADIUS_KM * np.where(between, across, ends)
+
+def DecimateTrack(lon, lat, toleranceKm, maxSpanPoints=MAX_SPAN_POINTS):
+
+ # Select the vertices of the Douglas-Peucker simplification of a ground track
+ #
+ # Params:
+ #   lon, lat : in, required, type = float arrays
+ #   point coordinates in degrees, in track order
+ #
+ #   toleranceKm : in, required, type = float
+ #   largest distance in kilometers between a dropped point and the simplified track. 0 keeps every point
+ #
+ #   maxSpanPoints : in, optional, type = integer
+ #   largest number of points covered by a span of the simplified track, counting its first vertex
+ #
+ #   (keep, deviation) : out, required, type = tuple
+ #   boolean array of the simplified track vertices (always including the first and last point) and the
+ #   largest distance in kilometers of a dropped point from the simplified track
+
+  n    = len(lon)
+  keep = np.ones(n, dtype=bool)
+
+  if n < 3 or toleranceKm <= 0:
+    return (keep, 0.0)
+
+  points = _UnitVectors(np.asarray(lon, dtype=np.float64), np.asarray(lat, dtype=np.float64))
+  index  = np.arange(n)
+
+  keep[1:-1] = False
+
+ # Split every span whose farthest point exceeds the tolerance at that point, all spans at once, until none do
+  while True:
+    kept = np.flatnonzero(keep)
+    span = np.minimum(np.searchsorted(kept, index, side='right') - 1, len(kept) - 2)
+
+    deviation = TrackDeviation(points, points[kept[span]], points[kept[span + 1]])
+    deviation[keep] = 0.0
+
+    worst = np.maximum.reduceat(deviation, kept[:-1])
+
+ # Take the first farthest point of each span
+    split = np.flatnonzero((deviation > toleranceKm) & (deviation == worst[span]))
+    split = split[np.unique(span[split], return_index=True)[1]]
+
+ # Split spans that are within the tolerance but cover more than maxSpanPoints points
+    wide  = np.flatnonzero((kept[1:] - kept[:-1] > maxSpanPoints) & (worst <= toleranceKm))
+    split = np.concatenate((split, kept[wide] + maxSpanPoints))
+
+    if len(split) == 0:
+      break
+
+    keep[split] = True
+
+  return (keep, float(deviation.max()))
+
+def SpanOffsets(times, keep):
+
+ # Return the OFFSETS of each span of a simplified ground track
+ #
+ # Params:
+ #   times : in, required, type = float array
+ #   point times in epoch seconds, in track order
+ #
+ #   keep : in, required, type = boolean array
+ #   vertices of the simplified track returned by DecimateTrack()
+ #
+ #   offsets : out, required, type = list
+ #   one string per span holding the whole seconds from its first vertex of every point it covers, the first
+ #   vertex included and the last left to the next span, separated by spaces (e.g. '0 10 20')
+
+  kept = np.flatnonzero(keep)
+
+  if len(kept) < 2:
+    return []
+
+  times = np.asarray(times, dtype=np.float64)
+  first = kept[np.searchsorted(kept, np.arange(kept[-1]), side='right') - 1]
+
+  offsets = np.rint(times[:kept[-1]] - times[first]).astype(np.int64).tolist()
+
+  return [' '.join(str(o) for o in offsets[a:b]) for (a, b) in zip(kept[:-1].tolist(), kept[1:].tolist())]
+
+def ReadArc(arcFC):
+
+ # Read the points of a point-arc ephemeris shapefile in time order
+ #
+ # Params:
+ #   arcFC : in, required, type = string
+ #   path to the point-arc shapefile
+ #
+ #   (points, stamps) : out, required, type = tuple
+ #   POINT_DTYPE array returned by ReadPoints() and the list of TA_DATE strings of the points. The columns
+ #   are read from the columnar cache of the shapefile, the orbit number from the orbNNNN_arc.shp file name
+
+  points = ReadPoints(arcFC, FileOrbit(arcFC))
+
+  return (points, ReadColumns(arcFC)['stamp'][points['row']].tolist())
+
+def TrackSegments(points):
+
+ # Build the segments between consecutive points of a track
+ #
+ # Params:
+ #   points : in, required, type = POINT_DTYPE array
+ #   track points in time order
+ #
+ #   segments : out, required, type = SEGMENT_DTYPE array
+ #   one segment per consecutive pair of points, with the measures of BuildSegments()
+
+  segments = np.zeros(max(len(points) - 1, 0), dtype=SEGMENT_DTYPE)
+
+  if len(segments) == 0:
+    return segments
+
+  (segments['dist'], segments['duration'], segments['speed'], segments['heading']) = BuildSegments(
+    points['lon'], points['lat'], points['time'])
+
+  segments['orbit'] = points['orbit'][:-1]
+  segments['first'] = np.arange(len(segments))
+  segments['last']  = segments['first'] + 1
+  segments['lon1']  = points['lon'][:-1]
+  segments['lat1']  = points['lat'][:-1]
+  segments['lon2']  = points['lon'][1:]
+  segments['lat2']  = points['lat'][1:]
+
+  return segments
+
+def SimplifyArc(arcFC, toleranceKm):
+
+ # Simplify the ground track of a point-arc shapefile with DecimateTrack()
+ #
+ # Params:
+ #   arcFC : in, required, type = string
+ #   path to the point-arc shapefile
+ #
+ #   toleranceKm : in, required, type = float
+ #   simplification tolerance in kilometers
+ #
+ #   (kept, offsets, stats) : out, required, type = tuple
+ #   set of the file row indices (FID) of the simplified track vertices, the OFFSETS of each of its spans
+ #   returned by SpanOffsets(), and the (points, kept, deviation) statistics of the orbit as returned by
+ #   ExportLineNative()
+
+  points = ReadPoints(arcFC)
+
+  (keep, deviation) = DecimateTrack(points['lon'], points['lat'], toleranceKm)
+
+  return (set(points['row'][keep].tolist()), SpanOffsets(points['time'], keep),
+          (len(keep), int(keep.sum()), deviation))
+
+def ExportLineNative(arcFC, outLineFC, toleranceKm=0.0):
+
+ # Write one two-vertex polyline per consecutive pair of arc points or simplified track vertices, with
+ # TrackIntervalsToLine_ta fields
+ #
+ # Params:
+ #   arcFC : in, required, type = string
+ #   path to the point-arc shapefile being processed
+ #
+ #   outLineFC : in, required, type = string
+ #   path to the output polyline shapefile
+ #
+ #   toleranceKm : in, optional, type = float
+ #   simplify the track with DecimateTrack() first, writing one polyline per span between its vertices with the
+ #   OFFSETS of the points the span covers. 0 writes one polyline per pair of points
+ #
+ #   (points, kept, deviation) : out, required, type = tuple
+ #   number of arc points, number of vertices of the simplified track and the largest distance in kilometers
+ #   of a dropped point from it
+
+  args = (arcFC, outLineFC, toleranceKm)
+
+  return _WriteLine(_BuildLine(_ReadLine(*args), *args), *args)
+
+def _ReadLine(arcFC, outLineFC, toleranceKm=0.0):
+
+ # Read the points of one ExportLineNative() orbit
+
+  return ReadArc(arcFC)
+
+def _BuildLine(arc, arcFC, outLineFC, toleranceKm=0.0):
+
+ # Build the line features of one ExportLineNative() orbit from its points
+
+  (points, stamps) = arc
+
+  (keep, deviation) = DecimateTrack(points['lon'], points['lat'], toleranceKm)
+  kept = np.flatnonzero(keep).tolist()
+
+  shapes  = []
+  records = []
+
+  for s in Segments(TrackSegments(points[kept])):
+    shapes.append([[(s.lon1, s.lat1), (s.lon2, s.lat2)]])
+    records.append([stamps[kept[s.first]], stamps[kept[s.last]], s.dist, s.duration, s.speed, s.heading])
+
+ # Every span of a simplified track records the points it covers
+  if toleranceKm > 0:
+    for (record, offsets) in zip(records, SpanOffsets(points['time'], keep)):
+      record.append(offsets)
+
+  return (records, shapes, (len(keep), len(kept), deviation))
+
+def _WriteLine(line, arcFC, outLineFC, toleranceKm=0.0):
+
+ # Write the line features of one ExportLineNative() orbit and return its simplification statistics
+
+  (records, shapes, stats) = line
+
+  fields = LINE_FIELDS + [OFFSETS_FIELD] if toleranceKm > 0 else LINE_FIELDS
+
+  shp.WriteShapefile(outLineFC, shp.POLYLINE, fields, records, shapes, prj=arcFC)
+
+  return stats
+
+ # Read, compute and write parts of ExportLineNative() for RunPipeline()
+LINE_PARTS = (_ReadLine, _BuildLine, _WriteLine)
+
+def ExportLinesNative(procDir, workers=1, toleranceKm=0.0, stats=None, pipelined=False):
+
+ # Build line shapefiles for every point-arc shapefile in the processing directory
+ #
+ # Params:
+ #   procDir : in, required, type = string
+ #   path to the MXX_Processed_Orbits processing directory
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes
+ #
+ #   toleranceKm : in, optional, type = float
+ #   track simplification tolerance passed to ExportLineNative()
+ #
+ #   stats : in, optional, type = dictionary
+ #   filled with the (points, kept, deviation) statistics of each orbit number
+ #
+ #   pipelined : in, optional, type = boolean
+ #   overlap the reads and writes of consecutive orbits when running serially (see RunPipeline())
+ #
+ #   failures : out, required, type = list
+ #   list of (orbNum, error) tuples for each orbit that failed
+
+  lineDir_out = os.path.join(procDir, 'Line')
+
+  if not os.path.isdir(lineDir_out):
+    os.makedirs(lineDir_out)
+
+  jobs = [(FileOrbit(arcFC), (arcFC, os.path.join(lineDir_out, 'orb' + str(FileOrbit(arcFC)).zfill(4) + '_line.shp'),
+                               toleranceKm))
+          for arcFC in sorted(glob.glob(os.path.join(procDir, 'Arc', '*.shp')))]
+
+  return RunOrbits(ExportLineNative, jobs, workers, values=stats, pipeline=LINE_PARTS if pipelined else None)
+
+def SimplifySummary(stats, toleranceKm):
+
+ # Summarize the simplification statistics of a stage in one line
+ #
+ # Params:
+ #   stats : in, required, type = dictionary
+ #   (points, kept, deviation) statistics keyed on orbit number
+ #
+ #   toleranceKm : in, required, type = float
+ #   simplification tolerance in kilometers
+ #
+ #   message : out, required, type = string
+
+  points    = sum(s[0] for s in stats.values())
+  kept      = sum(s[1] for s in stats.values())
+  deviation = max([s[2] for s in stats.values()] or [0.0])
+
+ # Each orbit of n points has n - 1 segments to buffer
+  segments = sum(max(s[0] - 1, 0) for s in stats.values())
+  spans    = sum(max(s[1] - 1, 0) for s in stats.values())
+  dropped  = 100.0 * (segments - spans) / segments if segments else 0.0
+
+  return ('Simplify: ' + str(points) + ' track points reduced to ' + str(kept) + ' vertices in ' + str(len(stats)) +
+          ' orbit(s), ' + str(segments) + ' segments written as ' + str(spans) + ' (' + '%.1f' % dropped +
+          '% fewer), maximum deviation ' + '%.1f' % (deviation * 1000.0) + ' m (tolerance ' +
+          '%.1f' % (toleranceKm * 1000.0) + ' m)')
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Build orbit line shapefiles from point-arc shapefiles without arcpy.')
+  parser.add_argument('procDir', help='path to the MXX_Processed_Orbits directory')
+  parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+  parser.add_argument('--simplify', type=float, default=0.0, metavar='KM',
+                      help='drop track points within KM of the simplified track')
+  parser.add_argument('--pipelined', action='store_true',
+                      help='read the next orbit and write the previous one while the current one is built')
+  args = parser.parse_args()
+
+  stats = {}
+
+  for (orbNum, error) in ExportLinesNative(args.procDir, args.workers, args.simplify, stats, args.pipelined):
+    print('ExportLines: orbit ' + str(orbNum).zfill(4) + ' failed. ' + error)
+
+  if args.simplify > 0:
+    print(SimplifySummary(stats, args.simplify))
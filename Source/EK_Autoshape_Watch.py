@@ -0,0 +1,381 @@
+# EarthKAM AutoShape Watch Mode
+# EK_Autoshape_Watch.py
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from EK_Autoshape_Pool import RunOrbits
+from EK_Autoshape_Manifest import LoadManifest, SaveManifest, HashShapefile, Record, RunStale
+from EK_Autoshape_Arcs import ReadLightingCSV, SharedOrbits, ExportArcsNative
+from EK_Autoshape_Solar import EphemerisLighting, WriteLightingCSV
+from EK_Autoshape_Cache import ReadColumns
+from EK_Autoshape_Orbits import FileOrbit
+from EK_Autoshape_Swath import BufferDistanceKm
+from EK_Autoshape_Batch import FuseOrbitNative
+from EK_Autoshape_KMZ import ExportOrbitKMZ
+from EK_Autoshape_Index import LoadIndex
+
+ #
+ # This file consists of functions and a command line program for keeping the footprints of a live mission up
+ # to date while new STK coasting arc exports land in MXX_Raw_Orbits. The raw directory is polled every few
+ # seconds. A shapefile (or the lighting csv) is picked up once its files have kept the same size and time for
+ # one poll, so exports still being written are left alone.
+ #
+ # Each cycle only reprocesses what changed, using the content hashes of the rebuild manifest:
+ #
+ #   Raw   a coasting arc is split into point-arcs again when its contents changed or when any lighting
+ #         interval overlapping its time span changed (new or edited csv rows, or a sunlit interval that grew
+ #         as the next arc arrived). Intervals are compared with their orbit numbers, so renumbered rows count
+ #         as changed. A pass spanning coasting arcs is written by the arc holding most of it, which is split
+ #         again whenever another arc holding the pass is
+ #   Buff  orbits whose point-arc changed get a new line and formatted footprint, as in fused native runs of
+ #         the AutoShape tool, whose manifest entries they share
+ #   KMZ   orbits whose footprint changed get a new Orbit_NNNN.kmz in \Google
+ #
+ # The footprint index is refreshed after each cycle that rebuilt a footprint. An orbit that fails is reported
+ # once and retried only after its inputs change again.
+ #
+ # Point-arcs of orbits that disappear from the lighting intervals, and outputs of deleted coasting arcs, are
+ # left in place.
+ #
+ # Command line usage:
+ #   python EK_Autoshape_Watch.py <Mission_XX workspace> <MissionNum> <SwapLens> [--lighting CSV] [--offset N]
+ #                                [--geodesic] [--workers N] [--interval SEC] [--once]
+ #
+
+
+ # Seconds between polls of the raw directory
+POLL_SECONDS = 5.0
+
+ # Shapefile components that must be present and settled before a coasting arc is read
+_SHAPEFILE_PARTS = ('.shp', '.shx', '.dbf')
+
+
+def OpenWatch(workspace, MissionNum, SwapLens, lighting=None, orbitOffset=0, geodesic=False):
+
+ # Create the state of a watched mission
+ #
+ # Params:
+ #   workspace : in, required, type = string
+ #   path to the Mission_XX directory holding MXX_Raw_Orbits
+ #
+ #   MissionNum : in, required, type = integer
+ #   mission number
+ #
+ #   SwapLens : in, required, type = integer
+ #   index of the lens swap orbit
+ #
+ #   lighting : in, optional, type = string
+ #   subpoint lighting csv. The sunlit intervals are computed from the coasting arcs when None
+ #
+ #   orbitOffset : in, optional, type = integer
+ #   orbit number offset
+ #
+ #   geodesic : in, optional, type = boolean
+ #   offset the swath corners geodesically
+ #
+ #   watch : out, required, type = dictionary
+ #   state passed to PollMission()
+
+  prefix  = 'M' + str(MissionNum)
+  procDir = os.path.join(workspace, prefix + '_Processed_Orbits')
+
+  if not os.path.isdir(procDir):
+    os.makedirs(procDir)
+
+  return {'label':       prefix,
+          'rawDir':      os.path.join(workspace, prefix + '_Raw_Orbits'),
+          'procDir':     procDir,
+          'SwapLens':    SwapLens,
+          'lighting':    lighting,
+          'orbitOffset': orbitOffset,
+          'geodesic':    bool(geodesic),
+          'manifest':    LoadManifest(procDir),
+          'seen':        {},     # part stats of each file at the previous poll
+          'sources':     None,   # part stats of the files the current intervals were computed from
+          'intervals':   None,   # (starts, ends, numbers) lighting intervals
+          'failed':      {}}     # (stage, orbNum) to the inputs and params of its last failed attempt
+
+def _PartStats(path, parts):
+
+ # Return the size and modification time of each component of a file, or None while one is missing
+
+  base  = os.path.splitext(path)[0]
+  stats = []
+
+  for ext in parts:
+    if not os.path.isfile(base + ext):
+      return None
+
+    st = os.stat(base + ext)
+    stats.append((st.st_size, st.st_mtime))
+
+  return tuple(stats)
+
+def _Settled(watch, paths, parts):
+
+ # Return the paths whose components are present and unchanged since the previous poll
+
+  settled = []
+
+  for path in paths:
+    stats = _PartStats(path, parts)
+
+    if stats is not None and watch['seen'].get(path) == stats:
+      settled.append(path)
+
+    watch['seen'][path] = stats
+
+  return settled
+
+def _Intervals(watch, rawArcs):
+
+ # Return the numbered lighting intervals, recomputed only when the files they are read from changed
+
+  sources = [(path, watch['seen'][path]) for path in rawArcs]
+
+  if watch['lighting']:
+    sources.append((watch['lighting'], watch['seen'][watch['lighting']]))
+
+  if sources == watch['sources']:
+    return watch['intervals']
+
+  if watch['lighting']:
+    (starts, ends) = ReadLightingCSV(watch['lighting'])
+    baseOrbit = FileOrbit(rawArcs[0]) - 2 + watch['orbitOffset']
+    numbers   = baseOrbit + np.arange(len(starts), dtype=np.int64)
+  else:
+    (starts, ends, numbers) = EphemerisLighting(rawArcs, orbitOffset=watch['orbitOffset'])
+    WriteLightingCSV(os.path.join(watch['procDir'], watch['label'] + '_Lighting.csv'), starts, ends)
+
+  watch['sources']   = sources
+  watch['intervals'] = (starts, ends, numbers)
+
+  return watch['intervals']
+
+def _ArcIntervals(rawArc, intervals):
+
+ # Return the [orbNum, start, end] lighting intervals overlapping the time span of a coasting arc
+
+  (starts, ends, numbers) = intervals
+
+  times = np.asarray(ReadColumns(rawArc)['time'])
+  times = times[~np.isnan(times)]
+
+  if len(times) == 0:
+    return []
+
+  overlap = np.flatnonzero((starts <= times.max()) & (ends >= times.min()))
+
+  return [[int(numbers[i]), float(starts[i]), float(ends[i])] for i in overlap]
+
+def _ArcsCurrent(manifest, arcNum, inputs, procDir):
+
+ # Check whether a coasting arc was split from the same contents and intervals, and its point-arcs still exist
+
+  entry = manifest['stages'].get("Raw", {}).get(str(arcNum).zfill(4))
+
+  return (entry is not None and entry['inputs'] == inputs and
+          all(os.path.isfile(os.path.join(procDir, 'Arc', 'orb' + str(o).zfill(4) + '_arc.shp'))
+              for o in entry.get('orbits', [])))
+
+def _DropFailed(watch, stage, jobs):
+
+ # Leave out the jobs that already failed with the same inputs and parameters
+
+  return [job for job in jobs if watch['failed'].get((stage, job[0])) != (job[2], job[3])]
+
+def _NoteFailures(watch, stage, jobs, failures, report):
+
+ # Remember and report the jobs of a stage that failed
+
+  byOrbit = dict((job[0], job) for job in jobs)
+
+  for (orbNum, error) in failures:
+    watch['failed'][(stage, orbNum)] = (byOrbit[orbNum][2], byOrbit[orbNum][3])
+    report(watch['label'] + ' ' + stage + ': orbit ' + str(orbNum).zfill(4) + ' failed. ' + error)
+
+  return [(stage, orbNum, error) for (orbNum, error) in failures]
+
+def PollMission(watch, workers=1, progress=None):
+
+ # Process the settled changes of a watched mission once
+ #
+ # Params:
+ #   watch : in, required, type = dictionary
+ #   state returned by OpenWatch(), updated in place
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes
+ #
+ #   progress : in, optional, type = function
+ #   called with a one line message for each stage that rebuilt orbits and for each failure
+ #
+ #   (published, failures) : out, required, type = tuple
+ #   sorted orbit numbers whose KMZ was rewritten, and list of (stage, orbNum, error) tuples of new failures
+
+  report   = progress or (lambda message: None)
+  procDir  = watch['procDir']
+  manifest = watch['manifest']
+  failures = []
+
+  rawArcs = _Settled(watch, sorted(glob.glob(os.path.join(watch['rawDir'], '*.shp'))), _SHAPEFILE_PARTS)
+
+  if watch['lighting'] and not _Settled(watch, [watch['lighting']], ('.csv',)):
+    return ([], failures)
+
+  if not rawArcs:
+    return ([], failures)
+
+ # Split each coasting arc whose contents or overlapping lighting intervals changed
+  intervals = _Intervals(watch, rawArcs)
+
+  jobs    = []
+  sources = {}
+  stale   = []
+  shared  = None
+
+  for rawArc in rawArcs:
+    sources[rawArc] = {"CoastingArc": HashShapefile(manifest, rawArc), "Intervals": _ArcIntervals(rawArc, intervals)}
+
+    if not _ArcsCurrent(manifest, FileOrbit(rawArc), sources[rawArc], procDir):
+      stale.append(rawArc)
+
+ # The owner of a pass spanning coasting arcs writes it from all of them, so it is split again with the others
+  if stale:
+    shared = SharedOrbits(rawArcs, intervals[0], intervals[1], 0, intervals[2])
+    stale  = set(stale)
+    stale.update(owner for (owner, arcs) in shared.values() if stale.intersection(arcs))
+
+  for rawArc in rawArcs:
+    if rawArc in stale:
+      jobs.append((FileOrbit(rawArc),
+                   (rawArc, procDir, intervals[0], intervals[1], 0, intervals[2], shared), sources[rawArc], {},
+                   rawArc))
+
+  jobs    = _DropFailed(watch, "Raw", jobs)
+  written = {}
+  errors  = RunOrbits(ExportArcsNative, [job[:2] for job in jobs], workers, values=written)
+
+  for (arcNum, args, inputs, params, output) in jobs:
+    if arcNum in written:
+      Record(manifest, "Raw", arcNum, inputs, params)
+      manifest['stages']["Raw"][str(arcNum).zfill(4)]['orbits'] = written[arcNum]
+      report(watch['label'] + ' Raw: coasting arc ' + str(arcNum).zfill(4) + ' -> orbits ' +
+             ', '.join(str(o).zfill(4) for o in written[arcNum]))
+
+  failures += _NoteFailures(watch, "Raw", jobs, errors, report)
+
+  if jobs:
+    SaveManifest(procDir, manifest)
+
+ # Rebuild the footprint of each orbit whose point-arc changed
+  for folder in ('Line', 'Buff', 'Google'):
+    if not os.path.isdir(os.path.join(procDir, folder)):
+      os.makedirs(os.path.join(procDir, folder))
+
+  jobs = []
+
+  for arcFC in sorted(glob.glob(os.path.join(procDir, 'Arc', '*.shp'))):
+    current = FileOrbit(arcFC)
+    params  = {"buffKm": BufferDistanceKm(current, watch['SwapLens']), "native": True, "geodesic": watch['geodesic']}
+    jobs.append((current, (arcFC, procDir, watch['SwapLens'], watch['geodesic']), {"Arc": HashShapefile(manifest, arcFC)},
+                 params, os.path.join(procDir, 'Buff', 'orb' + str(current).zfill(4) + '_buff.shp')))
+
+  jobs  = _DropFailed(watch, "Buff", jobs)
+  built = {}
+
+  failures += _NoteFailures(watch, "Buff", jobs, RunStale(FuseOrbitNative, jobs, workers, manifest, procDir, "Buff",
+                                                          values=built), report)
+
+  if built:
+    report(watch['label'] + ' Buff: ' + str(len(built)) + ' footprint(s) rebuilt')
+    LoadIndex(procDir)
+
+ # Export the KMZ of each orbit whose footprint changed
+  jobs = []
+
+  for buffFC in sorted(glob.glob(os.path.join(procDir, 'Buff', '*.shp'))):
+    current = FileOrbit(buffFC)
+    outKMZ  = os.path.join(procDir, 'Google', 'Orbit_' + str(current).zfill(4) + '.kmz')
+    jobs.append((current, (buffFC, outKMZ), {"Buff": HashShapefile(manifest, buffFC)}, {}, outKMZ))
+
+  jobs      = _DropFailed(watch, "KMZ", jobs)
+  published = {}
+
+  failures += _NoteFailures(watch, "KMZ", jobs, RunStale(ExportOrbitKMZ, jobs, workers, manifest, procDir, "KMZ",
+                                                         values=published), report)
+
+  if published:
+    report(watch['label'] + ' KMZ: published orbits ' + ', '.join(str(o).zfill(4) for o in sorted(published)))
+
+  return (sorted(published), failures)
+
+def WatchMission(watch, workers=1, interval=POLL_SECONDS, progress=None, cycles=None):
+
+ # Poll a watched mission until interrupted
+ #
+ # Params:
+ #   watch : in, required, type = dictionary
+ #   state returned by OpenWatch()
+ #
+ #   workers : in, optional, type = integer
+ #   number of worker processes
+ #
+ #   interval : in, optional, type = float
+ #   seconds between polls
+ #
+ #   progress : in, optional, type = function
+ #   called with a one line progress message, see PollMission()
+ #
+ #   cycles : in, optional, type = integer
+ #   number of polls before returning. None polls until interrupted
+ #
+ #   failures : out, required, type = list
+ #   list of (stage, orbNum, error) tuples of every failure reported
+
+  failures = []
+  cycle    = 0
+
+  while cycles is None or cycle < cycles:
+    started = time.time()
+
+    failures += PollMission(watch, workers, progress)[1]
+    cycle    += 1
+
+    if cycles is None or cycle < cycles:
+      time.sleep(max(0.0, interval - (time.time() - started)))
+
+  return failures
+
+## Command line program ##
+
+if __name__ == '__main__':
+
+  parser = argparse.ArgumentParser(description='Keep the footprints of a live mission up to date as coasting arcs arrive.')
+  parser.add_argument('workspace', help='path to the Mission_XX directory holding MXX_Raw_Orbits')
+  parser.add_argument('MissionNum', type=int, help='mission number')
+  parser.add_argument('SwapLens', type=int, help='index of the lens swap orbit')
+  parser.add_argument('--lighting', help='subpoint lighting csv. Computed from the coasting arcs when omitted')
+  parser.add_argument('--offset', type=int, default=0, help='orbit number offset')
+  parser.add_argument('--geodesic', action='store_true', help='offset the swath corners geodesically')
+  parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+  parser.add_argument('--interval', type=float, default=POLL_SECONDS, help='seconds between polls')
+  parser.add_argument('--once', action='store_true', help='process the files already present and exit')
+  args = parser.parse_args()
+
+  def Progress(message):
+    print(time.strftime('%H:%M:%S') + ' ' + message)
+
+  watch = OpenWatch(args.workspace, args.MissionNum, args.SwapLens, args.lighting, args.offset, args.geodesic)
+
+  Progress(watch['label'] + ' Watch: polling ' + watch['rawDir'] + ' every ' + str(args.interval) + ' s')
+
+  try:
+    WatchMission(watch, args.workers, args.interval, Progress, 2 if args.once else None)
+  except KeyboardInterrupt:
+    Progress(watch['label'] + ' Watch: stopped')
@@ -0,0 +1,89 @@
+# EarthKAM AutoShape Test Fixtures
+# conftest.py
+
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from EK_Autoshape_Swath import BUFF_FIELDS
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of the pytest fixtures shared by the AutoShape checks. The mission fixture writes a small
+ # processing directory of unformatted buffer shapefiles, as left by BufferFOVNative(), whose footprints are
+ # random quadrilaterals and a square with a hole per orbit, so the footprint index and the coverage grid can be
+ # checked against a brute force point in polygon test.
+ #
+
+
+ # Orbits, footprints per orbit and extent (west, south, east, north) of the mission fixture
+MISSION_ORBITS = (1001, 1002, 1003)
+MISSION_FOOTPRINTS = 40
+MISSION_BOX = (-30.0, -20.0, 30.0, 20.0)
+
+
+def _Quad(rng):
+
+ # Return a random convex quadrilateral as a clockwise closed ring
+
+  (west, south, east, north) = MISSION_BOX
+  center = rng.uniform((west + 3, south + 3), (east - 3, north - 3))
+  angles = np.sort(rng.uniform(0, 2 * np.pi, 4))[::-1]
+  radius = rng.uniform(0.5, 3.0, 4)
+  ring   = [tuple(center + r * np.array([np.cos(a), np.sin(a)])) for (a, r) in zip(angles, radius)]
+
+  return [ring + ring[:1]]
+
+def _Donut(rng):
+
+ # Return a square with a square hole: a clockwise outer ring and a counterclockwise inner ring
+
+  (x, y) = rng.uniform((-20.0, -10.0), (20.0, 10.0))
+
+  outer = [(x - 4, y - 4), (x - 4, y + 4), (x + 4, y + 4), (x + 4, y - 4), (x - 4, y - 4)]
+  inner = [(x - 2, y - 2), (x + 2, y - 2), (x + 2, y + 2), (x - 2, y + 2), (x - 2, y - 2)]
+
+  return [outer, inner]
+
+def InsideShape(shape, lon, lat):
+
+ # Brute force even-odd test of points against every ring of a polygon shape, returning a boolean array
+
+  lon = np.asarray(lon, dtype=np.float64)
+  lat = np.asarray(lat, dtype=np.float64)
+  inside = np.zeros(lon.shape, dtype=bool)
+
+  for ring in shape:
+    for ((x1, y1), (x2, y2)) in zip(ring[:-1], ring[1:]):
+      if y1 == y2:
+        continue
+      crosses = ((y1 > lat) != (y2 > lat)) & (lon < x1 + (lat - y1) * (x2 - x1) / (y2 - y1))
+      inside ^= crosses
+
+  return inside
+
+@pytest.fixture
+def mission(tmpdir):
+
+ # Write the mission fixture, returning its processing directory and the (orbit, Start_Time, shape) footprints
+
+  rng = np.random.RandomState(26)
+  procDir = str(tmpdir.join('M1_Processed_Orbits'))
+  os.makedirs(os.path.join(procDir, 'Buff'))
+
+  epoch = datetime.datetime(2024, 3, 20)
+  footprints = []
+
+  for (n, orbNum) in enumerate(MISSION_ORBITS):
+    shapes = [_Quad(rng) for i in range(MISSION_FOOTPRINTS - 1)] + [_Donut(rng)]
+    stamps = [(epoch + datetime.timedelta(seconds=5400 * n + 60 * i)).strftime('%m/%d/%y %H:%M:%S')
+              for i in range(len(shapes))]
+
+    shp.WriteShapefile(os.path.join(procDir, 'Buff', 'orb' + str(orbNum) + '_buff.shp'), shp.POLYGON,
+                       BUFF_FIELDS, [[stamp] for stamp in stamps], shapes)
+
+    footprints.extend((orbNum, stamp, shape) for (stamp, shape) in zip(stamps, shapes))
+
+  return (procDir, footprints)
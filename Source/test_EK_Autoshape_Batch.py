@@ -0,0 +1,84 @@
+# EarthKAM AutoShape Batch Driver Checks
+# test_EK_Autoshape_Batch.py
+
+import glob
+import os
+import re
+
+import pytest
+
+from EK_Autoshape_Batch import ReadMissions, RunMissions, StageJobs
+from EK_Autoshape_Benchmark import GenerateMission
+
+ #
+ # This file consists of pytest checks of the batch driver on synthetic missions: the missions csv is read with
+ # its defaults, every stage of a mission hands its orbits to the next one, a mission that cannot be prepared
+ # stops without affecting the others, and a stage given the orbits of the one before only runs those orbits.
+ #
+
+
+def _Orbits(procDir, folder):
+
+ # Orbit numbers of the shapefiles or .kmz files in one folder of a processing directory
+
+  paths = glob.glob(os.path.join(procDir, folder, '*.shp')) + glob.glob(os.path.join(procDir, folder, '*.kmz'))
+
+  return sorted(int(re.search(r'\d{4}', os.path.basename(path)).group(0)) for path in paths)
+
+def testReadMissions(tmpdir):
+
+  missionsCSV = tmpdir.join('missions.csv')
+  missionsCSV.write('Workspace, MissionNum, SwapLens, Geodesic, Lighting\n'
+                    'C:\\Mission_1, 1, 1010, TRUE, \n'
+                    'C:\\Mission_2, 2, 2000, , C:\\M2_Lighting.csv\n')
+
+  missions = ReadMissions(str(missionsCSV))
+
+  assert missions[0] == {'workspace': 'C:\\Mission_1', 'MissionNum': 1, 'SwapLens': 1010, 'orbitOffset': 0,
+                         'lighting': None, 'geodesic': True}
+  assert missions[1]['lighting'] == 'C:\\M2_Lighting.csv'
+  assert missions[1]['geodesic'] is False
+
+@pytest.mark.parametrize('workers', [1, 2])
+def testRunMissions(tmpdir, workers):
+
+  (rawArcs, lightCSV, points) = GenerateMission(str(tmpdir), orbits=6, stepSec=30.0, arcOrbits=3)
+
+  missions = [{'workspace': str(tmpdir), 'MissionNum': 1, 'SwapLens': 1002, 'orbitOffset': 0,
+               'lighting': lightCSV, 'geodesic': False},
+              {'workspace': str(tmpdir.join('Mission_9')), 'MissionNum': 9, 'SwapLens': 0, 'orbitOffset': 0,
+               'lighting': None, 'geodesic': False}]
+  messages = []
+
+  failures = RunMissions(missions, workers, messages.append)
+
+ # The mission without coasting arcs stops at Daylight, and the other runs through every stage
+  assert [f[:3] for f in failures] == [('M9', 'Daylight', None)]
+  assert failures[0][3].startswith('IOError') or failures[0][3].startswith('OSError')
+
+  procDir = str(tmpdir.join('M1_Processed_Orbits'))
+  orbits  = _Orbits(procDir, 'Arc')
+
+  assert len(orbits) >= 5
+  assert _Orbits(procDir, 'Line') == orbits
+  assert _Orbits(procDir, 'Buff') == orbits
+  assert _Orbits(procDir, 'Google') == orbits
+  assert os.path.isfile(str(tmpdir.join('M1_Processed_Orbits', 'Google', 'Orbit_%04d.kmz' % orbits[0])))
+  assert 'M1 KML: ' + str(len(orbits)) + '/' + str(len(orbits)) + ' done' in messages
+
+def testStageGivenOrbits(tmpdir):
+
+  (rawArcs, lightCSV, points) = GenerateMission(str(tmpdir), orbits=3, stepSec=60.0, arcOrbits=3)
+
+  mission = {'workspace': str(tmpdir), 'MissionNum': 1, 'SwapLens': 0, 'orbitOffset': 0, 'lighting': lightCSV,
+             'geodesic': False}
+
+  for (func, orbNum, args) in StageJobs(mission, "Daylight"):
+    func(*args)
+
+  orbits = _Orbits(str(tmpdir.join('M1_Processed_Orbits')), 'Arc')
+
+ # Only the orbits that came out of the previous stage are run, and none of them when it produced nothing
+  assert [job[1] for job in StageJobs(mission, "AutoShape")] == orbits
+  assert [job[1] for job in StageJobs(mission, "AutoShape", orbits[1:])] == orbits[1:]
+  assert StageJobs(mission, "KML", []) == []
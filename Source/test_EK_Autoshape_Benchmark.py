@@ -0,0 +1,70 @@
+# EarthKAM AutoShape Benchmark Checks
+# test_EK_Autoshape_Benchmark.py
+
+import datetime
+import filecmp
+import math
+import os
+
+import pytest
+
+import EK_Autoshape_Benchmark as bench
+from EK_Autoshape_Lighting import WriteCalendarCSV
+
+ #
+ # This file consists of pytest checks of the benchmark: the synthetic mission is the same for the same
+ # arguments, every stage runs on a small mission, results compare stage by stage, and the Google Calendar csv
+ # timed by the export_gCal stage keeps the layout of the original tool.
+ #
+
+
+def testGenerateMissionIsDeterministic(tmpdir):
+
+  (first, firstCSV, points) = bench.GenerateMission(str(tmpdir.join('a')), orbits=4, stepSec=60.0, arcOrbits=3)
+  (second, secondCSV, again) = bench.GenerateMission(str(tmpdir.join('b')), orbits=4, stepSec=60.0, arcOrbits=3)
+
+  assert [os.path.basename(p) for p in first] == ['Coast_1000.shp', 'Coast_1003.shp']
+  assert points == again == int(math.ceil(3 * bench.ISS_PERIOD_S / 60.0)) + int(math.ceil(bench.ISS_PERIOD_S / 60.0))
+  assert filecmp.cmp(firstCSV, secondCSV, shallow=False)
+
+  for (a, b) in zip(first, second):
+    for ext in ('.shp', '.dbf'):
+      assert filecmp.cmp(a[:-4] + ext, b[:-4] + ext, shallow=False)
+
+def testRunBenchmark(tmpdir):
+
+  results = bench.RunBenchmark(str(tmpdir), orbits=3, stepSec=60.0, arcOrbits=3)
+
+  assert [s['stage'] for s in results['stages']] == [name for (name, prepare) in bench.STAGES]
+  assert all(s['error'] is None and s['rows'] > 0 for s in results['stages'])
+  assert results['config']['coastingArcs'] == 1
+
+ # A later run reuses the work directory, and other directories are refused
+  bench.RunBenchmark(str(tmpdir), orbits=1, stepSec=120.0)
+
+  tmpdir.mkdir('other').join('keep.txt').write('')
+
+  with pytest.raises(IOError):
+    bench.RunBenchmark(str(tmpdir.join('other')))
+
+def testCompareResults():
+
+  previous = {'stages': [{'stage': 'ReadCSV', 'wall': 2.0}, {'stage': 'FillOrbs', 'error': 'ValueError: x'}]}
+  results  = {'stages': [{'stage': 'ReadCSV', 'wall': 3.0}, {'stage': 'FillOrbs', 'wall': 1.0},
+                         {'stage': 'ExportArcs', 'wall': 1.0}]}
+
+  assert bench.CompareResults(previous, results) == [('ReadCSV', 2.0, 3.0, 1.5)]
+
+def testCalendarCSV(tmpdir):
+
+  start = datetime.datetime(2024, 3, 20, 23, 30, 5)
+  path  = str(tmpdir.join('M1_Calendar.csv'))
+
+  WriteCalendarCSV(path, [start, start + datetime.timedelta(hours=1.5)],
+                   [start + datetime.timedelta(minutes=45), start + datetime.timedelta(hours=2.25)], 1000)
+
+ # Bare \n line ends on every platform, as the original binary mode export wrote
+  with open(path, 'rb') as f:
+    assert f.read() == (b'Subject,Start Date,Start Time,End Date,End Time\n'
+                        b'Orbit 1000,03/20/2024,23:30:05,03/21/2024,00:15:05\n'
+                        b'Orbit 1001,03/21/2024,01:00:05,03/21/2024,01:45:05\n')
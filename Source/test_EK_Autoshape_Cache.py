@@ -0,0 +1,102 @@
+# EarthKAM AutoShape Columnar Cache Checks
+# test_EK_Autoshape_Cache.py
+
+import glob
+import os
+
+import numpy as np
+
+import EK_Autoshape_Cache as cache
+import EK_Autoshape_Shapefile as shp
+from EK_Autoshape_Time import EphToEpochSeconds
+
+ #
+ # This file consists of pytest checks of the columnar cache: the decoded columns of point and polyline
+ # shapefiles, one memory-mapped cache file per shapefile reused while the shapefile is unchanged, and a new
+ # cache file replacing the old one once the shapefile is rewritten, even when the old one cannot be removed.
+ #
+
+
+ARC_FIELDS = [("TA_DATE", 'C', 24, 0), ("OrbitNum", 'C', 24, 0)]
+STAMPS     = ['03/20/24 00:00:00', '03/20/24 00:00:10', '03/20/24 00:00:20']
+
+
+def _WriteArc(path, labels, mtime):
+
+ # Write a three point arc shapefile, the second point without a geometry, with a given modification time
+
+  shp.WriteShapefile(path, shp.POINT, ARC_FIELDS, [list(r) for r in zip(STAMPS, labels)],
+                     [(10.0, 20.0), None, (10.5, 20.5)])
+
+  for ext in ('.shp', '.shx', '.dbf'):
+    os.utime(os.path.splitext(path)[0] + ext, (mtime, mtime))
+
+  return path
+
+def _CacheFiles(tmpdir):
+
+ # Cache files of the test directory
+
+  return sorted(glob.glob(os.path.join(str(tmpdir), cache.CACHE_DIR, '*')))
+
+def testPointColumns(tmpdir):
+
+  path    = _WriteArc(str(tmpdir.join('orb1001_arc.shp')), ['Orbit 1001', '', 'Orbit 1001'], 1000000000)
+  columns = cache.ReadColumns(path)
+
+  assert sorted(columns) == ['label', 'stamp', 'time', 'x', 'y']
+  assert np.array_equal(columns['x'], [10.0, np.nan, 10.5], equal_nan=True)
+  assert columns['stamp'].tolist() == STAMPS
+  assert np.array_equal(columns['time'], EphToEpochSeconds(STAMPS))
+  assert columns['label'].tolist() == ['Orbit 1001', '', 'Orbit 1001']
+
+def testLineColumns(tmpdir):
+
+  path = str(tmpdir.join('orb1001_line.shp'))
+  shp.WriteShapefile(path, shp.POLYLINE, [("Start_Time", 'C', 24, 0)], [[STAMPS[0]], [STAMPS[1]]],
+                     [[[(0.0, 0.0), (1.0, 1.0), (2.0, 1.5)]], [[(2.0, 1.5), (3.0, 2.0)]]])
+
+  columns = cache.ReadColumns(path)
+
+  assert sorted(columns) == ['stamp', 'time', 'x1', 'x2', 'y1', 'y2']
+  assert columns['x2'].tolist() == [2.0, 3.0]
+  assert columns['y1'].tolist() == [0.0, 1.5]
+
+def testReusedWhileUnchanged(tmpdir):
+
+  path = _WriteArc(str(tmpdir.join('orb1001_arc.shp')), ['', '', ''], 1000000000)
+
+ # The first read decodes the shapefile, later reads map the single cache file
+  assert not isinstance(cache.ReadColumns(path)['time'], np.memmap)
+  assert isinstance(cache.ReadColumns(path)['time'], np.memmap)
+  assert len(_CacheFiles(tmpdir)) == 1
+
+def testRebuiltWhenChanged(tmpdir, monkeypatch):
+
+  path  = _WriteArc(str(tmpdir.join('orb1001_arc.shp')), ['', '', ''], 1000000000)
+  first = cache.ReadColumns(path)
+  old   = _CacheFiles(tmpdir)
+
+ # A label-only edit gets a new cache file and the old one is removed
+  _WriteArc(path, ['Orbit 1001'] * 3, 1000000100)
+
+  assert cache.ReadColumns(path)['label'].tolist() == ['Orbit 1001'] * 3
+  assert len(_CacheFiles(tmpdir)) == 1 and _CacheFiles(tmpdir) != old
+  assert first['label'].tolist() == ['', '', '']
+
+ # A cache that cannot be removed, like a mapped file on Windows, is left behind and cleaned up on the next build
+  def Locked(path):
+    raise OSError('in use')
+
+  current = _CacheFiles(tmpdir)
+  monkeypatch.setattr(cache.os, 'remove', Locked)
+  _WriteArc(path, ['Orbit 1002'] * 3, 1000000200)
+
+  assert cache.ReadColumns(path)['label'].tolist() == ['Orbit 1002'] * 3
+  assert len(_CacheFiles(tmpdir)) == 2
+
+  monkeypatch.undo()
+  _WriteArc(path, ['Orbit 1003'] * 3, 1000000300)
+
+  assert cache.ReadColumns(path)['label'].tolist() == ['Orbit 1003'] * 3
+  assert len(_CacheFiles(tmpdir)) == 1 and _CacheFiles(tmpdir) != current
@@ -0,0 +1,49 @@
+# EarthKAM AutoShape Coverage Grid Checks
+# test_EK_Autoshape_Coverage.py
+
+import numpy as np
+
+from EK_Autoshape_Coverage import BuildCoverage, LoadCoverage, CoverageSummary
+from EK_Autoshape_Time import EphToEpochSeconds
+from conftest import InsideShape, MISSION_BOX, MISSION_ORBITS
+
+ #
+ # This file consists of pytest checks of the scanline coverage grids against a brute force point in polygon
+ # test of every cell center: revisit counts the distinct orbits with a footprint containing the center, and
+ # the first pass is the earliest footprint containing it.
+ #
+
+
+def testRevisitAgainstPolygons(mission, tmpdir):
+
+  (procDir, footprints) = mission
+  outPath  = str(tmpdir.join('coverage.npz'))
+  coverage = BuildCoverage(procDir, 0.5, MISSION_BOX, outPath)
+
+  (west, south, east, north) = MISSION_BOX
+  (lat, lon) = np.mgrid[south + 0.25:north:0.5, west + 0.25:east:0.5]
+
+  revisit = np.zeros(lon.shape, dtype=np.int64)
+  first   = np.full(lon.shape, np.inf)
+  epoch   = EphToEpochSeconds([stamp for (num, stamp, shape) in footprints]).min()
+
+  for orbNum in MISSION_ORBITS:
+    seen = np.zeros(lon.shape, dtype=bool)
+
+    for (num, stamp, shape) in footprints:
+      if num == orbNum:
+        inside = InsideShape(shape, lon, lat)
+        seen  |= inside
+        first[inside] = np.minimum(first[inside], EphToEpochSeconds([stamp])[0] - epoch)
+
+    revisit += seen
+
+  assert revisit.max() > 1
+  assert np.array_equal(coverage['revisit'], revisit)
+  assert np.array_equal(coverage['coverage'], revisit > 0)
+  assert np.array_equal(coverage['firstPass'], np.where(np.isinf(first), -1, first))
+  assert np.array_equal(LoadCoverage(outPath)['revisit'], revisit)
+
+  assert coverage['cellsCovered'] == (revisit > 0).sum()
+  assert coverage['maxRevisit'] == revisit.max()
+  assert 'max %d orbits' % revisit.max() in CoverageSummary(coverage)
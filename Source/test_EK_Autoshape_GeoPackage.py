@@ -0,0 +1,203 @@
+# EarthKAM AutoShape GeoPackage Output Checks
+# test_EK_Autoshape_GeoPackage.py
+
+import os
+import struct
+
+import EK_Autoshape_GeoPackage as gpkg
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks of the mission GeoPackage: the geometry blobs and attributes of every
+ # layer decode back to the shapefiles they were packed from, the rtree triggers keep the spatial index in step
+ # with inserts, updates and deletes, repacking only replaces changed orbits, and dropped shapefiles stay packed.
+ #
+
+
+ARC_FIELDS  = [("TA_DATE", 'C', 24, 0), ("OrbitNum", 'C', 24, 0)]
+BUFF_FIELDS = [("OrbitNum", 'C', 24, 0), ("ReqTime", 'C', 24, 0), ("MDYTime", 'C', 24, 0)]
+
+
+def _Points(blob, offset, count):
+
+ # Read count little endian points from a WKB buffer
+
+  values = struct.unpack_from('<%dd' % (2 * count), blob, offset)
+
+  return ([(values[i], values[i + 1]) for i in range(0, len(values), 2)], offset + 16 * count)
+
+def _Decode(blob):
+
+ # Decode a GeoPackage blob written by GeometryBlob() into the shape it came from
+
+  flags  = struct.unpack_from('<B', blob, 3)[0]
+  offset = 8 + (32 if (flags >> 1) & 0x07 else 0)
+
+  (wkbType,) = struct.unpack_from('<I', blob, offset + 1)
+  offset += 5
+
+  if wkbType == 1:
+    return struct.unpack_from('<2d', blob, offset)
+
+  (parts,) = struct.unpack_from('<I', blob, offset)
+  offset += 4
+  shape = []
+
+  for i in range(parts):
+    offset += 5
+
+    if wkbType == 5:
+      (count,) = struct.unpack_from('<I', blob, offset)
+      (ring, offset) = _Points(blob, offset + 4, count)
+      shape.append(ring)
+    else:
+      (rings,) = struct.unpack_from('<I', blob, offset)
+      offset += 4
+
+      for j in range(rings):
+        (count,) = struct.unpack_from('<I', blob, offset)
+        (ring, offset) = _Points(blob, offset + 4, count)
+        shape.append(ring)
+
+  return shape
+
+def _WriteMission(procDir, orbits):
+
+ # Write the \Arc, \Line and \Buff shapefiles of a few orbits, the buffers with a second polygon holding a hole
+
+  for folder in ('Arc', 'Line', 'Buff'):
+    if not os.path.isdir(os.path.join(procDir, folder)):
+      os.makedirs(os.path.join(procDir, folder))
+
+  for orbNum in orbits:
+    x = float(orbNum - 1000)
+    label = 'Orbit ' + str(orbNum)
+
+    shp.WriteShapefile(os.path.join(procDir, 'Arc', 'orb%d_arc.shp' % orbNum), shp.POINT, ARC_FIELDS,
+                       [['03/20/24 00:00:00', label], ['03/20/24 00:00:10', label]], [(x, 1.0), (x + 0.5, 1.5)])
+    shp.WriteShapefile(os.path.join(procDir, 'Line', 'orb%d_line.shp' % orbNum), shp.POLYLINE,
+                       [("Start_Time", 'C', 24, 0), ("DURATION", 'N', 19, 11)],
+                       [['03/20/24 00:00:00', 10.0]], [[[(x, 1.0), (x + 0.5, 1.5)]]])
+    shp.WriteShapefile(os.path.join(procDir, 'Buff', 'orb%d_buff.shp' % orbNum), shp.POLYGON, BUFF_FIELDS,
+                       [[label, '2024/080/00:00:00', '03/20/24 00:00:00'],
+                        [label, '2024/080/00:00:10', '03/20/24 00:00:10']],
+                       [[[(x, 0.0), (x, 1.0), (x + 1.0, 1.0), (x + 1.0, 0.0), (x, 0.0)]],
+                        [[(x, 2.0), (x, 5.0), (x + 3.0, 5.0), (x + 3.0, 2.0), (x, 2.0)],
+                         [(x + 1.0, 3.0), (x + 2.0, 3.0), (x + 2.0, 4.0), (x + 1.0, 4.0), (x + 1.0, 3.0)]]])
+
+def _Shapefile(procDir, folder, orbNum):
+
+ # Path to one orbit shapefile of the mission
+
+  return os.path.join(procDir, folder, 'orb%d_%s.shp' % (orbNum, folder.lower()))
+
+def testRoundTrip(tmpdir):
+
+  procDir = str(tmpdir)
+  path    = str(tmpdir.join('M1_Mission.gpkg'))
+  _WriteMission(procDir, (1001, 1002))
+
+  assert gpkg.PackMission(procDir, path) == (6, 0)
+
+  conn = gpkg.Connect(path)
+
+  for (table, geometryType, folder) in gpkg.LAYERS:
+    for orbNum in (1001, 1002):
+      (fields, records, shapes) = shp.ReadShapefile(_Shapefile(procDir, folder, orbNum))
+      names = ', '.join('"%s"' % f[0] for f in fields)
+      rows  = conn.execute('SELECT geom, %s FROM "%s" WHERE orbit = ? ORDER BY fid' % (names, table),
+                           (orbNum,)).fetchall()
+
+      assert [list(row[1:]) for row in rows] == records
+      assert [_Decode(bytes(row[0])) for row in rows] == shapes
+
+  assert conn.execute('PRAGMA application_id').fetchone()[0] == 0x47504B47
+  conn.close()
+
+def testRtreeTriggers(tmpdir):
+
+  procDir = str(tmpdir)
+  path    = str(tmpdir.join('M1_Mission.gpkg'))
+  _WriteMission(procDir, (1001,))
+  gpkg.PackMission(procDir, path)
+
+  conn = gpkg.Connect(path)
+
+  def Envelopes():
+    return dict((row[0], tuple(row[1:]))
+                for row in conn.execute('SELECT id, minx, maxx, miny, maxy FROM rtree_buff_geom'))
+
+  assert Envelopes() == {1: (1.0, 2.0, 0.0, 1.0), 2: (1.0, 4.0, 2.0, 5.0)}
+
+ # Moving, nulling and deleting geometries outside the tools keeps the spatial index in step
+  blob = gpkg.GeometryBlob("MULTIPOLYGON", [[(7.0, 7.0), (7.0, 8.0), (9.0, 8.0), (9.0, 7.0), (7.0, 7.0)]],
+                           gpkg.WGS84_SRS_ID)[0]
+
+  with conn:
+    conn.execute('UPDATE buff SET geom = ? WHERE fid = 1', (blob,))
+  assert Envelopes()[1] == (7.0, 9.0, 7.0, 8.0)
+
+  with conn:
+    conn.execute('UPDATE buff SET geom = NULL WHERE fid = 1')
+  assert sorted(Envelopes()) == [2]
+
+  with conn:
+    conn.execute('DELETE FROM buff WHERE fid = 2')
+  assert Envelopes() == {}
+
+  conn.close()
+
+def testIncrementalRepack(tmpdir):
+
+  procDir = str(tmpdir)
+  path    = str(tmpdir.join('M1_Mission.gpkg'))
+  _WriteMission(procDir, (1001, 1002, 1003))
+
+  assert gpkg.PackMission(procDir, path) == (9, 0)
+  assert gpkg.PackMission(procDir, path) == (0, 0)
+
+ # A rewritten buffer replaces only its orbit, and a removed line removes its orbit
+  buffFC = _Shapefile(procDir, 'Buff', 1002)
+  shp.WriteShapefile(buffFC, shp.POLYGON, BUFF_FIELDS, [['Orbit 1002', 'a', 'b']],
+                     [[[(0.0, 0.0), (0.0, 1.0), (1.0, 1.0), (0.0, 0.0)]]])
+  os.utime(buffFC, (1000000000, 1000000000))
+  gpkg.DropShapefile(_Shapefile(procDir, 'Line', 1003))
+
+  assert gpkg.PackMission(procDir, path) == (1, 1)
+
+  conn = gpkg.Connect(path)
+
+  assert conn.execute('SELECT orbit, COUNT(*) FROM buff GROUP BY orbit').fetchall() == [(1001, 2), (1002, 1), (1003, 2)]
+  assert conn.execute('SELECT DISTINCT orbit FROM line ORDER BY orbit').fetchall() == [(1001,), (1002,)]
+  assert conn.execute('SELECT COUNT(*) FROM rtree_buff_geom').fetchone()[0] == 5
+
+  conn.close()
+
+def testDropKeepsPackedOrbits(tmpdir):
+
+  procDir = str(tmpdir)
+  path    = str(tmpdir.join('M1_Mission.gpkg'))
+  _WriteMission(procDir, (1001, 1002))
+
+ # Packing keeps the shapefiles unless asked to drop them
+  gpkg.PackMission(procDir, path)
+
+  assert os.path.isfile(_Shapefile(procDir, 'Buff', 1001))
+
+  assert gpkg.PackMission(procDir, path, drop=True) == (0, 0)
+  assert os.listdir(os.path.join(procDir, 'Buff')) == []
+
+ # Dropped orbits stay packed, and a rebuilt orbit replaces its dropped layer
+  _WriteMission(procDir, (1002,))
+  for folder in ('Arc', 'Line'):
+    gpkg.DropShapefile(_Shapefile(procDir, folder, 1002))
+
+  assert gpkg.PackMission(procDir, path) == (1, 0)
+
+  conn = gpkg.Connect(path)
+
+  assert conn.execute('SELECT orbit, COUNT(*) FROM buff GROUP BY orbit').fetchall() == [(1001, 2), (1002, 2)]
+  assert conn.execute('SELECT layer, orbit, dropped FROM autoshape_sources ORDER BY layer, orbit').fetchall() == [
+      ('arc', 1001, 1), ('arc', 1002, 1), ('buff', 1001, 1), ('buff', 1002, 0), ('line', 1001, 1), ('line', 1002, 1)]
+
+  conn.close()
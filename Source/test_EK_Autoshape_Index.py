@@ -0,0 +1,146 @@
+# EarthKAM AutoShape Footprint Index Checks
+# test_EK_Autoshape_Index.py
+
+import datetime
+import os
+
+import numpy as np
+
+from EK_Autoshape_Index import (BuildIndex, IndexCurrent, LoadIndex, QueryPoints, QueryTime, QueryTimes,
+                                TimeSeconds, _Descend)
+from EK_Autoshape_Orbits import OrbitLabel
+import EK_Autoshape_Shapefile as shp
+from conftest import InsideShape, MISSION_BOX, MISSION_FOOTPRINTS
+
+ #
+ # This file consists of pytest checks of the packed STR R-tree of the footprint index against brute force: the
+ # tree descent must return exactly the footprints whose bounding boxes intersect each query box, and point
+ # queries exactly the footprints whose rings contain each point. Time queries return exactly the footprints
+ # whose span, from their start to the start of the next footprint of their orbit, meets each time range. The
+ # saved index is reused until a buffer shapefile changes.
+ #
+
+
+def _Key(index, feat):
+
+ # Return the (orbit, MDYTime) keys of indexed footprints
+
+  return [(int(index['orbit'][i]), str(index['mdyTime'][i])) for i in feat]
+
+def testDescendAgainstBoxes(mission):
+
+  (procDir, footprints) = mission
+  index = BuildIndex(procDir)
+
+  rng = np.random.RandomState(7)
+  (west, south, east, north) = MISSION_BOX
+  lo  = rng.uniform((west, south), (east, north), (300, 2))
+  box = np.column_stack((lo, lo + rng.uniform(0.0, 8.0, (300, 2))))
+
+  (query, feat) = _Descend(index, box)
+  found = set(zip(query.tolist(), _Key(index, feat)))
+
+  expected = set()
+
+  for (orbNum, stamp, shape) in footprints:
+    points = np.asarray([p for ring in shape for p in ring])
+    (xmin, ymin) = points.min(axis=0)
+    (xmax, ymax) = points.max(axis=0)
+
+    for q in np.flatnonzero((box[:, 0] <= xmax) & (box[:, 2] >= xmin) & (box[:, 1] <= ymax) & (box[:, 3] >= ymin)):
+      expected.add((int(q), (orbNum, stamp)))
+
+  assert found == expected
+
+def testPointsAgainstPolygons(mission):
+
+  (procDir, footprints) = mission
+  index = LoadIndex(procDir)
+
+  rng = np.random.RandomState(11)
+  (west, south, east, north) = MISSION_BOX
+  lon = rng.uniform(west, east, 2000)
+  lat = rng.uniform(south, north, 2000)
+
+  (query, feat) = QueryPoints(index, lon, lat)
+  found = set(zip(query.tolist(), _Key(index, feat)))
+
+  expected = set()
+
+  for (orbNum, stamp, shape) in footprints:
+    expected.update((int(q), (orbNum, stamp)) for q in np.flatnonzero(InsideShape(shape, lon, lat)))
+
+  assert len(expected) > 0
+  assert found == expected
+
+def _Seconds(stamp):
+
+ # Brute force seconds since 1970-01-01 of an MDYTime stamp
+
+  return (datetime.datetime.strptime(stamp, '%m/%d/%y %H:%M:%S') - datetime.datetime(1970, 1, 1)).total_seconds()
+
+def testTimesAgainstSpans(mission):
+
+  (procDir, footprints) = mission
+  index = LoadIndex(procDir)
+
+ # Footprints are a minute apart, so each spans a minute, the last of an orbit included
+  starts = [_Seconds(stamp) for (orbNum, stamp, shape) in footprints]
+  (first, last) = (min(starts), max(starts))
+
+  rng  = np.random.RandomState(25)
+  tmin = rng.uniform(first - 600.0, last + 600.0, 500)
+  tmax = tmin + np.where(rng.uniform(size=500) < 0.3, 0.0, rng.uniform(0.0, 400.0, 500))
+
+ # Points in time on the start and on the end of a span
+  tmin[:2] = tmax[:2] = (starts[5], starts[5] + 60.0)
+
+  (query, feat) = QueryTimes(index, tmin, tmax)
+  found = list(zip(query.tolist(), _Key(index, feat)))
+
+  expected = sorted((int(q), (orbNum, stamp), start) for ((orbNum, stamp, shape), start) in zip(footprints, starts)
+                    for q in np.flatnonzero((start <= tmax) & (start + 60.0 > tmin)))
+
+  assert len(expected) > 0
+  assert found == [(q, key) for (q, key, start) in sorted(expected, key=lambda e: (e[0], e[2]))]
+  assert [key for (q, key) in found if q == 0] == [(footprints[5][0], footprints[5][1])]
+  assert [key for (q, key) in found if q == 1] == [(footprints[6][0], footprints[6][1])]
+
+def testTimeStrings(mission):
+
+  (procDir, footprints) = mission
+  index = LoadIndex(procDir)
+  (orbNum, stamp, shape) = footprints[MISSION_FOOTPRINTS + 3]
+
+ # The 4th footprint of the 2nd orbit starts 90 minutes and 3 minutes after the first, on day 80 of 2024
+  assert TimeSeconds(stamp) == TimeSeconds(' 2024/080/01:33:00 ') == _Seconds(stamp)
+
+  matches = QueryTime(index, '2024/080/01:33:30')
+
+  assert [m[:3] for m in matches] == [(OrbitLabel(orbNum), '2024/080/01:33:00', stamp)]
+  assert [np.allclose(a, b) for (a, b) in zip(matches[0][3], shape)] == [True] * len(shape)
+
+ # A range in seconds takes every footprint it meets, and the gap between orbits none
+  assert [m[2] for m in QueryTime(index, _Seconds(stamp) - 60.0, _Seconds(stamp) + 60.0)] == \
+         [s for (n, s, f) in footprints[MISSION_FOOTPRINTS + 2:MISSION_FOOTPRINTS + 5]]
+  assert QueryTime(index, '03/20/24 01:00:00', '03/20/24 01:29:59') == []
+
+def testRebuiltWhenBuffersChange(mission):
+
+  (procDir, footprints) = mission
+  buffFC = os.path.join(procDir, 'Buff', 'orb1002_buff.shp')
+
+  assert not IndexCurrent(procDir)
+
+  LoadIndex(procDir)
+
+  assert IndexCurrent(procDir)
+
+ # Rewriting one orbit with a footprint less makes the index stale, and the reloaded index drops the footprint
+  (fields, records, shapes) = shp.ReadShapefile(buffFC)
+  shp.WriteShapefile(buffFC, shp.POLYGON, fields, records[1:], shapes[1:])
+  os.utime(buffFC, (1000000000, 1000000000))
+
+  assert not IndexCurrent(procDir)
+  assert len(LoadIndex(procDir)['orbit']) == len(footprints) - 1
+  assert IndexCurrent(procDir)
@@ -0,0 +1,173 @@
+# EarthKAM AutoShape KMZ Writer Checks
+# test_EK_Autoshape_KMZ.py
+
+import math
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import EK_Autoshape_KMZ as kmz
+import EK_Autoshape_Shapefile as shp
+from EK_Autoshape_Swath import DissolveRings, FORMATTED_FIELDS, SwathPolygons
+
+ #
+ # This file consists of pytest checks of the native KMZ writer: every footprint of a buffer shapefile becomes one
+ # placemark with its attributes, pipelined per-orbit archives match the streamed ones, and a regionated archive
+ # links every tile from the root, keeps every full resolution footprint in a leaf tile, and outlines the coarse
+ # runs of a curved pass without filling the inside of the curve.
+ #
+
+
+KML = '{http://www.opengis.net/kml/2.2}'
+
+
+def _WriteBuffer(path, orbNum, lon, lat):
+
+ # Write a native buffer shapefile of 17 km swaths along a track, one footprint per 10 second segment
+
+  n     = len(lon) - 1
+  rings = SwathPolygons(np.array(lon[:-1]), np.array(lat[:-1]), np.array(lon[1:]), np.array(lat[1:]), 17.0)
+  times = ['2024/080/00:%02d:%02d' % divmod(10 * i, 60) for i in range(n)]
+
+  (records, shapes) = DissolveRings(rings, times)
+  records = [['Orbit ' + str(orbNum).zfill(4), t, 't%d' % i] for (i, (t,)) in enumerate(records)]
+
+  shp.WriteShapefile(path, shp.POLYGON, FORMATTED_FIELDS, records, shapes)
+
+  return path
+
+def _Arc(n, lon0=0.0, radius=10.0):
+
+ # Quarter circle track of n points starting at (lon0, 0), turning from north to east around a center radius
+ # degrees further east
+
+  angles = np.linspace(math.pi, math.pi / 2, n)
+
+  return (list(lon0 + radius + radius * np.cos(angles)), list(radius * np.sin(angles)))
+
+def _Documents(path):
+
+ # Parse every .kml file of a .kmz archive
+
+  with zipfile.ZipFile(path) as archive:
+    return dict((name, ET.fromstring(archive.read(name))) for name in archive.namelist())
+
+def _Rings(placemark):
+
+ # Coordinates of the outer boundaries of a placemark
+
+  return [[tuple(float(v) for v in p.split(',')) for p in c.text.split()]
+          for c in placemark.iter(KML + 'coordinates')]
+
+def testOrbitKMZ(tmpdir):
+
+  buffFC = _WriteBuffer(str(tmpdir.join('orb1001_buff.shp')), 1001, *_Arc(8))
+  outKMZ = str(tmpdir.join('Orbit_1001.kmz'))
+
+  kmz.ExportOrbitKMZ(buffFC, outKMZ)
+
+  doc        = _Documents(outKMZ)['doc.kml']
+  placemarks = list(doc.iter(KML + 'Placemark'))
+
+  assert doc.find(KML + 'Document/' + KML + 'name').text == 'Orbit_1001'
+  assert [p.find(KML + 'name').text for p in placemarks] == ['2024/080/00:%02d:%02d' % divmod(10 * i, 60)
+                                                             for i in range(7)]
+  assert [d.text for d in placemarks[2].iter(KML + 'value')] == ['Orbit 1001', '2024/080/00:00:20', 't2']
+
+def testPipelinedMatchesStreamed(tmpdir):
+
+  buffFCs = [_WriteBuffer(str(tmpdir.join('orb%d_buff.shp' % orbNum)), orbNum, *_Arc(6, lon0=orbNum - 1000.0))
+             for orbNum in (1001, 1002, 1003)]
+
+  for (folder, pipelined) in (('a', False), ('b', True)):
+    tmpdir.mkdir(folder)
+    assert kmz.ExportOrbitKMZs(buffFCs, str(tmpdir.join(folder)), pipelined) == []
+
+  for orbNum in (1001, 1002, 1003):
+    name = 'Orbit_%d.kmz' % orbNum
+    with zipfile.ZipFile(str(tmpdir.join('a', name))) as a, zipfile.ZipFile(str(tmpdir.join('b', name))) as b:
+      assert a.read('doc.kml') == b.read('doc.kml')
+
+def testMissionKMZ(tmpdir):
+
+  buffFCs = [_WriteBuffer(str(tmpdir.join('orb%d_buff.shp' % orbNum)), orbNum, *_Arc(5)) for orbNum in (1002, 1001)]
+  outKMZ  = str(tmpdir.join('M1.kmz'))
+
+  kmz.ExportMissionKMZ(buffFCs, outKMZ, 'M1')
+
+  folders = list(_Documents(outKMZ)['doc.kml'].iter(KML + 'Folder'))
+
+  assert [f.find(KML + 'name').text for f in folders] == ['Orbit 1001', 'Orbit 1002']
+  assert [len(f.findall(KML + 'Placemark')) for f in folders] == [4, 4]
+
+def _Regionate(tmpdir, buffFCs, name):
+
+ # Write a regionated .kmz and return its parsed documents, checking every linked tile exists
+
+  outKMZ = str(tmpdir.join(name))
+
+  kmz.ExportRegionatedKMZ(buffFCs, outKMZ, 'M1', depth=2, segmentsPerOutline=4)
+
+  docs  = _Documents(outKMZ)
+  links = [l.text for doc in docs.values() for l in doc.iter(KML + 'href')]
+
+  assert links[0] == 'tiles/0_0_0.kml'
+  assert sorted(['tiles/' + l for l in links[1:]] + [links[0]]) == sorted(n for n in docs if n != 'doc.kml')
+
+  return docs
+
+def testRegionatedTiles(tmpdir, monkeypatch):
+
+  buffFCs = [_WriteBuffer(str(tmpdir.join('orb%d_buff.shp' % orbNum)), orbNum, *_Arc(33, lon0=orbNum - 1000.0))
+             for orbNum in (1001, 1002)]
+
+  docs = _Regionate(tmpdir, buffFCs, 'a.kmz')
+
+ # Every footprint sits in exactly one leaf tile, with its attributes
+  leaves = [p for (name, doc) in docs.items() if name.startswith('tiles/2_') for p in doc.iter(KML + 'Placemark')]
+
+  assert len(leaves) == 64
+  assert all(len(p.findall('.//' + KML + 'Data')) == 3 for p in leaves)
+
+ # Coarse outlines of 4 and 8 segments per orbit on levels 1 and 0
+  coarse = [p.find(KML + 'name').text for (name, doc) in docs.items() if re.match(r'tiles/[01]_', name)
+            for p in doc.iter(KML + 'Placemark')]
+
+  assert len(coarse) == 2 * (8 + 4)
+  assert 'Orbit 1001 2024/080/00:00:00 - 2024/080/00:00:30' in coarse
+
+ # Buffering placemarks a few at a time writes the same tiles
+  monkeypatch.setattr(kmz, 'KMZ_TILE_BUFFER', 1000)
+
+  small = _Regionate(tmpdir, buffFCs, 'b.kmz')
+
+  assert sorted(docs) == sorted(small)
+  assert all(ET.tostring(docs[name]) == ET.tostring(small[name]) for name in docs)
+
+def testOutlineFollowsCurve():
+
+ # A run of native swaths around a quarter circle of radius 10 degrees
+  (lon, lat) = _Arc(17)
+  rings      = SwathPolygons(np.array(lon[:-1]), np.array(lat[:-1]), np.array(lon[1:]), np.array(lat[1:]), 17.0)
+  ring       = kmz._RunOutline([[tuple(p) for p in r[:4].tolist()] for r in rings])
+
+  assert ring[0] == ring[-1]
+  assert kmz._SignedArea(ring) < 0
+
+ # Every vertex stays within the swath half width of the track circle, so the center of the curve, which a hull
+ # of the run would cover, is left out
+  distances = [math.hypot(x - 10.0, y) for (x, y) in ring]
+
+  assert max(abs(d - 10.0) for d in distances) < 0.25
+
+def testOutlineAcrossAntimeridian(tmpdir):
+
+  buffFC = _WriteBuffer(str(tmpdir.join('orb1001_buff.shp')), 1001, [179.0, 179.5, -180.0, -179.5, -179.0], [0.0] * 5)
+
+  docs = _Regionate(tmpdir, [buffFC], 'c.kmz')
+
+  for p in docs['tiles/0_0_0.kml'].iter(KML + 'Placemark'):
+    xs = [x for ring in _Rings(p) for (x, y) in ring]
+    assert max(xs) - min(xs) < 5.0
@@ -0,0 +1,131 @@
+# EarthKAM AutoShape Lens Schedule Checks
+# test_EK_Autoshape_Lenses.py
+
+import datetime
+import os
+
+import pytest
+
+import EK_Autoshape_Lenses as lenses
+from EK_Autoshape_Manifest import LoadManifest
+from EK_Autoshape_Swath import BufferOrbitNative, KM_PER_DEG
+from EK_Autoshape_Tracks import LINE_FIELDS
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks of the lens schedule: schedule csv files are read with open orbit ranges
+ # and rejected when a lens could not be written or buffered, each orbit gets the lenses whose ranges hold it, and
+ # the lens footprints of an orbit are the formatted buffers of each of its lenses, serially, pipelined and
+ # rebuilt only when the line or the lenses of an orbit change.
+ #
+
+
+EPOCH = datetime.datetime(2024, 3, 20)
+
+
+def _WriteLines(procDir, orbits):
+
+ # Write a \Line shapefile of 4 one minute segments heading east along the equator for each orbit
+
+  lineDir = os.path.join(procDir, 'Line')
+
+  if not os.path.isdir(lineDir):
+    os.makedirs(lineDir)
+
+  for orbNum in orbits:
+    x0     = float(orbNum - 1000) * 10.0
+    stamps = [(EPOCH + datetime.timedelta(minutes=orbNum - 1000 + i)).strftime('%m/%d/%y %H:%M:%S')
+              for i in range(5)]
+
+    shp.WriteShapefile(os.path.join(lineDir, 'orb%d_line.shp' % orbNum), shp.POLYLINE, LINE_FIELDS,
+                       [[stamps[i], stamps[i + 1], 0.5 * KM_PER_DEG, 60.0, 0.0, 90.0] for i in range(4)],
+                       [[[(x0 + 0.5 * i, 0.0), (x0 + 0.5 * (i + 1), 0.0)]] for i in range(4)])
+
+def _Schedule(tmpdir, text):
+
+ # Write a schedule csv and read it back
+
+  scheduleCSV = tmpdir.join('schedule.csv')
+  scheduleCSV.write(text)
+
+  return lenses.ReadLensSchedule(str(scheduleCSV))
+
+def testReadLensSchedule(tmpdir):
+
+  schedule = _Schedule(tmpdir, 'Lens, FirstOrbit, LastOrbit, BuffKm, Note\n'
+                               '50mm, , 1010, 56, wide\n'
+                               ', , , , \n'
+                               '180mm, 1005, , 17.5, \n')
+
+  assert schedule == [('50mm', None, 1010, 56.0), ('180mm', 1005, None, 17.5)]
+
+  for (row, message) in (('A' * 25 + ', 1, 2, 10', 'longer than 24 characters'),
+                         ('Zero, 1, 2, 0', 'expected a positive distance'),
+                         ('Back, 5, 2, 10', 'ends at orbit 2 before it starts at 5')):
+    with pytest.raises(ValueError) as error:
+      _Schedule(tmpdir, 'Lens,FirstOrbit,LastOrbit,BuffKm\n' + row + '\n')
+
+    assert message in str(error.value)
+
+  with pytest.raises(ValueError):
+    _Schedule(tmpdir, 'Lens,FirstOrbit,LastOrbit,BuffKm\n')
+
+def testOrbitLenses():
+
+  schedule = [('Wide', None, 1002, 56.0), ('Zoom', 1002, 1003, 8.0), ('Wide', 1002, None, 56.0)]
+
+  assert lenses.OrbitLenses(schedule, 1001) == [['Wide', 56.0]]
+  assert lenses.OrbitLenses(schedule, 1002) == [['Wide', 56.0], ['Zoom', 8.0]]
+  assert lenses.OrbitLenses(schedule, 1004) == [['Wide', 56.0]]
+
+ # The single lens swap buffers the swap orbit wide and the next one narrow
+  assert lenses.OrbitLenses(lenses.SwapSchedule(1001), 1001) == [['Wide', 56.0]]
+  assert lenses.OrbitLenses(lenses.SwapSchedule(1001), 1002) == [['Narrow', 17.0]]
+
+@pytest.mark.parametrize('pipelined', [False, True])
+def testLensSwathsMatchBuffers(tmpdir, pipelined):
+
+  procDir  = str(tmpdir)
+  schedule = [('Wide', None, None, 56.0), ('Zoom', 1002, None, 8.0)]
+  counts   = {}
+  _WriteLines(procDir, (1001, 1002, 1003))
+
+  assert lenses.LensSwathsNative(procDir, schedule, pipelined=pipelined, counts=counts) == []
+  assert counts == {1001: 4, 1002: 8, 1003: 8}
+
+ # Each lens of an orbit gives the same footprints as the formatted buffer of its distance
+  for orbNum in (1001, 1002, 1003):
+    lineFC = str(tmpdir.join('Line', 'orb%d_line.shp' % orbNum))
+    (fields, records, shapes) = shp.ReadShapefile(str(tmpdir.join('Lens', 'orb%d_lens.shp' % orbNum)))
+
+    assert [f[0] for f in fields] == ['OrbitNum', 'ReqTime', 'MDYTime', 'Lens', 'BuffKm']
+
+    for (lens, buffKm) in lenses.OrbitLenses(schedule, orbNum):
+      buffFC = str(tmpdir.join('%s_%d_buff.shp' % (lens, orbNum)))
+      BufferOrbitNative(lineFC, buffFC, buffKm, orbNum=orbNum)
+      (buffFields, buffRecords, buffShapes) = shp.ReadShapefile(buffFC)
+
+      ours = [i for (i, record) in enumerate(records) if record[3] == lens]
+
+      assert [records[i][:3] for i in ours] == buffRecords
+      assert [records[i][4] for i in ours] == [buffKm] * len(buffRecords)
+      assert [shapes[i] for i in ours] == buffShapes
+
+def testLensSwathsRebuildChangedOrbits(tmpdir):
+
+  procDir  = str(tmpdir)
+  manifest = LoadManifest(procDir)
+  counts   = {}
+  _WriteLines(procDir, (1001, 1002))
+
+  lenses.LensSwathsNative(procDir, [('Wide', None, None, 56.0)], manifest=manifest, counts=counts)
+  assert sorted(counts) == [1001, 1002]
+
+ # Nothing changed, then only the orbit gaining a lens is rebuilt
+  counts.clear()
+  lenses.LensSwathsNative(procDir, [('Wide', None, None, 56.0)], manifest=manifest, counts=counts)
+  assert counts == {}
+
+  lenses.LensSwathsNative(procDir, [('Wide', None, None, 56.0), ('Zoom', 1002, None, 8.0)], manifest=manifest,
+                          counts=counts)
+  assert counts == {1002: 8}
@@ -0,0 +1,116 @@
+# EarthKAM AutoShape Rebuild Manifest Checks
+# test_EK_Autoshape_Manifest.py
+
+import os
+
+import EK_Autoshape_Manifest as mf
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks of the staleness rules of the rebuild manifest: an output is reused only
+ # while it exists, is complete and was built from the same input hashes and parameters. A shapefile hash covers
+ # its attributes as well as its shapes, and RunStale() reruns exactly the orbits that are out of date.
+ #
+
+
+FIELDS = [("TA_DATE", 'C', 24, 0)]
+
+
+def _WriteArc(path, stamp, mtime):
+
+ # Write a one point arc shapefile with the given TA_DATE and modification time
+
+  shp.WriteShapefile(path, shp.POINT, FIELDS, [[stamp]], [(10.0, 20.0)])
+
+  for ext in ('.shp', '.shx', '.dbf'):
+    os.utime(os.path.splitext(path)[0] + ext, (mtime, mtime))
+
+def _Build(arcFC, outFC):
+
+ # Orbit job copying the TA_DATE of an arc to its output
+
+  with open(outFC, 'w') as f:
+    f.write(shp.ReadShapefile(arcFC)[1][0][0])
+
+  return 1
+
+def testShapefileHashCoversAttributes(tmpdir):
+
+  path     = str(tmpdir.join('orb1001_arc.shp'))
+  manifest = mf.LoadManifest(str(tmpdir))
+
+  _WriteArc(path, '03/20/24 00:00:00', 1000000000)
+  first = mf.HashShapefile(manifest, path)
+
+ # Same shapes and sizes, edited TA_DATE
+  _WriteArc(path, '03/20/24 00:00:10', 1000000100)
+
+  assert mf.HashShapefile(manifest, path) != first
+
+  _WriteArc(path, '03/20/24 00:00:00', 1000000200)
+
+  assert mf.HashShapefile(manifest, path) == first
+
+def testIsCurrent(tmpdir):
+
+  output   = str(tmpdir.join('orb1001_line.shp'))
+  manifest = mf.LoadManifest(str(tmpdir))
+  inputs   = {"Arc": "abc"}
+  params   = {"native": True}
+
+  mf.Record(manifest, "Line", 1001, inputs, params)
+
+ # The output has to exist
+  assert not mf.IsCurrent(manifest, "Line", 1001, inputs, params, output)
+
+  tmpdir.join('orb1001_line.shp').write('')
+
+  assert mf.IsCurrent(manifest, "Line", 1001, inputs, params, output)
+  assert not mf.IsCurrent(manifest, "Line", 1001, {"Arc": "abd"}, params, output)
+  assert not mf.IsCurrent(manifest, "Line", 1001, inputs, {"native": False}, output)
+  assert not mf.IsCurrent(manifest, "Line", 1002, inputs, params, output)
+
+ # Incomplete outputs are rebuilt until they are completed
+  mf.Record(manifest, "Line", 1001, inputs, params, complete=False)
+
+  assert not mf.IsCurrent(manifest, "Line", 1001, inputs, params, output)
+  assert mf.Pending(manifest, "Line") == [1001]
+
+  mf.Complete(manifest, "Line", 1001)
+
+  assert mf.IsCurrent(manifest, "Line", 1001, inputs, params, output)
+  assert mf.Pending(manifest, "Line") == []
+
+def testRunStale(tmpdir):
+
+  procDir = str(tmpdir)
+  arcs    = dict((orbNum, str(tmpdir.join('orb%d_arc.shp' % orbNum))) for orbNum in (1001, 1002, 1003))
+
+  for (orbNum, path) in arcs.items():
+    _WriteArc(path, '03/20/24 00:00:0%d' % (orbNum - 1000), 1000000000)
+
+  def Run(params):
+    manifest = mf.LoadManifest(procDir)
+    values   = {}
+    jobs     = [(orbNum, (path, path + '.out'), {"Arc": mf.HashShapefile(manifest, path)}, params, path + '.out')
+                for (orbNum, path) in sorted(arcs.items())]
+
+    assert mf.RunStale(_Build, jobs, 1, manifest, procDir, "Line", values=values) == []
+
+    return sorted(values)
+
+  assert Run({"native": True}) == [1001, 1002, 1003]
+  assert Run({"native": True}) == []
+
+ # An attribute edit, a removed output and a parameter change each rebuild what they touch
+  _WriteArc(arcs[1002], '03/20/24 00:00:09', 1000000100)
+
+  assert Run({"native": True}) == [1002]
+
+  os.remove(arcs[1003] + '.out')
+
+  assert Run({"native": True}) == [1003]
+  assert Run({"native": False}) == [1001, 1002, 1003]
+
+ # The manifest survives a reload
+  assert sorted(mf.LoadManifest(procDir)['stages']['Line']) == ['1001', '1002', '1003']
@@ -0,0 +1,48 @@
+# EarthKAM AutoShape Orbit Model Checks
+# test_EK_Autoshape_Orbits.py
+
+import os
+
+from EK_Autoshape_Arcs import ReadLightingCSV, ExportArcsNative
+from EK_Autoshape_Batch import FuseOrbitNative
+from EK_Autoshape_Benchmark import GenerateMission
+from EK_Autoshape_Orbits import FileOrbit, OrbitLabel
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks of the orbit labels and file names: point-arcs keep the unpadded
+ # OrbitNum label FillOrbs writes on the coasting arcs, buffers get the zero padded label of ReqFmt, and the
+ # orbit number is read back from the name of every kind of orbit file.
+ #
+
+
+def testFileOrbit():
+
+  assert FileOrbit(os.path.join('M1_Processed_Orbits', 'Buff', 'orb0098_buff.shp')) == 98
+  assert FileOrbit(os.path.join('M1_Processed_Orbits', 'Arc', 'orb1234_arc.shp')) == 1234
+  assert FileOrbit(os.path.join('M1_Processed_Orbits', 'Google', 'Orbit_0998.kmz')) == 998
+  assert FileOrbit(os.path.join('M12_Raw_Orbits', 'Coast_1000.shp')) == 1000
+
+def testOrbitLabels(tmpdir):
+
+  (rawArcs, lightCSV, points) = GenerateMission(str(tmpdir), orbits=2, stepSec=60.0, arcOrbits=2)
+  (starts, ends) = ReadLightingCSV(lightCSV)
+
+  procDir = str(tmpdir.join('M1_Processed_Orbits'))
+
+  for folder in ('Arc', 'Line', 'Buff'):
+    os.makedirs(os.path.join(procDir, folder))
+
+ # Number the orbits below 1000, where the labels and file names differ in padding
+  assert ExportArcsNative(rawArcs[0], procDir, starts, ends, 96) == [98, 99]
+
+  arcFC = os.path.join(procDir, 'Arc', 'orb0098_arc.shp')
+
+  assert set(record[1] for record in shp.ReadShapefile(arcFC)[1]) == set(['Orbit 98'])
+
+  FuseOrbitNative(arcFC, procDir, 1000)
+
+  buffFC = os.path.join(procDir, 'Buff', 'orb0098_buff.shp')
+
+  assert set(record[0] for record in shp.ReadShapefile(buffFC)[1]) == set([OrbitLabel(98)]) == set(['Orbit 0098'])
+  assert FileOrbit(buffFC) == 98
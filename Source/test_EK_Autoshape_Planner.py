@@ -0,0 +1,116 @@
+# EarthKAM AutoShape Photo Request Planner Checks
+# test_EK_Autoshape_Planner.py
+
+import datetime
+import math
+import os
+
+import numpy as np
+
+from EK_Autoshape_Planner import PlanWindows, SegmentWindows
+from EK_Autoshape_Swath import BufferOrbitNative, KM_PER_DEG
+from EK_Autoshape_Time import EphToEpochSeconds
+from EK_Autoshape_Tracks import LINE_FIELDS
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks of the request windows of the planner: the closest approach, entry and
+ # exit times interpolated along a segment for targets on and off the ground track and across the antimeridian,
+ # and the windows of consecutive segments of one orbit merged into one.
+ #
+
+
+ # Ground track of the line fixture: 10 segments of half a degree of the equator heading east, 60 seconds each
+STEP_DEG = 0.5
+STEP_SEC = 60.0
+EPOCH    = datetime.datetime(2024, 3, 20)
+
+
+def _WriteMission(procDir, orbNum):
+
+ # Write the \Line and formatted \Buff shapefiles of one orbit along the equator
+
+  for folder in ('Line', 'Buff'):
+    os.makedirs(os.path.join(procDir, folder))
+
+  stamps  = [(EPOCH + datetime.timedelta(seconds=STEP_SEC * i)).strftime('%m/%d/%y %H:%M:%S') for i in range(11)]
+  records = [[stamps[i], stamps[i + 1], STEP_DEG * KM_PER_DEG, STEP_SEC, 0.0, 90.0] for i in range(10)]
+  shapes  = [[[(STEP_DEG * i, 0.0), (STEP_DEG * (i + 1), 0.0)]] for i in range(10)]
+
+  lineFC = os.path.join(procDir, 'Line', 'orb%d_line.shp' % orbNum)
+  shp.WriteShapefile(lineFC, shp.POLYLINE, LINE_FIELDS, records, shapes)
+
+  BufferOrbitNative(lineFC, os.path.join(procDir, 'Buff', 'orb%d_buff.shp' % orbNum), 56.0, orbNum=orbNum)
+
+def testOnTrack():
+
+  ends = np.array([[0.0, 0.0, 1.0, 0.0]])
+  (entry, closest, exit, cross, offset) = SegmentWindows(np.array([0.25]), np.array([0.0]), ends, np.array([100.0]),
+                                                         np.array([60.0]), np.array([17.0]))
+
+ # A quarter of the way along, with 17 km on either side at one degree a minute
+  secPerKm = 60.0 / KM_PER_DEG
+
+  assert np.allclose(closest, 115.0)
+  assert np.allclose(entry, 115.0 - 17.0 * secPerKm)
+  assert np.allclose(exit, 115.0 + 17.0 * secPerKm)
+  assert np.allclose(cross, 0.0)
+  assert np.allclose(offset, 0.0)
+
+def testOffTrack():
+
+ # A southbound segment and a target 10 km west of its midpoint, and a target 20 km past its end
+  ends = np.array([[30.0, 10.0, 30.0, 9.0]] * 2)
+  lon  = np.array([30.0 - 10.0 / (KM_PER_DEG * math.cos(math.radians(9.5))), 30.0])
+  lat  = np.array([9.5, 9.0 - 20.0 / KM_PER_DEG])
+
+  (entry, closest, exit, cross, offset) = SegmentWindows(lon, lat, ends, np.zeros(2), np.full(2, 60.0),
+                                                         np.full(2, 56.0))
+
+  half = math.sqrt(56.0 ** 2 - 10.0 ** 2) * 60.0 / KM_PER_DEG
+
+  assert np.allclose(cross, [10.0, 0.0])
+  assert np.allclose(closest, [30.0, 60.0 + 20.0 * 60.0 / KM_PER_DEG])
+  assert np.allclose(entry[0], 30.0 - half)
+  assert np.allclose(exit[0], 30.0 + half)
+  assert np.allclose(offset, [0.0, 20.0])
+
+def testAcrossAntimeridian():
+
+  ends = np.array([[179.5, 0.0, -179.5, 0.0]])
+  (entry, closest, exit, cross, offset) = SegmentWindows(np.array([-180.0]), np.array([0.0]), ends, np.zeros(1),
+                                                         np.array([60.0]), np.array([17.0]))
+
+  assert np.allclose(closest, 30.0)
+  assert np.allclose(offset, 0.0)
+
+def testZeroLengthSegment():
+
+  ends = np.array([[5.0, 5.0, 5.0, 5.0]])
+  (entry, closest, exit, cross, offset) = SegmentWindows(np.array([5.0]), np.array([5.0]), ends, np.zeros(1),
+                                                         np.zeros(1), np.array([17.0]))
+
+  assert np.isnan(closest).all()
+
+def testPlanWindows(tmpdir):
+
+  procDir = str(tmpdir.join('M1_Processed_Orbits'))
+  _WriteMission(procDir, 1001)
+
+ # A target 0.2 degrees north of the track, seen across several segments, and one outside every footprint
+  windows = PlanWindows(procDir, [1.25, 3.0], [0.2, 5.0], 2000)
+
+  assert len(windows) == 1
+
+  (target, orbit, entry, closest, exit, cross) = windows[0]
+
+  start    = float(EphToEpochSeconds([EPOCH.strftime('%m/%d/%y %H:%M:%S')])[0])
+  secPerKm = STEP_SEC / (STEP_DEG * KM_PER_DEG * math.cos(math.radians(0.2)))
+  half     = math.sqrt(56.0 ** 2 - (0.2 * KM_PER_DEG) ** 2) * secPerKm
+
+ # The segments are merged into one window, centered on the closest approach
+  assert (target, orbit) == (0, 1001)
+  assert abs(cross - 0.2 * KM_PER_DEG) < 1e-6
+  assert abs(closest - (start + 150.0)) < 1e-6
+  assert abs(entry - (closest - half)) < 1e-6
+  assert abs(exit - (closest + half)) < 1e-6
@@ -0,0 +1,121 @@
+# EarthKAM AutoShape Orbit Pool Checks
+# test_EK_Autoshape_Pool.py
+
+import threading
+
+import pytest
+
+from EK_Autoshape_Pool import RunOrbits, RunPipeline
+
+ #
+ # This file consists of pytest checks of RunOrbits(), serially and across a process pool: every orbit runs once,
+ # the value of each orbit that succeeded is returned by orbit number, and an orbit raising an exception is
+ # reported as a failure without stopping the others. RunPipeline() is checked to write the orbits in job order,
+ # isolate failures in each of its parts, bound its read-ahead and stop reading when interrupted.
+ #
+
+
+def _Square(orbNum):
+
+ # Orbit job returning the square of its orbit number, failing on orbit 1003
+
+  if orbNum == 1003:
+    raise ValueError('bad orbit ' + str(orbNum))
+
+  return orbNum * orbNum
+
+@pytest.mark.parametrize('workers', [1, 2])
+def testFailuresAreIsolated(workers):
+
+  values = {}
+  jobs   = [(orbNum, (orbNum,)) for orbNum in (1005, 1001, 1003, 1002)]
+
+  failures = RunOrbits(_Square, jobs, workers, values=values)
+
+  assert failures == [(1003, 'ValueError: bad orbit 1003')]
+  assert values == {1001: 1001 * 1001, 1002: 1002 * 1002, 1005: 1005 * 1005}
+
+def testNoJobs():
+
+  assert RunOrbits(_Square, [], 4) == []
+
+class _Parts(object):
+
+ # Read, compute and write parts recording their calls, failing on the given orbit of each part
+
+  def __init__(self, failRead=None, failCompute=None, failWrite=None, interrupt=None):
+    self.fail    = (failRead, failCompute, failWrite)
+    self.stop    = interrupt
+    self.reads   = []
+    self.ahead   = []
+    self.written = []
+    self.threads = set()
+    self.lock    = threading.Lock()
+
+  def Read(self, orbNum):
+    with self.lock:
+      self.threads.add(('read', threading.current_thread().name))
+      self.reads.append(orbNum)
+    if orbNum == self.fail[0]:
+      raise IOError('unreadable orbit ' + str(orbNum))
+    return orbNum * 10
+
+  def Compute(self, data, orbNum):
+    with self.lock:
+      self.ahead.append(len(self.reads) - self.reads.index(orbNum) - 1)
+    if orbNum == self.stop:
+      raise KeyboardInterrupt()
+    if orbNum == self.fail[1]:
+      raise ValueError('bad orbit ' + str(orbNum))
+    return data + 1
+
+  def Write(self, result, orbNum):
+    self.threads.add(('write', threading.current_thread().name))
+    if orbNum == self.fail[2]:
+      raise OSError('disk full')
+    self.written.append(orbNum)
+    return result
+
+  def Tuple(self):
+    return (self.Read, self.Compute, self.Write)
+
+def testPipelineIsolatesFailures():
+
+  parts  = _Parts(failRead=1002, failCompute=1003, failWrite=1004)
+  values = {}
+  jobs   = [(orbNum, (orbNum,)) for orbNum in (1001, 1002, 1003, 1004, 1005)]
+
+  failures = RunPipeline(parts.Tuple(), jobs, values=values)
+
+  assert [f[0] for f in failures] == [1002, 1003, 1004]
+  assert failures[0][1].endswith('Error: unreadable orbit 1002')
+  assert failures[1][1] == 'ValueError: bad orbit 1003'
+  assert failures[2][1] == 'OSError: disk full'
+  assert values == {1001: 10011, 1005: 10051}
+  assert parts.written == [1001, 1005]
+
+ # Reads and writes run off the main thread
+  assert threading.current_thread().name not in set(name for (part, name) in parts.threads)
+
+def testPipelineReadAhead():
+
+  parts = _Parts()
+  jobs  = [(orbNum, (orbNum,)) for orbNum in range(1000, 1040)]
+
+  assert RunPipeline(parts.Tuple(), jobs, depth=1) == []
+
+ # Besides the orbit being computed, the reader holds at most the queued orbits and the one waiting to be queued
+  assert parts.written == list(range(1000, 1040))
+  assert max(parts.ahead) <= 2
+
+def testPipelineInterrupted():
+
+  parts = _Parts(interrupt=1002)
+  jobs  = [(orbNum, (orbNum,)) for orbNum in range(1000, 1100)]
+
+  with pytest.raises(KeyboardInterrupt):
+    RunPipeline(parts.Tuple(), jobs, depth=2)
+
+ # The orbits computed before the interrupt are still written, and the reader stops well short of the last job
+  assert parts.written == [1000, 1001]
+  assert len(parts.reads) < 10
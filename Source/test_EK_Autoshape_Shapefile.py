@@ -0,0 +1,55 @@
+# EarthKAM AutoShape Shapefile I/O Checks
+# test_EK_Autoshape_Shapefile.py
+
+import pytest
+
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks that shapefiles written by WriteShapefile() read back unchanged through
+ # ReadShapefile(), for every supported shape type, with null shapes and with no features at all.
+ #
+
+
+ # Fields of every round trip: text, integer and fixed point numbers
+FIELDS = [("Start_Time", 'C', 24, 0),
+          ("Orbit",      'N', 9, 0),
+          ("D_KM",       'N', 19, 11)]
+
+RECORDS = [["03/20/24 00:00:00", 1001, 12.5],
+           ["03/20/24 00:01:00", 1002, 0.0],
+           ["",                  None, None]]
+
+SHAPES = {shp.POINT:    [(-179.5, 51.25), None, (0.0, -0.5)],
+          shp.POLYLINE: [[[(10.0, 20.0), (11.5, 21.0)]], [[(0.0, 0.0), (1.0, 1.0)], [(2.0, 2.0), (3.0, 2.5)]], None],
+          shp.POLYGON:  [[[(0.0, 0.0), (0.0, 4.0), (4.0, 4.0), (4.0, 0.0), (0.0, 0.0)],
+                          [(1.0, 1.0), (2.0, 1.0), (2.0, 2.0), (1.0, 2.0), (1.0, 1.0)]],
+                         None,
+                         [[(170.0, -5.0), (170.0, 5.0), (190.0, 5.0), (170.0, -5.0)]]]}
+
+
+@pytest.mark.parametrize('shapeType', sorted(SHAPES))
+def testRoundTrip(tmpdir, shapeType):
+
+  path = str(tmpdir.join('orb1001_test.shp'))
+
+  shp.WriteShapefile(path, shapeType, FIELDS, RECORDS, SHAPES[shapeType])
+
+  (fields, records, shapes) = shp.ReadShapefile(path)
+
+  assert shp.ReadShapeType(path) == shapeType
+  assert [f[:2] for f in fields] == [f[:2] for f in FIELDS]
+  assert records == RECORDS
+
+ # Points read back as tuples and parts as lists of tuples
+  assert shapes == SHAPES[shapeType]
+
+@pytest.mark.parametrize('shapeType', sorted(SHAPES))
+def testRoundTripEmpty(tmpdir, shapeType):
+
+  path = str(tmpdir.join('orb1001_empty.shp'))
+
+  shp.WriteShapefile(path, shapeType, FIELDS, [], [])
+
+  assert shp.ReadShapeType(path) == shapeType
+  assert shp.ReadShapefile(path)[1:] == ([], [])
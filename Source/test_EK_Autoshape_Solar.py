@@ -0,0 +1,37 @@
+# EarthKAM AutoShape Solar Lighting Checks
+# test_EK_Autoshape_Solar.py
+
+import calendar
+import datetime
+
+import pytest
+
+from EK_Autoshape_Solar import SubsolarPoint
+
+ #
+ # This file consists of pytest checks of SubsolarPoint() at the 2024 equinoxes and solstices. The subsolar
+ # latitude is the declination, zero at an equinox and the obliquity at a solstice, and the subsolar longitude
+ # is where apparent solar time is noon: 15 degrees per hour west of Greenwich at 12:00 UTC, less the equation
+ # of time.
+ #
+
+
+ # UTC time, subsolar latitude and equation of time in minutes of each 2024 equinox and solstice
+SEASONS = [(datetime.datetime(2024, 3, 20, 3, 6),    0.0,     -7.5),
+           (datetime.datetime(2024, 6, 20, 20, 51),  23.4393, -1.6),
+           (datetime.datetime(2024, 9, 22, 12, 44),  0.0,      7.3),
+           (datetime.datetime(2024, 12, 21, 9, 20), -23.4393,  1.9)]
+
+
+@pytest.mark.parametrize('season', SEASONS)
+def testSubsolarPoint(season):
+
+  (when, lat, equationMin) = season
+
+  (sunLon, sunLat) = SubsolarPoint([calendar.timegm(when.timetuple())])
+
+  hours = when.hour + when.minute / 60.0
+  lon   = (-15.0 * (hours - 12.0) - equationMin / 4.0 + 180.0) % 360.0 - 180.0
+
+  assert abs(sunLat[0] - lat) < 0.02
+  assert abs(sunLon[0] - lon) < 0.1
@@ -0,0 +1,82 @@
+# EarthKAM AutoShape Swath Engine Checks
+# test_EK_Autoshape_Swath.py
+
+import math
+
+import numpy as np
+import pytest
+
+from EK_Autoshape_Swath import DissolveRings, EARTH_RADIUS_KM, KM_PER_DEG, SwathPolygons
+
+ #
+ # This file consists of pytest checks of the swath rings of SwathPolygons(): every ring is closed and clockwise,
+ # the shapefile outer ring order, including across the antimeridian, its corners lie the buffer distance from
+ # the segment ends, and rings sharing a Start_Time are dissolved into one multipart polygon.
+ #
+
+
+ # Segments heading east, north, south west and across the antimeridian, and a zero length segment
+SEGMENTS = np.array([[10.0,    0.0,   11.0,    0.0],
+                     [-40.0,  20.0,  -40.0,   21.5],
+                     [120.0,  45.0,  119.0,   44.2],
+                     [179.6, -10.0, -179.7,  -10.4],
+                     [5.0,     5.0,    5.0,    5.0]])
+
+
+def _SignedArea(ring):
+
+ # Shoelace area of a closed ring, negative when clockwise
+
+  (x, y) = (ring[:, 0], ring[:, 1])
+
+  return 0.5 * float(np.sum(x[:-1] * y[1:] - x[1:] * y[:-1]))
+
+def _Haversine(lon1, lat1, lon2, lat2):
+
+ # Reference great circle distance in kilometers
+
+  (p1, p2) = (math.radians(lat1), math.radians(lat2))
+  h = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+@pytest.mark.parametrize('geodesic', [False, True])
+def testRingsClosedAndClockwise(geodesic):
+
+  rings = SwathPolygons(*(list(SEGMENTS.T) + [17.0, geodesic]))
+
+  assert rings.shape == (5, 5, 2)
+  assert np.isnan(rings[4]).all()
+
+  for ring in rings[:4]:
+    assert np.array_equal(ring[0], ring[-1])
+    assert _SignedArea(ring) < 0
+
+def testPlanarWidth():
+
+  rings = SwathPolygons(*(list(SEGMENTS[:1].T) + [56.0]))
+
+ # Left side north of the eastbound segment, both sides 56 km worth of degrees away
+  assert np.allclose(rings[0, :4, 0], [10.0, 11.0, 11.0, 10.0])
+  assert np.allclose(rings[0, :4, 1], np.array([1.0, 1.0, -1.0, -1.0]) * 56.0 / KM_PER_DEG)
+
+def testGeodesicWidth():
+
+  rings = SwathPolygons(*(list(SEGMENTS[:4].T) + [56.0, True]))
+
+  for (segment, ring) in zip(SEGMENTS[:4], rings):
+    (lon1, lat1, lon2, lat2) = segment
+
+    for (corner, (lon, lat)) in zip(ring[:4], [(lon1, lat1), (lon2, lat2), (lon2, lat2), (lon1, lat1)]):
+      assert abs(_Haversine(lon, lat, corner[0], corner[1]) - 56.0) < 1e-6
+
+def testDissolveOnStartTime():
+
+  rings = SwathPolygons(*(list(SEGMENTS.T) + [17.0]))
+
+  (records, shapes) = DissolveRings(rings, ['a', 'b', 'a', 'c', 'c'])
+
+ # The zero length segment leaves no ring behind
+  assert records == [['a'], ['b'], ['c']]
+  assert [len(shape) for shape in shapes] == [2, 1, 1]
+  assert shapes[0][1] == [tuple(p) for p in rings[2].tolist()]
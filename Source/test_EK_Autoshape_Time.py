@@ -0,0 +1,71 @@
+# EarthKAM AutoShape Time Parsing Checks
+# test_EK_Autoshape_Time.py
+
+import datetime
+
+import numpy as np
+import pytest
+
+import EK_Autoshape_Time as tm
+
+ #
+ # This file consists of pytest checks of the fixed-layout timestamp parsers against the strptime and strftime
+ # calls they replace, over random times from 1969 to 2068 (both sides of the two digit year pivot, and leap
+ # days), and of the round trips between epoch seconds and the ephemeris, lighting and request time strings.
+ #
+
+
+ # Random whole seconds from 1969-01-01 to 2068-12-31, with the leap day of 2024 and the ends of the range
+_EPOCH = datetime.datetime(1970, 1, 1)
+SECONDS = np.concatenate((np.random.RandomState(3).randint(-31536000, 3124137600, 500),
+                          [-31536000, 1709164800, 1709251199, 3124137599])).astype(np.float64)
+DATES   = [_EPOCH + datetime.timedelta(seconds=s) for s in SECONDS.tolist()]
+
+
+def testEphemerisTimes():
+
+  stamps = [d.strftime(tm.ArcEph_fmt) for d in DATES]
+
+  assert [tm.ParseEphTime(s) for s in stamps] == DATES
+  assert tm.EpochSecondsToEphTimes(SECONDS) == stamps
+  assert np.array_equal(tm.EphToEpochSeconds(stamps), SECONDS)
+
+def testRequestTimes():
+
+  stamps   = [d.strftime(tm.ArcEph_fmt) for d in DATES]
+  reqTimes = [d.strftime(tm.ReqTime_fmt) for d in DATES]
+
+  assert [tm.EphToReqTime(s) for s in stamps] == reqTimes
+  assert tm.EphToReqTimes(stamps) == reqTimes
+  assert tm.EpochSecondsToReqTimes(SECONDS + 0.75) == reqTimes
+  assert [tm.ParseReqTime(s) for s in reqTimes] == DATES
+
+def testLightingTimes():
+
+  millis = SECONDS + np.random.RandomState(4).randint(0, 1000, len(SECONDS)) / 1000.0
+  stamps = tm.EpochSecondsToLightTimes(millis)
+
+  expected = [datetime.datetime.strptime(s, tm.Light_fmt) for s in stamps]
+
+  assert [tm.ParseLightTime(s) for s in stamps] == expected
+  assert tm.ParseLightTimes(stamps) == expected
+  assert np.allclose(tm.Datetime64ToEpochSeconds(tm.LightToDatetime64(stamps)), millis, rtol=0, atol=1e-6)
+
+@pytest.mark.parametrize('stamp', ['3/2/17 4:05:09', '03/02/17 4:05:09'])
+def testUnpaddedFallsBack(stamp):
+
+  assert tm.ParseEphTime(stamp) == datetime.datetime.strptime(stamp, tm.ArcEph_fmt)
+  assert tm.EphToReqTimes([stamp]) == [datetime.datetime.strptime(stamp, tm.ArcEph_fmt).strftime(tm.ReqTime_fmt)]
+
+@pytest.mark.parametrize('stamp', ['02/30/17 00:00:00', '13/01/17 00:00:00', '01/01/17 24:00:00'])
+def testInvalidRaises(stamp):
+
+  with pytest.raises(ValueError):
+    tm.ParseEphTime(stamp)
+
+def testReqTimeDayOfYear():
+
+  assert tm.ParseReqTime('2024/366/23:59:59') == datetime.datetime(2024, 12, 31, 23, 59, 59)
+
+ # Day 366 of a common year rolls over like strptime does
+  assert tm.ParseReqTime('2023/366/00:00:00') == datetime.datetime.strptime('2023/366/00:00:00', tm.ReqTime_fmt)
@@ -0,0 +1,143 @@
+# EarthKAM AutoShape Stage Trace Checks
+# test_EK_Autoshape_Trace.py
+
+import csv
+import json
+import os
+
+import pytest
+
+import EK_Autoshape_Shapefile as shp
+import EK_Autoshape_Trace as tr
+from EK_Autoshape_Pool import RunOrbits
+
+ #
+ # This file consists of pytest checks of the stage trace: orbit rows count the records of the shapefiles an
+ # orbit read and wrote, in serial loops and in RunOrbits() worker processes, stage rows sum their orbits, the
+ # profile orbit is saved under cProfile, and the rows are reported and written to .json and .csv trace files.
+ #
+
+
+FIELDS = [("TA_DATE", 'C', 24, 0)]
+
+
+def _WritePoints(path, count):
+
+ # Write a point shapefile of count records
+
+  shp.WriteShapefile(path, shp.POINT, FIELDS, [['03/20/24 00:00:00']] * count, [(1.0, 2.0)] * count)
+
+def _CopyOrbit(inFC, outFC):
+
+ # Orbit job writing a copy of a point shapefile with one record more
+
+  (fields, records, shapes) = shp.ReadShapefile(inFC)
+  shp.WriteShapefile(outFC, shp.POINT, fields, records + records[:1], shapes + shapes[:1])
+
+class _Messages(object):
+
+ # Geoprocessor stand-in collecting the tool messages
+
+  def __init__(self):
+    self.messages = []
+
+  def AddMessage(self, message):
+    self.messages.append(message)
+
+def _Inputs(tmpdir, orbits):
+
+ # Write a 3, 4, ... record input shapefile per orbit and return the (orbNum, (input, output)) jobs
+
+  jobs = []
+
+  for (i, orbNum) in enumerate(orbits):
+    inFC = str(tmpdir.join('orb%d_arc.shp' % orbNum))
+    _WritePoints(inFC, 3 + i)
+    jobs.append((orbNum, (inFC, str(tmpdir.join('orb%d_line.shp' % orbNum)))))
+
+  return jobs
+
+def testSerialOrbits(tmpdir):
+
+  trace = tr.OpenTrace()
+  jobs  = _Inputs(tmpdir, (1001, 1002))
+
+ # No orbit is measured outside a stage
+  assert tr.BeginOrbit(1000) is None
+
+  tr.BeginStage(trace, "ExportLines")
+
+  for (orbNum, (inFC, outFC)) in jobs:
+    state = tr.BeginOrbit(orbNum, [inFC, outFC])
+    _CopyOrbit(inFC, outFC)
+    tr.EndOrbit(state)
+
+  tr.EndStage(trace)
+
+  rows = trace['rows']
+
+  assert [(r['stage'], r['orbit']) for r in rows] == [("ExportLines", 1001), ("ExportLines", 1002),
+                                                      ("ExportLines", None)]
+  assert [(r['rowsRead'], r['rowsWritten'], r['files']) for r in rows] == [(3, 4, 1), (4, 5, 1), (7, 9, 2)]
+  assert rows[2]['wall'] >= max(rows[0]['wall'], rows[1]['wall'])
+  assert tr.OrbitProbe() is None
+
+@pytest.mark.parametrize('workers', [1, 2])
+def testRunOrbits(tmpdir, workers):
+
+  tracePath = str(tmpdir.join('AutoShape_Trace.json'))
+  trace     = tr.OpenTrace(tracePath, 1002)
+  jobs      = _Inputs(tmpdir, (1001, 1002, 1003))
+
+  tr.BeginStage(trace, "ExportLines")
+  RunOrbits(_CopyOrbit, jobs, workers)
+  tr.EndStage(trace)
+
+  rows = sorted(trace['rows'], key=lambda r: (r['orbit'] is None, r['orbit']))
+
+  assert [(r['orbit'], r['rowsRead'], r['rowsWritten']) for r in rows] == [(1001, 3, 4), (1002, 4, 5), (1003, 5, 6),
+                                                                          (None, 12, 15)]
+  assert rows[-1]['cpu'] >= 0.0
+  assert os.path.isfile(str(tmpdir.join('orb1002_ExportLines.prof')))
+  assert not os.path.isfile(str(tmpdir.join('orb1001_ExportLines.prof')))
+
+ # The report summarizes the stage, and the trace file holds every row
+  gp = _Messages()
+  tr.ReportTrace(gp, trace)
+  tr.SaveTrace(trace)
+
+  assert gp.messages[0].startswith('ExportLines: ')
+  assert '12 rows read, 15 rows written, 3 files' in gp.messages[0]
+  assert 'Slowest of 3 orbits' in gp.messages[0]
+
+  with open(tracePath) as f:
+    saved = json.load(f)
+
+  assert saved['profileOrbit'] == 1002
+  assert [sorted(row) for row in saved['rows']] == [sorted(tr.TRACE_FIELDS)] * 4
+
+def testCsvTrace(tmpdir):
+
+  tracePath = str(tmpdir.join('AutoShape_Trace.csv'))
+  trace     = tr.OpenTrace(tracePath)
+
+  tr.BeginStage(trace, "LoadIndex")
+  tr.EndStage(trace, files=1, error='IOError: x')
+  tr.SaveTrace(trace)
+
+  with open(tracePath) as f:
+    rows = list(csv.reader(f))
+
+  assert rows[0] == tr.TRACE_FIELDS
+  assert rows[1][:2] == ['LoadIndex', '']
+  assert rows[1][6] == '1' and rows[1][8] == 'IOError: x'
+
+def testNoTrace():
+
+ # A tool run without a trace measures nothing
+  tr.BeginStage(None, "ExportLines")
+  tr.EndStage(None)
+  tr.ReportTrace(_Messages(), None)
+  tr.SaveTrace(None)
+
+  assert tr.OrbitProbe() is None
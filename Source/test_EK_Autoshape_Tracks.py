@@ -0,0 +1,164 @@
+# EarthKAM AutoShape Track Segment Checks
+# test_EK_Autoshape_Tracks.py
+
+import math
+
+import numpy as np
+
+from EK_Autoshape_Benchmark import GroundTrack, ISS_PERIOD_S
+from EK_Autoshape_Swath import BufferOrbitNative, FormatBufferNative
+from EK_Autoshape_Time import EphToEpochSeconds, EpochSecondsToEphTimes
+from EK_Autoshape_Tracks import (BuildSegments, DecimateTrack, EARTH_RADIUS_KM, ExportLineNative, MAX_SPAN_POINTS,
+                                 SimplifySummary, TrackDeviation, _UnitVectors)
+import EK_Autoshape_Shapefile as shp
+
+ #
+ # This file consists of pytest checks of the segment measures of BuildSegments() against a scalar haversine
+ # reference, and of the bearing against the direction of the second point in the local north/east frame of
+ # the first. The simplified track is checked to drop points within the tolerance only, and its line and buffer
+ # shapefiles to write one feature per span whose OFFSETS give back the Start_Time of every dropped point.
+ #
+
+
+ # Seconds between the points of the simplified track fixture, and the first of its times
+STEP_SEC = 10.0
+EPOCH    = 1710892800.0
+
+
+def _Haversine(lon1, lat1, lon2, lat2):
+
+ # Reference great circle distance in kilometers
+
+  (p1, p2) = (math.radians(lat1), math.radians(lat2))
+  h = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+
+  return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(h))
+
+def _Bearing(lon1, lat1, lon2, lat2):
+
+ # Reference initial bearing in degrees, from the north and east components of the chord to the second point
+
+  (l1, p1, l2, p2) = [math.radians(v) for v in (lon1, lat1, lon2, lat2)]
+
+  chord = (math.cos(p2) * math.cos(l2) - math.cos(p1) * math.cos(l1),
+           math.cos(p2) * math.sin(l2) - math.cos(p1) * math.sin(l1),
+           math.sin(p2) - math.sin(p1))
+  east  = (-math.sin(l1), math.cos(l1), 0.0)
+  north = (-math.sin(p1) * math.cos(l1), -math.sin(p1) * math.sin(l1), math.cos(p1))
+
+  return math.degrees(math.atan2(sum(c * e for (c, e) in zip(chord, east)),
+                                 sum(c * n for (c, n) in zip(chord, north)))) % 360.0
+
+def testHaversineReference():
+
+  rng = np.random.RandomState(5)
+
+ # A random walk of ISS-like steps, wrapped across the antimeridian, with a repeated timestamp
+  lon = (np.cumsum(rng.uniform(0.1, 0.6, 200)) + 170.0 + 180.0) % 360.0 - 180.0
+  lat = np.clip(np.cumsum(rng.uniform(-0.4, 0.4, 200)), -51.6, 51.6)
+  times = np.cumsum(rng.choice([0.0, 10.0, 60.0], 200))
+
+  (dist, duration, speed, heading) = BuildSegments(lon, lat, times)
+
+  for i in range(len(dist)):
+    reference = _Haversine(lon[i], lat[i], lon[i + 1], lat[i + 1])
+
+    assert abs(dist[i] - reference) < 1e-9 * max(reference, 1.0)
+    assert duration[i] == times[i + 1] - times[i]
+    assert abs(speed[i] - (reference / duration[i] * 3600.0 if duration[i] else 0.0)) < 1e-6
+    assert abs((heading[i] - _Bearing(lon[i], lat[i], lon[i + 1], lat[i + 1]) + 180.0) % 360.0 - 180.0) < 1e-6
+
+def testKnownSegments():
+
+ # One degree of the equator heading east, and one degree of a meridian heading south
+  (dist, duration, speed, heading) = BuildSegments([0.0, 1.0, 1.0], [0.0, 0.0, -1.0], [0.0, 15.0, 30.0])
+
+  assert np.allclose(dist, EARTH_RADIUS_KM * math.pi / 180.0)
+  assert np.allclose(speed, dist / 15.0 * 3600.0)
+  assert np.allclose(heading, [90.0, 180.0])
+
+def _WriteArc(path):
+
+ # Write one orbit of ISS ground track as a point-arc shapefile, returning its TA_DATE strings
+
+  seconds    = np.arange(0.0, ISS_PERIOD_S, STEP_SEC)
+  (lon, lat) = GroundTrack(seconds)
+  stamps     = EpochSecondsToEphTimes(EPOCH + seconds)
+
+  shp.WriteShapefile(path, shp.POINT, [("TA_DATE", 'C', 24, 0), ("OrbitNum", 'C', 24, 0)],
+                     [[stamp, 'Orbit 1000'] for stamp in stamps], list(zip(lon.tolist(), lat.tolist())))
+
+  return stamps
+
+def testDecimateTrack():
+
+  seconds    = np.arange(0.0, ISS_PERIOD_S, STEP_SEC)
+  (lon, lat) = GroundTrack(seconds)
+
+  (keep, deviation) = DecimateTrack(lon, lat, 1.0)
+  kept = np.flatnonzero(keep)
+
+  assert keep[0] and keep[-1]
+  assert len(kept) < len(keep) / 4
+  assert 0.0 < deviation <= 1.0
+  assert np.diff(kept).max() <= MAX_SPAN_POINTS
+
+ # Every dropped point lies within the tolerance of the span holding it
+  span   = np.minimum(np.searchsorted(kept, np.arange(len(keep)), side='right') - 1, len(kept) - 2)
+  points = _UnitVectors(lon, lat)
+
+  assert TrackDeviation(points, points[kept[span]], points[kept[span + 1]]).max() <= 1.0 + 1e-9
+
+ # No tolerance keeps every point
+  assert DecimateTrack(lon, lat, 0.0)[0].all()
+
+def testSimplifiedLine(tmpdir):
+
+  arcFC  = str(tmpdir.join('orb1000_arc.shp'))
+  lineFC = str(tmpdir.join('orb1000_line.shp'))
+  buffFC = str(tmpdir.join('orb1000_buff.shp'))
+  stamps = _WriteArc(arcFC)
+
+  (points, kept, deviation) = ExportLineNative(arcFC, lineFC, 1.0)
+  (fields, records, shapes) = shp.ReadShapefile(lineFC)
+
+  assert [f[0] for f in fields][-1] == 'OFFSETS'
+  assert points == len(stamps) and len(records) == kept - 1 < points / 4
+  assert all(len(shape) == 1 and len(shape[0]) == 2 for shape in shapes)
+
+ # The spans follow each other, and their offsets give back every Start_Time but the End_Time of the last
+  assert all(a[1] == b[0] for (a, b) in zip(records, records[1:]))
+  assert records[-1][1] == stamps[-1]
+
+  starts  = EphToEpochSeconds([record[0] for record in records])
+  covered = [start + float(offset) for (start, record) in zip(starts, records) for offset in record[-1].split()]
+
+  assert covered == list(EphToEpochSeconds(stamps[:-1]))
+  assert sum(record[3] for record in records) == (len(stamps) - 1) * STEP_SEC
+
+ # The footprint of each span keeps its offsets through the buffer and format stages
+  BufferOrbitNative(lineFC, buffFC, 28.0)
+  FormatBufferNative(buffFC, 1000)
+
+  (fields, formatted, shapes) = shp.ReadShapefile(buffFC)
+
+  assert [f[0] for f in fields] == ['OrbitNum', 'ReqTime', 'MDYTime', 'OFFSETS']
+  assert [record[2:] for record in formatted] == [[record[0], record[-1]] for record in records]
+
+  summary = SimplifySummary({1000: (points, kept, deviation)}, 1.0)
+
+  assert str(points - 1) + ' segments written as ' + str(kept - 1) in summary
+
+def testUnsimplifiedLine(tmpdir):
+
+  arcFC  = str(tmpdir.join('orb1000_arc.shp'))
+  lineFC = str(tmpdir.join('orb1000_line.shp'))
+  stamps = _WriteArc(arcFC)
+
+ # Without a tolerance every pair of points is a segment, and the line keeps the TrackIntervalsToLine_ta fields
+  assert ExportLineNative(arcFC, lineFC) == (len(stamps), len(stamps), 0.0)
+
+  (fields, records, shapes) = shp.ReadShapefile(lineFC)
+
+  assert 'OFFSETS' not in [f[0] for f in fields]
+  assert [record[0] for record in records] == stamps[:-1]
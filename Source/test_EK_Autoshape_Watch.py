@@ -0,0 +1,71 @@
+# EarthKAM AutoShape Watch Mode Checks
+# test_EK_Autoshape_Watch.py
+
+import os
+
+import EK_Autoshape_Watch as watchMode
+import EK_Autoshape_Shapefile as shp
+from EK_Autoshape_Benchmark import GenerateMission
+
+ #
+ # This file consists of pytest checks of the watch mode on a synthetic mission: coasting arcs are only picked
+ # up once they have settled for one poll, a poll without changes rebuilds nothing, a changed coasting arc only
+ # republishes the orbits whose point-arcs changed, and a failed orbit is reported once and left alone until its
+ # inputs change.
+ #
+
+
+def _OpenMission(tmpdir):
+
+ # Write a four orbit mission of two coasting arcs and open its watch, returning the watch and the coasting arcs
+
+  (rawArcs, lightCSV, points) = GenerateMission(str(tmpdir), orbits=4, stepSec=60.0, arcOrbits=2)
+
+  return (watchMode.OpenWatch(str(tmpdir), 1, 1002, lightCSV), rawArcs)
+
+def testSettledChanges(tmpdir):
+
+  (watch, rawArcs) = _OpenMission(tmpdir)
+  messages = []
+
+ # Files first seen in a poll may still be written, so the first poll leaves them alone
+  assert watchMode.PollMission(watch, progress=messages.append) == ([], [])
+  assert watchMode.PollMission(watch, progress=messages.append) == ([1000, 1001, 1002, 1003], [])
+  assert watchMode.PollMission(watch, progress=messages.append) == ([], [])
+
+  assert messages == ['M1 Raw: coasting arc 1000 -> orbits 1000, 1001',
+                      'M1 Raw: coasting arc 1002 -> orbits 1002, 1003',
+                      'M1 Buff: 4 footprint(s) rebuilt',
+                      'M1 KMZ: published orbits 1000, 1001, 1002, 1003']
+
+  for orbNum in (1000, 1001, 1002, 1003):
+    assert os.path.isfile(str(tmpdir.join('M1_Processed_Orbits', 'Google', 'Orbit_%d.kmz' % orbNum)))
+
+ # Cutting the end off the second coasting arc only changes the point-arc of its last orbit
+  (fields, records, shapes) = shp.ReadShapefile(rawArcs[1])
+  shp.WriteShapefile(rawArcs[1], shp.POINT, fields, records[:-30], shapes[:-30])
+
+  assert watchMode.PollMission(watch) == ([], [])
+  assert watchMode.PollMission(watch) == ([1003], [])
+
+def testFailureReportedOnce(tmpdir, monkeypatch):
+
+  (watch, rawArcs) = _OpenMission(tmpdir)
+  messages = []
+
+  def FailOrbit(arcFC, procDir, SwapLens, geodesic=False):
+    raise ValueError('bad orbit')
+
+  monkeypatch.setattr(watchMode, 'FuseOrbitNative', FailOrbit)
+
+  watchMode.PollMission(watch)
+  (published, failures) = watchMode.PollMission(watch, progress=messages.append)
+
+  assert published == []
+  assert sorted(f[:2] for f in failures) == [("Buff", 1000), ("Buff", 1001), ("Buff", 1002), ("Buff", 1003)]
+  assert 'M1 Buff: orbit 1000 failed. ValueError: bad orbit' in [m.split('\n')[0] for m in messages]
+
+ # The failed orbits are not retried while their inputs stay the same
+  monkeypatch.undo()
+
+  assert watchMode.PollMission(watch) == ([], [])